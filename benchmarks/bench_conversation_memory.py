@@ -0,0 +1,97 @@
+"""
+Memoria por conversación: ConversacionData (pydantic) vs CompactConversation.
+
+Arma N conversaciones con una mezcla realista (la mayoría en el menú o
+recolectando datos, una fracción en handoff con historial y otra en
+encuesta) y reporta bytes por conversación (tracemalloc), costo de creación y
+costo de acceso a los atributos del camino caliente.
+
+Uso:
+    python benchmarks/bench_conversation_memory.py [--sizes 10000 100000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.compact_conversation import CompactConversation
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+
+
+def _build(factory, index):
+    conversation = factory(f"+54911{index:08d}", EstadoConversacion.INICIO)
+    kind = index % 10
+    if kind < 6:
+        conversation.estado = EstadoConversacion.RECOLECTANDO_SECUENCIAL
+        conversation.tipo_consulta = TipoConsulta.PAGO_EXPENSAS
+        conversation.datos_temporales["fecha_pago"] = "12/03/2026"
+        conversation.datos_temporales["monto"] = "42000"
+    elif kind < 8:
+        conversation.estado = EstadoConversacion.ATENDIDO_POR_HUMANO
+        conversation.atendido_por_humano = True
+        conversation.handoff_started_at = datetime.utcnow()
+        for message_index in range(10):
+            conversation.message_history.append(
+                {"timestamp": datetime.utcnow(), "sender": "client", "message": f"mensaje {message_index}"}
+            )
+    elif kind == 8:
+        conversation.estado = EstadoConversacion.ENCUESTA_SATISFACCION
+        conversation.survey_enabled = True
+        conversation.survey_responses["1"] = "5"
+    return conversation
+
+
+def _pydantic_factory(numero_telefono, estado):
+    return ConversacionData(numero_telefono=numero_telefono, estado=estado)
+
+
+def _touch(conversation):
+    return (
+        conversation.estado == EstadoConversacion.ATENDIDO_POR_HUMANO,
+        conversation.atendido_por_humano,
+        conversation.datos_temporales.get("monto"),
+        conversation.survey_enabled,
+    )
+
+
+def _measure(label, factory, size):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    conversations = [_build(factory, index) for index in range(size)]
+    created = time.perf_counter() - started
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for conversation in conversations:
+        _touch(conversation)
+    accessed = time.perf_counter() - started
+
+    print(
+        f"{label:<8} n={size:>7} bytes/conv={current / size:8.0f} "
+        f"create={created / size * 1e6:6.2f}us access={accessed / size * 1e6:6.3f}us"
+    )
+    del conversations
+    return current / size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        full = _measure("pydantic", _pydantic_factory, size)
+        compact = _measure("compact", CompactConversation, size)
+        print(f"{'':<8} n={size:>7} compact/pydantic={compact / full:6.2%}")
+
+
+if __name__ == "__main__":
+    main()
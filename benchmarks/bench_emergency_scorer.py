@@ -0,0 +1,101 @@
+"""
+Tasa de llamadas al LLM de la detección de emergencias: antes vs. con el scorer local.
+
+Recorre una mezcla de mensajes típica fuera del menú (fechas, montos,
+direcciones, confirmaciones, descripciones de reclamos, mensajes durante el
+handoff y algunas emergencias reales) y cuenta cuántos llegarían a
+`nlu_service.mapear_intencion`. Antes del scorer eran todos los que no son
+saludo. También mide el costo por mensaje del scorer.
+
+Uso:
+    python benchmarks/bench_emergency_scorer.py [--repeat 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.emergency_scorer import AMBIGUOUS, EMERGENCY
+from chatbot.rules import ChatbotRules
+
+# (mensaje, es_emergencia) con la proporción aproximada del tráfico real
+CORPUS = (
+    [("12/03/2026", False), ("hoy", False), ("ayer a la tarde", False), ("15/2", False)] * 6
+    + [("42000", False), ("$ 38.500", False), ("pagué 51000 pesos", False)] * 6
+    + [("Av. Corrientes 1234", False), ("Paraguay 2957 7D", False), ("Sarmiento 1922 2° A", False)] * 6
+    + [("si", False), ("no", False), ("1", False), ("3", False), ("confirmo", False), ("ok gracias", False)] * 5
+    + [("juan.perez@gmail.com", False), ("Juan Pérez", False), ("de 9 a 13", False)] * 4
+    + [
+        ("hay humedad en la pared del living", False),
+        ("la pintura del pasillo está descascarada", False),
+        ("ruidos molestos del 4B todas las noches", False),
+        ("necesito una destapación en la cocina", False),
+        ("hay cucarachas en el sótano", False),
+    ] * 4
+    + [
+        ("la luz del pasillo no funciona", False),
+        ("se rompió el caño de la cocina", False),
+        ("pierde agua el tanque", False),
+        ("necesito pagar urgente las expensas", False),
+        ("sin agua desde ayer", False),
+    ] * 2
+    + [
+        ("quiero pagar urgente", False),
+        ("pasame el cbu urgente", False),
+        ("no hay humo ni fuego", False),
+        ("estoy inundado de trabajo, despues pago", False),
+        ("ayer hubo un incendio, ya esta todo bien, quiero presupuesto", False),
+    ]
+    + [
+        ("hay olor a gas en el palier", True),
+        ("urgencia", True),
+        ("se está inundando el departamento", True),
+        ("hay humo en la escalera", True),
+        ("me quedé encerrado en el ascensor", True),
+        ("huele a quemado en el pasillo", True),
+        ("se quema algo en el 3B", True),
+        ("salen llamas del medidor", True),
+        ("un vecino se desmayó en el hall", True),
+    ]
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    scorer = ChatbotRules._get_emergency_scorer()
+    escalated = 0
+    false_negatives = []
+    false_positives = []
+    for message, is_emergency in CORPUS:
+        # Fuera del menú: los positivos también los confirma el LLM
+        verdict = scorer.score(message, local_positives=False)
+        if verdict.decision == AMBIGUOUS:
+            escalated += 1
+        elif (verdict.decision == EMERGENCY) != is_emergency:
+            (false_negatives if is_emergency else false_positives).append(message)
+
+    total = len(CORPUS)
+    print(f"mensajes: {total}")
+    print(f"llamadas al LLM antes: {total} (tasa 1.000)")
+    print(f"llamadas al LLM con scorer: {escalated} (tasa {escalated / total:.3f})")
+    print(f"falsos negativos locales: {false_negatives or 'ninguno'}")
+    print(f"falsos positivos locales: {false_positives or 'ninguno'}")
+
+    messages = [message for message, _ in CORPUS]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for message in messages:
+            scorer.score(message, local_positives=False)
+    elapsed = time.perf_counter() - start
+    print(f"scorer: {elapsed / (args.repeat * total) * 1e6:.2f} µs/mensaje")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Resolución de direcciones de expensas: recorrido lineal vs. índice.
+
+Antes `_resolve_address_code_once` normalizaba cada entrada de
+`expensas_address_map` en cada búsqueda (localidad, números, avenida, tokens)
+y lo repetía en el reintento con el número pegado a la calle;
+`get_canonical_address` recorría `canonical_map` y
+`get_fuzzy_address_suggestions` normalizaba cada dirección canónica y corría
+SequenceMatcher contra todas. Ahora el índice se arma una vez por perfil:
+cada búsqueda son unas pocas consultas a diccionarios y las sugerencias solo
+comparan la calle de los edificios con el mismo número.
+
+Usa un mapa sintético de N edificios (por defecto 5.000) con variantes con y
+sin "Av.", números con barra y localidad (más calles con errores de tipeo
+para las sugerencias), y verifica que las dos implementaciones den lo mismo.
+También mide el arranque con catálogo externo: compilar el CSV vs. cargar el
+snapshot (pickle) ya compilado.
+
+Uso:
+    python benchmarks/bench_expensas_address_index.py [--buildings 5000] [--queries 100] [--repeat 3]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from difflib import SequenceMatcher
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from services.building_catalog import BuildingCatalog
+from services.expensas_sheet_service import ExpensasSheetService
+
+STREETS = [
+    "Santa Fe", "Córdoba", "Corrientes", "Rivadavia", "Pueyrredón", "Entre Ríos", "Callao",
+    "Paraguay", "Lavalle", "Charcas", "Güemes", "Sarmiento", "Uruguay", "Suipacha", "Junín",
+    "Billinghurst", "Aráoz", "Lezica", "Viel", "Amenábar", "Boyacá", "Palestina", "Formosa",
+    "Luis María Drago", "Ortiz de Ocampo", "Tte. Gral. Juan Domingo Perón", "Mario Bravo",
+    "Anibal Troilo", "Scalabrini Ortiz", "Juan B. Justo", "Medrano", "Gascón", "Bulnes",
+]
+
+
+def build_maps(buildings, seed=7):
+    rng = random.Random(seed)
+    address_map, canonical_map = {}, {}
+    used = set()
+    code = 1
+    while code <= buildings:
+        street = rng.choice(STREETS)
+        number = rng.randrange(10, 9000, 2)
+        if (street, number) in used:
+            continue
+        used.add((street, number))
+        avenida = "Av. " if rng.random() < 0.3 else ""
+        canonical = f"{avenida}{street} {number}/{(number + 2) % 100:02d}" if rng.random() < 0.2 else f"{avenida}{street} {number}"
+        address_map[code] = [canonical, f"{street} {number}"]
+        canonical_map[code] = canonical
+        code += 1
+    return address_map, canonical_map
+
+
+def build_queries(address_map, count, seed=11):
+    rng = random.Random(seed)
+    codes = list(address_map)
+    queries = []
+    for _ in range(count):
+        street_number = address_map[rng.choice(codes)][1]
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(street_number)
+        elif kind < 0.6:
+            queries.append(f"Av. {street_number}, CABA")
+        elif kind < 0.75:
+            # Número pegado a la calle ("Guemes3972")
+            street, number = street_number.rsplit(" ", 1)
+            queries.append(f"{street}{number}")
+        else:
+            # Número que no está en el mapa
+            queries.append(f"{rng.choice(STREETS)} {rng.randrange(1, 9000, 2)}")
+    return queries
+
+
+def build_typo_queries(canonical_map, count, seed=13):
+    rng = random.Random(seed)
+    canonicals = list(canonical_map.values())
+    queries = []
+    for _ in range(count):
+        street, number = rng.choice(canonicals).rsplit(" ", 1)
+        position = rng.randrange(1, len(street) - 1)
+        # Letra cambiada o salteada
+        if rng.random() < 0.5:
+            street = street[:position] + rng.choice("aeiourn") + street[position + 1:]
+        else:
+            street = street[:position] + street[position + 1:]
+        queries.append(f"{street} {number.split('/')[0]}")
+    return queries
+
+
+# --- Implementación anterior (copiada de antes del índice) ---
+
+def legacy_resolve_once(service, direccion, address_map):
+    input_clean = service._strip_localidad_tokens(direccion)
+    input_street_raw, input_numbers = service._extract_numbers_from_raw(input_clean)
+    input_street_norm = service._normalize_address_text(input_street_raw)
+    input_full_norm = service._normalize_address_text(input_clean)
+    input_street_norm_wo_avenida = service._strip_avenida_prefix(input_street_norm)
+    input_full_norm_wo_avenida = service._strip_avenida_prefix(input_full_norm)
+
+    for code, raw_address in address_map.items():
+        candidates = raw_address if isinstance(raw_address, (list, tuple, set)) else [raw_address]
+        for candidate in candidates:
+            raw_str = str(candidate).strip()
+            if not raw_str:
+                continue
+            mapped_clean = service._strip_localidad_tokens(raw_str)
+            mapped_street_raw, mapped_numbers = service._extract_numbers_from_raw(mapped_clean)
+            mapped_street_norm = service._normalize_address_text(mapped_street_raw)
+            mapped_full_norm = service._normalize_address_text(mapped_clean)
+            mapped_street_norm_wo_avenida = service._strip_avenida_prefix(mapped_street_norm)
+            mapped_full_norm_wo_avenida = service._strip_avenida_prefix(mapped_full_norm)
+
+            same_street = input_street_norm == mapped_street_norm
+            same_street = same_street or (
+                input_street_norm_wo_avenida
+                and input_street_norm_wo_avenida == mapped_street_norm_wo_avenida
+            )
+            if not same_street:
+                input_tokens = service._street_token_set(input_street_norm_wo_avenida or input_street_norm)
+                mapped_tokens = service._street_token_set(mapped_street_norm_wo_avenida or mapped_street_norm)
+                if mapped_tokens and mapped_tokens.issubset(input_tokens):
+                    same_street = True
+
+            if input_numbers and mapped_numbers and same_street:
+                if any(num in mapped_numbers for num in input_numbers):
+                    return service._coerce_code(code)
+            if input_full_norm and input_full_norm == mapped_full_norm:
+                return service._coerce_code(code)
+            if input_full_norm_wo_avenida and input_full_norm_wo_avenida == mapped_full_norm_wo_avenida:
+                return service._coerce_code(code)
+    return None
+
+
+def legacy_resolve(service, direccion, address_map):
+    resolved = legacy_resolve_once(service, direccion, address_map)
+    if resolved is not None:
+        return resolved
+    compact_input = service._strip_localidad_tokens(direccion)
+    compact_candidate = service._split_compact_street_number(compact_input)
+    if compact_candidate and compact_candidate != compact_input:
+        return legacy_resolve_once(service, compact_candidate, address_map)
+    return None
+
+
+def legacy_canonical(service, code, canonical_map):
+    normalized_code = service._coerce_code(code)
+    for raw_code, value in canonical_map.items():
+        if service._coerce_code(raw_code) == normalized_code:
+            return str(value).strip() or None
+    return None
+
+
+def legacy_fuzzy(service, direccion, canonical_map):
+    input_clean = service._strip_localidad_tokens(direccion)
+    input_street_raw, input_numbers = service._extract_numbers_from_raw(input_clean)
+    if not input_numbers:
+        return []
+    input_street_norm = service._strip_avenida_prefix(service._normalize_address_text(input_street_raw))
+    if not input_street_norm:
+        return []
+
+    matches = []
+    for canonical in canonical_map.values():
+        canonical_text = str(canonical).strip()
+        if not canonical_text:
+            continue
+        canonical_clean = service._strip_localidad_tokens(canonical_text)
+        candidate_street_raw, candidate_numbers = service._extract_numbers_from_raw(canonical_clean)
+        if not candidate_numbers or not any(number in candidate_numbers for number in input_numbers):
+            continue
+        candidate_street_norm = service._strip_avenida_prefix(service._normalize_address_text(candidate_street_raw))
+        if not candidate_street_norm:
+            continue
+        input_tokens = [token for token in service._street_token_set(input_street_norm) if token]
+        candidate_tokens = [token for token in service._street_token_set(candidate_street_norm) if token]
+        token_score = sum(
+            max(SequenceMatcher(None, a, b).ratio() for b in candidate_tokens) for a in input_tokens
+        ) / len(input_tokens)
+        full_score = SequenceMatcher(None, "".join(input_tokens), "".join(candidate_tokens)).ratio()
+        similarity = max(token_score, full_score)
+        if similarity >= service._FUZZY_STREET_THRESHOLD:
+            matches.append((similarity, canonical_text))
+
+    matches.sort(key=lambda item: (-item[0], item[1]))
+    unique_matches = []
+    for score, canonical in matches:
+        if canonical not in [text for _, text in unique_matches]:
+            unique_matches.append((score, canonical))
+    if len(unique_matches) > 2:
+        return []
+    if len(unique_matches) == 2 and (unique_matches[0][0] - unique_matches[1][0]) > service._FUZZY_SECONDARY_DELTA:
+        return [unique_matches[0][1]]
+    return [canonical for _, canonical in unique_matches]
+
+
+def _per_call_us(func, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (repeat * len(items)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buildings", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    address_map, canonical_map = build_maps(args.buildings)
+    queries = build_queries(address_map, args.queries)
+    service = ExpensasSheetService()
+    service._get_profile_maps = lambda: (address_map, canonical_map)
+
+    start = time.perf_counter()
+    service._get_address_index()
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    # El recorrido lineal tarda cientos de ms por consulta: se mide en la misma pasada que compara
+    start = time.perf_counter()
+    legacy_results = [legacy_resolve(service, query, address_map) for query in queries]
+    before = (time.perf_counter() - start) / len(queries) * 1e6
+    mismatches = [
+        query
+        for query, expected in zip(queries, legacy_results)
+        if service._resolve_address_code(query) != expected
+    ]
+    resolved = sum(result is not None for result in legacy_results)
+    print(
+        f"edificios: {len(address_map)}  consultas: {len(queries)} (resueltas {resolved})  "
+        f"diferencias: {mismatches or 'ninguna'}  armado del índice: {build_ms:.1f} ms"
+    )
+
+    after = _per_call_us(service._resolve_address_code, queries, args.repeat * 100)
+    print(f"{'dirección→código':18s} antes {before:10.1f} µs  índice {after:6.2f} µs  x{before / after:.0f}")
+
+    codes = list(canonical_map)[-args.queries:]
+    before = _per_call_us(lambda code: legacy_canonical(service, code, canonical_map), codes, args.repeat)
+    after = _per_call_us(service.get_canonical_address, codes, args.repeat * 100)
+    print(f"{'código→canónica':18s} antes {before:10.1f} µs  índice {after:6.2f} µs  x{before / after:.0f}")
+
+    typo_queries = build_typo_queries(canonical_map, args.queries)
+    start = time.perf_counter()
+    legacy_results = [legacy_fuzzy(service, query, canonical_map) for query in typo_queries]
+    before = (time.perf_counter() - start) / len(typo_queries) * 1e6
+    mismatches = [
+        query
+        for query, expected in zip(typo_queries, legacy_results)
+        if service.get_fuzzy_address_suggestions(query) != expected
+    ]
+    suggested = sum(bool(result) for result in legacy_results)
+    after = _per_call_us(service.get_fuzzy_address_suggestions, typo_queries, args.repeat * 100)
+    print(
+        f"{'sugerencias':18s} antes {before:10.1f} µs  índice {after:6.2f} µs  x{before / after:.0f}  "
+        f"(con sugerencia {suggested}/{len(typo_queries)}, diferencias: {mismatches or 'ninguna'})"
+    )
+
+    bench_catalog_boot(service, address_map, canonical_map)
+
+
+def bench_catalog_boot(service, address_map, canonical_map):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "edificios.csv")
+        snapshot_path = os.path.join(tmp_dir, "edificios.pickle")
+        with open(csv_path, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["codigo", "direccion", "canonica"])
+            for code, variants in address_map.items():
+                for position, variant in enumerate(variants):
+                    writer.writerow([code, variant, canonical_map[code] if position == 0 else ""])
+
+        def new_catalog():
+            return BuildingCatalog(
+                service._build_address_index, path=csv_path, snapshot_path=snapshot_path, reload_seconds=0
+            )
+
+        start = time.perf_counter()
+        new_catalog().reload()
+        compile_ms = (time.perf_counter() - start) * 1e3
+
+        catalog = new_catalog()
+        start = time.perf_counter()
+        catalog.load_snapshot()
+        snapshot_ms = (time.perf_counter() - start) * 1e3
+        size_kb = os.path.getsize(snapshot_path) / 1024
+        print(
+            f"{'arranque catálogo':18s} CSV {compile_ms:8.1f} ms  snapshot {snapshot_ms:6.1f} ms  "
+            f"x{compile_ms / snapshot_ms:.0f}  ({size_kb:.0f} KiB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Detectores regex/keyword por mensaje: loops de patrones vs. el matcher precompilado.
+
+Antes cada detector normalizaba el texto y corría sus propios patrones
+(`re.search` sin compilar, un regex nuevo por keyword en `_has_any_keyword`,
+`rf"\\b...\\b"` por frase de emergencia). Ahora `chatbot/message_matcher.py`
+recorre cada vista una vez con una alternación armada al importar y todos los
+detectores leen ese resultado.
+
+Mide por detector (implementación anterior vs. escaneo nuevo sin cache) y el
+costo total por mensaje cuando corren todos. También verifica que las dos
+implementaciones den el mismo resultado sobre el corpus.
+
+Uso:
+    python benchmarks/bench_message_matcher.py [--repeat 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import unicodedata
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot import message_matcher as mm
+
+CORPUS = (
+    ["12/03/2026", "hoy", "42000", "$ 38.500", "Av. Corrientes 1234", "Paraguay 2957 7D", "si", "1", "confirmo"] * 4
+    + [
+        "hay humedad en la pared del living",
+        "ruidos molestos del 4B todas las noches",
+        "juan.perez@gmail.com",
+        "Juan Pérez",
+        "de 9 a 13",
+    ] * 3
+    + [
+        "quiero hablar con una persona",
+        "no me entendés",
+        "no quiero hablar con nadie",
+        "necesito comunicarme",
+        "cuál es el teléfono?",
+        "me pasás el mail de contacto",
+        "número de cuenta 1234",
+        "información de contacto",
+        "muchas gracias!!",
+        "graciasss 🙏",
+        "volver al menú",
+        "sin aguaaa desde ayer",
+        "hay corte de gas en el edificio",
+    ]
+)
+
+
+# --- Implementación anterior (copiada de antes del matcher) ---
+
+def _legacy_normalize_text(value):
+    value = value.lower().strip()
+    return "".join(c for c in unicodedata.normalize("NFD", value) if unicodedata.category(c) != "Mn")
+
+
+def _legacy_normalize_words(texto):
+    texto = texto.strip().lower()
+    texto = "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+    texto = "".join(c if c.isalnum() or c.isspace() else " " for c in texto)
+    return " ".join(texto.split())
+
+
+def _legacy_normalize_menu(text):
+    return re.sub(r"(.)\1{2,}", r"\1", _legacy_normalize_words(text))
+
+
+def _legacy_has_any_keyword(text, keywords):
+    for keyword in keywords:
+        if re.search(rf"\b{re.escape(keyword)}\b", text):
+            return True
+    return False
+
+
+_NUMERO = r"(?:\b(?:numero|nro\.?|num)\b|n°|nº|#)"
+_CONTACT_INFO = re.compile(mm.CONTACT_INFO_PHRASE_PATTERN)
+_CALL = [re.compile(pattern) for pattern in mm.CALL_PATTERNS]
+_EXCLUSION = re.compile(rf"{_NUMERO}\s+de\s+(?:{'|'.join(mm.EXCLUSION_TERMS)})\b")
+_ADJ_NUM = re.compile(rf"{_NUMERO}\s+(?:de|para)?\s*(?:contacto|comunicarme)\b")
+_ADJ_EMAIL = re.compile(r"\b(?:email|mail|correo)\b\s+(?:de|para)?\s*(?:contacto|comunicarme)\b")
+
+
+def _legacy_adjacency(text):
+    return bool(_ADJ_NUM.search(text) or _ADJ_EMAIL.search(text))
+
+
+def _legacy_channels(text):
+    if _legacy_has_any_keyword(text, mm.PHONE_KEYWORDS):
+        return True
+    if _legacy_has_any_keyword(text, mm.WHATSAPP_KEYWORDS):
+        return True
+    if _legacy_has_any_keyword(text, mm.EMAIL_KEYWORDS):
+        return True
+    return any(pattern.search(text) for pattern in _CALL)
+
+
+def legacy_humano(mensaje):
+    text = _legacy_normalize_text(mensaje)
+    for neg in mm.HUMAN_NEGATION_PATTERNS:
+        if re.search(neg, text, re.IGNORECASE):
+            return False
+    if "comunicarme" in text and not _legacy_adjacency(text) and not _legacy_channels(text):
+        return True
+    for pattern in mm.HUMAN_INTENT_PATTERNS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return True
+    return False
+
+
+def legacy_contacto(mensaje):
+    text = _legacy_normalize_text(mensaje)
+    if _EXCLUSION.search(text):
+        return False
+    if _CONTACT_INFO.search(text):
+        return True
+    return _legacy_channels(text) or _legacy_adjacency(text)
+
+
+def legacy_emergency_phrase(mensaje):
+    normalized = _legacy_normalize_menu(mensaje)
+    return any(re.search(rf"\b{re.escape(phrase)}\b", normalized) for phrase in mm.EMERGENCY_MENU_PHRASES)
+
+
+def legacy_gratitude(mensaje):
+    normalized = _legacy_normalize_words(mensaje)
+    return any(keyword in normalized for keyword in mm.GRATITUDE_KEYWORDS)
+
+
+def legacy_volver_menu(mensaje):
+    lower = mensaje.lower().strip()
+    return any(frase in lower for frase in ("menu", "menú", "menu principal", "menú principal"))
+
+
+# --- Implementación nueva: mismas decisiones leyendo un único escaneo ---
+
+def new_humano(scan):
+    if mm.HUMAN_NEGATION in scan:
+        return False
+    if mm.COMUNICARME in scan and mm.CONTACT_ADJACENCY not in scan and mm.CONTACT_CHANNEL not in scan:
+        return True
+    return mm.HUMAN_INTENT in scan
+
+
+def new_contacto(scan):
+    if mm.CONTACT_EXCLUSION in scan:
+        return False
+    return bool({mm.CONTACT_INFO, mm.CONTACT_CHANNEL, mm.CONTACT_ADJACENCY} & scan.hits)
+
+
+# (nombre, anterior, nuevo, detectores del matcher que usa)
+DETECTORS = (
+    (
+        "solicitud_humano",
+        legacy_humano,
+        new_humano,
+        (mm.HUMAN_NEGATION, mm.COMUNICARME, mm.HUMAN_INTENT, mm.CONTACT_CHANNEL, mm.CONTACT_ADJACENCY),
+    ),
+    (
+        "consulta_contacto",
+        legacy_contacto,
+        new_contacto,
+        (mm.CONTACT_EXCLUSION, mm.CONTACT_INFO, mm.CONTACT_CHANNEL, mm.CONTACT_ADJACENCY),
+    ),
+    ("frase_emergencia", legacy_emergency_phrase, lambda scan: mm.EMERGENCY_PHRASE in scan, (mm.EMERGENCY_PHRASE,)),
+    ("agradecimiento", legacy_gratitude, lambda scan: mm.GRATITUDE in scan, (mm.GRATITUDE,)),
+    ("volver_menu", legacy_volver_menu, lambda scan: mm.VOLVER_MENU in scan, (mm.VOLVER_MENU,)),
+)
+
+
+def _per_message_us(func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            func(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    matcher = mm.message_matcher
+    messages = list(CORPUS)
+
+    mismatches = []
+    for message in messages:
+        scan = matcher.scan(message)
+        for name, legacy, new, _ in DETECTORS:
+            if legacy(message) != new(scan):
+                mismatches.append((name, message))
+    print(f"mensajes: {len(messages)}  diferencias: {mismatches or 'ninguna'}")
+
+    # Por detector: el matcher armado solo con sus patrones (incluye normalizar el texto)
+    legacy_total = 0.0
+    for name, legacy, new, detectors in DETECTORS:
+        single = mm.MessageMatcher({detector: mm.DETECTORS[detector] for detector in detectors})
+        before = _per_message_us(legacy, messages, args.repeat)
+        after = _per_message_us(lambda message: new(single.scan(message)), messages, args.repeat)
+        legacy_total += before
+        print(f"{name:18s} antes {before:7.2f} µs  matcher {after:7.2f} µs  x{before / after:.1f}")
+
+    # Por mensaje: todos los detectores leen un único escaneo
+    scan_cost = _per_message_us(matcher.scan, messages, args.repeat)
+    print(f"{'todos':18s} antes {legacy_total:7.2f} µs  matcher {scan_cost:7.2f} µs  x{legacy_total / scan_cost:.1f}")
+
+
+if __name__ == "__main__":
+    main()
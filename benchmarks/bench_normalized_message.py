@@ -0,0 +1,131 @@
+"""
+CPU de normalización por mensaje: normalizadores sueltos vs. NormalizedMessage.
+
+Antes, en un turno típico, el mismo texto pasaba por varios normalizadores,
+cada uno con su NFD + filtro de tildes + regex: opt-in, saludo (webhook,
+procesar_mensaje y detección de emergencia), menú (selección de opción y
+scorer), `_normalize_text` de NLU (humano y contacto) y agradecimiento. Ahora
+el webhook arma un `NormalizedMessage` una vez y cada uno lee su vista (lazy).
+
+Uso:
+    python benchmarks/bench_normalized_message.py [--repeat 5000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import unicodedata
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.normalized_message import NormalizedMessage
+
+CORPUS = [
+    "hola",
+    "Hola!!",
+    "12/03/2026",
+    "42000",
+    "$ 38.500",
+    "Av. Corrientes 1234",
+    "Sarmiento 1922 2° A",
+    "sí",
+    "quiero hablar con una persona",
+    "¿Cuál es el teléfono de la administración?",
+    "hay humedad en la pared del living, ¿pueden venir mañana?",
+    "Muchas gracias!! 🙏",
+    "volver al menú principal",
+    "sin aguaaa desde ayer",
+]
+
+
+# --- Normalizadores anteriores (copiados de antes de NormalizedMessage) ---
+
+def _sin_tildes(texto):
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+
+def legacy_optin(text):
+    return _sin_tildes(text.strip().upper())
+
+
+def legacy_greeting(text):
+    normalized = _sin_tildes(text.strip().lower())
+    normalized = " ".join(normalized.split())
+    normalized = normalized.strip(" \t\n\r¡!¿?.,;:()[]{}\"'`~*_")
+    return " ".join(normalized.split())
+
+
+def legacy_menu(text):
+    text = _sin_tildes(text.lower().strip())
+    text = "".join(c if c.isalnum() or c.isspace() else " " for c in text)
+    text = " ".join(text.split())
+    return re.sub(r"(.)\1{2,}", r"\1", text)
+
+
+def legacy_nlu(value):
+    return _sin_tildes(value.lower().strip())
+
+
+def legacy_gratitude(texto):
+    texto = _sin_tildes(texto.strip().lower())
+    texto = "".join(c if c.isalnum() or c.isspace() else " " for c in texto)
+    return " ".join(texto.split())
+
+
+# (nombre, normalizador anterior, vista nueva, veces por turno)
+NORMALIZERS = (
+    ("opt-in", legacy_optin, "keyword", 1),
+    ("saludo", legacy_greeting, "command", 3),
+    ("menú", legacy_menu, "squeezed", 2),
+    ("nlu", legacy_nlu, "accent_free", 2),
+    ("agradecimiento", legacy_gratitude, "words", 1),
+)
+
+
+def _per_message_us(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in CORPUS:
+            func(message)
+    return (time.perf_counter() - start) / (repeat * len(CORPUS)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args()
+
+    mismatches = [
+        (name, message)
+        for message in CORPUS
+        for name, legacy, view, _ in NORMALIZERS
+        if legacy(message) != getattr(NormalizedMessage(message), view)
+    ]
+    print(f"mensajes: {len(CORPUS)}  diferencias: {mismatches or 'ninguna'}")
+
+    for name, legacy, view, _ in NORMALIZERS:
+        before = _per_message_us(legacy, args.repeat)
+        after = _per_message_us(lambda message: getattr(NormalizedMessage(message), view), args.repeat)
+        print(f"{name:15s} antes {before:6.2f} µs  vista {after:6.2f} µs")
+
+    def legacy_turn(message):
+        for _, legacy, _, times in NORMALIZERS:
+            for _ in range(times):
+                legacy(message)
+
+    def new_turn(message):
+        normalized = NormalizedMessage.of(message)
+        for _, _, view, times in NORMALIZERS:
+            for _ in range(times):
+                getattr(normalized, view)
+
+    before = _per_message_us(legacy_turn, args.repeat)
+    after = _per_message_us(new_turn, args.repeat)
+    print(f"{'turno':15s} antes {before:6.2f} µs  una vez {after:6.2f} µs  x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
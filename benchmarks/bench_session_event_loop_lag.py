@@ -0,0 +1,171 @@
+"""
+Event-loop lag: session store sync vs async bajo N webhooks concurrentes.
+
+Usa un stand-in local de Firestore con latencia simulada (sin red ni
+credenciales). Cada "webhook" hace dedupe + carga de checkpoint, igual que el
+camino caliente de `/webhook/whatsapp`. Un monitor mide cuánto se atrasa un
+tick periódico del loop.
+
+Uso:
+    python benchmarks/bench_session_event_loop_lag.py [--webhooks 200] [--latency-ms 15]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from copy import deepcopy
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from google.api_core.exceptions import AlreadyExists
+
+from services.conversation_session_service import (
+    AsyncConversationSessionService,
+    ConversationSessionService,
+)
+
+TICK_SECONDS = 0.005
+
+
+class _Snapshot:
+    def __init__(self, data):
+        self._data = deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return deepcopy(self._data)
+
+
+class _SyncDocument:
+    def __init__(self, storage, doc_id, latency):
+        self._storage, self._doc_id, self._latency = storage, doc_id, latency
+
+    def _rtt(self):
+        time.sleep(self._latency)
+
+    def get(self):
+        self._rtt()
+        return _Snapshot(self._storage.get(self._doc_id))
+
+    def set(self, payload):
+        self._rtt()
+        self._storage[self._doc_id] = deepcopy(payload)
+
+    def create(self, payload):
+        self._rtt()
+        if self._doc_id in self._storage:
+            raise AlreadyExists("exists")
+        self._storage[self._doc_id] = deepcopy(payload)
+
+    def delete(self):
+        self._rtt()
+        self._storage.pop(self._doc_id, None)
+
+
+class _AsyncDocument(_SyncDocument):
+    async def _artt(self):
+        await asyncio.sleep(self._latency)
+
+    async def get(self):
+        await self._artt()
+        return _Snapshot(self._storage.get(self._doc_id))
+
+    async def set(self, payload):
+        await self._artt()
+        self._storage[self._doc_id] = deepcopy(payload)
+
+    async def create(self, payload):
+        await self._artt()
+        if self._doc_id in self._storage:
+            raise AlreadyExists("exists")
+        self._storage[self._doc_id] = deepcopy(payload)
+
+    async def delete(self):
+        await self._artt()
+        self._storage.pop(self._doc_id, None)
+
+
+class _Collection:
+    def __init__(self, storage, document_cls, latency):
+        self._storage, self._document_cls, self._latency = storage, document_cls, latency
+
+    def document(self, doc_id):
+        return self._document_cls(self._storage, doc_id, self._latency)
+
+
+class FirestoreStandIn:
+    def __init__(self, latency, document_cls):
+        self._latency = latency
+        self._document_cls = document_cls
+        self.collections = {}
+
+    def collection(self, name):
+        return _Collection(self.collections.setdefault(name, {}), self._document_cls, self._latency)
+
+
+async def _monitor(lags, stop):
+    loop = asyncio.get_running_loop()
+    expected = loop.time() + TICK_SECONDS
+    while not stop.is_set():
+        await asyncio.sleep(TICK_SECONDS)
+        now = loop.time()
+        lags.append(max(0.0, now - expected))
+        expected = now + TICK_SECONDS
+
+
+async def _run(mode, webhooks, latency):
+    if mode == "sync":
+        service = ConversationSessionService()
+        service._fs_client = FirestoreStandIn(latency, _SyncDocument)
+
+        async def handle(index):
+            service.mark_message_processed(f"wamid.{index}")
+            service.load_for_key(f"+54911{index:08d}")
+    else:
+        client = FirestoreStandIn(latency, _AsyncDocument)
+        service = AsyncConversationSessionService(client_factory=lambda: client)
+
+        async def handle(index):
+            await service.mark_message_processed(f"wamid.{index}")
+            await service.load_for_key(f"+54911{index:08d}")
+
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_monitor(lags, stop))
+    await asyncio.sleep(TICK_SECONDS * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(handle(index) for index in range(webhooks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    return elapsed, lags
+
+
+def _report(mode, elapsed, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(
+        f"{mode:<6} wall={elapsed * 1000:8.1f}ms "
+        f"lag_p50={statistics.median(lags_ms):8.2f}ms lag_p99={p99:8.2f}ms lag_max={lags_ms[-1]:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--webhooks", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=15.0)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    print(f"webhooks={args.webhooks} simulated_rtt={args.latency_ms}ms (2 round-trips por webhook)")
+    for mode in ("sync", "async"):
+        elapsed, lags = asyncio.run(_run(mode, args.webhooks, latency))
+        _report(mode, elapsed, lags)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput del backend de sesión SQLite (WAL) en el camino caliente por mensaje.
+
+Cada "mensaje" hace dedupe + carga de checkpoint + guardado, igual que un turno
+del flujo secuencial. Sin red ni credenciales: mide el piso local del store.
+
+Uso:
+    python benchmarks/bench_session_sqlite_backend.py [--messages 20000] [--conversations 500] [--threads 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from services.sqlite_session_service import SQLiteConversationSessionService
+
+
+def _turn(service, index, conversations):
+    key = f"+54911{index % conversations:08d}"
+    service.mark_message_processed(f"wamid.{index}")
+    checkpoint = service.load_for_key(key)
+    conversation = checkpoint.conversation if checkpoint else ConversacionData(
+        numero_telefono=key,
+        estado=EstadoConversacion.RECOLECTANDO_SECUENCIAL,
+        tipo_consulta=TipoConsulta.PAGO_EXPENSAS,
+    )
+    conversation.datos_temporales[f"campo_{index % 6}"] = str(index)
+    service.save_for_key(key, conversation)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service = SQLiteConversationSessionService(os.path.join(tmp_dir, "sessions.db"))
+        per_thread = args.messages // args.threads
+
+        def worker(offset):
+            for index in range(offset, offset + per_thread):
+                _turn(service, index, args.conversations)
+
+        threads = [threading.Thread(target=worker, args=(n * per_thread,)) for n in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        total = per_thread * args.threads
+        print(
+            f"sqlite messages={total} conversations={args.conversations} threads={args.threads} "
+            f"wall={elapsed * 1000:.1f}ms throughput={total / elapsed:,.0f} msg/s "
+            f"per_msg={elapsed / total * 1e6:.1f}us"
+        )
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
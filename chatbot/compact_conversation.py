@@ -0,0 +1,330 @@
+import os
+import sys
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from .models import ConversacionData, EstadoConversacion, TipoConsulta
+
+CONVERSATION_COMPACT_STORE = os.getenv("CONVERSATION_COMPACT_STORE", "false").lower() == "true"
+CONVERSATION_HISTORY_RING_SIZE = int(os.getenv("CONVERSATION_HISTORY_RING_SIZE", "10"))
+
+_HANDOFF_DEFAULTS: Dict[str, Any] = {
+    "atendido_por_humano": False,
+    "slack_thread_ts": None,
+    "slack_channel_id": None,
+    "handoff_started_at": None,
+    "last_client_message_at": None,
+    "modo_conversacion_activa": False,
+    "mensaje_handoff_contexto": None,
+    "handoff_notified": False,
+    "resolution_question_sent": False,
+    "resolution_question_sent_at": None,
+}
+_SURVEY_DEFAULTS: Dict[str, Any] = {
+    "survey_enabled": False,
+    "survey_offered": False,
+    "survey_offer_sent_at": None,
+    "survey_accepted": None,
+    "survey_sent": False,
+    "survey_sent_at": None,
+    "survey_responses": dict,
+    "survey_question_number": 0,
+}
+_HISTORY_KEYS = ("timestamp", "sender", "message")
+
+
+def _intern_enum(enum_cls, value) -> Optional[str]:
+    # El `.value` del miembro es un único objeto str compartido por todas las conversaciones
+    if value is None:
+        return None
+    return enum_cls(value).value
+
+
+def _make_record(name: str, defaults: Dict[str, Any]):
+    def __init__(self):
+        for field, default in defaults.items():
+            setattr(self, field, default() if callable(default) else default)
+
+    return type(name, (), {"__slots__": tuple(defaults), "__init__": __init__})
+
+
+_HandoffRecord = _make_record("_HandoffRecord", _HANDOFF_DEFAULTS)
+_SurveyRecord = _make_record("_SurveyRecord", _SURVEY_DEFAULTS)
+
+
+def _is_default(value, default) -> bool:
+    return value is default or (type(value) is type(default) and value == default)
+
+
+def _record_property(slot: str, record_cls, field: str, default):
+    mutable = callable(default)
+
+    def getter(self):
+        record = getattr(self, slot)
+        if record is None:
+            if not mutable:
+                return default
+            record = record_cls()
+            setattr(self, slot, record)
+        return getattr(record, field)
+
+    def setter(self, value):
+        record = getattr(self, slot)
+        if record is None:
+            if _is_default(value, default() if mutable else default):
+                return
+            record = record_cls()
+            setattr(self, slot, record)
+        setattr(record, field, value)
+
+    return property(getter, setter)
+
+
+class HistoryRing:
+    """
+    Historial de mensajes de tamaño fijo.
+
+    Guarda cada entrada {timestamp, sender, message} como tupla (el sender
+    internado) y la devuelve como dict, así que se lee igual que la lista.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, entries=(), maxlen: Optional[int] = None):
+        entries = list(entries)
+        maxlen = max(CONVERSATION_HISTORY_RING_SIZE if maxlen is None else maxlen, len(entries), 1)
+        self._items = deque((self._pack(entry) for entry in entries), maxlen=maxlen)
+
+    @staticmethod
+    def _pack(entry):
+        if isinstance(entry, dict) and tuple(entry) == _HISTORY_KEYS:
+            sender = entry["sender"]
+            return (entry["timestamp"], sys.intern(sender) if isinstance(sender, str) else sender, entry["message"])
+        return entry
+
+    @staticmethod
+    def _unpack(item):
+        if isinstance(item, tuple):
+            return dict(zip(_HISTORY_KEYS, item))
+        return item
+
+    def append(self, entry) -> None:
+        self._items.append(self._pack(entry))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._unpack(item) for item in self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._unpack(item) for item in list(self._items)[index]]
+        return self._unpack(self._items[index])
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+
+class CompactConversation:
+    """
+    Representación en memoria de `ConversacionData` para el store caliente.
+
+    Atributo por atributo se usa igual que el modelo pydantic, pero con
+    __slots__, los campos de handoff y encuesta en sub-registros que se
+    crean recién cuando algo deja de tener el valor default, enums
+    internados y el historial en un ring de tamaño fijo. `from_model` /
+    `to_model` convierten sin pérdida en los bordes de persistencia.
+    """
+
+    __slots__ = (
+        "numero_telefono",
+        "_estado",
+        "_estado_anterior",
+        "_tipo_consulta",
+        "datos_contacto",
+        "_datos_temporales",
+        "nombre_usuario",
+        "_handoff",
+        "_survey",
+        "_history",
+        "_checkpoint_fingerprint",
+        "_checkpoint_saved_at",
+        "_checkpoint_field_hashes",
+        "_checkpoint_schema_version",
+        "_estado_listener",
+    )
+
+    def __init__(self, numero_telefono: str, estado, **fields) -> None:
+        self.numero_telefono = numero_telefono
+        self._estado = _intern_enum(EstadoConversacion, estado)
+        self._estado_anterior = None
+        self._tipo_consulta = None
+        self.datos_contacto = None
+        self._datos_temporales = None
+        self.nombre_usuario = None
+        self._handoff = None
+        self._survey = None
+        self._history = None
+        self._checkpoint_fingerprint = None
+        self._checkpoint_saved_at = None
+        self._checkpoint_field_hashes = None
+        self._checkpoint_schema_version = None
+        self._estado_listener = None
+        for field, value in fields.items():
+            if field not in ConversacionData.model_fields:
+                raise TypeError(f"unexpected field {field!r}")
+            setattr(self, field, value)
+
+    # ---------- Campos principales ----------
+
+    @property
+    def estado(self) -> str:
+        return self._estado
+
+    @estado.setter
+    def estado(self, value) -> None:
+        self._estado = _intern_enum(EstadoConversacion, value)
+        if self._estado_listener is not None:
+            self._estado_listener()
+
+    def set_estado_listener(self, listener) -> None:
+        self._estado_listener = listener
+
+    @property
+    def estado_anterior(self) -> Optional[str]:
+        return self._estado_anterior
+
+    @estado_anterior.setter
+    def estado_anterior(self, value) -> None:
+        self._estado_anterior = _intern_enum(EstadoConversacion, value)
+
+    @property
+    def tipo_consulta(self) -> Optional[str]:
+        return self._tipo_consulta
+
+    @tipo_consulta.setter
+    def tipo_consulta(self, value) -> None:
+        self._tipo_consulta = _intern_enum(TipoConsulta, value)
+
+    @property
+    def datos_temporales(self) -> dict:
+        if self._datos_temporales is None:
+            self._datos_temporales = {}
+        return self._datos_temporales
+
+    @datos_temporales.setter
+    def datos_temporales(self, value) -> None:
+        self._datos_temporales = value
+
+    @property
+    def message_history(self) -> HistoryRing:
+        if self._history is None:
+            self._history = HistoryRing()
+        return self._history
+
+    @message_history.setter
+    def message_history(self, value) -> None:
+        self._history = value if isinstance(value, HistoryRing) else HistoryRing(value)
+
+    # ---------- Dirty-tracking del checkpoint (mismo contrato que ConversacionData) ----------
+
+    def mark_checkpoint_saved(
+        self,
+        fingerprint: str,
+        saved_at: datetime,
+        *,
+        field_hashes: Optional[Dict[str, str]] = None,
+        schema_version: Optional[int] = None,
+    ) -> None:
+        self._checkpoint_fingerprint = fingerprint
+        self._checkpoint_saved_at = saved_at
+        self._checkpoint_field_hashes = field_hashes
+        self._checkpoint_schema_version = schema_version
+
+    def checkpoint_changed(self, fingerprint: str) -> bool:
+        return self._checkpoint_fingerprint != fingerprint
+
+    @property
+    def checkpoint_saved_at(self) -> Optional[datetime]:
+        return self._checkpoint_saved_at
+
+    @property
+    def checkpoint_field_hashes(self) -> Optional[Dict[str, str]]:
+        return self._checkpoint_field_hashes
+
+    @property
+    def checkpoint_schema_version(self) -> Optional[int]:
+        return self._checkpoint_schema_version
+
+    # ---------- Conversión ----------
+
+    @classmethod
+    def from_model(cls, model: ConversacionData) -> "CompactConversation":
+        compact = cls(model.numero_telefono, model.estado)
+        for field in ConversacionData.model_fields:
+            if field in ("numero_telefono", "estado"):
+                continue
+            value = getattr(model, field)
+            # Los contenedores vacíos quedan sin asignar (se crean al primer uso)
+            if isinstance(value, (dict, list)) and not value:
+                continue
+            setattr(compact, field, value)
+        compact.mark_checkpoint_saved(
+            model._checkpoint_fingerprint,
+            model.checkpoint_saved_at,
+            field_hashes=model.checkpoint_field_hashes,
+            schema_version=model.checkpoint_schema_version,
+        )
+        return compact
+
+    def to_model(self) -> ConversacionData:
+        fields = {field: self._peek(field) for field in ConversacionData.model_fields}
+        model = ConversacionData(**fields)
+        model.mark_checkpoint_saved(
+            self._checkpoint_fingerprint,
+            self._checkpoint_saved_at,
+            field_hashes=self._checkpoint_field_hashes,
+            schema_version=self._checkpoint_schema_version,
+        )
+        return model
+
+    def _peek(self, field: str):
+        """Lee un campo sin materializar sub-registros ni contenedores vacíos."""
+        if field in _HANDOFF_DEFAULTS or field in _SURVEY_DEFAULTS:
+            record = self._handoff if field in _HANDOFF_DEFAULTS else self._survey
+            if record is None:
+                default = _HANDOFF_DEFAULTS.get(field, _SURVEY_DEFAULTS.get(field))
+                return default() if callable(default) else default
+            return getattr(record, field)
+        if field == "datos_temporales":
+            return self._datos_temporales if self._datos_temporales is not None else {}
+        if field == "message_history":
+            return self._history.to_list() if self._history is not None else []
+        return getattr(self, field)
+
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        return self.to_model().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs) -> str:
+        return self.to_model().model_dump_json(**kwargs)
+
+    def __repr__(self) -> str:
+        return f"CompactConversation(numero_telefono={self.numero_telefono!r}, estado={self._estado!r})"
+
+
+for _field, _default in _HANDOFF_DEFAULTS.items():
+    setattr(CompactConversation, _field, _record_property("_handoff", _HandoffRecord, _field, _default))
+for _field, _default in _SURVEY_DEFAULTS.items():
+    setattr(CompactConversation, _field, _record_property("_survey", _SurveyRecord, _field, _default))
+
+
+def to_runtime_conversation(conversation):
+    """Conversación para el store en memoria: compacta si CONVERSATION_COMPACT_STORE está activo."""
+    if CONVERSATION_COMPACT_STORE and isinstance(conversation, ConversacionData):
+        return CompactConversation.from_model(conversation)
+    return conversation
@@ -0,0 +1,280 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import MutableMapping
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from .models import ConversacionData
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_CACHE_MAX_SIZE = int(os.getenv("CONVERSATION_CACHE_MAX_SIZE", "20000"))
+CONVERSATION_CACHE_IDLE_SECONDS = float(os.getenv("CONVERSATION_CACHE_IDLE_SECONDS", "7200"))
+
+# Cuántas conversaciones se miden para estimar el tamaño en memoria
+_SIZE_SAMPLE = 64
+
+
+class ConversationCache(MutableMapping):
+    """
+    Mapa de conversaciones residentes acotado por capacidad (LRU) y por tiempo
+    sin actividad (TTL).
+
+    Se usa como el dict `conversaciones` del manager. Al desalojar se llama a
+    `on_evict(key, conversation)` en un hilo de spill: el alta que desaloja
+    no espera el guardado (puede venir del event loop). Mientras tanto la
+    conversación queda en `_spilling` y un acceso la recupera. Si `on_evict`
+    retorna False (p.ej. falló el spill al store) vuelve a quedar residente.
+    Las que cumplen `is_pinned` no se desalojan (handoff, encuesta, turno en
+    curso). `in` solo consulta: no cambia el orden LRU ni el último acceso.
+
+    Con `group_of` mantiene un conteo por grupo (p.ej. estado) que se
+    actualiza en altas, bajas y desalojos. Los cambios de estado in-place
+    llegan por `set_estado_listener` de la conversación; otros cambios que
+    afecten al grupo se avisan con `regroup(key)`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+        on_evict: Optional[Callable[[str, ConversacionData], bool]] = None,
+        is_pinned: Optional[Callable[[str, ConversacionData], bool]] = None,
+        group_of: Optional[Callable[[ConversacionData], Hashable]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max(1, CONVERSATION_CACHE_MAX_SIZE if max_size is None else max_size)
+        self.idle_seconds = CONVERSATION_CACHE_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self._on_evict = on_evict
+        self._is_pinned = is_pinned
+        self._group_of = group_of
+        self._groups: Dict[str, Hashable] = {}
+        self._group_counts: Counter = Counter()
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, Tuple[ConversacionData, float]]" = OrderedDict()
+        # Desalojadas cuyo spill está en curso: un acceso concurrente las recupera
+        self._spilling: Dict[str, ConversacionData] = {}
+        self._sweep_interval = max(1.0, min(60.0, self.idle_seconds / 10))
+        self._last_sweep = clock()
+        self._evicted_capacity = 0
+        self._evicted_idle = 0
+        self._spill_failures = 0
+        self._resurrected = 0
+        self._spill_queue: "queue.Queue[Tuple[str, ConversacionData, str]]" = queue.Queue()
+        self._spill_thread: Optional[threading.Thread] = None
+
+    # ---------- MutableMapping ----------
+
+    def __getitem__(self, key: str) -> ConversacionData:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                conversation = self._spilling.pop(key, None)
+                if conversation is None:
+                    raise KeyError(key)
+                self._resurrected += 1
+            else:
+                conversation = entry[0]
+            self._entries[key] = (conversation, self._clock())
+            self._entries.move_to_end(key)
+            return conversation
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._entries or key in self._spilling
+
+    def __setitem__(self, key: str, conversation: ConversacionData) -> None:
+        with self._lock:
+            self._spilling.pop(key, None)
+            self._entries[key] = (conversation, self._clock())
+            self._entries.move_to_end(key)
+            self._set_group_locked(key, conversation)
+            victims = self._collect_victims(protect=key)
+        self._spill_later(victims)
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            found = self._entries.pop(key, None) is not None
+            found = self._spilling.pop(key, None) is not None or found
+            if found:
+                self._set_group_locked(key, None)
+        if not found:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            keys = list(self._entries)
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._spilling.clear()
+            self._groups.clear()
+            self._group_counts.clear()
+
+    # Recorridos completos (/stats, sweeps): snapshot sin tocar el orden LRU ni el último acceso
+    def values(self) -> List[ConversacionData]:
+        with self._lock:
+            return [conversation for conversation, _ in self._entries.values()]
+
+    def items(self) -> List[Tuple[str, ConversacionData]]:
+        with self._lock:
+            return [(key, conversation) for key, (conversation, _) in self._entries.items()]
+
+    # ---------- Conteo por grupo ----------
+
+    def _set_group_locked(self, key: str, conversation: Optional[ConversacionData]) -> None:
+        if self._group_of is None:
+            return
+        if key in self._groups:
+            previous = self._groups.pop(key)
+            self._group_counts[previous] -= 1
+            if self._group_counts[previous] <= 0:
+                del self._group_counts[previous]
+        if conversation is not None:
+            group = self._group_of(conversation)
+            self._groups[key] = group
+            self._group_counts[group] += 1
+            set_listener = getattr(conversation, "set_estado_listener", None)
+            if set_listener is not None:
+                set_listener(lambda: self.regroup(key))
+
+    def regroup(self, key: str) -> None:
+        """Recalcula el grupo de `key` tras modificar la conversación in-place."""
+        with self._lock:
+            entry = self._entries.get(key)
+            conversation = entry[0] if entry is not None else self._spilling.get(key)
+            if conversation is not None:
+                self._set_group_locked(key, conversation)
+
+    def group_counts(self) -> Dict[Hashable, int]:
+        with self._lock:
+            return dict(self._group_counts)
+
+    # ---------- Desalojo ----------
+
+    def _collect_victims(self, *, protect: Optional[str] = None) -> List[Tuple[str, ConversacionData, str]]:
+        now = self._clock()
+        sweep_idle = now - self._last_sweep >= self._sweep_interval
+        if sweep_idle:
+            self._last_sweep = now
+        if len(self._entries) <= self.max_size and not sweep_idle:
+            return []
+
+        victims = []
+        # Recorre desde el menos usado; las fijadas pasan al final (ya no son candidatas)
+        for _ in range(len(self._entries)):
+            key, (conversation, last_access) = next(iter(self._entries.items()))
+            over_capacity = len(self._entries) > self.max_size
+            idle = sweep_idle and now - last_access >= self.idle_seconds
+            if not over_capacity and not idle:
+                break
+            if key == protect or (self._is_pinned is not None and self._is_pinned(key, conversation)):
+                self._entries.move_to_end(key)
+                continue
+            del self._entries[key]
+            self._spilling[key] = conversation
+            victims.append((key, conversation, "capacity" if over_capacity else "idle"))
+        return victims
+
+    def _spill_later(self, victims: List[Tuple[str, ConversacionData, str]]) -> None:
+        if not victims:
+            return
+        if self._on_evict is None:
+            # Sin spill no hay I/O: se termina en el acto
+            self._evict(victims)
+            return
+        with self._lock:
+            if self._spill_thread is None or not self._spill_thread.is_alive():
+                self._spill_thread = threading.Thread(
+                    target=self._run_spills, name="conversation-spill", daemon=True
+                )
+                self._spill_thread.start()
+        for victim in victims:
+            self._spill_queue.put(victim)
+
+    def _run_spills(self) -> None:
+        while True:
+            victim = self._spill_queue.get()
+            try:
+                self._evict([victim])
+            except Exception as exc:
+                logger.error("conversation_spill_worker_failed phone=%s error=%s", victim[0], str(exc))
+            finally:
+                self._spill_queue.task_done()
+
+    def flush(self) -> None:
+        """Espera a que terminen los spills encolados (tests, apagado)."""
+        self._spill_queue.join()
+
+    def _evict(self, victims: List[Tuple[str, ConversacionData, str]]) -> None:
+        for key, conversation, reason in victims:
+            keep = False
+            if self._on_evict is not None:
+                try:
+                    keep = self._on_evict(key, conversation) is False
+                except Exception as exc:
+                    keep = True
+                    logger.error("conversation_evict_failed phone=%s error=%s", key, str(exc))
+            with self._lock:
+                if keep:
+                    self._spill_failures += 1
+                if self._spilling.get(key) is not conversation:
+                    # Se volvió a usar, se reemplazó o se borró durante el spill: queda como está
+                    continue
+                del self._spilling[key]
+                if keep:
+                    # Vuelve como la más reciente: se reintenta en un próximo desalojo
+                    self._entries[key] = (conversation, self._clock())
+                    continue
+                self._set_group_locked(key, None)
+                if reason == "capacity":
+                    self._evicted_capacity += 1
+                else:
+                    self._evicted_idle += 1
+            logger.info(
+                "conversation_evicted phone=%s estado=%s reason=%s",
+                key,
+                conversation.estado,
+                reason,
+            )
+
+    def sweep(self) -> int:
+        """Fuerza el barrido por inactividad. Retorna cuántas desalojó (el spill sigue en background)."""
+        with self._lock:
+            self._last_sweep = self._clock() - self._sweep_interval
+            victims = self._collect_victims()
+        self._spill_later(victims)
+        return len(victims)
+
+    # ---------- Observabilidad ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = len(self._entries)
+            sample = [conversation for conversation, _ in islice(self._entries.values(), _SIZE_SAMPLE)]
+            stats = {
+                "resident": resident,
+                "max_size": self.max_size,
+                "idle_seconds": self.idle_seconds,
+                "evicted_capacity": self._evicted_capacity,
+                "evicted_idle": self._evicted_idle,
+                "spill_failures": self._spill_failures,
+                "resurrected": self._resurrected,
+                "spilling": len(self._spilling),
+            }
+        # Estimación por muestreo: serializar todo sería O(n) en cada /stats
+        sampled_bytes = sum(len(conversation.model_dump_json()) for conversation in sample)
+        stats["approx_bytes"] = int(sampled_bytes / len(sample) * resident) if sample else 0
+        return stats
@@ -0,0 +1,184 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Clasificador local de emergencias: lo que resuelve con certeza no va al LLM
+EMERGENCY_LOCAL_SCORER_ENABLED = os.getenv("EMERGENCY_LOCAL_SCORER_ENABLED", "true").lower() == "true"
+
+EMERGENCY = "emergency"
+NOT_EMERGENCY = "not_emergency"
+AMBIGUOUS = "ambiguous"
+
+# Léxico curado (texto ya normalizado: minúsculas, sin tildes ni puntuación).
+# Peligros que por sí solos son emergencia.
+HAZARD_PATTERNS = (
+    r"incendio\w*",
+    r"fuego",
+    r"prendio fuego",
+    r"humo",
+    r"olor a gas",
+    r"olor gas",
+    r"(?:fuga|perdida|escape|perdiendo) de gas",
+    r"explosion\w*",
+    r"explot\w*",
+    r"electrocut\w*",
+    r"cortocircuito\w*",
+    r"chispas?",
+    r"inundacion\w*",
+    r"(?:se|esta|estan) inunda\w*",
+    r"derrumb\w*",
+    r"se (?:cayo|cae|esta cayendo) el (?:techo|cielorraso|balcon)",
+    r"(?:atrapad|encerrad)[oa]s? en el ascensor",
+)
+# Vocabulario de riesgo: no alcanza para decidir, pero tampoco para descartar (lo decide el LLM)
+RISK_PATTERNS = (
+    r"gas",
+    r"agua",
+    r"luz",
+    r"electric\w*",
+    r"cables?",
+    r"techo",
+    r"inundad\w*",
+    r"ascensor\w*",
+    r"olor\w*",
+    r"fuga\w*",
+    r"pierde",
+    r"perdida",
+    r"cano\w*",
+    r"rot[oa]s?",
+    r"rompio",
+    r"cay\w*",
+    r"cae",
+    r"quem\w*",
+    r"huele\w*",
+    r"llamas?",
+    r"desmay\w*",
+    r"herid\w*",
+    r"sangr\w*",
+    r"ambulancia",
+    r"bomberos?",
+    r"policia",
+    r"robo\w*",
+    r"ladron\w*",
+    r"grave",
+    r"ayuda",
+    r"ya mismo",
+)
+# "no es urgente", "sin urgencia": anulan la keyword negada
+NEGATION_PATTERN = r"(?:no es|no son|no|sin|nada)\s+(?:una\s+|muy\s+|tan\s+)?(?:emergencias?|urgencias?|urgentes?|grave)"
+# "no hay humo ni fuego", "sin olor a gas": el peligro negado no decide, queda como riesgo
+HAZARD_NEGATION_PREFIX = r"(?:no hay|no hubo|no hay mas|no tengo|no sale|no|sin|ni)\s+"
+
+_KEYWORD_WEIGHT = 0.6
+_OUTAGE_WEIGHT = 0.5
+_RISK_WEIGHT = 0.2
+
+
+def _alternation(patterns: Iterable[str]) -> "re.Pattern[str]":
+    return re.compile(r"\b(?:" + "|".join(patterns) + r")\b")
+
+
+@dataclass(frozen=True)
+class EmergencyVerdict:
+    decision: str
+    score: float
+    reason: str
+
+
+class EmergencyScorer:
+    """
+    Puntaje determinístico de emergencia sobre el texto normalizado.
+
+    - Peligro explícito y no negado (incendio, olor a gas, ...) → emergencia,
+      solo si el llamador admite positivos locales (`local_positives`, en el
+      menú). Fuera del menú un peligro también puede ser figurado o pasado
+      ("inundado de trabajo", "ayer hubo un incendio"): va al LLM.
+    - Sin keyword, frase de corte ni vocabulario de riesgo → no es emergencia.
+    - El resto (keyword de emergencia, "sin agua" fuera del menú, peligro
+      negado, vocabulario de riesgo) es la banda ambigua: la decide el LLM.
+
+    Cada categoría es una sola regex precompilada: clasificar cuesta
+    microsegundos.
+    """
+
+    def __init__(
+        self,
+        *,
+        keywords: Iterable[str],
+        outage_phrases: Iterable[str] = (),
+        normalize: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        self._normalize = normalize or (lambda text: " ".join(text.lower().split()))
+        keyword_patterns = [re.escape(self._normalize(keyword)) + "s?" for keyword in keywords if keyword]
+        outage_patterns = [re.escape(phrase) for phrase in outage_phrases if phrase]
+        self._keywords = _alternation(keyword_patterns) if keyword_patterns else None
+        self._outages = _alternation(outage_patterns) if outage_patterns else None
+        self._hazards = _alternation(HAZARD_PATTERNS)
+        self._negated_hazards = _alternation([HAZARD_NEGATION_PREFIX + r"(?:" + "|".join(HAZARD_PATTERNS) + r")"])
+        self._risks = _alternation(RISK_PATTERNS)
+        self._negation = _alternation([NEGATION_PATTERN])
+        self._lock = threading.Lock()
+        self._counts = {EMERGENCY: 0, NOT_EMERGENCY: 0, AMBIGUOUS: 0}
+
+    def score(self, mensaje: str, *, local_positives: bool = True) -> EmergencyVerdict:
+        text = self._normalize(mensaje or "")
+        if not text:
+            return EmergencyVerdict(NOT_EMERGENCY, 0.0, "empty")
+        text = self._negation.sub(" ", text)
+        negated_hazard = self._negated_hazards.search(text)
+        if negated_hazard:
+            text = self._negated_hazards.sub(" ", text)
+
+        hazard = self._hazards.search(text)
+        if hazard:
+            if local_positives:
+                return EmergencyVerdict(EMERGENCY, 1.0, f"hazard:{hazard.group(0)}")
+            return EmergencyVerdict(AMBIGUOUS, 1.0, f"hazard:{hazard.group(0)}")
+
+        score = 0.0
+        reasons = []
+        if negated_hazard:
+            score += _RISK_WEIGHT
+            reasons.append(f"negated_hazard:{negated_hazard.group(0)}")
+        keyword = self._keywords.search(text) if self._keywords else None
+        if keyword:
+            score += _KEYWORD_WEIGHT
+            reasons.append(f"keyword:{keyword.group(0)}")
+        outage = self._outages.search(text) if self._outages else None
+        if outage:
+            score += _OUTAGE_WEIGHT
+            reasons.append(f"outage:{outage.group(0)}")
+        risk = self._risks.search(text)
+        if risk:
+            score += _RISK_WEIGHT
+            reasons.append(f"risk:{risk.group(0)}")
+
+        if score >= 1.0 and local_positives:
+            decision = EMERGENCY
+        elif score == 0.0:
+            decision = NOT_EMERGENCY
+        else:
+            decision = AMBIGUOUS
+        return EmergencyVerdict(decision, round(min(score, 1.0), 2), ",".join(reasons) or "no_signal")
+
+    def classify(self, mensaje: str, *, local_positives: bool = True) -> EmergencyVerdict:
+        """`score` + conteo por decisión (AMBIGUOUS = llamada al LLM)."""
+        verdict = self.score(mensaje, local_positives=local_positives)
+        with self._lock:
+            self._counts[verdict.decision] += 1
+        return verdict
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        checked = sum(counts.values())
+        return {
+            "checked": checked,
+            "local_emergency": counts[EMERGENCY],
+            "local_not_emergency": counts[NOT_EMERGENCY],
+            "escalated_to_llm": counts[AMBIGUOUS],
+            # Antes del scorer cada mensaje chequeado era una llamada al LLM (tasa 1.0)
+            "llm_call_rate": round(counts[AMBIGUOUS] / checked, 4) if checked else 0.0,
+        }
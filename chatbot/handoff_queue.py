@@ -0,0 +1,247 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Capacidad inicial del árbol de posiciones (se duplica o compacta al llenarse)
+_INITIAL_CAPACITY = 64
+
+
+class _FenwickTree:
+    """Conteo de ocupados por secuencia: posición = prefijo en O(log n)."""
+
+    __slots__ = ("size", "_tree")
+
+    def __init__(self, size: int, occupied: int = 0) -> None:
+        self.size = size
+        self._tree = [0] * (size + 1)
+        # Construcción lineal con los primeros `occupied` slots en 1
+        for index in range(1, size + 1):
+            if index <= occupied:
+                self._tree[index] += 1
+            parent = index + (index & -index)
+            if parent <= size:
+                self._tree[parent] += self._tree[index]
+
+    def add(self, slot: int, delta: int) -> None:
+        index = slot + 1
+        while index <= self.size:
+            self._tree[index] += delta
+            index += index & -index
+
+    def prefix(self, slot: int) -> int:
+        """Cantidad de ocupados en [0, slot]."""
+        index = slot + 1
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, rank: int) -> int:
+        """Slot del `rank`-ésimo ocupado (1-indexed)."""
+        slot = 0
+        step = 1 << (self.size.bit_length() - 1)
+        while step:
+            candidate = slot + step
+            if candidate <= self.size and self._tree[candidate] < rank:
+                slot = candidate
+                rank -= self._tree[candidate]
+            step >>= 1
+        return slot
+
+
+class HandoffQueue:
+    """
+    Cola FIFO de handoffs con pertenencia, alta, baja y rotación en O(1).
+
+    Se usa como la lista `handoff_queue` del manager (append, remove, index,
+    `in`, iteración, acceso por índice). Cada número tiene una secuencia
+    creciente y un Fenwick tree cuenta los ocupados, así que la posición se
+    obtiene en O(log n) sin recorrer la cola. `on_change(op, numero)` se
+    llama después de cada mutación (append, remove, rotate, clear).
+    """
+
+    def __init__(
+        self,
+        items: Iterable[str] = (),
+        *,
+        on_change: Optional[Callable[[str, Optional[str]], None]] = None,
+    ) -> None:
+        self._order: "OrderedDict[str, int]" = OrderedDict()
+        self._by_slot: Dict[int, str] = {}
+        self._tree = _FenwickTree(_INITIAL_CAPACITY)
+        self._next_slot = 0
+        self.on_change = None
+        for numero_telefono in items:
+            self.append(numero_telefono)
+        self.on_change = on_change
+
+    # ---------- Mutaciones ----------
+
+    def append(self, numero_telefono: str) -> bool:
+        """Agrega al final. False si ya estaba (no se duplica)."""
+        if numero_telefono in self._order:
+            return False
+        self._push(numero_telefono)
+        self._notify("append", numero_telefono)
+        return True
+
+    def remove(self, numero_telefono: str) -> None:
+        """Igual que list.remove: ValueError si no está."""
+        if not self.discard(numero_telefono):
+            raise ValueError(f"{numero_telefono!r} not in handoff queue")
+
+    def discard(self, numero_telefono: str) -> bool:
+        if numero_telefono not in self._order:
+            return False
+        self._pop(numero_telefono)
+        self._notify("remove", numero_telefono)
+        return True
+
+    def rotate(self, numero_telefono: str) -> bool:
+        """Mueve el número al final de la cola. False si no está."""
+        if numero_telefono not in self._order:
+            return False
+        self._pop(numero_telefono)
+        self._push(numero_telefono)
+        self._notify("rotate", numero_telefono)
+        return True
+
+    def clear(self) -> None:
+        self._order.clear()
+        self._by_slot.clear()
+        self._tree = _FenwickTree(_INITIAL_CAPACITY)
+        self._next_slot = 0
+        self._notify("clear", None)
+
+    # ---------- Consultas ----------
+
+    def __contains__(self, numero_telefono: object) -> bool:
+        return numero_telefono in self._order
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __bool__(self) -> bool:
+        return bool(self._order)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._order))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._order)[index]
+        size = len(self._order)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("handoff queue index out of range")
+        if index == 0:
+            return next(iter(self._order))
+        return self._by_slot[self._tree.find(index + 1)]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (HandoffQueue, list, tuple)):
+            return list(self._order) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"HandoffQueue({list(self._order)!r})"
+
+    def index(self, numero_telefono: str) -> int:
+        """Igual que list.index (0-indexed): ValueError si no está."""
+        slot = self._order.get(numero_telefono)
+        if slot is None:
+            raise ValueError(f"{numero_telefono!r} not in handoff queue")
+        return self._tree.prefix(slot) - 1
+
+    def position(self, numero_telefono: str) -> Optional[int]:
+        """Posición 1-indexed o None si no está en cola."""
+        slot = self._order.get(numero_telefono)
+        if slot is None:
+            return None
+        return self._tree.prefix(slot)
+
+    def first(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+    def to_list(self) -> List[str]:
+        return list(self._order)
+
+    # ---------- Internos ----------
+
+    def _push(self, numero_telefono: str) -> None:
+        if self._next_slot >= self._tree.size:
+            self._reindex()
+        slot = self._next_slot
+        self._next_slot += 1
+        self._order[numero_telefono] = slot
+        self._by_slot[slot] = numero_telefono
+        self._tree.add(slot, 1)
+
+    def _pop(self, numero_telefono: str) -> None:
+        slot = self._order.pop(numero_telefono)
+        del self._by_slot[slot]
+        self._tree.add(slot, -1)
+
+    def _reindex(self) -> None:
+        # Se agotaron las secuencias: renumerar 0..n-1 (O(n), amortizado por las altas previas)
+        size = len(self._order)
+        capacity = self._tree.size
+        if size * 2 > capacity:
+            capacity *= 2
+        self._tree = _FenwickTree(capacity, occupied=size)
+        self._by_slot = {}
+        for slot, numero_telefono in enumerate(list(self._order)):
+            self._order[numero_telefono] = slot
+            self._by_slot[slot] = numero_telefono
+        self._next_slot = size
+
+    def _notify(self, op: str, numero_telefono: Optional[str]) -> None:
+        if self.on_change is not None:
+            self.on_change(op, numero_telefono)
+
+
+class HandoffQueueAggregates:
+    """
+    Agregados de la cola mantenidos en cada alta/baja: tamaño, espera del
+    más antiguo y media móvil de espera de los que ya salieron de la cola.
+
+    El orden de alta se guarda aparte del orden de la cola (que `/next`
+    rota), así el más antiguo es siempre el primero: lectura O(1).
+    """
+
+    def __init__(self) -> None:
+        self._enqueued_at: "OrderedDict[str, datetime]" = OrderedDict()
+        self._completed = 0
+        self._mean_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def on_enqueue(self, numero_telefono: str, enqueued_at: datetime) -> None:
+        if numero_telefono not in self._enqueued_at:
+            self._enqueued_at[numero_telefono] = enqueued_at
+
+    def on_dequeue(self, numero_telefono: str, now: datetime, enqueued_at: Optional[datetime] = None) -> None:
+        started = self._enqueued_at.pop(numero_telefono, None) or enqueued_at
+        if started is None:
+            return
+        wait = max(0.0, (now - started).total_seconds())
+        self._completed += 1
+        self._mean_wait_seconds += (wait - self._mean_wait_seconds) / self._completed
+        self._max_wait_seconds = max(self._max_wait_seconds, wait)
+
+    def clear(self) -> None:
+        self._enqueued_at.clear()
+
+    def oldest_enqueued_at(self) -> Optional[datetime]:
+        return next(iter(self._enqueued_at.values()), None)
+
+    def snapshot(self, now: datetime, *, size: Optional[int] = None, oldest: Optional[datetime] = None) -> Dict[str, Any]:
+        oldest = oldest if oldest is not None else self.oldest_enqueued_at()
+        return {
+            "size": len(self._enqueued_at) if size is None else size,
+            "oldest_wait_seconds": round((now - oldest).total_seconds(), 3) if oldest is not None else None,
+            "mean_wait_seconds": round(self._mean_wait_seconds, 3),
+            "max_wait_seconds": round(self._max_wait_seconds, 3),
+            "completed": self._completed,
+        }
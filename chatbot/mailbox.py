@@ -0,0 +1,262 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_TURN_STALE_SECONDS = float(os.getenv("CONVERSATION_TURN_STALE_SECONDS", "30"))
+
+
+class _MailboxSlot:
+    __slots__ = ("pending", "owner", "owner_ticket", "depth", "cond", "async_waiters")
+
+    def __init__(self, lock: threading.Lock):
+        self.pending: Deque[int] = deque()
+        self.owner: Optional[Any] = None
+        self.owner_ticket: Optional[int] = None
+        self.depth = 0
+        self.cond = threading.Condition(lock)
+        # Esperas de `turn_async`: (loop, future) que se despiertan al liberar el turno
+        self.async_waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+
+
+def _wake_future(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ConversationMailbox:
+    """
+    Ejecución ordenada por conversación (un "actor" por numero_telefono).
+
+    Cada mensaje reserva un turno al llegar (`reserve`) y se procesa cuando su
+    turno llega al frente (`turn`): los mensajes de un mismo número se procesan
+    estrictamente en orden de llegada y números distintos corren en paralelo.
+    Las reservas que nunca se consumen se descartan luego de
+    CONVERSATION_TURN_STALE_SECONDS para no bloquear la conversación.
+
+    Desde un event loop se usa `turn_async`: espera el turno sin bloquear el
+    thread del loop, así un mensaje anterior del mismo número que todavía está
+    en un `await` puede avanzar mientras tanto.
+    """
+
+    def __init__(self, stale_seconds: Optional[float] = None):
+        self.stale_seconds = (
+            CONVERSATION_TURN_STALE_SECONDS if stale_seconds is None else stale_seconds
+        )
+        self._lock = threading.Lock()
+        self._slots: Dict[str, _MailboxSlot] = {}
+        self._tickets = itertools.count(1)
+        self._acquired = 0
+        self._contended = 0
+        self._stale_dropped = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._max_queue_length = 0
+
+    def reserve(self, key: str) -> int:
+        """Reserva el próximo turno para `key` (llamar en orden de llegada)."""
+        with self._lock:
+            return self._reserve_locked(key)
+
+    def _reserve_locked(self, key: str) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = _MailboxSlot(self._lock)
+            self._slots[key] = slot
+        ticket = next(self._tickets)
+        slot.pending.append(ticket)
+        if len(slot.pending) > self._max_queue_length:
+            self._max_queue_length = len(slot.pending)
+        return ticket
+
+    @contextmanager
+    def turn(self, key: str, ticket: Optional[int] = None) -> Iterator[None]:
+        """
+        Bloquea hasta que sea el turno de `ticket` para `key`.
+
+        Sin ticket reserva uno en el momento. Es reentrante para el thread que
+        ya tiene el turno de esa conversación.
+        """
+        me = threading.get_ident()
+        with self._lock:
+            slot = self._slots.get(key)
+            if ticket is None and slot is not None and slot.owner == me:
+                slot.depth += 1
+                reentrant = True
+            else:
+                reentrant = False
+                if ticket is None:
+                    ticket = self._reserve_locked(key)
+                    slot = self._slots[key]
+                elif slot is None or ticket not in slot.pending:
+                    # Reserva descartada por stale: volver a la cola
+                    ticket = self._reserve_locked(key)
+                    slot = self._slots[key]
+                self._wait_for_turn(key, slot, ticket)
+                slot.owner = me
+                slot.owner_ticket = ticket
+                slot.depth = 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                if reentrant:
+                    slot.depth -= 1
+                else:
+                    self._release_locked(key, slot, ticket)
+
+    def _wait_for_turn(self, key: str, slot: _MailboxSlot, ticket: int) -> None:
+        started = time.monotonic()
+        contended = slot.pending[0] != ticket
+        while slot.pending[0] != ticket:
+            notified = slot.cond.wait(timeout=self.stale_seconds)
+            if notified or slot.pending[0] == ticket:
+                continue
+            self._drop_stale_head_locked(key, slot)
+        self._record_wait_locked(started, contended)
+
+    def _drop_stale_head_locked(self, key: str, slot: _MailboxSlot) -> None:
+        head = slot.pending[0]
+        if slot.owner_ticket != head:
+            # La reserva del frente nunca se consumió (evento perdido): descartarla
+            slot.pending.popleft()
+            self._stale_dropped += 1
+            logger.warning(
+                "conversation_turn_stale_dropped key=%s ticket=%s",
+                key,
+                head,
+            )
+            if slot.pending:
+                self._notify_locked(slot)
+
+    def _record_wait_locked(self, started: float, contended: bool) -> None:
+        waited = time.monotonic() - started
+        self._acquired += 1
+        if contended:
+            self._contended += 1
+        self._wait_total += waited
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+    @asynccontextmanager
+    async def turn_async(self, key: str, ticket: Optional[int] = None) -> AsyncIterator[None]:
+        """
+        Como `turn`, pero espera con await: no bloquea el event loop.
+
+        No es reentrante: el dueño del turno es la task, no el thread.
+        """
+        loop = asyncio.get_running_loop()
+        owner = asyncio.current_task()
+        started = time.monotonic()
+        with self._lock:
+            slot = self._slots.get(key)
+            if ticket is None or slot is None or ticket not in slot.pending:
+                ticket = self._reserve_locked(key)
+                slot = self._slots[key]
+            contended = slot.pending[0] != ticket
+
+        while True:
+            with self._lock:
+                if ticket not in slot.pending:
+                    # Descartada por stale mientras esperaba: volver a la cola
+                    ticket = self._reserve_locked(key)
+                    slot = self._slots[key]
+                if slot.pending[0] == ticket:
+                    self._record_wait_locked(started, contended)
+                    slot.owner = owner
+                    slot.owner_ticket = ticket
+                    slot.depth = 1
+                    break
+                future = loop.create_future()
+                waiter = (loop, future)
+                slot.async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(future, timeout=self.stale_seconds)
+                notified = True
+            except asyncio.TimeoutError:
+                notified = False
+            finally:
+                with self._lock:
+                    if waiter in slot.async_waiters:
+                        slot.async_waiters.remove(waiter)
+            if not notified:
+                with self._lock:
+                    if slot.pending[0] != ticket:
+                        self._drop_stale_head_locked(key, slot)
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release_locked(key, slot, ticket)
+
+    def _release_locked(self, key: str, slot: _MailboxSlot, ticket: int) -> None:
+        slot.owner = None
+        slot.owner_ticket = None
+        slot.depth = 0
+        if slot.pending and slot.pending[0] == ticket:
+            slot.pending.popleft()
+        else:
+            try:
+                slot.pending.remove(ticket)
+            except ValueError:
+                pass
+        if slot.pending:
+            self._notify_locked(slot)
+        elif self._slots.get(key) is slot:
+            del self._slots[key]
+
+    @staticmethod
+    def _notify_locked(slot: _MailboxSlot) -> None:
+        slot.cond.notify_all()
+        for loop, future in slot.async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake_future, future)
+            except RuntimeError:
+                # Loop ya cerrado: esa espera no va a continuar
+                pass
+
+    def abandon(self, key: str, ticket: int) -> None:
+        """Libera una reserva que no se va a consumir (no-op si ya se procesó)."""
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None or ticket not in slot.pending or slot.owner_ticket == ticket:
+                return
+            slot.pending.remove(ticket)
+            if slot.pending:
+                self._notify_locked(slot)
+            elif slot.owner is None:
+                del self._slots[key]
+
+    def queue_length(self, key: str) -> int:
+        """Mensajes pendientes o en curso para `key`."""
+        with self._lock:
+            slot = self._slots.get(key)
+            return len(slot.pending) if slot else 0
+
+    def stats(self, top: int = 5) -> Dict[str, Any]:
+        with self._lock:
+            lengths = sorted(
+                ((key, len(slot.pending)) for key, slot in self._slots.items()),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            avg_wait = (self._wait_total / self._acquired) if self._acquired else 0.0
+            return {
+                "active_keys": len(self._slots),
+                "pending_messages": sum(length for _, length in lengths),
+                "max_queue_length_seen": self._max_queue_length,
+                "top_queues": [{"key": key, "length": length} for key, length in lengths[:top]],
+                "acquired": self._acquired,
+                "contended": self._contended,
+                "stale_dropped": self._stale_dropped,
+                "lock_wait_ms_avg": round(avg_wait * 1000, 2),
+                "lock_wait_ms_max": round(self._wait_max * 1000, 2),
+            }
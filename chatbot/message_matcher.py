@@ -0,0 +1,265 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from .normalized_message import NormalizedMessage
+
+# Vistas de NormalizedMessage sobre las que corren los detectores
+VIEW_TEXT = "accent_free"  # minúsculas y sin tildes
+VIEW_WORDS = "words"       # + puntuación a espacios, espacios unificados
+VIEW_MENU = "squeezed"     # + alargamientos (>=3 repeticiones) colapsados
+
+# Detectores
+HUMAN_NEGATION = "human_negation"
+HUMAN_INTENT = "human_intent"
+COMUNICARME = "comunicarme"
+CONTACT_EXCLUSION = "contact_exclusion"
+CONTACT_INFO = "contact_info"
+CONTACT_CHANNEL = "contact_channel"
+CONTACT_ADJACENCY = "contact_adjacency"
+EMERGENCY_PHRASE = "emergency_phrase"
+GRATITUDE = "gratitude"
+VOLVER_MENU = "volver_menu"
+
+# Patrones para detectar intención de hablar con humano/agente
+HUMAN_INTENT_PATTERNS = [
+    # Palabras clave directas
+    r"\bhumano\b",
+    r"\bpersona\b",
+    r"\balguien\s+real\b",
+    r"\batenci[oó]n\s+al\s+cliente\b",
+    r"\bagente\b",
+    r"\boperador(?:a)?\b",
+    r"\brepresentante\b",
+    r"\basesor(?:a)?\b",
+
+    # Expresiones comunes
+    r"\bquiero\s+hablar\b",
+    r"\bnecesito\s+hablar\b",
+    r"\bpuedo\s+hablar\b",
+    r"\bhablar\s+con\s+(?:alguien|una\s+persona)\b",
+    r"\bquiero\s+hablar\s+con\s+(?:alguien|una\s+persona)\b",
+    r"\bquiero\s+hablar\s+con\s+(?:vos|ustedes)\b",
+    r"\bnecesito\s+hablar\s+con\s+(?:alguien|una\s+persona)\b",
+    r"\bcomunicar(?:me)?\s+con\s+(?:alguien|una\s+persona)\b",
+
+    # Frustración / fallback
+    r"no\s+me\s+entend[eé]s?",
+    r"ninguna\s+opci[oó]n",
+    r"ninguna\s+de\s+las\s+anteriores",
+    r"quiero\s+que\s+me\s+atiendan?",
+
+    # Mayúsculas / errores comunes
+    r"HABLAR\s+CON\s+HUMANO",
+    r"humnao",
+    r"operadro",
+]
+# Negaciones simples para evitar falsos positivos
+HUMAN_NEGATION_PATTERNS = [
+    r"no\s+quiero\s+hablar",
+    r"no\s+humano",
+    r"sin\s+humano",
+]
+
+CONTACT_INFO_PHRASE_PATTERN = r"\binformacion\s+de\s+contacto\b"
+PHONE_KEYWORDS = ("telefono", "tel", "celular", "cel", "movil")
+WHATSAPP_KEYWORDS = ("whatsapp", "wsp", "wa", "wpp")
+EMAIL_KEYWORDS = ("email", "mail", "correo")
+CALL_PATTERNS = [
+    r"\bllamar(?:le|les|lo|los|la|las|me|nos)?\b",
+    r"\bllamo\b",
+]
+# Sinónimos de "número" (una alternativa por patrón: cada una arranca con un literal)
+NUMERO_SYNONYMS = (r"\bnumero\b", r"\bnro\.?\b", r"\bnum\b", r"n°", r"nº", r"#")
+EXCLUSION_TERMS = (
+    "cuenta",
+    "factura",
+    "reclamo",
+    "seguimiento",
+    "unidad",
+    "depto",
+    "dto",
+    "piso",
+    "contrato",
+    "cliente",
+    "servicio",
+    "pedido",
+    "tramite",
+    "referencia",
+    "comprobante",
+    "recibo",
+    "expensa",
+    "expensas",
+    "pago",
+    "cbu",
+    "dni",
+    "cuit",
+    "cuil",
+)
+EXCLUSION_PATTERNS = [
+    rf"{synonym}\s+de\s+(?:{'|'.join(EXCLUSION_TERMS)})\b" for synonym in NUMERO_SYNONYMS
+]
+CONTACT_ADJ_NUM_PATTERNS = [
+    rf"{synonym}\s+(?:de|para)?\s*(?:contacto|comunicarme)\b" for synonym in NUMERO_SYNONYMS
+]
+CONTACT_ADJ_EMAIL_PATTERNS = [
+    rf"\b{keyword}\b\s+(?:de|para)?\s*(?:contacto|comunicarme)\b" for keyword in EMAIL_KEYWORDS
+]
+
+# Frases específicas para mapear a emergencia SOLO desde el inicio/menú.
+# (Fuera del menú solo hacen ambigua la detección: decide el LLM.)
+EMERGENCY_MENU_PHRASES = (
+    "sin agua",
+    "corte de agua",
+    "agua cortada",
+    "falta de agua",
+    "no hay agua",
+    "baja presion",
+    "baja presion de agua",
+    "poca presion",
+    "poca presion de agua",
+    "sin gas",
+    "corte de gas",
+    "gas cortado",
+    "no hay gas",
+)
+
+GRATITUDE_KEYWORDS = {
+    "gracias",
+    "muchas gracias",
+    "mil gracias",
+    "gracias totales",
+    "gracias artu",
+    "gracias genia",
+    "gracias por todo",
+    "gracias!!!",
+    "gracias!!",
+    "genial gracias",
+    "buenísimo gracias",
+    "graciass",
+    "graciasss",
+    "grac",
+    "thank you",
+    "thanks",
+}
+
+
+def _keyword_patterns(keywords: Iterable[str]) -> List[str]:
+    return [rf"\b{re.escape(keyword)}\b" for keyword in keywords]
+
+
+# detector -> (vista, patrones). Cada patrón arranca con un literal (opcionalmente tras `\b`):
+# ese prefijo es el ancla del prefiltro. El orden es el de prioridad al reportar.
+DETECTORS: Dict[str, Tuple[str, Sequence[str]]] = {
+    HUMAN_NEGATION: (VIEW_TEXT, HUMAN_NEGATION_PATTERNS),
+    HUMAN_INTENT: (VIEW_TEXT, HUMAN_INTENT_PATTERNS),
+    COMUNICARME: (VIEW_TEXT, [r"comunicarme"]),
+    CONTACT_EXCLUSION: (VIEW_TEXT, EXCLUSION_PATTERNS),
+    CONTACT_INFO: (VIEW_TEXT, [CONTACT_INFO_PHRASE_PATTERN]),
+    CONTACT_CHANNEL: (
+        VIEW_TEXT,
+        [
+            *_keyword_patterns(PHONE_KEYWORDS),
+            *_keyword_patterns(WHATSAPP_KEYWORDS),
+            *_keyword_patterns(EMAIL_KEYWORDS),
+            *CALL_PATTERNS,
+        ],
+    ),
+    CONTACT_ADJACENCY: (VIEW_TEXT, [*CONTACT_ADJ_NUM_PATTERNS, *CONTACT_ADJ_EMAIL_PATTERNS]),
+    # 'menú' queda como 'menu' en la vista sin tildes
+    VOLVER_MENU: (VIEW_TEXT, [r"menu"]),
+    GRATITUDE: (VIEW_WORDS, [re.escape(keyword) for keyword in sorted(GRATITUDE_KEYWORDS)]),
+    EMERGENCY_PHRASE: (VIEW_MENU, _keyword_patterns(EMERGENCY_MENU_PHRASES)),
+}
+
+
+def _literal_anchor(pattern: str) -> Tuple[bool, str]:
+    """(`\b` al inicio, prefijo literal obligatorio) de un patrón."""
+    word_start = pattern.startswith(r"\b")
+    rest = pattern[2:] if word_start else pattern
+    anchor = ""
+    for idx, char in enumerate(rest):
+        if not (char.isalnum() or char in "#°º"):
+            break
+        if rest[idx + 1:idx + 2] in ("?", "*", "{"):
+            break
+        anchor += char
+    if not anchor:
+        raise ValueError(f"pattern without literal prefix: {pattern}")
+    return word_start, anchor.lower()
+
+
+class MessageScan:
+    """Resultado de un escaneo: el mensaje normalizado + detectores que dispararon."""
+
+    def __init__(self, message: NormalizedMessage, hits: FrozenSet[str], patterns: Tuple[Tuple[str, str], ...] = ()):
+        self.message = message
+        self.hits = hits
+        self.patterns = patterns
+
+    def __contains__(self, detector: str) -> bool:
+        return detector in self.hits
+
+    def pattern(self, detector: str) -> Optional[str]:
+        """Patrón del detector que matcheó primero en el texto (para logs)."""
+        for name, pattern in self.patterns:
+            if name == detector:
+                return pattern
+        return None
+
+
+class MessageMatcher:
+    """
+    Todos los detectores regex/keyword en un solo recorrido por vista.
+
+    Al construirlo se arma, por vista, una alternación con los prefijos literales
+    de todos los patrones (`(?=\b(?:humano|persona|...)|(?:no|menu|#|...))`): el
+    motor de `re` descarta casi todas las posiciones con una comparación de un
+    carácter. Solo en las posiciones donde aparece un prefijo se prueban los
+    patrones completos que empiezan con ese carácter, así que el resultado es el
+    mismo que correr cada patrón por separado sobre todo el texto.
+    """
+
+    def __init__(self, detectors: Dict[str, Tuple[str, Sequence[str]]]):
+        self.detectors = dict(detectors)
+        self._prefilter: Dict[str, re.Pattern] = {}
+        self._candidates: Dict[str, Dict[str, List[Tuple[str, str, re.Pattern]]]] = {}
+        anchors: Dict[str, Tuple[set, set]] = {}
+        for detector, (view, patterns) in self.detectors.items():
+            word_anchors, free_anchors = anchors.setdefault(view, (set(), set()))
+            by_char = self._candidates.setdefault(view, {})
+            for pattern in patterns:
+                word_start, anchor = _literal_anchor(pattern)
+                (word_anchors if word_start else free_anchors).add(re.escape(anchor))
+                by_char.setdefault(anchor[0], []).append(
+                    (detector, pattern, re.compile(pattern, re.IGNORECASE))
+                )
+        for view, (word_anchors, free_anchors) in anchors.items():
+            branches = []
+            if word_anchors:
+                branches.append(r"\b(?:" + "|".join(sorted(word_anchors)) + ")")
+            if free_anchors:
+                branches.append("(?:" + "|".join(sorted(free_anchors)) + ")")
+            self._prefilter[view] = re.compile("(?=" + "|".join(branches) + ")")
+
+    def scan(self, message: str) -> MessageScan:
+        message = NormalizedMessage.of(message)
+        first: Dict[str, str] = {}
+        for view, prefilter in self._prefilter.items():
+            # Las vistas se calculan solo si algún detector las usa (y quedan en el mensaje)
+            text = getattr(message, view)
+            by_char = self._candidates[view]
+            for anchor in prefilter.finditer(text):
+                pos = anchor.start()
+                for detector, pattern, compiled in by_char.get(text[pos], ()):
+                    if detector not in first and compiled.match(text, pos):
+                        first[detector] = pattern
+        return MessageScan(message, frozenset(first), tuple(first.items()))
+
+
+# Instancia global
+message_matcher = MessageMatcher(DETECTORS)
+
+
+def scan_message(message: str) -> MessageScan:
+    """Un escaneo por mensaje: queda en el NormalizedMessage y los detectores de rules/NLU lo comparten."""
+    return NormalizedMessage.of(message).scan
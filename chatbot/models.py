@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, PrivateAttr
 from enum import Enum
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 from datetime import datetime
 
 class TipoConsulta(str, Enum):
@@ -86,3 +86,46 @@ class ConversacionData(BaseModel):
     survey_question_number: int = 0  # Número de pregunta actual (1, 2, 3)
     # Historial de mensajes durante handoff
     message_history: List[Dict[str, Any]] = Field(default_factory=list)  # [{timestamp, sender, message}]
+    # Dirty-tracking del checkpoint: huella de lo último persistido (no se serializa)
+    _checkpoint_fingerprint: Optional[str] = PrivateAttr(default=None)
+    _checkpoint_saved_at: Optional[datetime] = PrivateAttr(default=None)
+    _checkpoint_field_hashes: Optional[Dict[str, str]] = PrivateAttr(default=None)
+    _checkpoint_schema_version: Optional[int] = PrivateAttr(default=None)
+    # Aviso al contenedor (cache del manager) cuando cambia el estado, para los contadores
+    _estado_listener: Optional[Callable[[], None]] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name == "estado" and self._estado_listener is not None:
+            self._estado_listener()
+
+    def set_estado_listener(self, listener: Optional[Callable[[], None]]) -> None:
+        self._estado_listener = listener
+
+    def mark_checkpoint_saved(
+        self,
+        fingerprint: str,
+        saved_at: datetime,
+        *,
+        field_hashes: Optional[Dict[str, str]] = None,
+        schema_version: Optional[int] = None,
+    ) -> None:
+        self._checkpoint_fingerprint = fingerprint
+        self._checkpoint_saved_at = saved_at
+        self._checkpoint_field_hashes = field_hashes
+        self._checkpoint_schema_version = schema_version
+
+    def checkpoint_changed(self, fingerprint: str) -> bool:
+        return self._checkpoint_fingerprint != fingerprint
+
+    @property
+    def checkpoint_saved_at(self) -> Optional[datetime]:
+        return self._checkpoint_saved_at
+
+    @property
+    def checkpoint_field_hashes(self) -> Optional[Dict[str, str]]:
+        return self._checkpoint_field_hashes
+
+    @property
+    def checkpoint_schema_version(self) -> Optional[int]:
+        return self._checkpoint_schema_version
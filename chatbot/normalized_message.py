@@ -0,0 +1,105 @@
+import re
+import unicodedata
+from typing import Tuple
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+_ELONGATION_RE = re.compile(r"(.)\1{2,}")
+_DIGIT_RE = re.compile(r"\d")
+# Puntuación y símbolos que se recortan de los bordes de un comando corto ("hola!", "¡inicio!")
+_GREETING_EDGE_CHARS = " \t\n\r¡!¿?.,;:()[]{}\"'`~*_"
+
+
+class _view:
+    """Vista calculada en el primer acceso y guardada en la instancia (sin el lock de cached_property)."""
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+
+def strip_accents(value: str) -> str:
+    """Quita tildes/diacríticos (NFD sin marcas combinantes)."""
+    if value.isascii():
+        return value
+    return "".join(
+        c for c in unicodedata.normalize("NFD", value) if unicodedata.category(c) != "Mn"
+    )
+
+
+class NormalizedMessage(str):
+    """
+    Texto de un mensaje entrante con sus vistas normalizadas, calculadas una vez y a demanda.
+
+    Es un `str` con el texto original, así que viaja por `procesar_mensaje`, los
+    detectores y el historial sin cambiar firmas; quien necesita una forma
+    normalizada la lee de acá en lugar de repetir NFD + regex.
+    """
+
+    @classmethod
+    def of(cls, value) -> "NormalizedMessage":
+        if isinstance(value, cls):
+            return value
+        return cls(value or "")
+
+    def __reduce__(self):
+        # Al persistir/copiar se guarda como str plano (sin las vistas cacheadas)
+        return (str, (str(self),))
+
+    @_view
+    def lowered(self) -> str:
+        """Minúsculas sin espacios en los bordes."""
+        return str.lower(self).strip()
+
+    @_view
+    def accent_free(self) -> str:
+        """Minúsculas y sin tildes."""
+        return strip_accents(self.lowered)
+
+    @_view
+    def words(self) -> str:
+        """Sin tildes, puntuación a espacios y espacios unificados."""
+        return " ".join(_PUNCTUATION_RE.sub(" ", self.accent_free).split())
+
+    @_view
+    def tokens(self) -> Tuple[str, ...]:
+        return tuple(self.words.split())
+
+    @_view
+    def squeezed(self) -> str:
+        """`words` con alargamientos (>=3 repeticiones) colapsados, sin romper letras dobles reales."""
+        return _ELONGATION_RE.sub(r"\1", self.words)
+
+    @_view
+    def digits(self) -> Tuple[str, ...]:
+        """Dígitos del texto original, en orden."""
+        return tuple(_DIGIT_RE.findall(self))
+
+    @_view
+    def compact(self) -> str:
+        """Sin tildes, sin espacios ni puntos (bsas = bs as = bs. as.)."""
+        return self.accent_free.replace(" ", "").replace(".", "")
+
+    @_view
+    def command(self) -> str:
+        """Comando corto: sin tildes, espacios unificados y sin puntuación en los bordes."""
+        stripped = " ".join(self.accent_free.split()).strip(_GREETING_EDGE_CHARS)
+        return " ".join(stripped.split())
+
+    @_view
+    def keyword(self) -> str:
+        """MAYÚSCULAS sin tildes (palabras clave de opt-in)."""
+        return self.accent_free.upper()
+
+    @_view
+    def scan(self):
+        """Hits de los detectores regex/keyword (un solo recorrido, ver message_matcher)."""
+        from .message_matcher import message_matcher
+
+        return message_matcher.scan(self)
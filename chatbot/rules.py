@@ -1,10 +1,27 @@
 import logging
 import os
 import re
-import unicodedata
 from typing import Optional
 from .models import EstadoConversacion, TipoConsulta
 from .states import conversation_manager
+from .emergency_scorer import AMBIGUOUS, EMERGENCY, EMERGENCY_LOCAL_SCORER_ENABLED, EmergencyScorer
+from .normalized_message import NormalizedMessage
+from .message_matcher import (
+    EMERGENCY_MENU_PHRASES,
+    EMERGENCY_PHRASE,
+    GRATITUDE,
+    GRATITUDE_KEYWORDS,
+    VOLVER_MENU,
+    scan_message,
+)
+from services.llm_client import LLM_TURN_BUDGET_SECONDS, llm_budget
+from services.nlu_turn_memo import (
+    NLU_TURN_COMBINED_ENABLED,
+    PERFIL_DIRECCION_UNIDAD,
+    PERFIL_EXPENSAS_ED,
+    PERFIL_INTENCION,
+    nlu_turn_memo,
+)
 from config.company_profiles import get_active_company_profile
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
@@ -44,12 +61,8 @@ def normalizar_texto(texto: str) -> str:
     """
     Normaliza texto: lowercase + sin acentos + sin espacios + sin puntos
     """
-    texto = texto.lower().strip()
-    # Remover acentos
-    sin_acentos = ''.join(c for c in unicodedata.normalize('NFD', texto) 
-                          if unicodedata.category(c) != 'Mn')
-    # Remover espacios y puntos para mejor matching (bsas = bs as = bs. as.)
-    return sin_acentos.replace(' ', '').replace('.', '')
+    # Sin espacios ni puntos para mejor matching (bsas = bs as = bs. as.)
+    return NormalizedMessage.of(texto).compact
 
 # Mapeo de sinónimos para validación geográfica (solo minúsculas, se normalizan automáticamente)
 SINONIMOS_CABA = [
@@ -138,7 +151,11 @@ class ChatbotRules:
         ],
         "emergencia": ["emergencia", "urgente", "urgencia", "auxilio", "peligro"],
     }
+    # Frases específicas para mapear a emergencia SOLO desde el inicio/menú.
+    # (Fuera del menú solo hacen ambigua la detección: decide el LLM.)
+    EMERGENCY_MENU_PHRASES = EMERGENCY_MENU_PHRASES
     _MENU_KEYWORDS = None
+    _EMERGENCY_SCORER = None
     SERVICE_TYPE_OPTIONS = (
         {"id": "servicio_destapacion", "title": "Destapación", "value": "Destapación"},
         {
@@ -152,24 +169,7 @@ class ChatbotRules:
     )
     MAX_DIRECCIONES_GUARDADAS = 5
 
-    GRATITUDE_KEYWORDS = {
-        "gracias",
-        "muchas gracias",
-        "mil gracias",
-        "gracias totales",
-        "gracias artu",
-        "gracias genia",
-        "gracias por todo",
-        "gracias!!!",
-        "gracias!!",
-        "genial gracias",
-        "buenísimo gracias",
-        "graciass",
-        "graciasss",
-        "grac",
-        "thank you",
-        "thanks",
-    }
+    GRATITUDE_KEYWORDS = GRATITUDE_KEYWORDS
     GRATITUDE_EMOJIS = {"🙏", "🤝", "👍", "🙌", "😊", "😁", "🤗", "👌"}
 
     @staticmethod
@@ -234,6 +234,16 @@ class ChatbotRules:
             EstadoConversacion.ATENDIDO_POR_HUMANO,
         }
 
+    @classmethod
+    def _get_emergency_scorer(cls) -> EmergencyScorer:
+        if cls._EMERGENCY_SCORER is None:
+            cls._EMERGENCY_SCORER = EmergencyScorer(
+                keywords=cls.EXTRA_MENU_KEYWORDS["emergencia"],
+                outage_phrases=cls.EMERGENCY_MENU_PHRASES,
+                normalize=cls._normalize_menu_text,
+            )
+        return cls._EMERGENCY_SCORER
+
     @staticmethod
     def _detect_emergency_intent(mensaje: str, conversacion=None) -> bool:
         if not mensaje:
@@ -247,20 +257,90 @@ class ChatbotRules:
         }
 
         # Solo permitir detección por keywords/frases del menú si estamos en contexto de menú.
-        # Fuera del menú, la detección de emergencia se delega a NLU (OpenAI) para minimizar falsos positivos.
+        # Fuera del menú, lo que el scorer local no resuelve se delega a NLU (OpenAI) para minimizar falsos positivos.
         if menu_context:
             opcion, _ = ChatbotRules._match_menu_option(mensaje)
             if opcion and opcion.get("tipo") == TipoConsulta.EMERGENCIA:
                 return True
 
-        try:
-            from services.nlu_service import nlu_service
+        # Los negativos claros se resuelven localmente; los positivos solo en el menú (fuera, los confirma el LLM)
+        if EMERGENCY_LOCAL_SCORER_ENABLED:
+            verdict = ChatbotRules._get_emergency_scorer().classify(mensaje, local_positives=bool(menu_context))
+            if verdict.decision != AMBIGUOUS:
+                return verdict.decision == EMERGENCY
 
-            intent = nlu_service.mapear_intencion(mensaje)
+        try:
+            intent = ChatbotRules._nlu_intencion(mensaje, conversacion)
             return intent == TipoConsulta.EMERGENCIA
         except Exception:
             return False
 
+    @staticmethod
+    def _texto_nlu(mensaje: str) -> str:
+        return " ".join((mensaje or "").split())
+
+    @staticmethod
+    def _perfil_nlu_turno(mensaje: str, conversacion) -> str:
+        """Campos que conviene pedir junto con la intención según el paso actual."""
+        if conversacion is None or conversacion.estado != EstadoConversacion.RECOLECTANDO_SECUENCIAL:
+            return PERFIL_INTENCION
+        campo_actual = conversation_manager.get_campo_siguiente(conversacion.numero_telefono)
+        if (
+            campo_actual == "direccion"
+            and conversacion.tipo_consulta == TipoConsulta.PAGO_EXPENSAS
+            and ChatbotRules._parece_expensas_ed_todo_en_uno(mensaje)
+        ):
+            return PERFIL_EXPENSAS_ED
+        if (
+            campo_actual == "direccion_servicio"
+            and conversacion.tipo_consulta == TipoConsulta.SOLICITAR_SERVICIO
+            and ChatbotRules._parece_direccion_con_unidad(mensaje)
+        ):
+            return PERFIL_DIRECCION_UNIDAD
+        return PERFIL_INTENCION
+
+    @staticmethod
+    def _nlu_analisis_turno(mensaje: str, perfil: str) -> dict:
+        from services.nlu_service import nlu_service
+
+        texto = ChatbotRules._texto_nlu(mensaje)
+        return nlu_turn_memo.get_or_compute(
+            ("analizar_turno", perfil, texto),
+            lambda: nlu_service.analizar_turno(texto, perfil) or {},
+        )
+
+    @staticmethod
+    def _nlu_intencion(mensaje: str, conversacion=None) -> Optional[TipoConsulta]:
+        """
+        Intención vía NLU, memoizada en el turno: la detección de emergencia y la
+        selección de opción del mismo mensaje comparten un solo llamado.
+        """
+        if NLU_TURN_COMBINED_ENABLED:
+            perfil = ChatbotRules._perfil_nlu_turno(mensaje, conversacion)
+            return ChatbotRules._nlu_analisis_turno(mensaje, perfil).get("intencion")
+        from services.nlu_service import nlu_service
+
+        return nlu_turn_memo.get_or_compute(
+            ("mapear_intencion", ChatbotRules._texto_nlu(mensaje)),
+            lambda: nlu_service.mapear_intencion(mensaje),
+        )
+
+    @staticmethod
+    def _nlu_campos_turno(valor: str, perfil: str) -> dict:
+        """
+        Campos de dirección del paso actual. Con NLU_TURN_COMBINED_ENABLED salen
+        del mismo análisis que ya dio la intención del turno.
+        """
+        if NLU_TURN_COMBINED_ENABLED:
+            return ChatbotRules._nlu_analisis_turno(valor, perfil).get("campos") or {}
+        from services.nlu_service import nlu_service
+
+        metodo = "extraer_expensas_ed_combinado" if perfil == PERFIL_EXPENSAS_ED else "extraer_direccion_unidad"
+        return nlu_turn_memo.get_or_compute(
+            (metodo, ChatbotRules._texto_nlu(valor)),
+            lambda: getattr(nlu_service, metodo)(valor),
+        )
+
     @staticmethod
     def _handle_emergency(numero_telefono: str, conversacion, mensaje_original: str = "") -> Optional[str]:
         logger = logging.getLogger(__name__)
@@ -309,32 +389,16 @@ class ChatbotRules:
 
     @classmethod
     def _normalize_menu_text(cls, text: str) -> str:
-        text = text.lower().strip()
-        text = ''.join(
-            c for c in unicodedata.normalize('NFD', text)
-            if unicodedata.category(c) != 'Mn'
-        )
-        text = ''.join(c if c.isalnum() or c.isspace() else ' ' for c in text)
-        text = " ".join(text.split())
         # Colapsa alargamientos (>=3 repeticiones) sin romper letras dobles reales (ll/rr/etc).
-        text = re.sub(r"(.)\1{2,}", r"\1", text)
-        return text
+        return NormalizedMessage.of(text).squeezed
 
     @staticmethod
     def _normalize_greeting_command(text: str) -> str:
         """Normaliza comandos cortos (p.ej. 'hola!') sin afectar el texto para NLU."""
         if not text:
             return ""
-        normalized = text.strip().lower()
-        normalized = "".join(
-            c
-            for c in unicodedata.normalize("NFD", normalized)
-            if unicodedata.category(c) != "Mn"
-        )
-        normalized = " ".join(normalized.split())
         # Remueve puntuación y símbolos comunes solo en los bordes (no en el medio).
-        normalized = normalized.strip(" \t\n\r¡!¿?.,;:()[]{}\"'`~*_")
-        return " ".join(normalized.split())
+        return NormalizedMessage.of(text).command
 
     @staticmethod
     def _squeeze_repeated_chars(text: str) -> str:
@@ -446,36 +510,20 @@ class ChatbotRules:
     def _match_menu_option(cls, mensaje: str):
         if not mensaje:
             return None, ""
-        digits = re.findall(r"\d", mensaje)
+        mensaje = NormalizedMessage.of(mensaje)
+        digits = mensaje.digits
         if len(digits) == 1:
             idx = int(digits[0])
             if 1 <= idx <= len(cls.MENU_OPTIONS):
                 return cls.MENU_OPTIONS[idx - 1], "number"
-        normalized = cls._normalize_menu_text(mensaje)
+        normalized = mensaje.squeezed
         if not normalized:
             return None, ""
         # Frases específicas para mapear a emergencia SOLO desde el inicio/menú.
         # (No se usan en la detección global de emergencia para no interrumpir flujos en curso.)
         emergency_option = cls._get_menu_option_by_id("emergencia")
-        if emergency_option:
-            emergency_phrases = (
-                "sin agua",
-                "corte de agua",
-                "agua cortada",
-                "falta de agua",
-                "no hay agua",
-                "baja presion",
-                "baja presion de agua",
-                "poca presion",
-                "poca presion de agua",
-                "sin gas",
-                "corte de gas",
-                "gas cortado",
-                "no hay gas",
-            )
-            for phrase in emergency_phrases:
-                if re.search(rf"\b{re.escape(phrase)}\b", normalized):
-                    return emergency_option, "keyword_phrase"
+        if emergency_option and EMERGENCY_PHRASE in scan_message(mensaje):
+            return emergency_option, "keyword_phrase"
         for option in cls.MENU_OPTIONS:
             if normalized == option["id"]:
                 return option, "id"
@@ -519,17 +567,6 @@ class ChatbotRules:
 
 Responde con el número de la opción que necesitas 📱"""
     
-    @staticmethod
-    def _normalizar_agradecimiento(texto: str) -> str:
-        texto = texto.strip().lower()
-        texto = ''.join(
-            c for c in unicodedata.normalize('NFD', texto)
-            if unicodedata.category(c) != 'Mn'
-        )
-        texto = ''.join(c if c.isalnum() or c.isspace() else ' ' for c in texto)
-        texto = " ".join(texto.split())
-        return texto
-    
     @staticmethod
     def es_mensaje_agradecimiento(texto: str) -> bool:
         if not texto:
@@ -540,26 +577,17 @@ Responde con el número de la opción que necesitas 📱"""
         if raw and len(raw) <= 8 and any(emoji in raw for emoji in ChatbotRules.GRATITUDE_EMOJIS):
             return True
         
-        normalizado = ChatbotRules._normalizar_agradecimiento(raw)
+        mensaje = NormalizedMessage.of(texto)
+        normalizado = mensaje.words
         if not normalizado:
             return False
         
-        if normalizado in ChatbotRules.GRATITUDE_KEYWORDS:
+        # Keywords como substring (cubre la frase exacta y "gracias"/"thanks" sueltas)
+        if GRATITUDE in scan_message(mensaje):
             return True
         
         compact = normalizado.replace(" ", "")
-        if compact in {"gracias", "muchasgracias", "milgracias", "graciass", "graciasss", "thankyou"}:
-            return True
-        
-        for keyword in ChatbotRules.GRATITUDE_KEYWORDS:
-            if keyword in normalizado:
-                return True
-        
-        palabras = set(normalizado.split())
-        if "gracias" in palabras or "thanks" in palabras:
-            return True
-        
-        return False
+        return compact in {"gracias", "muchasgracias", "milgracias", "graciass", "graciasss", "thankyou"}
     
     @staticmethod
     def get_mensaje_post_finalizado_gracias() -> str:
@@ -570,12 +598,7 @@ Responde con el número de la opción que necesitas 📱"""
         """
         Detecta si el usuario quiere volver al menú principal
         """
-        mensaje_lower = mensaje.lower().strip()
-        frases_menu = [
-            'menu', 'menú', 'menu principal', 'menú principal'
-        ]
-        
-        return any(frase in mensaje_lower for frase in frases_menu)
+        return VOLVER_MENU in scan_message(mensaje)
 
     @staticmethod
     def _activar_handoff(numero_telefono: str, mensaje_contexto: str):
@@ -1375,9 +1398,7 @@ Responde con el número de la opción que necesitas 📱"""
     def _normalize_seleccion_texto(texto: str) -> str:
         if not texto:
             return ""
-        normalized = unicodedata.normalize("NFD", texto.lower().strip())
-        normalized = "".join(c for c in normalized if unicodedata.category(c) != "Mn")
-        normalized = re.sub(r"[^a-z0-9\s]", " ", normalized)
+        normalized = re.sub(r"[^a-z0-9\s]", " ", NormalizedMessage.of(texto).accent_free)
         normalized = re.sub(r"\s+", " ", normalized).strip()
         return normalized
 
@@ -2113,9 +2134,7 @@ Responde con el número de la opción que necesitas 📱"""
 
             if ChatbotRules._parece_expensas_ed_todo_en_uno(valor):
                 try:
-                    from services.nlu_service import nlu_service
-
-                    parsed = nlu_service.extraer_expensas_ed_combinado(valor)
+                    parsed = ChatbotRules._nlu_campos_turno(valor, PERFIL_EXPENSAS_ED)
                     if parsed:
                         llm_parse_ok = True
                         llm_base = (parsed.get("direccion_altura") or "").strip()
@@ -2200,9 +2219,9 @@ Responde con el número de la opción que necesitas 📱"""
 
             if ChatbotRules._parece_direccion_con_unidad(valor):
                 try:
-                    from services.nlu_service import nlu_service, NLUService
+                    from services.nlu_service import NLUService
 
-                    parsed = nlu_service.extraer_direccion_unidad(valor)
+                    parsed = ChatbotRules._nlu_campos_turno(valor, PERFIL_DIRECCION_UNIDAD)
                     if parsed:
                         llm_base = (parsed.get("direccion_altura") or "").strip()
                         llm_sugerido = NLUService.construir_unidad_sugerida(parsed)
@@ -2805,13 +2824,23 @@ Responde con el número del campo que deseas modificar."""
     
     @staticmethod
     def procesar_mensaje(numero_telefono: str, mensaje: str, nombre_usuario: str = "") -> str:
+        # Un turno = un mensaje entrante: los resultados NLU se memoizan hasta devolver la respuesta
+        # y todos los llamados LLM del turno comparten un presupuesto de tiempo.
+        # El texto se normaliza una vez (vistas lazy) y los detectores reciben ese mismo objeto.
+        mensaje = NormalizedMessage.of(mensaje)
+        with nlu_turn_memo.turn(), llm_budget(LLM_TURN_BUDGET_SECONDS):
+            return ChatbotRules._procesar_mensaje_turno(numero_telefono, mensaje, nombre_usuario)
+
+    @staticmethod
+    def _procesar_mensaje_turno(numero_telefono: str, mensaje: str, nombre_usuario: str = "") -> str:
         conversacion = conversation_manager.get_conversacion(numero_telefono)
         
         # Guardar nombre de usuario si es la primera vez que lo vemos
         if nombre_usuario and not conversacion.nombre_usuario:
             conversation_manager.set_nombre_usuario(numero_telefono, nombre_usuario)
 
-        mensaje_limpio = mensaje.strip().lower()
+        mensaje = NormalizedMessage.of(mensaje)
+        mensaje_limpio = mensaje.lowered
         is_greeting = ChatbotRules._is_greeting_command(mensaje)
 
         # Reanudar o mantener pausa por emergencia
@@ -2972,9 +3001,8 @@ Responde con el número del campo que deseas modificar."""
         if opcion:
             return ChatbotRules._aplicar_opcion_menu(numero_telefono, opcion, mensaje, source)
 
-        # Fallback: usar NLU para mapear mensaje a intención
-        from services.nlu_service import nlu_service
-        tipo_consulta_nlu = nlu_service.mapear_intencion(mensaje)
+        # Fallback: usar NLU para mapear mensaje a intención (reusa lo ya calculado en el turno)
+        tipo_consulta_nlu = ChatbotRules._nlu_intencion(mensaje, conversacion)
 
         if tipo_consulta_nlu:
             return ChatbotRules._aplicar_tipo_consulta(numero_telefono, tipo_consulta_nlu, mensaje, "nlu")
@@ -1,28 +1,286 @@
 import os
 import re
 import logging
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
 from decimal import Decimal, InvalidOperation
 from typing import Dict, Optional, List, Any
 from .models import ConversacionData, EstadoConversacion, TipoConsulta
+from .compact_conversation import CONVERSATION_COMPACT_STORE, CompactConversation, to_runtime_conversation
+from .conversation_cache import ConversationCache
+from .handoff_queue import HandoffQueue, HandoffQueueAggregates
+from .mailbox import ConversationMailbox
 from services.metrics_service import metrics_service
 from services.phone_display import format_phone_for_agent
 from datetime import datetime, timedelta
-from services.conversation_session_service import conversation_session_service
+from services.conversation_session_service import (
+    async_conversation_session_service,
+    conversation_session_service,
+)
+from services.handoff_queue_store import HandoffQueueJournal, create_handoff_queue_store
+from services.handoff_timeout_scheduler import HandoffTimeoutScheduler
+from services.shared_handoff_queue import (
+    HANDOFF_INSTANCE_ID,
+    HandoffLeaseBusy,
+    SharedHandoffQueue,
+    create_shared_handoff_queue,
+)
 
 POST_FINALIZADO_WINDOW_SECONDS = int(os.getenv("POST_FINALIZADO_WINDOW_SECONDS", "120"))
 logger = logging.getLogger(__name__)
 
+# Estados que no se desalojan de memoria: el sweep de handoff/encuesta los necesita residentes
+PINNED_STATES = {
+    EstadoConversacion.ENVIANDO,
+    EstadoConversacion.ATENDIDO_POR_HUMANO,
+    EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA,
+    EstadoConversacion.ENCUESTA_SATISFACCION,
+}
+_PINNED_STATE_VALUES = {estado.value for estado in PINNED_STATES}
+
+
+def _estado_value(conversacion) -> str:
+    return getattr(conversacion.estado, "value", conversacion.estado)
+
+
 class ConversationManager:
-    def __init__(self, session_service=None):
-        self.conversaciones: Dict[str, ConversacionData] = {}
-        self.recently_finalized: Dict[str, datetime] = {}
+    def __init__(self, session_service=None, async_session_service=None, handoff_store=None, handoff_backend=None):
+        # LRU + TTL: las reanudables se bajan al store al desalojarse, el resto se descarta
+        self.conversaciones: ConversationCache = ConversationCache(
+            on_evict=self._spill_conversation,
+            is_pinned=self._is_conversation_pinned,
+            # Conteo por estado incremental: /stats no recorre las conversaciones
+            group_of=_estado_value,
+        )
+        # Orden de inserción = orden temporal: el barrido corta en la primera vigente
+        self.recently_finalized: "OrderedDict[str, datetime]" = OrderedDict()
         self.session_service = session_service or conversation_session_service
+        self.async_session_service = async_session_service or async_conversation_session_service
+        # Turnos por conversación: mensajes de un mismo número se procesan en orden
+        self.mailbox = ConversationMailbox()
+        # Timers de cierre de handoff/encuesta indexados por vencimiento; el callback lo conecta main.
+        # Cada cierre toma el turno del número en el mailbox, como un mensaje más.
+        self.handoff_timeouts = HandoffTimeoutScheduler(
+            lookup=self.conversaciones.get,
+            turn=lambda numero_telefono: self.mailbox.turn(numero_telefono),
+        )
+
+        # Sistema de cola FIFO para handoffs (O(1) por operación, journal opcional para reinicios)
+        self.handoff_queue = HandoffQueue()
+        self._active_handoff: Optional[str] = None  # Número de teléfono activo actualmente
+        # Tamaño, espera más antigua y media de espera, actualizados en cada alta/baja
+        self.handoff_aggregates = HandoffQueueAggregates()
+        # Backend compartido entre instancias: si está configurado reemplaza a la cola local y al journal
+        self.shared_handoff: Optional[SharedHandoffQueue] = (
+            handoff_backend if handoff_backend is not None else create_shared_handoff_queue()
+        )
+        self.instance_id = HANDOFF_INSTANCE_ID
+        store = None
+        if self.shared_handoff is None:
+            store = handoff_store if handoff_store is not None else create_handoff_queue_store()
+        self.handoff_journal: Optional[HandoffQueueJournal] = HandoffQueueJournal(store) if store is not None else None
+        if self.handoff_journal is not None:
+            self._restore_handoff_queue()
+        self.handoff_queue.on_change = self._on_handoff_queue_change
+
+    @property
+    def active_handoff(self) -> Optional[str]:
+        return self._active_handoff
+
+    @active_handoff.setter
+    def active_handoff(self, numero_telefono: Optional[str]) -> None:
+        if numero_telefono == self._active_handoff:
+            return
+        self._active_handoff = numero_telefono
+        self._on_handoff_queue_change("activate", numero_telefono)
 
-        # Sistema de cola FIFO para handoffs
-        self.handoff_queue: List[str] = []  # Lista de números de teléfono en orden FIFO
-        self.active_handoff: Optional[str] = None  # Número de teléfono activo actualmente
+    def _is_conversation_pinned(self, numero_telefono: str, conversacion: ConversacionData) -> bool:
+        if conversacion.atendido_por_humano or _estado_value(conversacion) in _PINNED_STATE_VALUES:
+            return True
+        if numero_telefono == self.active_handoff or numero_telefono in self.handoff_queue:
+            return True
+        # Turno en curso o mensajes en espera para este número
+        return self.mailbox.queue_length(numero_telefono) > 0
+
+    def _spill_conversation(self, numero_telefono: str, conversacion: ConversacionData) -> bool:
+        """Desalojo: guarda las reanudables en el store; False si no se pudo (queda residente)."""
+        if not self.session_service.is_resumable_state(conversacion.estado):
+            return True
+        save = getattr(self.session_service, "save_for_key_if_changed", None) or self.session_service.save_for_key
+        try:
+            save(numero_telefono, conversacion)
+        except Exception as exc:
+            logger.error(
+                "conversation_spill_failed phone=%s estado=%s error=%s",
+                numero_telefono,
+                conversacion.estado,
+                str(exc),
+            )
+            return False
+        return True
+
+    def _sweep_recently_finalized(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=POST_FINALIZADO_WINDOW_SECONDS)
+        while self.recently_finalized:
+            numero_telefono, timestamp = next(iter(self.recently_finalized.items()))
+            if timestamp > cutoff:
+                break
+            self.recently_finalized.pop(numero_telefono, None)
+
+    def _set_recently_finalized(self, numero_telefono: str) -> None:
+        self.recently_finalized.pop(numero_telefono, None)
+        self._sweep_recently_finalized()
+        self.recently_finalized[numero_telefono] = datetime.utcnow()
+
+    # ---------- Journal de la cola de handoffs ----------
+
+    _HANDOFF_JOURNAL_FIELDS = ("nombre_usuario", "handoff_started_at", "mensaje_handoff_contexto")
+
+    def _handoff_entry(self, numero_telefono: str) -> Dict[str, Any]:
+        """Metadata mínima para reconstruir la conversación en handoff después de un reinicio."""
+        entry: Dict[str, Any] = {"numero_telefono": numero_telefono}
+        conversacion = self.conversaciones.get(numero_telefono)
+        if conversacion is None:
+            return entry
+        for field in self._HANDOFF_JOURNAL_FIELDS:
+            value = getattr(conversacion, field, None)
+            if value is not None:
+                entry[field] = value.isoformat() if isinstance(value, datetime) else value
+        return entry
+
+    def _handoff_snapshot(self) -> Dict[str, Any]:
+        return {
+            "queue": [self._handoff_entry(numero) for numero in self.handoff_queue],
+            "active": self._active_handoff,
+        }
+
+    def _handoff_enqueued_at(self, numero_telefono: str) -> datetime:
+        conversacion = self.conversaciones.get(numero_telefono)
+        started_at = getattr(conversacion, "handoff_started_at", None) if conversacion is not None else None
+        return started_at or datetime.utcnow()
+
+    def _on_handoff_queue_change(self, op: str, numero_telefono: Optional[str]) -> None:
+        if op == "append":
+            self.handoff_aggregates.on_enqueue(numero_telefono, self._handoff_enqueued_at(numero_telefono))
+        elif op == "remove":
+            self.handoff_aggregates.on_dequeue(numero_telefono, datetime.utcnow())
+        elif op == "clear":
+            self.handoff_aggregates.clear()
+        if self.handoff_journal is None:
+            return
+        meta = None
+        if op == "append":
+            meta = self._handoff_entry(numero_telefono)
+            meta.pop("numero_telefono")
+        self.handoff_journal.record(op, numero_telefono, self._handoff_snapshot, meta=meta)
+
+    @staticmethod
+    def _conversation_from_handoff_entry(entry: Dict[str, Any]):
+        # Las conversaciones en handoff no tienen checkpoint: se rearman con la metadata de la cola
+        started_at = entry.get("handoff_started_at")
+        return to_runtime_conversation(ConversacionData(
+            numero_telefono=entry["numero_telefono"],
+            estado=EstadoConversacion.ATENDIDO_POR_HUMANO,
+            atendido_por_humano=True,
+            handoff_notified=True,
+            nombre_usuario=entry.get("nombre_usuario"),
+            handoff_started_at=datetime.fromisoformat(started_at) if started_at else None,
+            mensaje_handoff_contexto=entry.get("mensaje_handoff_contexto"),
+        ))
+
+    def _ensure_shared_conversation(self, state: Dict[str, Any]) -> None:
+        """El activo pudo encolarse en otra instancia: rearmar su conversación si acá no está."""
+        active = state.get("active")
+        if active is None or active in self.conversaciones:
+            return
+        for entry in state["queue"]:
+            if entry["numero_telefono"] == active:
+                self.conversaciones[active] = self._conversation_from_handoff_entry(entry)
+                self.refresh_handoff_timeout(active)
+                return
+
+    def _queue_conversations(self):
+        """(número -> conversación en orden de cola, número activo) para armar /queue."""
+        if self.shared_handoff is None:
+            return {numero: self.conversaciones.get(numero) for numero in self.handoff_queue}, self.active_handoff
+        state = self.shared_handoff.snapshot()
+        self._active_handoff = state["active"]
+        conversations = {}
+        for entry in state["queue"]:
+            numero = entry["numero_telefono"]
+            conversations[numero] = self.conversaciones.get(numero) or self._conversation_from_handoff_entry(entry)
+        return conversations, state["active"]
+
+    def handoff_command_lease(self):
+        """Lease del handoff activo para comandos de varios pasos (no-op con la cola local)."""
+        if self.shared_handoff is None:
+            return nullcontext()
+        return self.shared_handoff.lease(self.instance_id)
+
+    def _restore_handoff_queue(self) -> None:
+        entries, active = self.handoff_journal.restore()
+        for entry in entries:
+            numero_telefono = entry["numero_telefono"]
+            self.handoff_queue.append(numero_telefono)
+            if numero_telefono not in self.conversaciones:
+                self.conversaciones[numero_telefono] = self._conversation_from_handoff_entry(entry)
+            self.handoff_aggregates.on_enqueue(numero_telefono, self._handoff_enqueued_at(numero_telefono))
+            self.refresh_handoff_timeout(numero_telefono)
+        self._active_handoff = active
+        if entries:
+            logger.info("handoff_queue_restored size=%s active=%s", len(entries), active)
+
+    def refresh_handoff_timeout(self, numero_telefono: str) -> None:
+        """Reprograma el timer de cierre tras cambiar estado o timestamps de handoff/encuesta."""
+        try:
+            self.handoff_timeouts.refresh(self.conversaciones.get(numero_telefono))
+        except Exception as exc:
+            logger.error("handoff_timeout_refresh_failed phone=%s error=%s", numero_telefono, str(exc))
+
+    def handoff_queue_stats(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        if self.shared_handoff is None:
+            aggregates = self.handoff_aggregates.snapshot(now, size=len(self.handoff_queue))
+        else:
+            # La cola compartida se lee del backend (O(tamaño)); la media es la de esta instancia
+            queue = self.shared_handoff.snapshot()["queue"]
+            started = [entry["handoff_started_at"] for entry in queue if entry.get("handoff_started_at")]
+            oldest = datetime.fromisoformat(min(started)) if started else None
+            aggregates = self.handoff_aggregates.snapshot(now, size=len(queue), oldest=oldest)
+        return {
+            **aggregates,
+            "active": self._active_handoff is not None,
+            "journal": self.handoff_journal.stats() if self.handoff_journal is not None else None,
+            "shared": self.shared_handoff.stats() if self.shared_handoff is not None else None,
+        }
+
+    def state_counts(self) -> Dict[str, int]:
+        """Conversaciones residentes por estado (contadores incrementales, O(estados))."""
+        return self.conversaciones.group_counts()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        stats = self.conversaciones.stats()
+        stats["recently_finalized"] = len(self.recently_finalized)
+        return stats
+
+    def _checkpoint_miss_cache(self):
+        # Los session services de prueba no siempre lo tienen
+        return getattr(self.session_service, "miss_cache", None)
+
+    def _known_checkpoint_miss(self, numero_telefono: str) -> bool:
+        miss_cache = self._checkpoint_miss_cache()
+        return miss_cache is not None and miss_cache.contains(numero_telefono)
+
+    def _record_checkpoint_miss(self, numero_telefono: str, started: float) -> None:
+        miss_cache = self._checkpoint_miss_cache()
+        if miss_cache is not None:
+            miss_cache.add(numero_telefono, load_ms=(time.perf_counter() - started) * 1000)
 
     def _load_checkpoint(self, numero_telefono: str) -> Optional[ConversacionData]:
+        if self._known_checkpoint_miss(numero_telefono):
+            return None
+        started = time.perf_counter()
         try:
             checkpoint = self.session_service.load_for_key(numero_telefono)
         except Exception as exc:
@@ -32,39 +290,80 @@ class ConversationManager:
                 str(exc),
             )
             return None
-        if checkpoint is None:
-            return None
+        conversation, expired = self._evaluate_checkpoint(numero_telefono, checkpoint)
+        if conversation is None:
+            self._record_checkpoint_miss(numero_telefono, started)
+        if expired:
+            try:
+                self.session_service.delete_for_key(numero_telefono)
+            except Exception as exc:
+                logger.error(
+                    "checkpoint_delete_failed_on_expire phone=%s error=%s",
+                    numero_telefono,
+                    str(exc),
+                )
+        return conversation
 
-        if not self.session_service.is_resumable_state(checkpoint.conversation.estado):
-            logger.info(
-                "checkpoint_skipped_non_resumable doc_id=%s estado=%s",
-                checkpoint.doc_id,
-                checkpoint.conversation.estado,
+    async def _load_checkpoint_async(self, numero_telefono: str) -> Optional[ConversacionData]:
+        """Igual que `_load_checkpoint` pero sobre el session service async."""
+        if self._known_checkpoint_miss(numero_telefono):
+            return None
+        started = time.perf_counter()
+        try:
+            checkpoint = await self.async_session_service.load_for_key(numero_telefono)
+        except Exception as exc:
+            logger.error(
+                "checkpoint_load_failed phone=%s error=%s",
+                numero_telefono,
+                str(exc),
             )
             return None
-
-        if self.session_service.is_expired(checkpoint.expires_at):
+        conversation, expired = self._evaluate_checkpoint(numero_telefono, checkpoint)
+        if conversation is None:
+            self._record_checkpoint_miss(numero_telefono, started)
+        if expired:
             try:
-                self.session_service.delete_for_key(numero_telefono)
+                await self.async_session_service.delete_for_key(numero_telefono)
             except Exception as exc:
                 logger.error(
                     "checkpoint_delete_failed_on_expire phone=%s error=%s",
                     numero_telefono,
                     str(exc),
                 )
+        return conversation
+
+    def _evaluate_checkpoint(self, numero_telefono: str, checkpoint) -> tuple[Optional[ConversacionData], bool]:
+        """
+        Decide si un checkpoint cargado se puede reanudar.
+
+        Returns:
+            tuple: (conversación a hidratar o None, True si expiró y hay que borrarlo)
+        """
+        if checkpoint is None:
+            return None, False
+
+        if not self.session_service.is_resumable_state(checkpoint.conversation.estado):
+            logger.info(
+                "checkpoint_skipped_non_resumable doc_id=%s estado=%s",
+                checkpoint.doc_id,
+                checkpoint.conversation.estado,
+            )
+            return None, False
+
+        if self.session_service.is_expired(checkpoint.expires_at):
             logger.info(
                 "checkpoint_expired_on_read doc_id=%s estado=%s",
                 checkpoint.doc_id,
                 checkpoint.conversation.estado,
             )
-            return None
+            return None, True
 
         logger.info(
             "checkpoint_hydrated phone=%s estado=%s",
             numero_telefono,
             checkpoint.conversation.estado,
         )
-        return checkpoint.conversation
+        return checkpoint.conversation, False
 
     def _delete_checkpoint(self, numero_telefono: str, reason: str) -> None:
         try:
@@ -77,16 +376,36 @@ class ConversationManager:
                 str(exc),
             )
     
+    @staticmethod
+    def _new_conversation(numero_telefono: str):
+        if CONVERSATION_COMPACT_STORE:
+            return CompactConversation(numero_telefono, EstadoConversacion.INICIO)
+        return ConversacionData(
+            numero_telefono=numero_telefono,
+            estado=EstadoConversacion.INICIO
+        )
+
     def get_conversacion(self, numero_telefono: str) -> ConversacionData:
         if numero_telefono not in self.conversaciones:
             checkpoint_conversation = self._load_checkpoint(numero_telefono)
             if checkpoint_conversation is not None:
-                self.conversaciones[numero_telefono] = checkpoint_conversation
+                self.conversaciones[numero_telefono] = to_runtime_conversation(checkpoint_conversation)
             else:
-                self.conversaciones[numero_telefono] = ConversacionData(
-                    numero_telefono=numero_telefono,
-                    estado=EstadoConversacion.INICIO
-                )
+                self.conversaciones[numero_telefono] = self._new_conversation(numero_telefono)
+        return self.conversaciones[numero_telefono]
+
+    async def get_conversacion_async(self, numero_telefono: str) -> ConversacionData:
+        """
+        Variante async de `get_conversacion`: la carga del checkpoint no bloquea el event loop.
+        """
+        if numero_telefono not in self.conversaciones:
+            checkpoint_conversation = await self._load_checkpoint_async(numero_telefono)
+            # Otro handler pudo hidratarla mientras se esperaba el I/O
+            if numero_telefono not in self.conversaciones:
+                if checkpoint_conversation is not None:
+                    self.conversaciones[numero_telefono] = to_runtime_conversation(checkpoint_conversation)
+                else:
+                    self.conversaciones[numero_telefono] = self._new_conversation(numero_telefono)
         return self.conversaciones[numero_telefono]
     
     def update_estado(self, numero_telefono: str, nuevo_estado: EstadoConversacion):
@@ -245,7 +564,8 @@ class ConversationManager:
         conversacion.nombre_usuario = nombre
     
     def finalizar_conversacion(self, numero_telefono: str):
-        self.recently_finalized[numero_telefono] = datetime.utcnow()
+        self._set_recently_finalized(numero_telefono)
+        self.handoff_timeouts.cancel(numero_telefono)
         if numero_telefono in self.conversaciones:
             del self.conversaciones[numero_telefono]
         self._delete_checkpoint(numero_telefono, "finalizar_conversacion")
@@ -255,6 +575,7 @@ class ConversationManager:
             pass
     
     def reset_conversacion(self, numero_telefono: str):
+        self.handoff_timeouts.cancel(numero_telefono)
         if numero_telefono in self.conversaciones:
             del self.conversaciones[numero_telefono]
         self.recently_finalized.pop(numero_telefono, None)
@@ -324,19 +645,22 @@ class ConversationManager:
         Returns:
             int: Posición en la cola (1-indexed)
         """
+        self.refresh_handoff_timeout(numero_telefono)
+        if self.shared_handoff is not None:
+            meta = self._handoff_entry(numero_telefono)
+            meta.pop("numero_telefono")
+            position, _size, self._active_handoff = self.shared_handoff.enqueue(numero_telefono, meta)
+            return position
+
         # Solo agregar si no está ya en la cola
-        if numero_telefono not in self.handoff_queue:
-            self.handoff_queue.append(numero_telefono)
+        self.handoff_queue.append(numero_telefono)
 
         # Si no hay conversación activa, activar esta
         if self.active_handoff is None:
             self.activate_next_handoff()
 
         # Retornar posición (1-indexed)
-        try:
-            return self.handoff_queue.index(numero_telefono) + 1
-        except ValueError:
-            return 1
+        return self.handoff_queue.position(numero_telefono) or 1
 
     def activate_next_handoff(self) -> Optional[str]:
         """
@@ -345,12 +669,11 @@ class ConversationManager:
         Returns:
             Optional[str]: Número de teléfono activado o None si la cola está vacía
         """
-        if self.handoff_queue:
-            self.active_handoff = self.handoff_queue[0]
-            return self.active_handoff
-        else:
-            self.active_handoff = None
-            return None
+        if self.shared_handoff is not None:
+            self._active_handoff = self.shared_handoff.activate_next()
+            return self._active_handoff
+        self.active_handoff = self.handoff_queue.first()
+        return self.active_handoff
 
     def get_active_handoff(self) -> Optional[str]:
         """
@@ -359,6 +682,10 @@ class ConversationManager:
         Returns:
             Optional[str]: Número activo o None
         """
+        if self.shared_handoff is not None:
+            state = self.shared_handoff.snapshot()
+            self._active_handoff = state["active"]
+            self._ensure_shared_conversation(state)
         return self.active_handoff
 
     def get_queue_position(self, numero_telefono: str) -> Optional[int]:
@@ -371,10 +698,10 @@ class ConversationManager:
         Returns:
             Optional[int]: Posición (1-indexed) o None si no está en cola
         """
-        try:
-            return self.handoff_queue.index(numero_telefono) + 1
-        except ValueError:
-            return None
+        if self.shared_handoff is not None:
+            queue = self.shared_handoff.snapshot()["queue"]
+            return next((i + 1 for i, entry in enumerate(queue) if entry["numero_telefono"] == numero_telefono), None)
+        return self.handoff_queue.position(numero_telefono)
 
     def get_queue_size(self) -> int:
         """
@@ -383,20 +710,36 @@ class ConversationManager:
         Returns:
             int: Tamaño de la cola
         """
+        if self.shared_handoff is not None:
+            return len(self.shared_handoff.snapshot()["queue"])
         return len(self.handoff_queue)
 
-    def close_active_handoff(self) -> Optional[str]:
+    def close_active_handoff(self, expected: Optional[str] = None) -> Optional[str]:
         """
         Cierra la conversación activa, la remueve de la cola,
         y activa automáticamente la siguiente.
 
+        Args:
+            expected: Si se indica, solo cierra si ese número sigue siendo el activo
+
         Returns:
             Optional[str]: Número del siguiente activado o None
         """
-        if self.active_handoff and self.active_handoff in self.handoff_queue:
-            # Remover de la cola
-            self.handoff_queue.remove(self.active_handoff)
-
+        if self.shared_handoff is not None:
+            try:
+                closed, self._active_handoff = self.shared_handoff.close_active(self.instance_id, expected)
+            except HandoffLeaseBusy as exc:
+                logger.warning("handoff_lease_busy op=close owner=%s", str(exc))
+                return None
+            if closed is None:
+                return None
+            self.handoff_aggregates.on_dequeue(closed, datetime.utcnow(), self._handoff_enqueued_at(closed))
+            self.finalizar_conversacion(closed)
+            return self._active_handoff
+
+        if expected is not None and self.active_handoff != expected:
+            return None
+        if self.active_handoff and self.handoff_queue.discard(self.active_handoff):
             # Finalizar conversación
             self.finalizar_conversacion(self.active_handoff)
 
@@ -416,11 +759,15 @@ class ConversationManager:
         Returns:
             Optional[str]: Número del siguiente activado o None
         """
-        if self.active_handoff and self.active_handoff in self.handoff_queue:
-            # Mover al final
-            self.handoff_queue.remove(self.active_handoff)
-            self.handoff_queue.append(self.active_handoff)
+        if self.shared_handoff is not None:
+            try:
+                self._active_handoff = self.shared_handoff.move_to_next(self.instance_id)
+            except HandoffLeaseBusy as exc:
+                logger.warning("handoff_lease_busy op=next owner=%s", str(exc))
+                return None
+            return self._active_handoff
 
+        if self.active_handoff and self.handoff_queue.rotate(self.active_handoff):
             # Activar el nuevo primero
             return self.activate_next_handoff()
 
@@ -437,6 +784,8 @@ class ConversationManager:
             Optional[str]: Número de teléfono o None si índice inválido
         """
         try:
+            if self.shared_handoff is not None:
+                return self.shared_handoff.snapshot()["queue"][index - 1]["numero_telefono"]
             return self.handoff_queue[index - 1]
         except IndexError:
             return None
@@ -452,14 +801,19 @@ class ConversationManager:
         Returns:
             bool: True si fue removido, False si no estaba en cola
         """
-        if numero_telefono not in self.handoff_queue:
+        if self.shared_handoff is not None:
+            removed, self._active_handoff = self.shared_handoff.remove(numero_telefono)
+            if removed:
+                self.handoff_aggregates.on_dequeue(
+                    numero_telefono, datetime.utcnow(), self._handoff_enqueued_at(numero_telefono)
+                )
+            return removed
+
+        if not self.handoff_queue.discard(numero_telefono):
             return False
 
         was_active = (self.active_handoff == numero_telefono)
 
-        # Remover de la cola
-        self.handoff_queue.remove(numero_telefono)
-
         # Si era el activo, activar siguiente
         if was_active:
             self.active_handoff = None
@@ -478,30 +832,25 @@ class ConversationManager:
             EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA,
             EstadoConversacion.ENCUESTA_SATISFACCION,
         }
-        visible_queue = []
-        for numero in self.handoff_queue:
-            conversacion = self.conversaciones.get(numero)
-            if not conversacion:
-                continue
-            if conversacion.estado in survey_states:
-                continue
-            visible_queue.append(numero)
-
-        if not visible_queue:
-            return "📋 *COLA DE HANDOFFS*\n\n✅ No hay conversaciones activas.\n\nTodas las consultas han sido atendidas."
-
+        queue_conversations, active = self._queue_conversations()
+        # Una sola pasada con un único "ahora" para todos los tiempos
+        ahora = datetime.utcnow()
         lines = ["📋 *COLA DE HANDOFFS*\n"]
+        visibles = 0
+        espera_total_min = 0.0
+        esperando = 0
 
-        for i, numero in enumerate(visible_queue):
-            conversacion = self.conversaciones.get(numero)
-            if not conversacion:
+        for numero, conversacion in queue_conversations.items():
+            if not conversacion or conversacion.estado in survey_states:
                 continue
-            is_active = (numero == self.active_handoff)
+            i = visibles
+            visibles += 1
+            is_active = (numero == active)
 
             # Calcular tiempo desde el inicio del handoff
             tiempo_desde_inicio = ""
             if conversacion.handoff_started_at:
-                delta = datetime.utcnow() - conversacion.handoff_started_at
+                delta = ahora - conversacion.handoff_started_at
                 minutos = int(delta.total_seconds() / 60)
                 if minutos < 60:
                     tiempo_desde_inicio = f"{minutos} min"
@@ -509,11 +858,15 @@ class ConversationManager:
                     horas = minutos // 60
                     mins = minutos % 60
                     tiempo_desde_inicio = f"{horas}h {mins}min"
+                # Promedio de espera: todos menos el primero visible
+                if i > 0:
+                    espera_total_min += delta.total_seconds() / 60
+                    esperando += 1
 
             # Calcular tiempo desde último mensaje
             tiempo_ultimo_mensaje = ""
             if conversacion.last_client_message_at:
-                delta = datetime.utcnow() - conversacion.last_client_message_at
+                delta = ahora - conversacion.last_client_message_at
                 segundos = int(delta.total_seconds())
                 if segundos < 60:
                     tiempo_ultimo_mensaje = f"{segundos} seg"
@@ -546,23 +899,16 @@ class ConversationManager:
 
             lines.append("")  # Línea en blanco
 
+        if not visibles:
+            return "📋 *COLA DE HANDOFFS*\n\n✅ No hay conversaciones activas.\n\nTodas las consultas han sido atendidas."
+
         lines.append("─" * 30)
-        lines.append(f"📊 Total: {len(visible_queue)} conversación(es)")
+        lines.append(f"📊 Total: {visibles} conversación(es)")
 
         # Calcular tiempo promedio de espera
-        if len(visible_queue) > 1:
-            tiempos_espera = []
-            for numero in visible_queue[1:]:  # Excluir el activo
-                conv = self.conversaciones.get(numero)
-                if not conv:
-                    continue
-                if conv.handoff_started_at:
-                    delta = datetime.utcnow() - conv.handoff_started_at
-                    tiempos_espera.append(delta.total_seconds() / 60)
-
-            if tiempos_espera:
-                promedio = int(sum(tiempos_espera) / len(tiempos_espera))
-                lines.append(f"⏰ Tiempo promedio espera: {promedio} min")
+        if esperando:
+            promedio = int(espera_total_min / esperando)
+            lines.append(f"⏰ Tiempo promedio espera: {promedio} min")
 
         return "\n".join(lines)
     
@@ -596,7 +942,7 @@ class ConversationManager:
             conversacion.message_history = conversacion.message_history[-max_messages:]
     
     def mark_recently_finalized(self, numero_telefono: str):
-        self.recently_finalized[numero_telefono] = datetime.utcnow()
+        self._set_recently_finalized(numero_telefono)
     
     def was_finalized_recently(self, numero_telefono: str) -> bool:
         timestamp = self.recently_finalized.get(numero_telefono)
@@ -1,5 +1,7 @@
 import os
 import json
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Cargar variables de entorno PRIMERO
@@ -12,22 +14,50 @@ from typing import Optional
 from chatbot.rules import ChatbotRules, RATE_LIMIT_MESSAGE
 from chatbot.states import conversation_manager
 from chatbot.models import EstadoConversacion, ConversacionData, TipoConsulta
+from chatbot.normalized_message import NormalizedMessage
 from services.meta_whatsapp_service import meta_whatsapp_service
 from services.meta_messenger_service import meta_messenger_service
 from services.whatsapp_handoff_service import whatsapp_handoff_service
-from services.conversation_session_service import conversation_session_service
+from services.conversation_session_service import (
+    async_conversation_session_service,
+    conversation_session_service,
+)
+from services.webhook_ingest_service import webhook_ingest_service
+from services.llm_response_cache import llm_response_cache
+from services.nlu_turn_memo import nlu_turn_memo
+from services.llm_client import llm_client
+from services.handoff_timeout_scheduler import (
+    HANDOFF_TIMEOUT_SCHEDULER_ENABLED,
+    REASON_RESOLUTION_QUESTION,
+    REASON_SURVEY,
+    REASON_SURVEY_OFFER,
+)
 from services.phone_display import format_phone_for_agent
-import unicodedata
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Timers de cierre de handoff en background (opt-in; si no, /handoff/ttl-sweep)
+    if HANDOFF_TIMEOUT_SCHEDULER_ENABLED:
+        conversation_manager.handoff_timeouts.start()
+    # Catálogo de edificios externo: snapshot al arrancar y recarga en background (si está configurado)
+    from services.expensas_sheet_service import expensas_sheet_service
+
+    expensas_sheet_service.catalog.start()
+    yield
+    conversation_manager.handoff_timeouts.stop()
+    expensas_sheet_service.catalog.stop()
+
+
 # Crear la aplicación FastAPI
 app = FastAPI(
     title="Artuso Chatbot API",
     description="Chatbot para pagos de expensas y reclamos",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Intencional: el handoff expira por inactividad a los 60 minutos por defecto.
@@ -50,17 +80,24 @@ COMPROBANTE_MIME_EXT = {
 HANDOFF_STANDARD_NUMBER_ENV = "HANDOFF_WHATSAPP_NUMBER"
 HANDOFF_EMERGENCY_NUMBER_ENV = "HANDOFF_EMERGENCY_WHATSAPP_NUMBER"
 RATE_LIMIT_INBOUND_ENABLED = os.getenv("RATE_LIMIT_INBOUND_ENABLED", "false").lower() == "true"
+# Deletes por commit (Firestore acepta hasta 500 por batch)
 SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE = int(
-    os.getenv("SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE", "100")
+    os.getenv("SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE", "500")
+)
+SESSION_CHECKPOINT_CLEANUP_TIME_BUDGET_SECONDS = float(
+    os.getenv("SESSION_CHECKPOINT_CLEANUP_TIME_BUDGET_SECONDS", "45")
 )
 SESSION_CHECKPOINT_CLEANUP_TOKEN_ENV = "SESSION_CHECKPOINT_CLEANUP_TOKEN"
+# Ack-first: responder 200 apenas se valida la firma y procesar en el pool de workers.
+WEBHOOK_ACK_FIRST_ENABLED = os.getenv("WEBHOOK_ACK_FIRST_ENABLED", "false").lower() == "true"
+# Dedupe + carga de checkpoint con el cliente async de Firestore (no bloquea el event loop).
+SESSION_ASYNC_CLIENT_ENABLED = os.getenv("SESSION_ASYNC_CLIENT_ENABLED", "false").lower() == "true"
 
 
 def _normalize_optin_keyword(text: str) -> str:
     if not text:
         return ""
-    normalized = unicodedata.normalize("NFD", text.strip().upper())
-    return "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
+    return NormalizedMessage.of(text).keyword
 
 
 _OPTIN_ACCEPT_KEYWORD = _normalize_optin_keyword(os.getenv("OPTIN_ACCEPT_KEYWORD", "ACEPTO"))
@@ -227,7 +264,9 @@ def _save_final_checkpoint_if_needed(numero_telefono: str) -> None:
     if not conversation_session_service.is_resumable_state(conversacion.estado):
         return
     try:
-        conversation_session_service.save_for_key(numero_telefono, conversacion)
+        # Fin de turno: si nada cambió desde el último guardado (p.ej. el
+        # save-before-send del mismo turno) no se vuelve a escribir
+        conversation_session_service.save_for_key_if_changed(numero_telefono, conversacion)
     except Exception as exc:
         logger.error(
             "final_save_failed phone=%s estado=%s error=%s",
@@ -404,133 +443,107 @@ async def health():
         "service": "artuso-chatbot"
     }
 
-@app.post("/handoff/ttl-sweep")
-async def handoff_ttl_sweep(token: str = Form(...)):
-    """Job idempotente para cerrar conversaciones en handoff por inactividad.
-    Ejecutar cada 15 minutos con cron. TTL por env (default 120 min)."""
-    if token != os.getenv("AGENT_API_TOKEN", ""):
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    from datetime import datetime, timedelta
-    ahora = datetime.utcnow()
-    cerradas = 0
-    resolution_timeout_minutes = 10  # Timeout para preguntas de resolución
-    
-    survey_states = {
-        EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA,
-        EstadoConversacion.ENCUESTA_SATISFACCION,
-    }
+def _close_timed_out_handoff(conv: ConversacionData, close_reason: str) -> bool:
+    """Cierra una conversación de handoff/encuesta cuyo timer venció (mensaje al cliente + cola)."""
+    try:
+        # Enviar mensaje de cierre al cliente (usa el servicio correcto según el canal)
+        if close_reason == REASON_SURVEY_OFFER:
+            # Cierre silencioso cuando no responde a oferta de encuesta (no enviar mensaje)
+            conv.survey_accepted = None  # Registrar como timeout
+            logger.info(
+                "survey_timeout client_phone=%s agent_phone=%s state=%s reason=offer_timeout",
+                conv.numero_telefono,
+                os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
+                conv.estado,
+            )
+            logger.info(f"⏱️ Timeout de oferta de encuesta para {conv.numero_telefono}")
+        elif close_reason == REASON_SURVEY:
+            send_message(conv.numero_telefono, "¡Gracias por tu consulta! Damos por finalizada esta conversación. ✅")
+            logger.info(
+                "survey_timeout client_phone=%s agent_phone=%s state=%s reason=survey_incomplete",
+                conv.numero_telefono,
+                os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
+                conv.estado,
+            )
+        elif close_reason == REASON_RESOLUTION_QUESTION:
+            send_message(conv.numero_telefono, "¡Gracias por tu consulta! Damos por finalizada esta conversación. ✅")
+        else:
+            send_message(
+                conv.numero_telefono,
+                "Cerramos esta conversación por falta de actividad.\n"
+                "Quedamos atentos si volvés a necesitar ayuda.",
+            )
+    except Exception:
+        pass
+
+    # Verificar si es la conversación activa en la cola
+    active_phone = conversation_manager.get_active_handoff()
+    if active_phone == conv.numero_telefono:
+        # Era la conversación activa, usar close_active_handoff
+        next_phone = conversation_manager.close_active_handoff()
+
+        # Si hay siguiente conversación, notificar al agente
+        suppress_agent_notify = close_reason in (REASON_SURVEY_OFFER, REASON_SURVEY)
+        if next_phone and not suppress_agent_notify:
+            try:
+                next_conv = conversation_manager.get_conversacion(next_phone)
+                position = 1
+                total = conversation_manager.get_queue_size()
+                _notify_handoff_activated(next_conv, position, total)
+            except Exception as e:
+                logger.error(f"Error notificando siguiente handoff después de TTL: {e}")
+    else:
+        # No es la activa, solo remover de cola
+        conversation_manager.remove_from_handoff_queue(conv.numero_telefono)
+        conversation_manager.finalizar_conversacion(conv.numero_telefono)
 
-    for conv in list(conversation_manager.conversaciones.values()):
-        if conv.atendido_por_humano or conv.estado in survey_states or conv.estado == EstadoConversacion.ATENDIDO_POR_HUMANO:
-            should_close = False
-            close_reason = ""
-
-            # Verificar timeout de oferta de encuesta (2 minutos)
-            if conv.estado == EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA and conv.survey_offer_sent_at:
-                if (ahora - conv.survey_offer_sent_at) > timedelta(minutes=2):
-                    should_close = True
-                    close_reason = "Oferta de encuesta sin respuesta"
-
-            # Verificar timeout de encuesta de satisfacción (15 minutos)
-            elif conv.estado == EstadoConversacion.ENCUESTA_SATISFACCION and conv.survey_sent_at:
-                if (ahora - conv.survey_sent_at) > timedelta(minutes=15):
-                    should_close = True
-                    close_reason = "Encuesta de satisfacción sin completar"
-
-            # Verificar timeout de pregunta de resolución (10 minutos)
-            elif conv.resolution_question_sent and conv.resolution_question_sent_at:
-                if (ahora - conv.resolution_question_sent_at) > timedelta(minutes=resolution_timeout_minutes):
-                    should_close = True
-                    close_reason = "Pregunta de resolución sin respuesta"
-            
-            # Verificar inactividad general de handoff
-            elif conv.last_client_message_at or conv.handoff_started_at:
-                last_ts = conv.last_client_message_at or conv.handoff_started_at
-                if last_ts and (ahora - last_ts) > timedelta(minutes=HANDOFF_INACTIVITY_MINUTES):
-                    should_close = True
-                    close_reason = "Inactividad general"
-            
-            if should_close:
-                try:
-                    # Enviar mensaje de cierre al cliente (usa el servicio correcto según el canal)
-                    if close_reason == "Oferta de encuesta sin respuesta":
-                        # Cierre silencioso cuando no responde a oferta de encuesta (no enviar mensaje)
-                        conv.survey_accepted = None  # Registrar como timeout
-                        logger.info(
-                            "survey_timeout client_phone=%s agent_phone=%s state=%s reason=offer_timeout",
-                            conv.numero_telefono,
-                            os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
-                            conv.estado,
-                        )
-                        logger.info(f"⏱️ Timeout de oferta de encuesta para {conv.numero_telefono}")
-                    elif close_reason == "Encuesta de satisfacción sin completar":
-                        send_message(conv.numero_telefono, "¡Gracias por tu consulta! Damos por finalizada esta conversación. ✅")
-                        logger.info(
-                            "survey_timeout client_phone=%s agent_phone=%s state=%s reason=survey_incomplete",
-                            conv.numero_telefono,
-                            os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
-                            conv.estado,
-                        )
-                    elif close_reason == "Pregunta de resolución sin respuesta":
-                        send_message(conv.numero_telefono, "¡Gracias por tu consulta! Damos por finalizada esta conversación. ✅")
-                    else:
-                        send_message(
-                            conv.numero_telefono,
-                            "Cerramos esta conversación por falta de actividad.\n"
-                            "Quedamos atentos si volvés a necesitar ayuda.",
-                        )
-                except Exception:
-                    pass
+    logger.info(f"Conversación {conv.numero_telefono} cerrada por: {close_reason}")
+    return True
 
-                # Verificar si es la conversación activa en la cola
-                active_phone = conversation_manager.get_active_handoff()
-                if active_phone == conv.numero_telefono:
-                    # Era la conversación activa, usar close_active_handoff
-                    next_phone = conversation_manager.close_active_handoff()
-                    cerradas += 1
-
-                    # Si hay siguiente conversación, notificar al agente
-                    suppress_agent_notify = close_reason in (
-                        "Oferta de encuesta sin respuesta",
-                        "Encuesta de satisfacción sin completar",
-                    )
-                    if next_phone and not suppress_agent_notify:
-                        try:
-                            next_conv = conversation_manager.get_conversacion(next_phone)
-                            position = 1
-                            total = conversation_manager.get_queue_size()
-                            _notify_handoff_activated(next_conv, position, total)
-                        except Exception as e:
-                            logger.error(f"Error notificando siguiente handoff después de TTL: {e}")
-                else:
-                    # No es la activa, solo remover de cola
-                    conversation_manager.remove_from_handoff_queue(conv.numero_telefono)
-                    conversation_manager.finalizar_conversacion(conv.numero_telefono)
-                    cerradas += 1
 
-                logger.info(f"Conversación {conv.numero_telefono} cerrada por: {close_reason}")
-    
-    return {"closed": cerradas}
+conversation_manager.handoff_timeouts.on_timeout = _close_timed_out_handoff
+conversation_manager.handoff_timeouts.inactivity_minutes = HANDOFF_INACTIVITY_MINUTES
+
+
+@app.post("/handoff/ttl-sweep")
+async def handoff_ttl_sweep(token: str = Form(...), full_scan: bool = Form(False)):
+    """Disparo manual de los timers de cierre de handoff (cron o con el scheduler apagado).
+    Cierra solo lo vencido en el índice; `full_scan` reindexa antes todas las conversaciones
+    en memoria (p. ej. tras restaurar desde checkpoints)."""
+    if token != os.getenv("AGENT_API_TOKEN", ""):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    timeouts = conversation_manager.handoff_timeouts
+    if full_scan:
+        for conv in list(conversation_manager.conversaciones.values()):
+            timeouts.refresh(conv)
+    # Cada cierre espera el turno de su conversación: fuera del loop
+    cerradas = await asyncio.to_thread(timeouts.run_due)
+    return {"closed": cerradas, "pending": timeouts.stats()["pending"]}
 
 
 @app.post("/session-checkpoints/cleanup")
 async def session_checkpoints_cleanup(token: str = Form(...)):
-    """Job diario idempotente para borrar checkpoints vencidos en lotes chicos."""
+    """Job diario idempotente: borra checkpoints y marcadores de dedupe vencidos en batches."""
     if token != os.getenv(SESSION_CHECKPOINT_CLEANUP_TOKEN_ENV, ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    deleted_doc_ids = conversation_session_service.cleanup_expired_checkpoints(
-        limit=SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE,
+    # Barrido sync con presupuesto de hasta 45s: en un hilo para no frenar el loop
+    result = await asyncio.to_thread(
+        conversation_session_service.cleanup_expired,
+        batch_size=SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE,
+        time_budget_seconds=SESSION_CHECKPOINT_CLEANUP_TIME_BUDGET_SECONDS,
     )
     logger.info(
-        "checkpoint_cleanup_run deleted=%s batch_limit=%s",
-        len(deleted_doc_ids),
+        "checkpoint_cleanup_run deleted=%s elapsed_ms=%s budget_exhausted=%s batch_limit=%s",
+        result["deleted"],
+        result["elapsed_ms"],
+        result["budget_exhausted"],
         SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE,
     )
     return {
-        "deleted": len(deleted_doc_ids),
-        "deleted_doc_ids": deleted_doc_ids,
+        **result,
         "batch_limit": SESSION_CHECKPOINT_CLEANUP_BATCH_SIZE,
+        "time_budget_seconds": SESSION_CHECKPOINT_CLEANUP_TIME_BUDGET_SECONDS,
     }
 
 @app.get("/webhook/whatsapp")
@@ -611,577 +624,779 @@ async def webhook_whatsapp_receive(request: Request):
             return PlainTextResponse("Forbidden", status_code=403)
         
         logger.debug("Payload completo: %s", json.dumps(webhook_data))
-        
-        # Extraer datos de mensaje usando el servicio apropiado
-        message_data = messaging_service.extract_message_data(webhook_data)
-        
-        if message_data:
-            numero_telefono, mensaje_usuario, message_id, profile_name, message_type, message_caption = message_data
-            skip_final_save = False
 
-            logger.info(
-                f"Mensaje recibido de {numero_telefono} ({profile_name or 'sin nombre'}): {mensaje_usuario}"
-            )
+        messages, statuses = _extract_webhook_events(webhook_data, messaging_service)
 
-            if message_id:
-                try:
-                    is_duplicate = conversation_session_service.mark_message_processed(message_id)
-                except Exception as exc:
-                    logger.error(
-                        "message_dedupe_failed phone=%s message_id=%s error=%s",
-                        numero_telefono,
-                        message_id,
-                        str(exc),
-                    )
-                else:
-                    if is_duplicate:
-                        logger.info(
-                            "message_deduped phone=%s message_id=%s",
-                            numero_telefono,
-                            message_id,
-                        )
-                        return PlainTextResponse("", status_code=200)
-
-            # Verificar si el mensaje viene del agente humano
-            if whatsapp_handoff_service.is_agent_message(numero_telefono):
-                from services.agent_command_service import agent_command_service
-                if agent_command_service.is_command(mensaje_usuario or ""):
-                    command = agent_command_service.parse_command(mensaje_usuario or "")
-                    if command == "optin":
-                        await handle_agent_message(numero_telefono, mensaje_usuario, profile_name)
-                        return PlainTextResponse("", status_code=200)
-                    await handle_agent_message(numero_telefono, mensaje_usuario, profile_name)
-                    return PlainTextResponse("", status_code=200)
-
-                normalized_optin = _normalize_optin_keyword(mensaje_usuario or "")
-                is_optin_accept_decline = normalized_optin in {
-                    _OPTIN_ACCEPT_KEYWORD,
-                    _OPTIN_DECLINE_KEYWORD,
-                }
-                is_optin_resubscribe = normalized_optin == _OPTIN_RESUBSCRIBE_KEYWORD
-                is_optin_optout = normalized_optin in _OPTIN_OUT_KEYWORDS
+        if WEBHOOK_ACK_FIRST_ENABLED:
+            webhook_ingest_service.start(_process_webhook_events)
+            if webhook_ingest_service.submit(messages, statuses, is_whatsapp):
+                return PlainTextResponse("OK", status_code=200)
+            # Cola llena: procesar inline como backpressure en lugar de perder el evento
 
-                if message_type == "interactive" and is_optin_accept_decline:
-                    from services.optin_service import optin_service
+        return await _process_webhook_events(messages, statuses, is_whatsapp)
 
-                    handled, reply, use_buttons = optin_service.handle_inbound_message(
-                        numero_telefono,
-                        mensaje_usuario,
-                    )
-                    if handled:
-                        if reply:
-                            if use_buttons and not numero_telefono.startswith("messenger:"):
-                                buttons = optin_service.get_optin_buttons()
-                                sent = meta_whatsapp_service.send_interactive_buttons(
-                                    numero_telefono,
-                                    reply,
-                                    buttons,
-                                )
-                                if not sent:
-                                    send_message(numero_telefono, reply)
-                            else:
-                                send_message(numero_telefono, reply)
-                        return PlainTextResponse("", status_code=200)
-
-                    send_message(
-                        numero_telefono,
-                        "No pude aplicar esa respuesta. "
-                        "Si era por el opt-in, usa /optin (o ALTA) y respondé con los botones.",
-                    )
-                    return PlainTextResponse("", status_code=200)
+    except Exception as e:
+        logger.error(f"Error en webhook de WhatsApp: {str(e)}")
+        _report_webhook_exception(e)
+        return PlainTextResponse("Error", status_code=500)
 
-                if is_optin_resubscribe or is_optin_optout:
-                    from services.optin_service import optin_service
 
-                    handled, reply, use_buttons = optin_service.handle_inbound_message(
-                        numero_telefono,
-                        mensaje_usuario,
-                    )
-                    if handled:
-                        if reply:
-                            if use_buttons and not numero_telefono.startswith("messenger:"):
-                                buttons = optin_service.get_optin_buttons()
-                                sent = meta_whatsapp_service.send_interactive_buttons(
-                                    numero_telefono,
-                                    reply,
-                                    buttons,
-                                )
-                                if not sent:
-                                    send_message(numero_telefono, reply)
-                            else:
-                                send_message(numero_telefono, reply)
-                        return PlainTextResponse("", status_code=200)
-
-                if message_type != "interactive" and is_optin_accept_decline:
-                    send_message(
-                        numero_telefono,
-                        "Para aceptar/rechazar el opt-in, usa los botones del mensaje de consentimiento. "
-                        "Si no los ves, usa /optin para recibirlos nuevamente.",
-                    )
-                    return PlainTextResponse("", status_code=200)
+def _report_webhook_exception(exc: Exception) -> None:
+    # Reporte estructurado de excepción
+    try:
+        from services.error_reporter import error_reporter
 
-                if message_type == "interactive":
-                    logger.info(
-                        "agent_interactive_ignored agent_phone=%s id=%s",
-                        numero_telefono,
-                        mensaje_usuario,
-                    )
-                    return PlainTextResponse("", status_code=200)
+        error_reporter.capture_exception(
+            exc,
+            {
+                "webhook_type": "whatsapp_meta",
+                "error": str(exc)
+            }
+        )
+    except Exception:
+        pass
 
-                await handle_agent_message(numero_telefono, mensaje_usuario, profile_name)
-                return PlainTextResponse("", status_code=200)
 
-            normalized_optin = _normalize_optin_keyword(mensaje_usuario or "")
-            should_check_optin = normalized_optin in (
-                _OPTIN_OUT_KEYWORDS
-                | {_OPTIN_ACCEPT_KEYWORD, _OPTIN_DECLINE_KEYWORD, _OPTIN_RESUBSCRIBE_KEYWORD}
-            )
-            if should_check_optin:
-                from services.optin_service import optin_service
+def _extract_webhook_events(webhook_data: dict, messaging_service) -> tuple[list, list]:
+    """
+    Extrae todos los mensajes y statuses del batch.
 
-                handled, reply, use_buttons = optin_service.handle_inbound_message(
-                    numero_telefono,
-                    mensaje_usuario,
-                )
-                if handled:
-                    if reply:
-                        if use_buttons and not numero_telefono.startswith("messenger:"):
-                            buttons = optin_service.get_optin_buttons()
-                            sent = meta_whatsapp_service.send_interactive_buttons(
-                                numero_telefono,
-                                reply,
-                                buttons,
-                            )
-                            if not sent:
-                                send_message(numero_telefono, reply)
-                        else:
-                            send_message(numero_telefono, reply)
-                    return PlainTextResponse("", status_code=200)
+    Cada mensaje reserva su turno en el mailbox de la conversación en orden de
+    llegada, antes de encolarse, para que el procesamiento respete ese orden.
+    """
+    messages = messaging_service.extract_messages(webhook_data)
+    statuses = meta_whatsapp_service.extract_statuses(webhook_data)
+    inbound = [
+        (message_data, conversation_manager.mailbox.reserve(message_data[0]))
+        for message_data in messages
+    ]
+    return inbound, statuses
 
-            conversacion_actual = conversation_manager.get_conversacion(numero_telefono)
-            was_finalized_recently = conversation_manager.was_finalized_recently(numero_telefono)
 
-            if RATE_LIMIT_INBOUND_ENABLED and _should_count_rate_limit(
-                conversacion_actual,
-                mensaje_usuario,
-                is_whatsapp,
-                was_finalized_recently,
-            ):
-                from services.rate_limit_service import rate_limit_service
+async def _process_webhook_events(messages: list, statuses: list, is_whatsapp: bool):
+    """
+    Procesa los eventos de un webhook ya validado (mensajes entrantes y status updates).
 
-                allowed, count, date_key = rate_limit_service.check_and_increment(numero_telefono)
-                if not allowed:
-                    logger.info(
-                        "rate_limit_block phone=%s date=%s count=%s",
-                        numero_telefono,
-                        date_key,
-                        count,
-                    )
-                    send_message(numero_telefono, RATE_LIMIT_MESSAGE)
-                    return PlainTextResponse("", status_code=200)
-
-            # Manejar botones/listas interactivos nativos de Meta
-            if message_type == 'interactive':
-                if not mensaje_usuario:
-                    logger.warning(
-                        f"Interacción sin ID de botón/lista desde {numero_telefono}: {message_id}"
-                    )
-                    return PlainTextResponse("", status_code=200)
+    Se ejecuta inline desde el endpoint o desde un worker del pool ack-first.
+    Meta puede agrupar varios mensajes/statuses en un mismo POST: se procesan todos.
+    """
+    try:
+        response = None
+        if messages:
+            response = await _dispatch_inbound_messages(messages, is_whatsapp)
 
-                respuesta_interactiva = await handle_interactive_button(
-                    numero_telefono,
-                    mensaje_usuario,
-                    profile_name
-                )
+        # Status updates (opcional, para métricas)
+        for status_data in statuses:
+            _handle_status_update(status_data)
 
-                if respuesta_interactiva:
-                    send_message(numero_telefono, respuesta_interactiva)
+        if response is not None:
+            return response
 
-                _maybe_notify_handoff(numero_telefono)
-                _postprocess_enviando(numero_telefono)
+        # Siempre retornar 200 para que Meta no reintente
+        return _ok_response()
 
-                return _ok_response(numero_telefono, save_final=True)
+    except Exception as e:
+        logger.error(f"Error en webhook de WhatsApp: {str(e)}")
+        _report_webhook_exception(e)
+        return PlainTextResponse("Error", status_code=500)
+    finally:
+        # Liberar turnos que no llegaron a consumirse (no-op para los procesados)
+        for message_data, ticket in messages:
+            conversation_manager.mailbox.abandon(message_data[0], ticket)
 
-            # Manejar comprobantes adjuntos
-            if message_type in {"image", "document"} and mensaje_usuario.startswith("media:"):
-                conversacion_media = conversation_manager.get_conversacion(numero_telefono)
-                survey_states = {
-                    EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA,
-                    EstadoConversacion.ENCUESTA_SATISFACCION,
-                }
 
-                if (
-                    conversacion_media.estado in survey_states
-                    or conversacion_media.atendido_por_humano
-                    or conversacion_media.estado == EstadoConversacion.ATENDIDO_POR_HUMANO
-                ):
-                    logger.info(
-                        "media_ignored phone=%s state=%s",
-                        numero_telefono,
-                        conversacion_media.estado,
-                    )
-                    return PlainTextResponse("", status_code=200)
+async def _dispatch_inbound_messages(messages: list, is_whatsapp: bool) -> PlainTextResponse:
+    """
+    Fan-out de los mensajes de un batch.
 
-                if numero_telefono.startswith("messenger:"):
-                    send_message(
-                        numero_telefono,
-                        "Recibí el archivo, pero ahora no puedo procesarlo por este canal.",
-                    )
-                    return PlainTextResponse("", status_code=200)
+    Agrupa por remitente preservando el orden de llegada: cada remitente se
+    procesa secuencialmente y remitentes distintos corren en paralelo.
+    """
+    by_sender = {}
+    for message_data, ticket in messages:
+        by_sender.setdefault(message_data[0], []).append((message_data, ticket))
+
+    if len(by_sender) == 1:
+        results = [
+            await _process_sender_messages(
+                messages,
+                is_whatsapp,
+                use_async_session=SESSION_ASYNC_CLIENT_ENABLED,
+            )
+        ]
+    else:
+        logger.info(
+            "webhook_batch_fanout messages=%s senders=%s",
+            len(messages),
+            len(by_sender),
+        )
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(_process_sender_messages_in_thread, sender_messages, is_whatsapp)
+                for sender_messages in by_sender.values()
+            )
+        )
 
-                media_id = mensaje_usuario.split("media:", 1)[1]
-                media_data = meta_whatsapp_service.download_media(media_id)
-                if not media_data:
-                    send_message(
-                        numero_telefono,
-                        "❌ No pude descargar el archivo. Probá enviar nuevamente.",
-                    )
-                    return PlainTextResponse("", status_code=200)
+    responses = [response for sender_responses in results for response in sender_responses]
+    if any(response is None for response in responses):
+        return PlainTextResponse("Error", status_code=500)
+    if len(responses) == 1:
+        return responses[0]
+    return PlainTextResponse("", status_code=200)
 
-                content, mime_type = media_data
-                ext = COMPROBANTE_MIME_EXT.get(mime_type, "")
-                if not ext:
-                    send_message(
-                        numero_telefono,
-                        "❌ Formato no soportado. Enviá PNG, JPG, PDF o HEIC.",
+
+async def _process_sender_messages(
+    sender_messages: list,
+    is_whatsapp: bool,
+    *,
+    use_async_session: bool = False,
+) -> list:
+    """Procesa en orden los mensajes de un mismo remitente. None marca un mensaje fallido."""
+    responses = []
+    for message_data, ticket in sender_messages:
+        try:
+            dedupe_checked = False
+            if use_async_session:
+                # El I/O async va antes de tomar el turno: mientras se espera,
+                # el loop puede atender otros webhooks sin romper el orden.
+                if await _prefetch_session_async(message_data):
+                    conversation_manager.mailbox.abandon(message_data[0], ticket)
+                    responses.append(PlainTextResponse("", status_code=200))
+                    continue
+                dedupe_checked = True
+            # Espera con await: el loop sigue atendiendo a los mensajes anteriores del número
+            async with conversation_manager.mailbox.turn_async(message_data[0], ticket):
+                responses.append(
+                    await _handle_inbound_message(
+                        message_data,
+                        is_whatsapp,
+                        dedupe_checked=dedupe_checked,
                     )
-                    return PlainTextResponse("", status_code=200)
+                )
+        except Exception as e:
+            logger.error(
+                "inbound_message_failed phone=%s message_id=%s error=%s",
+                message_data[0],
+                message_data[2],
+                str(e),
+            )
+            _report_webhook_exception(e)
+            responses.append(None)
+    return responses
 
-                from services.gcs_storage_service import gcs_storage_service
 
-                url = gcs_storage_service.upload_public(content, mime_type, ext)
-                if not url:
-                    send_message(
-                        numero_telefono,
-                        "❌ No pude guardar el archivo. Intentá más tarde.",
-                    )
-                    return PlainTextResponse("", status_code=200)
+def _process_sender_messages_in_thread(sender_messages: list, is_whatsapp: bool) -> list:
+    return asyncio.run(_process_sender_messages(sender_messages, is_whatsapp))
 
-                caption_text = (message_caption or "").strip()
-                campo_siguiente = conversation_manager.get_campo_siguiente(numero_telefono)
-                esperando_comprobante = (
-                    conversacion_media.estado == EstadoConversacion.RECOLECTANDO_SECUENCIAL
-                    and campo_siguiente == "comprobante"
+
+async def _prefetch_session_async(message_data: tuple) -> bool:
+    """
+    Dedupe e hidratación del checkpoint con el cliente async.
+
+    Returns:
+        bool: True si el mensaje es un duplicado y no debe procesarse.
+    """
+    numero_telefono, message_id = message_data[0], message_data[2]
+    if message_id:
+        try:
+            is_duplicate = await async_conversation_session_service.mark_message_processed(message_id)
+        except Exception as exc:
+            logger.error(
+                "message_dedupe_failed phone=%s message_id=%s error=%s",
+                numero_telefono,
+                message_id,
+                str(exc),
+            )
+        else:
+            if is_duplicate:
+                logger.info(
+                    "message_deduped phone=%s message_id=%s",
+                    numero_telefono,
+                    message_id,
                 )
-                corrigiendo_comprobante = (
-                    conversacion_media.estado == EstadoConversacion.CORRIGIENDO_CAMPO
-                    and conversacion_media.datos_temporales.get("_campo_a_corregir") == "comprobante"
+                return True
+    if not whatsapp_handoff_service.is_agent_message(numero_telefono):
+        await conversation_manager.get_conversacion_async(numero_telefono)
+    return False
+
+
+async def _handle_inbound_message(
+    message_data: tuple,
+    is_whatsapp: bool,
+    *,
+    dedupe_checked: bool = False,
+) -> PlainTextResponse:
+    """Procesa un mensaje entrante individual (usuario o agente)."""
+    numero_telefono, mensaje_usuario, message_id, profile_name, message_type, message_caption = message_data
+    skip_final_save = False
+    # Normalización única: opt-in, rate limit, gracias y procesar_mensaje leen las vistas de este objeto
+    if mensaje_usuario is not None:
+        mensaje_usuario = NormalizedMessage.of(mensaje_usuario)
+
+    logger.info(
+        f"Mensaje recibido de {numero_telefono} ({profile_name or 'sin nombre'}): {mensaje_usuario}"
+    )
+
+    if message_id and not dedupe_checked:
+        try:
+            is_duplicate = conversation_session_service.mark_message_processed(message_id)
+        except Exception as exc:
+            logger.error(
+                "message_dedupe_failed phone=%s message_id=%s error=%s",
+                numero_telefono,
+                message_id,
+                str(exc),
+            )
+        else:
+            if is_duplicate:
+                logger.info(
+                    "message_deduped phone=%s message_id=%s",
+                    numero_telefono,
+                    message_id,
                 )
+                return PlainTextResponse("", status_code=200)
 
-                if conversacion_media.tipo_consulta == TipoConsulta.PAGO_EXPENSAS and conversacion_media.estado not in {
-                    EstadoConversacion.INICIO,
-                    EstadoConversacion.ESPERANDO_OPCION,
-                }:
-                    _append_url_to_list(conversacion_media, "comprobante", url)
-                    logger.info(
-                        "media_saved_as_comprobante phone=%s",
-                        numero_telefono,
-                    )
+    # Verificar si el mensaje viene del agente humano
+    if whatsapp_handoff_service.is_agent_message(numero_telefono):
+        from services.agent_command_service import agent_command_service
+        if agent_command_service.is_command(mensaje_usuario or ""):
+            command = agent_command_service.parse_command(mensaje_usuario or "")
+            if command == "optin":
+                await handle_agent_message(numero_telefono, mensaje_usuario, profile_name)
+                return PlainTextResponse("", status_code=200)
+            await handle_agent_message(numero_telefono, mensaje_usuario, profile_name)
+            return PlainTextResponse("", status_code=200)
 
-                    if corrigiendo_comprobante:
-                        valido, error = conversation_manager.validar_y_guardar_datos(numero_telefono)
-                        if not valido:
-                            send_message(numero_telefono, f"❌ Error al actualizar: {error}")
-                            return _ok_response(numero_telefono, save_final=True)
-                        conversation_manager.set_datos_temporales(numero_telefono, "_campo_a_corregir", None)
-                        conversation_manager.update_estado(numero_telefono, EstadoConversacion.CONFIRMANDO)
-                        conversacion_actualizada = conversation_manager.get_conversacion(numero_telefono)
-                        send_message(
-                            numero_telefono,
-                            f"✅ Campo actualizado correctamente.\n\n{ChatbotRules.get_mensaje_confirmacion(conversacion_actualizada)}",
-                        )
-                        return _ok_response(numero_telefono, save_final=True)
+        normalized_optin = _normalize_optin_keyword(mensaje_usuario or "")
+        is_optin_accept_decline = normalized_optin in {
+            _OPTIN_ACCEPT_KEYWORD,
+            _OPTIN_DECLINE_KEYWORD,
+        }
+        is_optin_resubscribe = normalized_optin == _OPTIN_RESUBSCRIBE_KEYWORD
+        is_optin_optout = normalized_optin in _OPTIN_OUT_KEYWORDS
 
-                    if caption_text:
-                        respuesta_caption = ChatbotRules.procesar_mensaje(
-                            numero_telefono,
-                            caption_text,
-                            profile_name,
-                        )
-                        if respuesta_caption:
-                            send_message(numero_telefono, respuesta_caption)
-                        _maybe_notify_handoff(numero_telefono)
-                        _postprocess_enviando(numero_telefono)
-                        return _ok_response(numero_telefono, save_final=True)
-
-                    siguiente = conversation_manager.get_campo_siguiente(numero_telefono)
-                    if not siguiente:
-                        conversation_manager.update_estado(numero_telefono, EstadoConversacion.CONFIRMANDO)
-                        send_message(
+        if message_type == "interactive" and is_optin_accept_decline:
+            from services.optin_service import optin_service
+
+            handled, reply, use_buttons = optin_service.handle_inbound_message(
+                numero_telefono,
+                mensaje_usuario,
+            )
+            if handled:
+                if reply:
+                    if use_buttons and not numero_telefono.startswith("messenger:"):
+                        buttons = optin_service.get_optin_buttons()
+                        sent = meta_whatsapp_service.send_interactive_buttons(
                             numero_telefono,
-                            ChatbotRules.get_mensaje_confirmacion(
-                                conversation_manager.get_conversacion(numero_telefono)
-                            ),
+                            reply,
+                            buttons,
                         )
-                        return _ok_response(numero_telefono, save_final=True)
+                        if not sent:
+                            send_message(numero_telefono, reply)
+                    else:
+                        send_message(numero_telefono, reply)
+                return PlainTextResponse("", status_code=200)
+
+            send_message(
+                numero_telefono,
+                "No pude aplicar esa respuesta. "
+                "Si era por el opt-in, usa /optin (o ALTA) y respondé con los botones.",
+            )
+            return PlainTextResponse("", status_code=200)
 
-                    if esperando_comprobante:
-                        send_message(
+        if is_optin_resubscribe or is_optin_optout:
+            from services.optin_service import optin_service
+
+            handled, reply, use_buttons = optin_service.handle_inbound_message(
+                numero_telefono,
+                mensaje_usuario,
+            )
+            if handled:
+                if reply:
+                    if use_buttons and not numero_telefono.startswith("messenger:"):
+                        buttons = optin_service.get_optin_buttons()
+                        sent = meta_whatsapp_service.send_interactive_buttons(
                             numero_telefono,
-                            ChatbotRules._get_pregunta_campo_secuencial(siguiente),
+                            reply,
+                            buttons,
                         )
-                        return _ok_response(numero_telefono, save_final=True)
+                        if not sent:
+                            send_message(numero_telefono, reply)
+                    else:
+                        send_message(numero_telefono, reply)
+                return PlainTextResponse("", status_code=200)
 
-                    send_message(
-                        numero_telefono,
-                        "🧾 Comprobante recibido.\n\n"
-                        + ChatbotRules._get_pregunta_campo_secuencial(siguiente),
-                    )
-                    return _ok_response(numero_telefono, save_final=True)
+        if message_type != "interactive" and is_optin_accept_decline:
+            send_message(
+                numero_telefono,
+                "Para aceptar/rechazar el opt-in, usa los botones del mensaje de consentimiento. "
+                "Si no los ves, usa /optin para recibirlos nuevamente.",
+            )
+            return PlainTextResponse("", status_code=200)
 
-                if conversacion_media.tipo_consulta == TipoConsulta.SOLICITAR_SERVICIO and conversacion_media.estado not in {
-                    EstadoConversacion.INICIO,
-                    EstadoConversacion.ESPERANDO_OPCION,
-                }:
-                    _append_url_to_list(conversacion_media, "adjuntos_servicio", url)
-                    logger.info(
-                        "adjuntos_servicio_count phone=%s count=%s",
+        if message_type == "interactive":
+            logger.info(
+                "agent_interactive_ignored agent_phone=%s id=%s",
+                numero_telefono,
+                mensaje_usuario,
+            )
+            return PlainTextResponse("", status_code=200)
+
+        await handle_agent_message(numero_telefono, mensaje_usuario, profile_name)
+        return PlainTextResponse("", status_code=200)
+
+    normalized_optin = _normalize_optin_keyword(mensaje_usuario or "")
+    should_check_optin = normalized_optin in (
+        _OPTIN_OUT_KEYWORDS
+        | {_OPTIN_ACCEPT_KEYWORD, _OPTIN_DECLINE_KEYWORD, _OPTIN_RESUBSCRIBE_KEYWORD}
+    )
+    if should_check_optin:
+        from services.optin_service import optin_service
+
+        handled, reply, use_buttons = optin_service.handle_inbound_message(
+            numero_telefono,
+            mensaje_usuario,
+        )
+        if handled:
+            if reply:
+                if use_buttons and not numero_telefono.startswith("messenger:"):
+                    buttons = optin_service.get_optin_buttons()
+                    sent = meta_whatsapp_service.send_interactive_buttons(
                         numero_telefono,
-                        len(conversacion_media.datos_temporales.get("adjuntos_servicio", [])),
+                        reply,
+                        buttons,
                     )
+                    if not sent:
+                        send_message(numero_telefono, reply)
+                else:
+                    send_message(numero_telefono, reply)
+            return PlainTextResponse("", status_code=200)
+
+    conversacion_actual = conversation_manager.get_conversacion(numero_telefono)
+    was_finalized_recently = conversation_manager.was_finalized_recently(numero_telefono)
+
+    if RATE_LIMIT_INBOUND_ENABLED and _should_count_rate_limit(
+        conversacion_actual,
+        mensaje_usuario,
+        is_whatsapp,
+        was_finalized_recently,
+    ):
+        from services.rate_limit_service import rate_limit_service
+
+        allowed, count, date_key = rate_limit_service.check_and_increment(numero_telefono)
+        if not allowed:
+            logger.info(
+                "rate_limit_block phone=%s date=%s count=%s",
+                numero_telefono,
+                date_key,
+                count,
+            )
+            send_message(numero_telefono, RATE_LIMIT_MESSAGE)
+            return PlainTextResponse("", status_code=200)
+
+    # Manejar botones/listas interactivos nativos de Meta
+    if message_type == 'interactive':
+        if not mensaje_usuario:
+            logger.warning(
+                f"Interacción sin ID de botón/lista desde {numero_telefono}: {message_id}"
+            )
+            return PlainTextResponse("", status_code=200)
 
-                    if caption_text:
-                        respuesta_caption = ChatbotRules.procesar_mensaje(
-                            numero_telefono,
-                            caption_text,
-                            profile_name,
-                        )
-                        if respuesta_caption:
-                            send_message(numero_telefono, respuesta_caption)
-                        _maybe_notify_handoff(numero_telefono)
-                        _postprocess_enviando(numero_telefono)
-                        return _ok_response(numero_telefono, save_final=True)
-
-                    siguiente = conversation_manager.get_campo_siguiente(numero_telefono)
-                    if siguiente:
-                        send_message(
-                            numero_telefono,
-                            "📎 Archivo recibido.\n\n"
-                            + ChatbotRules._get_pregunta_campo_secuencial(siguiente),
-                        )
+        respuesta_interactiva = await handle_interactive_button(
+            numero_telefono,
+            mensaje_usuario,
+            profile_name
+        )
+
+        if respuesta_interactiva:
+            send_message(numero_telefono, respuesta_interactiva)
+
+        _maybe_notify_handoff(numero_telefono)
+        _postprocess_enviando(numero_telefono)
+
+        return _ok_response(numero_telefono, save_final=True)
+
+    # Manejar comprobantes adjuntos
+    if message_type in {"image", "document"} and mensaje_usuario.startswith("media:"):
+        conversacion_media = conversation_manager.get_conversacion(numero_telefono)
+        survey_states = {
+            EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA,
+            EstadoConversacion.ENCUESTA_SATISFACCION,
+        }
+
+        if (
+            conversacion_media.estado in survey_states
+            or conversacion_media.atendido_por_humano
+            or conversacion_media.estado == EstadoConversacion.ATENDIDO_POR_HUMANO
+        ):
+            logger.info(
+                "media_ignored phone=%s state=%s",
+                numero_telefono,
+                conversacion_media.estado,
+            )
+            return PlainTextResponse("", status_code=200)
+
+        if numero_telefono.startswith("messenger:"):
+            send_message(
+                numero_telefono,
+                "Recibí el archivo, pero ahora no puedo procesarlo por este canal.",
+            )
+            return PlainTextResponse("", status_code=200)
+
+        media_id = mensaje_usuario.split("media:", 1)[1]
+        media_data = meta_whatsapp_service.download_media(media_id)
+        if not media_data:
+            send_message(
+                numero_telefono,
+                "❌ No pude descargar el archivo. Probá enviar nuevamente.",
+            )
+            return PlainTextResponse("", status_code=200)
+
+        content, mime_type = media_data
+        ext = COMPROBANTE_MIME_EXT.get(mime_type, "")
+        if not ext:
+            send_message(
+                numero_telefono,
+                "❌ Formato no soportado. Enviá PNG, JPG, PDF o HEIC.",
+            )
+            return PlainTextResponse("", status_code=200)
+
+        from services.gcs_storage_service import gcs_storage_service
+
+        url = gcs_storage_service.upload_public(content, mime_type, ext)
+        if not url:
+            send_message(
+                numero_telefono,
+                "❌ No pude guardar el archivo. Intentá más tarde.",
+            )
+            return PlainTextResponse("", status_code=200)
+
+        caption_text = (message_caption or "").strip()
+        campo_siguiente = conversation_manager.get_campo_siguiente(numero_telefono)
+        esperando_comprobante = (
+            conversacion_media.estado == EstadoConversacion.RECOLECTANDO_SECUENCIAL
+            and campo_siguiente == "comprobante"
+        )
+        corrigiendo_comprobante = (
+            conversacion_media.estado == EstadoConversacion.CORRIGIENDO_CAMPO
+            and conversacion_media.datos_temporales.get("_campo_a_corregir") == "comprobante"
+        )
+
+        if conversacion_media.tipo_consulta == TipoConsulta.PAGO_EXPENSAS and conversacion_media.estado not in {
+            EstadoConversacion.INICIO,
+            EstadoConversacion.ESPERANDO_OPCION,
+        }:
+            _append_url_to_list(conversacion_media, "comprobante", url)
+            logger.info(
+                "media_saved_as_comprobante phone=%s",
+                numero_telefono,
+            )
+
+            if corrigiendo_comprobante:
+                valido, error = conversation_manager.validar_y_guardar_datos(numero_telefono)
+                if not valido:
+                    send_message(numero_telefono, f"❌ Error al actualizar: {error}")
                     return _ok_response(numero_telefono, save_final=True)
+                conversation_manager.set_datos_temporales(numero_telefono, "_campo_a_corregir", None)
+                conversation_manager.update_estado(numero_telefono, EstadoConversacion.CONFIRMANDO)
+                conversacion_actualizada = conversation_manager.get_conversacion(numero_telefono)
+                send_message(
+                    numero_telefono,
+                    f"✅ Campo actualizado correctamente.\n\n{ChatbotRules.get_mensaje_confirmacion(conversacion_actualizada)}",
+                )
+                return _ok_response(numero_telefono, save_final=True)
 
-                _append_url_to_list(conversacion_media, "adjuntos_pendientes", url)
-                if caption_text:
-                    existing_caption = conversacion_media.datos_temporales.get("adjuntos_pendientes_caption", "")
-                    combined = f"{existing_caption}\n{caption_text}" if existing_caption else caption_text
-                    conversation_manager.set_datos_temporales(
-                        numero_telefono,
-                        "adjuntos_pendientes_caption",
-                        combined,
-                    )
-                conversation_manager.set_datos_temporales(numero_telefono, "_media_confirmacion", True)
-                conversation_manager.update_estado(numero_telefono, EstadoConversacion.CONFIRMANDO_MEDIA)
-                if not _persist_checkpoint_before_send(numero_telefono, "media_confirmacion"):
-                    return _ok_response(numero_telefono, save_final=False)
-                ChatbotRules.send_media_confirmacion(numero_telefono)
-                return _ok_response(numero_telefono, save_final=False)
-
-            # Fallback para contenidos no-texto
-            if not mensaje_usuario or not mensaje_usuario.strip():
-                logger.info(
-                    f"Mensaje de tipo {message_type or 'desconocido'} sin texto manejable de {numero_telefono}"
+            if caption_text:
+                respuesta_caption = ChatbotRules.procesar_mensaje(
+                    numero_telefono,
+                    caption_text,
+                    profile_name,
                 )
+                if respuesta_caption:
+                    send_message(numero_telefono, respuesta_caption)
+                _maybe_notify_handoff(numero_telefono)
+                _postprocess_enviando(numero_telefono)
+                return _ok_response(numero_telefono, save_final=True)
+
+            siguiente = conversation_manager.get_campo_siguiente(numero_telefono)
+            if not siguiente:
+                conversation_manager.update_estado(numero_telefono, EstadoConversacion.CONFIRMANDO)
                 send_message(
                     numero_telefono,
-                    "Recibi tu mensaje, pero actualmente este canal solo procesa texto. Por favor, escribi tu consulta."
+                    ChatbotRules.get_mensaje_confirmacion(
+                        conversation_manager.get_conversacion(numero_telefono)
+                    ),
                 )
-                return PlainTextResponse("", status_code=200)
-            
-            # Manejar mensajes posteriores a cierre reciente (agradecimientos)
-            if was_finalized_recently:
-                if ChatbotRules.es_mensaje_agradecimiento(mensaje_usuario):
-                    mensaje_gracias = ChatbotRules.get_mensaje_post_finalizado_gracias()
-                    if mensaje_gracias:
-                        send_message(numero_telefono, mensaje_gracias)
-                    logger.info(f"🙏 Mensaje de agradecimiento ignorado para {numero_telefono}")
-                    return PlainTextResponse("", status_code=200)
-                else:
-                    conversation_manager.clear_recently_finalized(numero_telefono)
+                return _ok_response(numero_telefono, save_final=True)
 
-            try:
-                siguiente_campo = conversation_manager.get_campo_siguiente(numero_telefono)
-                logger.info(
-                    "Estado conversacion: phone=%s estado=%s tipo=%s siguiente=%s",
+            if esperando_comprobante:
+                send_message(
                     numero_telefono,
-                    conversacion_actual.estado,
-                    conversacion_actual.tipo_consulta,
-                    siguiente_campo,
+                    ChatbotRules._get_pregunta_campo_secuencial(siguiente),
                 )
-            except Exception:
-                pass
-            
-            # Verificar si está esperando respuesta de encuesta (PRIORIDAD MUY ALTA)
-            if conversacion_actual.estado == EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA:
-                from services.survey_service import survey_service
-                from datetime import datetime
-                
-                # Parsear respuesta (1=sí, 2=no)
-                respuesta = mensaje_usuario.strip().lower()
-                
-                # Keywords de aceptación
-                acepta_keywords = ['1', '1️⃣', 'si', 'sí', 'yes', 'ok', 'dale', 'con gusto', 'acepto']
-                # Keywords de rechazo
-                rechaza_keywords = ['2', '2️⃣', 'no', 'nope', 'no gracias', 'no quiero', 'paso']
-                
-                if any(kw in respuesta for kw in acepta_keywords):
-                    # Cliente acepta la encuesta
-                    conversacion_actual.survey_accepted = True
-                    logger.info(
-                        "survey_accepted client_phone=%s agent_phone=%s state=%s",
-                        numero_telefono,
-                        os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
-                        conversacion_actual.estado,
-                    )
-                    
-                    # Iniciar encuesta
-                    success = survey_service.send_survey(numero_telefono, conversacion_actual)
-                    
-                    if success:
-                        logger.info(f"✅ Cliente {numero_telefono} aceptó encuesta, primera pregunta enviada")
-                    else:
-                        logger.error(f"❌ Error enviando primera pregunta de encuesta a {numero_telefono}")
-                        # Fallback: cerrar conversación
-                        send_message(
-                            numero_telefono,
-                            "¡Gracias por tu tiempo! Que tengas un buen día. ✅"
-                        )
-                        
-                        # Verificar si esta conversación es la activa antes de cerrar
-                        active_phone = conversation_manager.get_active_handoff()
-                        if active_phone == numero_telefono:
-                            conversation_manager.close_active_handoff()
-                        else:
-                            conversation_manager.remove_from_handoff_queue(numero_telefono)
-                            conversation_manager.finalizar_conversacion(numero_telefono)
-                    
-                    return PlainTextResponse("", status_code=200)
-                
-                elif any(kw in respuesta for kw in rechaza_keywords):
-                    # Cliente rechaza la encuesta
-                    conversacion_actual.survey_accepted = False
-                    logger.info(
-                        "survey_declined client_phone=%s agent_phone=%s state=%s",
-                        numero_telefono,
-                        os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
-                        conversacion_actual.estado,
-                    )
-                    
-                    # Enviar mensaje de agradecimiento y cerrar
-                    send_message(
-                        numero_telefono,
-                        "¡Gracias por tu tiempo! Que tengas un buen día. ✅"
-                    )
-                    
-                    # Verificar si esta conversación es la activa
-                    active_phone = conversation_manager.get_active_handoff()
-                    
-                    if active_phone == numero_telefono:
-                        # Es la conversación activa, usar close_active_handoff
-                        next_phone = conversation_manager.close_active_handoff()
-                        
-                        logger.info(f"✅ Cliente {numero_telefono} rechazó encuesta, conversación cerrada (era activa)")
-                        
-                        # Notificar al agente si hay siguiente conversación
-                        if next_phone:
-                            next_conv = conversation_manager.get_conversacion(next_phone)
-                            position = 1
-                            total = conversation_manager.get_queue_size()
-                            _notify_handoff_activated(next_conv, position, total)
-                    else:
-                        # NO es la conversación activa, solo removerla de la cola sin afectar la activa
-                        conversation_manager.remove_from_handoff_queue(numero_telefono)
-                        conversation_manager.finalizar_conversacion(numero_telefono)
-                        
-                        logger.info(f"✅ Cliente {numero_telefono} rechazó encuesta, conversación cerrada (NO era activa)")
-                    
-                    return PlainTextResponse("", status_code=200)
-                else:
-                    # Respuesta no reconocida, pedir que responda con 1 o 2
-                    send_message(
-                        numero_telefono,
-                        "Por favor responde con:\n1️⃣ para aceptar la encuesta\n2️⃣ para omitirla"
-                    )
-                    return PlainTextResponse("", status_code=200)
-            
-            # Verificar si está en encuesta de satisfacción (PRIORIDAD ALTA)
-            if conversacion_actual.estado == EstadoConversacion.ENCUESTA_SATISFACCION:
-                # Procesar respuesta de encuesta
-                from services.survey_service import survey_service
-                
-                survey_complete, next_message = survey_service.process_survey_response(
-                    numero_telefono, mensaje_usuario, conversacion_actual
+                return _ok_response(numero_telefono, save_final=True)
+
+            send_message(
+                numero_telefono,
+                "🧾 Comprobante recibido.\n\n"
+                + ChatbotRules._get_pregunta_campo_secuencial(siguiente),
+            )
+            return _ok_response(numero_telefono, save_final=True)
+
+        if conversacion_media.tipo_consulta == TipoConsulta.SOLICITAR_SERVICIO and conversacion_media.estado not in {
+            EstadoConversacion.INICIO,
+            EstadoConversacion.ESPERANDO_OPCION,
+        }:
+            _append_url_to_list(conversacion_media, "adjuntos_servicio", url)
+            logger.info(
+                "adjuntos_servicio_count phone=%s count=%s",
+                numero_telefono,
+                len(conversacion_media.datos_temporales.get("adjuntos_servicio", [])),
+            )
+
+            if caption_text:
+                respuesta_caption = ChatbotRules.procesar_mensaje(
+                    numero_telefono,
+                    caption_text,
+                    profile_name,
                 )
-                
-                if next_message:
-                    # Enviar siguiente pregunta o mensaje de finalización
-                    send_message(numero_telefono, next_message)
-                
-                if survey_complete:
-                    # Encuesta completada, finalizar conversación
-                    # Verificar si esta conversación es la activa
-                    aborted_invalids = bool(
-                        conversacion_actual.datos_temporales.get("survey_aborted_invalids")
-                    )
-                    active_phone = conversation_manager.get_active_handoff()
-                    
-                    if active_phone == numero_telefono:
-                        # Es la conversación activa, cerrar y activar siguiente
-                        next_phone = conversation_manager.close_active_handoff()
-                        logger.info(f"✅ Encuesta completada y conversación finalizada para {numero_telefono} (era activa)")
-                        
-                        # Notificar al agente si hay siguiente conversación
-                        if next_phone and aborted_invalids:
-                            try:
-                                next_conv = conversation_manager.get_conversacion(next_phone)
-                                position = 1
-                                total = conversation_manager.get_queue_size()
-                                _notify_handoff_activated(next_conv, position, total)
-                            except Exception as e:
-                                logger.error(f"Error notificando siguiente handoff después de encuesta: {e}")
-                    else:
-                        # NO es la conversación activa, solo removerla de la cola sin afectar la activa
-                        conversation_manager.remove_from_handoff_queue(numero_telefono)
-                        conversation_manager.finalizar_conversacion(numero_telefono)
-                        logger.info(f"✅ Encuesta completada y conversación finalizada para {numero_telefono} (NO era activa)")
-                
-                return PlainTextResponse("", status_code=200)
-            
-            # Si está en handoff, reenviar al agente
-            if conversacion_actual.atendido_por_humano or conversacion_actual.estado == EstadoConversacion.ATENDIDO_POR_HUMANO:
-                # Interceptar emergencia incluso si está en handoff (no notificar al agente).
-                emergencia_detectada = ChatbotRules._detect_emergency_intent(
-                    mensaje_usuario,
-                    conversacion_actual,
+                if respuesta_caption:
+                    send_message(numero_telefono, respuesta_caption)
+                _maybe_notify_handoff(numero_telefono)
+                _postprocess_enviando(numero_telefono)
+                return _ok_response(numero_telefono, save_final=True)
+
+            siguiente = conversation_manager.get_campo_siguiente(numero_telefono)
+            if siguiente:
+                send_message(
+                    numero_telefono,
+                    "📎 Archivo recibido.\n\n"
+                    + ChatbotRules._get_pregunta_campo_secuencial(siguiente),
                 )
-                if emergencia_detectada:
-                    respuesta_emergencia = ChatbotRules._handle_emergency(
-                        numero_telefono,
-                        conversacion_actual,
-                        mensaje_usuario,
-                    )
-                    if respuesta_emergencia:
-                        send_message(numero_telefono, respuesta_emergencia)
-                    return PlainTextResponse("", status_code=200)
+            return _ok_response(numero_telefono, save_final=True)
+
+        _append_url_to_list(conversacion_media, "adjuntos_pendientes", url)
+        if caption_text:
+            existing_caption = conversacion_media.datos_temporales.get("adjuntos_pendientes_caption", "")
+            combined = f"{existing_caption}\n{caption_text}" if existing_caption else caption_text
+            conversation_manager.set_datos_temporales(
+                numero_telefono,
+                "adjuntos_pendientes_caption",
+                combined,
+            )
+        conversation_manager.set_datos_temporales(numero_telefono, "_media_confirmacion", True)
+        conversation_manager.update_estado(numero_telefono, EstadoConversacion.CONFIRMANDO_MEDIA)
+        if not _persist_checkpoint_before_send(numero_telefono, "media_confirmacion"):
+            return _ok_response(numero_telefono, save_final=False)
+        ChatbotRules.send_media_confirmacion(numero_telefono)
+        return _ok_response(numero_telefono, save_final=False)
+
+    # Fallback para contenidos no-texto
+    if not mensaje_usuario or not mensaje_usuario.strip():
+        logger.info(
+            f"Mensaje de tipo {message_type or 'desconocido'} sin texto manejable de {numero_telefono}"
+        )
+        send_message(
+            numero_telefono,
+            "Recibi tu mensaje, pero actualmente este canal solo procesa texto. Por favor, escribi tu consulta."
+        )
+        return PlainTextResponse("", status_code=200)
+
+    # Manejar mensajes posteriores a cierre reciente (agradecimientos)
+    if was_finalized_recently:
+        if ChatbotRules.es_mensaje_agradecimiento(mensaje_usuario):
+            mensaje_gracias = ChatbotRules.get_mensaje_post_finalizado_gracias()
+            if mensaje_gracias:
+                send_message(numero_telefono, mensaje_gracias)
+            logger.info(f"🙏 Mensaje de agradecimiento ignorado para {numero_telefono}")
+            return PlainTextResponse("", status_code=200)
+        else:
+            conversation_manager.clear_recently_finalized(numero_telefono)
 
-                # Notificar al agente vía WhatsApp con indicación de posición en cola
+    try:
+        siguiente_campo = conversation_manager.get_campo_siguiente(numero_telefono)
+        logger.info(
+            "Estado conversacion: phone=%s estado=%s tipo=%s siguiente=%s",
+            numero_telefono,
+            conversacion_actual.estado,
+            conversacion_actual.tipo_consulta,
+            siguiente_campo,
+        )
+    except Exception:
+        pass
+
+    # Verificar si está esperando respuesta de encuesta (PRIORIDAD MUY ALTA)
+    if conversacion_actual.estado == EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA:
+        from services.survey_service import survey_service
+        from datetime import datetime
+
+        # Parsear respuesta (1=sí, 2=no)
+        respuesta = mensaje_usuario.strip().lower()
+
+        # Keywords de aceptación
+        acepta_keywords = ['1', '1️⃣', 'si', 'sí', 'yes', 'ok', 'dale', 'con gusto', 'acepto']
+        # Keywords de rechazo
+        rechaza_keywords = ['2', '2️⃣', 'no', 'nope', 'no gracias', 'no quiero', 'paso']
+
+        if any(kw in respuesta for kw in acepta_keywords):
+            # Cliente acepta la encuesta
+            conversacion_actual.survey_accepted = True
+            logger.info(
+                "survey_accepted client_phone=%s agent_phone=%s state=%s",
+                numero_telefono,
+                os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
+                conversacion_actual.estado,
+            )
+
+            # Iniciar encuesta
+            success = survey_service.send_survey(numero_telefono, conversacion_actual)
+            conversation_manager.refresh_handoff_timeout(numero_telefono)
+
+            if success:
+                logger.info(f"✅ Cliente {numero_telefono} aceptó encuesta, primera pregunta enviada")
+            else:
+                logger.error(f"❌ Error enviando primera pregunta de encuesta a {numero_telefono}")
+                # Fallback: cerrar conversación
+                send_message(
+                    numero_telefono,
+                    "¡Gracias por tu tiempo! Que tengas un buen día. ✅"
+                )
+
+                # Verificar si esta conversación es la activa antes de cerrar
                 active_phone = conversation_manager.get_active_handoff()
-                is_active = (active_phone == numero_telefono)
-                
-                if conversacion_actual.mensaje_handoff_contexto and not conversacion_actual.handoff_notified:
-                    # Es el primer mensaje del handoff, incluir contexto completo
-                    if is_active:
-                        success = _notify_handoff_activated(
-                            conversacion_actual,
-                            1,
-                            conversation_manager.get_queue_size(),
-                        )
-                    else:
-                        # Por ahora, enviar notificación simple
-                        template_sent, agent_number = _send_handoff_template(conversacion_actual)
-                        if agent_number:
-                            numero_display = format_phone_for_agent(numero_telefono)
-                            notification = f"""🔄 *Solicitud de handoff*
+                if active_phone == numero_telefono:
+                    conversation_manager.close_active_handoff()
+                else:
+                    conversation_manager.remove_from_handoff_queue(numero_telefono)
+                    conversation_manager.finalizar_conversacion(numero_telefono)
+
+            return PlainTextResponse("", status_code=200)
+
+        elif any(kw in respuesta for kw in rechaza_keywords):
+            # Cliente rechaza la encuesta
+            conversacion_actual.survey_accepted = False
+            logger.info(
+                "survey_declined client_phone=%s agent_phone=%s state=%s",
+                numero_telefono,
+                os.getenv(HANDOFF_STANDARD_NUMBER_ENV, ""),
+                conversacion_actual.estado,
+            )
+
+            # Enviar mensaje de agradecimiento y cerrar
+            send_message(
+                numero_telefono,
+                "¡Gracias por tu tiempo! Que tengas un buen día. ✅"
+            )
+
+            # Verificar si esta conversación es la activa
+            active_phone = conversation_manager.get_active_handoff()
+
+            if active_phone == numero_telefono:
+                # Es la conversación activa, usar close_active_handoff
+                next_phone = conversation_manager.close_active_handoff()
+
+                logger.info(f"✅ Cliente {numero_telefono} rechazó encuesta, conversación cerrada (era activa)")
+
+                # Notificar al agente si hay siguiente conversación
+                if next_phone:
+                    next_conv = conversation_manager.get_conversacion(next_phone)
+                    position = 1
+                    total = conversation_manager.get_queue_size()
+                    _notify_handoff_activated(next_conv, position, total)
+            else:
+                # NO es la conversación activa, solo removerla de la cola sin afectar la activa
+                conversation_manager.remove_from_handoff_queue(numero_telefono)
+                conversation_manager.finalizar_conversacion(numero_telefono)
+
+                logger.info(f"✅ Cliente {numero_telefono} rechazó encuesta, conversación cerrada (NO era activa)")
+
+            return PlainTextResponse("", status_code=200)
+        else:
+            # Respuesta no reconocida, pedir que responda con 1 o 2
+            send_message(
+                numero_telefono,
+                "Por favor responde con:\n1️⃣ para aceptar la encuesta\n2️⃣ para omitirla"
+            )
+            return PlainTextResponse("", status_code=200)
+
+    # Verificar si está en encuesta de satisfacción (PRIORIDAD ALTA)
+    if conversacion_actual.estado == EstadoConversacion.ENCUESTA_SATISFACCION:
+        # Procesar respuesta de encuesta
+        from services.survey_service import survey_service
+
+        survey_complete, next_message = survey_service.process_survey_response(
+            numero_telefono, mensaje_usuario, conversacion_actual
+        )
+
+        if next_message:
+            # Enviar siguiente pregunta o mensaje de finalización
+            send_message(numero_telefono, next_message)
+
+        if survey_complete:
+            # Encuesta completada, finalizar conversación
+            # Verificar si esta conversación es la activa
+            aborted_invalids = bool(
+                conversacion_actual.datos_temporales.get("survey_aborted_invalids")
+            )
+            active_phone = conversation_manager.get_active_handoff()
+
+            if active_phone == numero_telefono:
+                # Es la conversación activa, cerrar y activar siguiente
+                next_phone = conversation_manager.close_active_handoff()
+                logger.info(f"✅ Encuesta completada y conversación finalizada para {numero_telefono} (era activa)")
+
+                # Notificar al agente si hay siguiente conversación
+                if next_phone and aborted_invalids:
+                    try:
+                        next_conv = conversation_manager.get_conversacion(next_phone)
+                        position = 1
+                        total = conversation_manager.get_queue_size()
+                        _notify_handoff_activated(next_conv, position, total)
+                    except Exception as e:
+                        logger.error(f"Error notificando siguiente handoff después de encuesta: {e}")
+            else:
+                # NO es la conversación activa, solo removerla de la cola sin afectar la activa
+                conversation_manager.remove_from_handoff_queue(numero_telefono)
+                conversation_manager.finalizar_conversacion(numero_telefono)
+                logger.info(f"✅ Encuesta completada y conversación finalizada para {numero_telefono} (NO era activa)")
+
+        return PlainTextResponse("", status_code=200)
+
+    # Si está en handoff, reenviar al agente
+    if conversacion_actual.atendido_por_humano or conversacion_actual.estado == EstadoConversacion.ATENDIDO_POR_HUMANO:
+        # Interceptar emergencia incluso si está en handoff (no notificar al agente).
+        emergencia_detectada = ChatbotRules._detect_emergency_intent(
+            mensaje_usuario,
+            conversacion_actual,
+        )
+        if emergencia_detectada:
+            respuesta_emergencia = ChatbotRules._handle_emergency(
+                numero_telefono,
+                conversacion_actual,
+                mensaje_usuario,
+            )
+            if respuesta_emergencia:
+                send_message(numero_telefono, respuesta_emergencia)
+            return PlainTextResponse("", status_code=200)
+
+        # Notificar al agente vía WhatsApp con indicación de posición en cola
+        active_phone = conversation_manager.get_active_handoff()
+        is_active = (active_phone == numero_telefono)
+
+        if conversacion_actual.mensaje_handoff_contexto and not conversacion_actual.handoff_notified:
+            # Es el primer mensaje del handoff, incluir contexto completo
+            if is_active:
+                success = _notify_handoff_activated(
+                    conversacion_actual,
+                    1,
+                    conversation_manager.get_queue_size(),
+                )
+            else:
+                # Por ahora, enviar notificación simple
+                template_sent, agent_number = _send_handoff_template(conversacion_actual)
+                if agent_number:
+                    numero_display = format_phone_for_agent(numero_telefono)
+                    notification = f"""🔄 *Solicitud de handoff*
 
 Cliente: {profile_name or 'Sin nombre'} ({numero_display})
 
@@ -1192,131 +1407,112 @@ Cliente: {profile_name or 'Sin nombre'} ({numero_display})
 • Responde en este mismo chat y enviaremos tu mensaje al cliente automáticamente.
 • No es necesario escribirle al número del cliente.
 • Para cerrar la conversación, responde con: /resuelto"""
-                            from services.optin_service import optin_service
-                            channel, identifier = optin_service.resolve_identifier(agent_number)
-                            if not optin_service.is_opted_in(channel, identifier):
-                                logger.warning(
-                                    "optin_blocked_handoff_notification channel=%s id=%s",
-                                    channel,
-                                    identifier,
-                                )
-                                text_sent = False
-                            else:
-                                text_sent = meta_whatsapp_service.send_text_message(agent_number, notification)
-                            success = template_sent or text_sent
-                        else:
-                            success = template_sent
-
-                    if success:
-                        conversacion_actual.handoff_notified = True
+                    from services.optin_service import optin_service
+                    channel, identifier = optin_service.resolve_identifier(agent_number)
+                    if not optin_service.is_opted_in(channel, identifier):
+                        logger.warning(
+                            "optin_blocked_handoff_notification channel=%s id=%s",
+                            channel,
+                            identifier,
+                        )
+                        text_sent = False
+                    else:
+                        text_sent = meta_whatsapp_service.send_text_message(agent_number, notification)
+                    success = template_sent or text_sent
                 else:
-                    # Es un mensaje posterior durante el handoff
-                    # Obtener posición si no es activo
-                    position = None if is_active else conversation_manager.get_queue_position(numero_telefono)
-                    
-                    # Guardar mensaje del cliente en historial
-                    conversation_manager.add_message_to_history(numero_telefono, "client", mensaje_usuario)
-                    
-                    # Enviar notificación de mensaje con indicador de posición
-                    notification = _format_client_message_notification(
-                        numero_telefono,
-                        profile_name or '',
-                        mensaje_usuario,
-                        is_active,
-                        position
-                    )
-                    agent_number = _get_handoff_agent_number(conversacion_actual)
-                    meta_whatsapp_service.send_text_message(agent_number, notification)
-                    
-                    # Si no es activo, agregar recordatorio
-                    if not is_active and position:
-                        reminder = f"ℹ️ Este mensaje es del cliente en posición #{position}. Los mensajes que escribas irán al cliente activo. Usa /next para cambiar o /queue para ver la cola completa."
-                        meta_whatsapp_service.send_text_message(agent_number, reminder)
-                
-                try:
-                    from datetime import datetime
-                    conversacion_actual.last_client_message_at = datetime.utcnow()
-                except Exception:
-                    pass
-                
-                return PlainTextResponse("", status_code=200)
-            
-            # Procesar el mensaje con el chatbot (incluyendo nombre del perfil)
-            respuesta = ChatbotRules.procesar_mensaje(numero_telefono, mensaje_usuario, profile_name)
-            conversacion_post = conversation_manager.get_conversacion(numero_telefono)
+                    success = template_sent
 
-            if (
-                conversacion_post.estado == EstadoConversacion.CONFIRMANDO
-                and not numero_telefono.startswith("messenger:")
-            ):
-                if _persist_checkpoint_before_send(numero_telefono, "confirmacion_interactiva"):
-                    ChatbotRules.send_confirmacion_interactiva(numero_telefono, conversacion_post)
-                    skip_final_save = True
-                respuesta = ""
+            if success:
+                conversacion_actual.handoff_notified = True
+        else:
+            # Es un mensaje posterior durante el handoff
+            # Obtener posición si no es activo
+            position = None if is_active else conversation_manager.get_queue_position(numero_telefono)
 
-            # Enviar respuesta usando el servicio correcto (WhatsApp o Messenger)
-            if respuesta and respuesta.strip():
-                mensaje_enviado = send_message(numero_telefono, respuesta)
+            # Guardar mensaje del cliente en historial
+            conversation_manager.add_message_to_history(numero_telefono, "client", mensaje_usuario)
 
-                if not mensaje_enviado:
-                    logger.error(f"Error enviando mensaje a {numero_telefono}")
-            else:
-                logger.info(f"Respuesta vacía, no se envía mensaje a {numero_telefono}")
-            
-            # Si durante el procesamiento se activó el handoff, agregar a cola y notificar al agente
-            _maybe_notify_handoff(numero_telefono)
-            
-            _postprocess_enviando(numero_telefono)
-            return _ok_response(numero_telefono, save_final=not skip_final_save)
-        
-        # Extraer datos de estado de mensaje (opcional, para métricas)
-        status_data = meta_whatsapp_service.extract_status_data(webhook_data)
-        
-        if status_data:
-            message_status = status_data.get('status', '')
-            message_id = status_data.get('message_id', '')
-            errors = status_data.get('errors', [])
-            
-            logger.info(f"Status update recibido - ID: {message_id}, Status: {message_status}")
-            if errors:
-                logger.error(
-                    "Status update error - ID=%s Status=%s Errors=%s",
-                    message_id,
-                    message_status,
-                    errors,
-                )
-            
-            # Registrar métricas
-            from services.metrics_service import metrics_service
-
-            if message_status == 'sent':
-                metrics_service.on_message_sent()
-            elif message_status == 'delivered':
-                metrics_service.on_message_delivered()
-            elif message_status == 'failed':
-                metrics_service.on_message_failed()
-            elif message_status == 'read':
-                metrics_service.on_message_read()
-        
-        # Siempre retornar 200 para que Meta no reintente
-        return _ok_response()
-        
-    except Exception as e:
-        logger.error(f"Error en webhook de WhatsApp: {str(e)}")
-        # Reporte estructurado de excepción
-        try:
-            from services.error_reporter import error_reporter
-
-            error_reporter.capture_exception(
-                e,
-                {
-                    "webhook_type": "whatsapp_meta",
-                    "error": str(e)
-                }
+            # Enviar notificación de mensaje con indicador de posición
+            notification = _format_client_message_notification(
+                numero_telefono,
+                profile_name or '',
+                mensaje_usuario,
+                is_active,
+                position
             )
+            agent_number = _get_handoff_agent_number(conversacion_actual)
+            meta_whatsapp_service.send_text_message(agent_number, notification)
+
+            # Si no es activo, agregar recordatorio
+            if not is_active and position:
+                reminder = f"ℹ️ Este mensaje es del cliente en posición #{position}. Los mensajes que escribas irán al cliente activo. Usa /next para cambiar o /queue para ver la cola completa."
+                meta_whatsapp_service.send_text_message(agent_number, reminder)
+
+        try:
+            from datetime import datetime
+            conversacion_actual.last_client_message_at = datetime.utcnow()
+            conversation_manager.refresh_handoff_timeout(numero_telefono)
         except Exception:
             pass
-        return PlainTextResponse("Error", status_code=500)
+
+        return PlainTextResponse("", status_code=200)
+
+    # Procesar el mensaje con el chatbot (incluyendo nombre del perfil)
+    respuesta = ChatbotRules.procesar_mensaje(numero_telefono, mensaje_usuario, profile_name)
+    conversacion_post = conversation_manager.get_conversacion(numero_telefono)
+
+    if (
+        conversacion_post.estado == EstadoConversacion.CONFIRMANDO
+        and not numero_telefono.startswith("messenger:")
+    ):
+        if _persist_checkpoint_before_send(numero_telefono, "confirmacion_interactiva"):
+            ChatbotRules.send_confirmacion_interactiva(numero_telefono, conversacion_post)
+            skip_final_save = True
+        respuesta = ""
+
+    # Enviar respuesta usando el servicio correcto (WhatsApp o Messenger)
+    if respuesta and respuesta.strip():
+        mensaje_enviado = send_message(numero_telefono, respuesta)
+
+        if not mensaje_enviado:
+            logger.error(f"Error enviando mensaje a {numero_telefono}")
+    else:
+        logger.info(f"Respuesta vacía, no se envía mensaje a {numero_telefono}")
+
+    # Si durante el procesamiento se activó el handoff, agregar a cola y notificar al agente
+    _maybe_notify_handoff(numero_telefono)
+
+    _postprocess_enviando(numero_telefono)
+    return _ok_response(numero_telefono, save_final=not skip_final_save)
+
+
+def _handle_status_update(status_data: dict) -> None:
+    """Registra un status update de mensaje saliente (métricas)."""
+    message_status = status_data.get('status', '')
+    message_id = status_data.get('message_id', '')
+    errors = status_data.get('errors', [])
+
+    logger.info(f"Status update recibido - ID: {message_id}, Status: {message_status}")
+    if errors:
+        logger.error(
+            "Status update error - ID=%s Status=%s Errors=%s",
+            message_id,
+            message_status,
+            errors,
+        )
+
+    # Registrar métricas
+    from services.metrics_service import metrics_service
+
+    if message_status == 'sent':
+        metrics_service.on_message_sent()
+    elif message_status == 'delivered':
+        metrics_service.on_message_delivered()
+    elif message_status == 'failed':
+        metrics_service.on_message_failed()
+    elif message_status == 'read':
+        metrics_service.on_message_read()
+
 
 @app.post("/agent/reply")
 async def agent_reply(to: str = Form(...), body: str = Form(...), token: str = Form(...)):
@@ -1347,18 +1543,28 @@ async def agent_close(to: str = Form(...), token: str = Form(...)):
 
 @app.get("/stats")
 async def get_stats():
-    """Endpoint para obtener estadísticas básicas del chatbot"""
-    total_conversaciones = len(conversation_manager.conversaciones)
-    conversaciones_por_estado = {}
-    
-    for conversacion in conversation_manager.conversaciones.values():
-        estado = conversacion.estado
-        conversaciones_por_estado[estado] = conversaciones_por_estado.get(estado, 0) + 1
-    
+    """Endpoint para obtener estadísticas básicas del chatbot (lecturas O(1), apto para polling)"""
+    from datetime import datetime, timezone
+    from services.expensas_sheet_service import expensas_sheet_service
     return {
-        "total_conversaciones_activas": total_conversaciones,
-        "conversaciones_por_estado": conversaciones_por_estado,
-        "timestamp": "2024-01-01T00:00:00Z"  # Placeholder timestamp
+        "total_conversaciones_activas": len(conversation_manager.conversaciones),
+        # Contadores incrementales por estado: no recorre las conversaciones
+        "conversaciones_por_estado": conversation_manager.state_counts(),
+        "webhook_ingest": webhook_ingest_service.stats(),
+        "conversation_mailbox": conversation_manager.mailbox.stats(),
+        "inbound_dedupe": conversation_session_service.dedupe_cache.stats(),
+        "checkpoint_writes": conversation_session_service.checkpoint_write_stats(),
+        "checkpoint_miss_cache": conversation_session_service.miss_cache.stats(),
+        "conversation_memory": conversation_manager.memory_stats(),
+        "handoff_queue": conversation_manager.handoff_queue_stats(),
+        "handoff_timeouts": conversation_manager.handoff_timeouts.stats(),
+        "emergency_scorer": ChatbotRules._get_emergency_scorer().stats(),
+        "nlu_cache": llm_response_cache.stats(),
+        "nlu_turn": nlu_turn_memo.stats(),
+        # Breaker, limitador y percentiles de latencia de OpenAI
+        "llm_client": llm_client.stats(),
+        "building_catalog": expensas_sheet_service.catalog.stats(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
 def _format_handoff_activated_notification(conversacion: ConversacionData, position: int, total: int) -> str:
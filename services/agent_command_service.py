@@ -1,9 +1,11 @@
 import logging
 import os
 from typing import Optional
+from chatbot.models import EstadoConversacion
 from chatbot.states import conversation_manager
 from services.meta_whatsapp_service import meta_whatsapp_service
 from services.phone_display import format_phone_for_agent
+from services.shared_handoff_queue import HandoffLeaseBusy
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +85,8 @@ class AgentCommandService:
 
         return None
 
+    _LEASE_BUSY_MESSAGE = "⏳ Se está procesando otro comando sobre la conversación activa. Intenta nuevamente en unos segundos."
+
     def execute_done_command(self, agent_phone: str) -> str:
         """
         Ejecuta el comando /done: ofrece encuesta al cliente o cierra conversación si encuestas deshabilitadas.
@@ -93,6 +97,15 @@ class AgentCommandService:
         Returns:
             str: Mensaje de respuesta para el agente
         """
+        # Con la cola compartida, un solo comando a la vez sobre el activo entre todas las instancias
+        try:
+            with conversation_manager.handoff_command_lease():
+                return self._execute_done_command(agent_phone)
+        except HandoffLeaseBusy:
+            logger.warning("handoff_lease_busy command=done agent_phone=%s", agent_phone)
+            return self._LEASE_BUSY_MESSAGE
+
+    def _execute_done_command(self, agent_phone: str) -> str:
         try:
             from services.survey_service import survey_service
             from chatbot.models import EstadoConversacion
@@ -126,6 +139,7 @@ class AgentCommandService:
                     conversacion.survey_offered = True
                     conversacion.survey_offer_sent_at = datetime.utcnow()
                     conversacion.atendido_por_humano = False
+                    conversation_manager.refresh_handoff_timeout(active_phone)
 
                     conversation_manager.remove_from_handoff_queue(active_phone)
 
@@ -144,7 +158,7 @@ class AgentCommandService:
                     logger.error(f"❌ Error enviando oferta de encuesta al cliente {active_phone}")
                     active_now = conversation_manager.get_active_handoff()
                     if active_now == active_phone:
-                        conversation_manager.close_active_handoff()
+                        conversation_manager.close_active_handoff(expected=active_phone)
                     else:
                         conversation_manager.remove_from_handoff_queue(active_phone)
                         conversation_manager.finalizar_conversacion(active_phone)
@@ -158,7 +172,7 @@ class AgentCommandService:
                 )
 
                 # Cerrar conversación activa (esto automáticamente activa la siguiente)
-                next_phone = conversation_manager.close_active_handoff()
+                next_phone = conversation_manager.close_active_handoff(expected=active_phone)
 
                 logger.info(f"✅ Agente {agent_phone} finalizó conversación con {active_phone} (encuestas deshabilitadas)")
 
@@ -216,6 +230,14 @@ Si no respondes en 2 minutos, cerraremos la conversación automáticamente."""
         Returns:
             str: Mensaje de respuesta para el agente
         """
+        try:
+            with conversation_manager.handoff_command_lease():
+                return self._execute_next_command(agent_phone)
+        except HandoffLeaseBusy:
+            logger.warning("handoff_lease_busy command=next agent_phone=%s", agent_phone)
+            return self._LEASE_BUSY_MESSAGE
+
+    def _execute_next_command(self, agent_phone: str) -> str:
         try:
             active_phone = conversation_manager.get_active_handoff()
 
@@ -402,7 +424,7 @@ Si no respondes en 2 minutos, cerraremos la conversación automáticamente."""
                 conversacion = conversation_manager.get_conversacion(numero_telefono)
                 
                 # Verificar que esté en handoff
-                if not (conversacion.atendido_por_humano or conversacion.estado.value == 'atendido_por_humano'):
+                if not (conversacion.atendido_por_humano or conversacion.estado == EstadoConversacion.ATENDIDO_POR_HUMANO):
                     telefono_display = format_phone_for_agent(numero_telefono)
                     return f"⚠️ El número {telefono_display} no está en handoff actualmente."
             else:
@@ -0,0 +1,291 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Catálogo de edificios de expensas fuera del código (vacío = mapas del perfil en company_profiles)
+EXPENSAS_CATALOG_PATH = os.getenv("EXPENSAS_CATALOG_PATH", "")
+# Pestaña del spreadsheet de expensas con el catálogo (mismas columnas que el CSV)
+EXPENSAS_CATALOG_SHEET = os.getenv("EXPENSAS_CATALOG_SHEET", "")
+# Snapshot compilado (pickle) para arrancar sin recompilar
+EXPENSAS_CATALOG_SNAPSHOT_PATH = os.getenv("EXPENSAS_CATALOG_SNAPSHOT_PATH", "")
+# Cada cuánto se revisa la fuente en background (0 = solo al arrancar)
+EXPENSAS_CATALOG_RELOAD_SECONDS = float(os.getenv("EXPENSAS_CATALOG_RELOAD_SECONDS", "60"))
+
+SNAPSHOT_VERSION = 1
+
+# (address_map, canonical_map) con la misma forma que en company_profiles
+CatalogMaps = Tuple[Dict[Any, List[str]], Dict[Any, str]]
+
+
+def _coerce_code(code: Any) -> Any:
+    text = str(code).strip()
+    return int(text) if text.isdigit() else text
+
+
+def maps_from_rows(rows: Sequence[Sequence[Any]]) -> CatalogMaps:
+    """
+    Filas `codigo, direccion, canonica` (con encabezado) → mapas del perfil.
+
+    Una fila por variante de dirección; la canónica alcanza con ponerla en una
+    fila del código (gana la primera no vacía). El orden de las filas es el
+    orden de búsqueda.
+    """
+    if not rows:
+        return {}, {}
+    header = [str(cell).strip().lower() for cell in rows[0]]
+    try:
+        code_col = header.index("codigo")
+        address_col = header.index("direccion")
+    except ValueError:
+        raise ValueError("el catálogo necesita las columnas 'codigo' y 'direccion'")
+    canonical_col = header.index("canonica") if "canonica" in header else None
+
+    address_map: Dict[Any, List[str]] = {}
+    canonical_map: Dict[Any, str] = {}
+    for row in rows[1:]:
+        cells = [str(cell).strip() for cell in row]
+        if len(cells) <= code_col or not cells[code_col]:
+            continue
+        code = _coerce_code(cells[code_col])
+        variants = address_map.setdefault(code, [])
+        if len(cells) > address_col and cells[address_col]:
+            variants.append(cells[address_col])
+        if canonical_col is not None and len(cells) > canonical_col and cells[canonical_col]:
+            canonical_map.setdefault(code, cells[canonical_col])
+    return address_map, canonical_map
+
+
+def maps_from_json(payload: Dict[str, Any]) -> CatalogMaps:
+    """JSON con las mismas claves que el perfil: `expensas_address_map` / `expensas_address_canonical_map`."""
+    raw_address_map = payload.get("expensas_address_map") or {}
+    raw_canonical_map = payload.get("expensas_address_canonical_map") or {}
+    address_map: Dict[Any, List[str]] = {}
+    for code, variants in raw_address_map.items():
+        if isinstance(variants, str):
+            variants = [variants]
+        address_map[_coerce_code(code)] = [str(variant).strip() for variant in variants]
+    canonical_map = {_coerce_code(code): str(value).strip() for code, value in raw_canonical_map.items()}
+    return address_map, canonical_map
+
+
+def parse_catalog_file(name: str, content: bytes) -> CatalogMaps:
+    text = content.decode("utf-8-sig")
+    if name.lower().endswith(".json"):
+        return maps_from_json(json.loads(text))
+    return maps_from_rows(list(csv.reader(io.StringIO(text))))
+
+
+class BuildingCatalog:
+    """
+    Catálogo de edificios cargado de un CSV/JSON o de una pestaña de Sheets.
+
+    La fuente se compila (`compile_index`) en un índice inmutable y se publica
+    con un swap de referencia: las búsquedas leen `current()` sin lock y nunca
+    esperan una recarga. Un hilo revisa la fuente cada `reload_seconds` y
+    recompila solo si cambió el contenido. El índice se guarda en
+    `snapshot_path` (pickle, escritura atómica) para que el próximo arranque lo
+    tenga sin recompilar. Si la fuente falla o viene vacía se loguea y se
+    sigue con el índice anterior (fail-open).
+    """
+
+    def __init__(
+        self,
+        compile_index: Callable[[dict, dict], Any],
+        *,
+        path: Optional[str] = None,
+        sheet_tab: Optional[str] = None,
+        sheet_reader: Optional[Callable[[str], List[List[Any]]]] = None,
+        snapshot_path: Optional[str] = None,
+        reload_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.compile_index = compile_index
+        self.path = EXPENSAS_CATALOG_PATH if path is None else path
+        self.sheet_tab = EXPENSAS_CATALOG_SHEET if sheet_tab is None else sheet_tab
+        self.sheet_reader = sheet_reader
+        self.snapshot_path = EXPENSAS_CATALOG_SNAPSHOT_PATH if snapshot_path is None else snapshot_path
+        self.reload_seconds = EXPENSAS_CATALOG_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        self._clock = clock
+        self._index = None
+        self._fingerprint: Optional[str] = None
+        self._file_stat: Optional[Tuple[int, int]] = None
+        self._loaded_at: Optional[float] = None
+        self._loaded_from: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reloads = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def source(self) -> str:
+        if self.path:
+            return self.path
+        if self.sheet_tab:
+            return f"sheet:{self.sheet_tab}"
+        return ""
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.source)
+
+    def current(self):
+        """Índice publicado (None si no hay catálogo externo o todavía no cargó)."""
+        return self._index
+
+    # ---------- Carga ----------
+
+    def _read_source(self) -> Optional[Tuple[str, CatalogMaps]]:
+        """(huella, mapas) de la fuente, o None si el archivo no cambió desde la última lectura."""
+        if self.path:
+            stat = os.stat(self.path)
+            file_stat = (stat.st_mtime_ns, stat.st_size)
+            if file_stat == self._file_stat and self._index is not None:
+                return None
+            with open(self.path, "rb") as handle:
+                content = handle.read()
+            self._file_stat = file_stat
+            fingerprint = hashlib.sha256(content).hexdigest()
+            if fingerprint == self._fingerprint and self._index is not None:
+                return None
+            return fingerprint, parse_catalog_file(self.path, content)
+
+        if self.sheet_reader is None:
+            raise RuntimeError("sin lector de Sheets para el catálogo")
+        rows = self.sheet_reader(self.sheet_tab)
+        payload = json.dumps(rows, ensure_ascii=False).encode("utf-8")
+        fingerprint = hashlib.sha256(payload).hexdigest()
+        if fingerprint == self._fingerprint and self._index is not None:
+            return None
+        return fingerprint, maps_from_rows(rows)
+
+    def reload(self) -> bool:
+        """Relee la fuente y publica un índice nuevo si cambió. True si hubo swap."""
+        if not self.configured:
+            return False
+        with self._reload_lock:
+            try:
+                loaded = self._read_source()
+                if loaded is None:
+                    return False
+                fingerprint, (address_map, canonical_map) = loaded
+                if not any(address_map.values()):
+                    raise ValueError("catálogo sin direcciones")
+                index = self.compile_index(address_map, canonical_map)
+            except Exception as exc:
+                self._failures += 1
+                self._last_error = str(exc)
+                logger.error("building_catalog_load_failed source=%s error=%s", self.source, str(exc))
+                return False
+
+            self._publish(index, fingerprint, "source")
+            logger.info(
+                "building_catalog_loaded source=%s buildings=%s variants=%s",
+                self.source,
+                len(address_map),
+                len(index.entries),
+            )
+            self._write_snapshot()
+            return True
+
+    def _publish(self, index, fingerprint: str, loaded_from: str) -> None:
+        # Una sola asignación: quien ya tomó el índice anterior termina su búsqueda con ese
+        self._index = index
+        self._fingerprint = fingerprint
+        self._loaded_at = self._clock()
+        self._loaded_from = loaded_from
+        self._reloads += 1
+
+    # ---------- Snapshot ----------
+
+    def load_snapshot(self) -> bool:
+        """Publica el índice guardado en `snapshot_path` (arranque rápido). True si lo cargó."""
+        if not self.configured or not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "rb") as handle:
+                snapshot = pickle.load(handle)
+            if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("source") != self.source:
+                return False
+            with self._reload_lock:
+                if self._index is None:
+                    self._publish(snapshot["index"], snapshot["fingerprint"], "snapshot")
+            return True
+        except Exception as exc:
+            self._failures += 1
+            self._last_error = str(exc)
+            logger.error("building_catalog_snapshot_load_failed path=%s error=%s", self.snapshot_path, str(exc))
+            return False
+
+    def _write_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "source": self.source,
+            "fingerprint": self._fingerprint,
+            "index": self._index,
+        }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as handle:
+                pickle.dump(snapshot, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as exc:
+            self._failures += 1
+            logger.error("building_catalog_snapshot_write_failed path=%s error=%s", self.snapshot_path, str(exc))
+
+    # ---------- Hilo de recarga ----------
+
+    def start(self) -> None:
+        """Carga el snapshot (si hay) y arranca el hilo que lee la fuente y la vigila (idempotente)."""
+        if not self.configured:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.load_snapshot()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="building-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.reload()
+            if self.reload_seconds <= 0:
+                return
+            self._stop.wait(self.reload_seconds)
+
+    # ---------- Métricas ----------
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "source": self.source or "profile",
+            "loaded": index is not None,
+            "loaded_from": self._loaded_from,
+            "loaded_at": self._loaded_at,
+            "fingerprint": self._fingerprint[:12] if self._fingerprint else None,
+            "buildings": len(index.address_map) if index is not None else 0,
+            "variants": len(index.entries) if index is not None else 0,
+            "reloads": self._reloads,
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
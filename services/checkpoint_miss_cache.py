@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_MISS_CACHE_ENABLED = os.getenv("CHECKPOINT_MISS_CACHE_ENABLED", "false").lower() == "true"
+CHECKPOINT_MISS_CACHE_SIZE = int(os.getenv("CHECKPOINT_MISS_CACHE_SIZE", "50000"))
+CHECKPOINT_MISS_CACHE_TTL_SECONDS = float(os.getenv("CHECKPOINT_MISS_CACHE_TTL_SECONDS", "60"))
+
+
+class CheckpointMissCache:
+    """
+    Cache negativo de "no hay checkpoint reanudable" por clave de conversación.
+
+    Evita el `load_for_key` bloqueante para primeros contactos y números que
+    vuelven sin sesión pendiente. Se invalida en cada `save_for_key` de la
+    clave; entre instancias solo lo acota el TTL, por eso es opt-in
+    (CHECKPOINT_MISS_CACHE_ENABLED) y con TTL corto.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: Optional[bool] = None,
+        max_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.enabled = CHECKPOINT_MISS_CACHE_ENABLED if enabled is None else enabled
+        self.max_size = max(1, CHECKPOINT_MISS_CACHE_SIZE if max_size is None else max_size)
+        self.ttl_seconds = CHECKPOINT_MISS_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._hits = 0
+        self._lookups = 0
+        self._recorded = 0
+        self._invalidations = 0
+        self._evictions = 0
+        self._miss_load_ms_total = 0.0
+        self._miss_load_ms_max = 0.0
+
+    def contains(self, key: str) -> bool:
+        """True si hay un miss vigente para la clave (se puede saltear el read)."""
+        if not self.enabled:
+            return False
+        now = self._clock()
+        with self._lock:
+            self._lookups += 1
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._entries[key]
+                self._evictions += 1
+                return False
+            self._hits += 1
+            return True
+
+    def add(self, key: str, *, load_ms: float = 0.0) -> None:
+        """Registra que el read de `key` no encontró nada reanudable (y cuánto tardó)."""
+        if not self.enabled:
+            return
+        now = self._clock()
+        with self._lock:
+            self._recorded += 1
+            self._miss_load_ms_total += load_ms
+            self._miss_load_ms_max = max(self._miss_load_ms_max, load_ms)
+            self._entries[key] = now + self.ttl_seconds
+            self._entries.move_to_end(key)
+            while self._entries:
+                oldest_expiry = next(iter(self._entries.values()))
+                if len(self._entries) > self.max_size or oldest_expiry <= now:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+                    continue
+                break
+
+    def invalidate(self, key: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recorded = self._recorded
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "misses_recorded": recorded,
+                "invalidations": self._invalidations,
+                "evictions": self._evictions,
+                # Latencia del read que terminó en miss: lo que cada hit se ahorra
+                "miss_load_ms_avg": round(self._miss_load_ms_total / recorded, 3) if recorded else 0.0,
+                "miss_load_ms_max": round(self._miss_load_ms_max, 3),
+            }
@@ -1,8 +1,16 @@
+import asyncio
 import copy
+import hashlib
+import json
 import logging
+import os
+import re
+import threading
+import time
+import weakref
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
 
 try:
     from google.cloud import firestore
@@ -10,11 +18,14 @@ except Exception:
     firestore = None
 
 try:
-    from google.api_core.exceptions import AlreadyExists
+    from google.api_core.exceptions import AlreadyExists, NotFound
 except Exception:
     AlreadyExists = None
+    NotFound = None
 
 from chatbot.models import ConversacionData, DatosContacto, EstadoConversacion, TipoConsulta
+from services.checkpoint_miss_cache import CheckpointMissCache
+from services.inbound_dedupe_service import FIRESTORE_MAX_BATCH_WRITES, InboundDedupeCache
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +34,15 @@ PROCESSED_MESSAGE_COLLECTION = "processed-inbound-message-ids"
 DEFAULT_FIRESTORE_DATABASE = "default"
 CHECKPOINT_SCHEMA_VERSION = 1
 CHECKPOINT_TTL_HOURS = 24
+# Un checkpoint sin cambios se reescribe igual pasado este tiempo para refrescar expires_at
+CHECKPOINT_REFRESH_SECONDS = float(os.getenv("SESSION_CHECKPOINT_REFRESH_SECONDS", "600"))
+# Escribir solo los campos que cambiaron (document.update) en lugar de set() completo
+CHECKPOINT_DELTA_WRITES = os.getenv("SESSION_CHECKPOINT_DELTA_WRITES", "false").lower() == "true"
+DELETE_FIELD = getattr(firestore, "DELETE_FIELD", None)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "firestore")
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "conversation_sessions.db")
+
+_SIMPLE_FIELD_PATH_RE = re.compile(r"^[_a-zA-Z][_a-zA-Z0-9]*$")
 
 RESUMABLE_STATES = {
     EstadoConversacion.RECOLECTANDO_DATOS,
@@ -63,6 +83,22 @@ def _ensure_utc(value: Optional[datetime]) -> Optional[datetime]:
     return value.astimezone(timezone.utc)
 
 
+def _field_path(*parts: str) -> str:
+    """Field path de Firestore; las claves no simples van entre backticks."""
+    quoted = []
+    for part in parts:
+        if _SIMPLE_FIELD_PATH_RE.match(part):
+            quoted.append(part)
+        else:
+            quoted.append("`" + part.replace("\\", "\\\\").replace("`", "\\`") + "`")
+    return ".".join(quoted)
+
+
+def _hash_value(value) -> str:
+    raw = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+
+
 def _enum_value(value) -> Optional[str]:
     if value is None:
         return None
@@ -80,10 +116,25 @@ class ConversationCheckpoint:
 
 
 class ConversationSessionService:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        dedupe_cache: Optional[InboundDedupeCache] = None,
+        *,
+        delta_writes: Optional[bool] = None,
+        miss_cache: Optional[CheckpointMissCache] = None,
+    ) -> None:
         self.database = DEFAULT_FIRESTORE_DATABASE
         self.collection = CHECKPOINT_COLLECTION
         self._fs_client = None
+        self.dedupe_cache = dedupe_cache or InboundDedupeCache()
+        self.miss_cache = miss_cache or CheckpointMissCache()
+        self.delta_writes = CHECKPOINT_DELTA_WRITES if delta_writes is None else delta_writes
+        self._write_stats_lock = threading.Lock()
+        self._checkpoints_written = 0
+        self._checkpoints_skipped = 0
+        self._delta_writes = 0
+        self._delta_fields_written = 0
+        self._delta_fallbacks = 0
 
     def _get_firestore_client(self):
         if firestore is None:
@@ -125,9 +176,10 @@ class ConversationSessionService:
         last_user_message_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
     ) -> dict:
-        updated_at = _ensure_utc(updated_at) or _utc_now()
-        last_user_message_at = _ensure_utc(last_user_message_at) or updated_at
-        expires_at = last_user_message_at + timedelta(hours=CHECKPOINT_TTL_HOURS)
+        timestamps = self._checkpoint_timestamps(
+            last_user_message_at=last_user_message_at,
+            updated_at=updated_at,
+        )
         payload = {
             "estado": _enum_value(conversation.estado),
             "estado_anterior": _enum_value(conversation.estado_anterior),
@@ -139,13 +191,174 @@ class ConversationSessionService:
                 if conversation.datos_contacto
                 else None
             ),
-            "updated_at": updated_at,
-            "last_user_message_at": last_user_message_at,
-            "expires_at": expires_at,
+            **timestamps,
             "schema_version": CHECKPOINT_SCHEMA_VERSION,
         }
         return payload
 
+    @staticmethod
+    def _checkpoint_timestamps(
+        *,
+        last_user_message_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+    ) -> dict:
+        updated_at = _ensure_utc(updated_at) or _utc_now()
+        last_user_message_at = _ensure_utc(last_user_message_at) or updated_at
+        return {
+            "updated_at": updated_at,
+            "last_user_message_at": last_user_message_at,
+            "expires_at": last_user_message_at + timedelta(hours=CHECKPOINT_TTL_HOURS),
+        }
+
+    @staticmethod
+    def _checkpoint_field_items(conversation: ConversacionData) -> dict:
+        """Campos persistidos (sin timestamps) por field path; cada clave de datos_temporales es su propio path."""
+        items = {
+            "estado": _enum_value(conversation.estado),
+            "estado_anterior": _enum_value(conversation.estado_anterior),
+            "tipo_consulta": _enum_value(conversation.tipo_consulta),
+            "nombre_usuario": conversation.nombre_usuario,
+            "datos_contacto": (
+                conversation.datos_contacto.model_dump(mode="json")
+                if conversation.datos_contacto
+                else None
+            ),
+        }
+        for key, value in (conversation.datos_temporales or {}).items():
+            items[_field_path("datos_temporales", str(key))] = value
+        return items
+
+    @classmethod
+    def checkpoint_field_hashes(cls, conversation: ConversacionData) -> Dict[str, str]:
+        return {path: _hash_value(value) for path, value in cls._checkpoint_field_items(conversation).items()}
+
+    def _build_write(
+        self,
+        conversation: ConversacionData,
+        *,
+        last_user_message_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+    ) -> Tuple[bool, dict, Dict[str, str]]:
+        """
+        Arma la escritura del checkpoint.
+
+        Returns:
+            (is_delta, payload, field_hashes): payload es un update por field
+            paths si hay versión persistida conocida con el mismo schema, o el
+            documento completo en caso contrario.
+        """
+        items = self._checkpoint_field_items(conversation)
+        field_hashes = {path: _hash_value(value) for path, value in items.items()}
+        previous = conversation.checkpoint_field_hashes
+        if (
+            not self.delta_writes
+            or DELETE_FIELD is None
+            or previous is None
+            or conversation.checkpoint_schema_version != CHECKPOINT_SCHEMA_VERSION
+        ):
+            payload = self.serialize(
+                conversation,
+                last_user_message_at=last_user_message_at,
+                updated_at=updated_at,
+            )
+            return False, payload, field_hashes
+
+        payload = {
+            path: copy.deepcopy(items[path])
+            for path, digest in field_hashes.items()
+            if previous.get(path) != digest
+        }
+        for path in previous.keys() - field_hashes.keys():
+            payload[path] = DELETE_FIELD
+        payload.update(
+            self._checkpoint_timestamps(
+                last_user_message_at=last_user_message_at,
+                updated_at=updated_at,
+            )
+        )
+        return True, payload, field_hashes
+
+    @classmethod
+    def checkpoint_fingerprint(
+        cls,
+        conversation: ConversacionData,
+        field_hashes: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Huella de los campos persistidos (sin timestamps) para detectar cambios."""
+        if field_hashes is None:
+            field_hashes = cls.checkpoint_field_hashes(conversation)
+        return _hash_value(sorted(field_hashes.items()))
+
+    def _mark_checkpoint_saved(
+        self,
+        conversation: ConversacionData,
+        payload: dict,
+        *,
+        field_hashes: Optional[Dict[str, str]] = None,
+        is_delta: bool = False,
+    ) -> None:
+        if field_hashes is None:
+            field_hashes = self.checkpoint_field_hashes(conversation)
+        conversation.mark_checkpoint_saved(
+            self.checkpoint_fingerprint(conversation, field_hashes),
+            payload["updated_at"],
+            field_hashes=field_hashes,
+            schema_version=CHECKPOINT_SCHEMA_VERSION,
+        )
+        with self._write_stats_lock:
+            self._checkpoints_written += 1
+            if is_delta:
+                self._delta_writes += 1
+                self._delta_fields_written += len(payload)
+
+    def _record_delta_fallback(self, doc_id: str) -> None:
+        with self._write_stats_lock:
+            self._delta_fallbacks += 1
+        logger.info("checkpoint_delta_fallback doc_id=%s reason=not_found", doc_id)
+
+    def needs_checkpoint_write(
+        self,
+        conversation: ConversacionData,
+        *,
+        now: Optional[datetime] = None,
+    ) -> bool:
+        if conversation.checkpoint_changed(self.checkpoint_fingerprint(conversation)):
+            return True
+        saved_at = _ensure_utc(conversation.checkpoint_saved_at)
+        if saved_at is None:
+            return True
+        now = _ensure_utc(now) or _utc_now()
+        return (now - saved_at).total_seconds() >= CHECKPOINT_REFRESH_SECONDS
+
+    def _record_checkpoint_skip(self, conversation_key: str, conversation: ConversacionData) -> None:
+        with self._write_stats_lock:
+            self._checkpoints_skipped += 1
+        logger.debug(
+            "checkpoint_save_skipped key=%s estado=%s",
+            conversation_key,
+            _enum_value(conversation.estado),
+        )
+
+    def checkpoint_write_stats(self) -> dict:
+        with self._write_stats_lock:
+            written = self._checkpoints_written
+            skipped = self._checkpoints_skipped
+            delta_writes = self._delta_writes
+            delta_fields = self._delta_fields_written
+            delta_fallbacks = self._delta_fallbacks
+        total = written + skipped
+        return {
+            "written": written,
+            "skipped": skipped,
+            "skip_rate": round(skipped / total, 4) if total else 0.0,
+            "refresh_seconds": CHECKPOINT_REFRESH_SECONDS,
+            "delta_enabled": self.delta_writes,
+            "delta_writes": delta_writes,
+            "full_writes": written - delta_writes,
+            "delta_fields_avg": round(delta_fields / delta_writes, 2) if delta_writes else 0.0,
+            "delta_fallbacks": delta_fallbacks,
+        }
+
     def hydrate(self, identifier: str, payload: dict, *, channel: str = "whatsapp") -> ConversationCheckpoint:
         raw = payload or {}
         estado = raw.get("estado", EstadoConversacion.INICIO.value)
@@ -166,13 +379,22 @@ class ConversationSessionService:
             datos_temporales=copy.deepcopy(raw.get("datos_temporales") or {}),
             datos_contacto=DatosContacto.model_validate(datos_contacto) if datos_contacto else None,
         )
+        # Lo recién cargado coincide con lo persistido: no hace falta reescribirlo
+        field_hashes = self.checkpoint_field_hashes(conversation)
+        schema_version = int(raw.get("schema_version") or CHECKPOINT_SCHEMA_VERSION)
+        conversation.mark_checkpoint_saved(
+            self.checkpoint_fingerprint(conversation, field_hashes),
+            updated_at,
+            field_hashes=field_hashes,
+            schema_version=schema_version,
+        )
         return ConversationCheckpoint(
             doc_id=self.build_doc_id(channel, identifier),
             conversation=conversation,
             updated_at=updated_at,
             last_user_message_at=last_user_message_at,
             expires_at=expires_at,
-            schema_version=int(raw.get("schema_version") or CHECKPOINT_SCHEMA_VERSION),
+            schema_version=schema_version,
         )
 
     def save(
@@ -185,16 +407,35 @@ class ConversationSessionService:
         updated_at: Optional[datetime] = None,
     ) -> dict:
         doc_id, document = self._document(channel, identifier)
-        payload = self.serialize(
+        is_delta, payload, field_hashes = self._build_write(
             conversation,
             last_user_message_at=last_user_message_at,
             updated_at=updated_at,
         )
-        document.set(payload)
+        if is_delta:
+            try:
+                document.update(payload)
+            except Exception as exc:
+                if not (NotFound and isinstance(exc, NotFound)):
+                    raise
+                # El documento ya no existe (finalizado/limpiado): escribirlo completo
+                self._record_delta_fallback(doc_id)
+                is_delta = False
+                payload = self.serialize(
+                    conversation,
+                    last_user_message_at=payload["last_user_message_at"],
+                    updated_at=payload["updated_at"],
+                )
+                document.set(payload)
+        else:
+            document.set(payload)
+        self._mark_checkpoint_saved(conversation, payload, field_hashes=field_hashes, is_delta=is_delta)
         logger.info(
-            "checkpoint_save doc_id=%s estado=%s",
+            "checkpoint_save doc_id=%s estado=%s mode=%s fields=%s",
             doc_id,
-            payload["estado"],
+            _enum_value(conversation.estado),
+            "delta" if is_delta else "full",
+            len(payload),
         )
         return payload
 
@@ -228,61 +469,156 @@ class ConversationSessionService:
         updated_at: Optional[datetime] = None,
     ) -> dict:
         channel, identifier = self.resolve_channel_and_identifier(conversation_key)
-        return self.save(
+        payload = self.save(
             channel,
             identifier,
             conversation,
             last_user_message_at=last_user_message_at,
             updated_at=updated_at,
         )
+        self.miss_cache.invalidate(conversation_key)
+        return payload
+
+    def save_for_key_if_changed(
+        self,
+        conversation_key: str,
+        conversation: ConversacionData,
+    ) -> Optional[dict]:
+        """
+        Guarda solo si el checkpoint cambió desde la última escritura/carga.
+
+        Los guardados forzados (save-before-send) siguen usando `save_for_key`;
+        este es el guardado de fin de turno, que coalesce todo lo del turno en
+        una sola escritura o ninguna.
+        """
+        if not self.needs_checkpoint_write(conversation):
+            self._record_checkpoint_skip(conversation_key, conversation)
+            return None
+        return self.save_for_key(conversation_key, conversation)
 
     def delete(self, channel: str, identifier: str) -> None:
         doc_id, document = self._document(channel, identifier)
         document.delete()
         logger.info("checkpoint_delete doc_id=%s", doc_id)
 
-    def cleanup_expired_checkpoints(
+    def cleanup_expired(
         self,
         *,
         now: Optional[datetime] = None,
-        limit: int = 100,
-    ) -> list[str]:
+        batch_size: int = FIRESTORE_MAX_BATCH_WRITES,
+        time_budget_seconds: Optional[float] = None,
+    ) -> dict:
+        """
+        Borra todo lo vencido (checkpoints y marcadores de dedupe) en páginas.
+
+        Cada página se borra en un solo commit de hasta 500 deletes. Si se
+        agota el presupuesto de tiempo se corta y la próxima corrida sigue
+        desde donde quedó (el job es idempotente).
+
+        Returns:
+            dict: conteos y throughput por colección, sin listar ids.
+        """
         now = _ensure_utc(now) or _utc_now()
+        batch_size = max(1, min(FIRESTORE_MAX_BATCH_WRITES, batch_size))
+        started = time.monotonic()
+        deadline = started + time_budget_seconds if time_budget_seconds is not None else None
+        budget_exhausted = False
+        collections = {}
+        for collection in (self.collection, PROCESSED_MESSAGE_COLLECTION):
+            collection_started = time.monotonic()
+            deleted = 0
+            batches = 0
+            while not budget_exhausted:
+                if deadline is not None and time.monotonic() >= deadline:
+                    budget_exhausted = True
+                    break
+                page_deleted = self._delete_expired_page(collection, now, batch_size)
+                if page_deleted:
+                    deleted += page_deleted
+                    batches += 1
+                    logger.info(
+                        "checkpoint_cleanup_batch collection=%s deleted=%s",
+                        collection,
+                        page_deleted,
+                    )
+                if page_deleted < batch_size:
+                    break
+            elapsed = time.monotonic() - collection_started
+            collections[collection] = {
+                "deleted": deleted,
+                "batches": batches,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "per_second": round(deleted / elapsed, 1) if elapsed > 0 else 0.0,
+            }
+        return {
+            "deleted": sum(item["deleted"] for item in collections.values()),
+            "collections": collections,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "budget_exhausted": budget_exhausted,
+        }
+
+    def _delete_expired_page(self, collection: str, now: datetime, batch_size: int) -> int:
+        client = self._get_firestore_client()
         query = (
-            self._get_firestore_client()
-            .collection(self.collection)
+            client.collection(collection)
             .where("expires_at", "<=", now)
-            .limit(limit)
+            .limit(batch_size)
         )
-        deleted_doc_ids = []
-        for snapshot in query.stream():
-            payload = snapshot.to_dict() or {}
-            snapshot.reference.delete()
-            logger.info(
-                "checkpoint_cleanup_delete doc_id=%s estado=%s",
-                snapshot.id,
-                payload.get("estado"),
-            )
-            deleted_doc_ids.append(snapshot.id)
-        return deleted_doc_ids
+        snapshots = list(query.stream())
+        if not snapshots:
+            return 0
+        batch = client.batch()
+        for snapshot in snapshots:
+            batch.delete(snapshot.reference)
+        batch.commit()
+        return len(snapshots)
 
     def delete_for_key(self, conversation_key: str) -> None:
         channel, identifier = self.resolve_channel_and_identifier(conversation_key)
         self.delete(channel, identifier)
 
+    def _marker_payload(self, processed_at: Optional[datetime]) -> dict:
+        processed_at = _ensure_utc(processed_at) or _utc_now()
+        return {
+            "processed_at": processed_at,
+            "expires_at": processed_at + timedelta(hours=CHECKPOINT_TTL_HOURS),
+        }
+
+    def _check_local_dedupe(self, message_id: str, payload: dict) -> Optional[bool]:
+        """
+        Primer nivel del dedupe (memoria).
+
+        Returns:
+            Optional[bool]: True/False si se resolvió localmente, None si hay que
+            ir a Firestore de forma sincrónica.
+        """
+        if self.dedupe_cache.check_and_add(message_id):
+            logger.info("message_dedupe_local_hit message_id=%s", message_id)
+            return True
+        if self.dedupe_cache.async_markers:
+            self.dedupe_cache.enqueue_marker(
+                message_id,
+                payload,
+                client_getter=self._get_marker_client,
+                collection=PROCESSED_MESSAGE_COLLECTION,
+            )
+            return False
+        return None
+
+    def _get_marker_client(self):
+        return ConversationSessionService._get_firestore_client(self)
+
     def mark_message_processed(
         self,
         message_id: str,
         *,
         processed_at: Optional[datetime] = None,
     ) -> bool:
-        processed_at = _ensure_utc(processed_at) or _utc_now()
-        expires_at = processed_at + timedelta(hours=CHECKPOINT_TTL_HOURS)
+        payload = self._marker_payload(processed_at)
+        local_result = self._check_local_dedupe(message_id, payload)
+        if local_result is not None:
+            return local_result
         document = self._get_firestore_client().collection(PROCESSED_MESSAGE_COLLECTION).document(message_id)
-        payload = {
-            "processed_at": processed_at,
-            "expires_at": expires_at,
-        }
         try:
             if hasattr(document, "create"):
                 document.create(payload)
@@ -307,4 +643,187 @@ class ConversationSessionService:
         return expires_at <= now
 
 
-conversation_session_service = ConversationSessionService()
+class AsyncConversationSessionService(ConversationSessionService):
+    """
+    Variante async sobre `firestore.AsyncClient` para el handler de FastAPI.
+
+    Comparte serialización/hidratación con la versión sync; las operaciones de
+    I/O son corrutinas para no bloquear el event loop. El cliente async queda
+    ligado al loop que lo crea, así que se mantiene uno por loop.
+    """
+
+    def __init__(
+        self,
+        client_factory: Optional[Callable[[], object]] = None,
+        dedupe_cache: Optional[InboundDedupeCache] = None,
+        *,
+        delta_writes: Optional[bool] = None,
+        miss_cache: Optional[CheckpointMissCache] = None,
+    ) -> None:
+        super().__init__(dedupe_cache=dedupe_cache, delta_writes=delta_writes, miss_cache=miss_cache)
+        self._client_factory = client_factory
+        self._loop_clients = weakref.WeakKeyDictionary()
+
+    def _get_firestore_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._loop_clients.get(loop)
+        if client is None:
+            if self._client_factory is not None:
+                client = self._client_factory()
+            else:
+                if firestore is None:
+                    raise RuntimeError("google-cloud-firestore not installed")
+                client = firestore.AsyncClient(database=self.database)
+            self._loop_clients[loop] = client
+        return client
+
+    async def save(
+        self,
+        channel: str,
+        identifier: str,
+        conversation: ConversacionData,
+        *,
+        last_user_message_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+    ) -> dict:
+        doc_id, document = self._document(channel, identifier)
+        is_delta, payload, field_hashes = self._build_write(
+            conversation,
+            last_user_message_at=last_user_message_at,
+            updated_at=updated_at,
+        )
+        if is_delta:
+            try:
+                await document.update(payload)
+            except Exception as exc:
+                if not (NotFound and isinstance(exc, NotFound)):
+                    raise
+                self._record_delta_fallback(doc_id)
+                is_delta = False
+                payload = self.serialize(
+                    conversation,
+                    last_user_message_at=payload["last_user_message_at"],
+                    updated_at=payload["updated_at"],
+                )
+                await document.set(payload)
+        else:
+            await document.set(payload)
+        self._mark_checkpoint_saved(conversation, payload, field_hashes=field_hashes, is_delta=is_delta)
+        logger.info(
+            "checkpoint_save doc_id=%s estado=%s mode=%s fields=%s",
+            doc_id,
+            _enum_value(conversation.estado),
+            "delta" if is_delta else "full",
+            len(payload),
+        )
+        return payload
+
+    async def load(self, channel: str, identifier: str) -> Optional[ConversationCheckpoint]:
+        doc_id, document = self._document(channel, identifier)
+        snapshot = await document.get()
+        if not snapshot.exists:
+            return None
+        checkpoint = self.hydrate(identifier, snapshot.to_dict() or {}, channel=channel)
+        logger.info(
+            "checkpoint_load doc_id=%s estado=%s",
+            doc_id,
+            _enum_value(checkpoint.conversation.estado),
+        )
+        return checkpoint
+
+    async def load_for_key(self, conversation_key: str) -> Optional[ConversationCheckpoint]:
+        channel, identifier = self.resolve_channel_and_identifier(conversation_key)
+        checkpoint = await self.load(channel, identifier)
+        if checkpoint is None:
+            return None
+        checkpoint.conversation.numero_telefono = self.build_runtime_key(channel, identifier)
+        return checkpoint
+
+    async def save_for_key(
+        self,
+        conversation_key: str,
+        conversation: ConversacionData,
+        *,
+        last_user_message_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+    ) -> dict:
+        channel, identifier = self.resolve_channel_and_identifier(conversation_key)
+        payload = await self.save(
+            channel,
+            identifier,
+            conversation,
+            last_user_message_at=last_user_message_at,
+            updated_at=updated_at,
+        )
+        self.miss_cache.invalidate(conversation_key)
+        return payload
+
+    async def save_for_key_if_changed(
+        self,
+        conversation_key: str,
+        conversation: ConversacionData,
+    ) -> Optional[dict]:
+        if not self.needs_checkpoint_write(conversation):
+            self._record_checkpoint_skip(conversation_key, conversation)
+            return None
+        return await self.save_for_key(conversation_key, conversation)
+
+    async def delete(self, channel: str, identifier: str) -> None:
+        doc_id, document = self._document(channel, identifier)
+        await document.delete()
+        logger.info("checkpoint_delete doc_id=%s", doc_id)
+
+    async def delete_for_key(self, conversation_key: str) -> None:
+        channel, identifier = self.resolve_channel_and_identifier(conversation_key)
+        await self.delete(channel, identifier)
+
+    async def mark_message_processed(
+        self,
+        message_id: str,
+        *,
+        processed_at: Optional[datetime] = None,
+    ) -> bool:
+        payload = self._marker_payload(processed_at)
+        local_result = self._check_local_dedupe(message_id, payload)
+        if local_result is not None:
+            return local_result
+        document = self._get_firestore_client().collection(PROCESSED_MESSAGE_COLLECTION).document(message_id)
+        try:
+            await document.create(payload)
+        except Exception as exc:
+            if AlreadyExists and isinstance(exc, AlreadyExists):
+                return True
+            raise
+        logger.info("message_marker_saved message_id=%s", message_id)
+        return False
+
+
+def create_session_services(backend: Optional[str] = None):
+    """
+    Construye el par (sync, async) de servicios de sesión según SESSION_BACKEND.
+
+    - firestore (default): colecciones de Firestore.
+    - sqlite: archivo local en SESSION_SQLITE_PATH (WAL), sin round-trips.
+    """
+    backend = (backend or SESSION_BACKEND).lower()
+    if backend == "sqlite":
+        from services.sqlite_session_service import (
+            AsyncSQLiteConversationSessionService,
+            SQLiteConversationSessionService,
+        )
+
+        sync_service = SQLiteConversationSessionService(SESSION_SQLITE_PATH)
+        return sync_service, AsyncSQLiteConversationSessionService(sync_service)
+    if backend != "firestore":
+        logger.error("session_backend_unknown backend=%s fallback=firestore", backend)
+    sync_service = ConversationSessionService()
+    # Comparte la capa local de dedupe y el cache negativo con la instancia sync:
+    # un reintento se corta sin importar qué camino procesó el original.
+    async_service = AsyncConversationSessionService(
+        dedupe_cache=sync_service.dedupe_cache,
+        miss_cache=sync_service.miss_cache,
+    )
+    return sync_service, async_service
+
+
+conversation_session_service, async_conversation_session_service = create_session_services()
@@ -4,16 +4,18 @@ import json
 import base64
 import time
 import logging
-import unicodedata
+from dataclasses import dataclass
 from difflib import SequenceMatcher
 from datetime import datetime, date
-from typing import Optional, Iterable, Tuple, Set, Any, List
+from typing import Optional, Iterable, Tuple, Set, FrozenSet, Any, Dict, List
 from zoneinfo import ZoneInfo
 
 gspread = None
 Credentials = None
 
+from chatbot.normalized_message import strip_accents
 from config.company_profiles import get_active_company_profile
+from services.building_catalog import BuildingCatalog
 
 logger = logging.getLogger(__name__)
 
@@ -117,6 +119,107 @@ def apply_expensas_title_and_headers(ws, title_text: str) -> None:
         logger.warning("Expensas title format skipped: %s", exc)
 
 
+@dataclass(frozen=True)
+class AddressKeys:
+    """Formas normalizadas de una dirección (ingresada o del mapa del perfil)."""
+
+    street: str
+    street_wo_avenida: str
+    full: str
+    full_wo_avenida: str
+    tokens: FrozenSet[str]
+    numbers: FrozenSet[int]
+
+
+class AddressIndex:
+    """
+    Índice de `expensas_address_map` / `expensas_address_canonical_map`, armado una vez por perfil.
+
+    Cada variante del mapa se normaliza al armarlo; resolver una dirección pasa a
+    ser una consulta por dirección completa (con y sin "avenida") y otra por
+    número, que deja solo los candidatos con ese número para comparar la calle.
+    Gana la primera variante del mapa que coincide, igual que el recorrido lineal.
+
+    Las direcciones canónicas (sugerencias fuzzy) quedan normalizadas y
+    tokenizadas, indexadas por número: una sugerencia exige compartir número,
+    así que solo se compara la calle contra ese puñado de edificios.
+
+    No se modifica después de armarlo: el catálogo externo (`building_catalog`)
+    lo publica por swap de referencia y lo guarda tal cual en su snapshot.
+    """
+
+    def __init__(self, address_map: dict, canonical_map: dict, parse, parse_canonical):
+        self.address_map = address_map
+        self.canonical_map = canonical_map
+        self.entries: List[Tuple[Any, AddressKeys]] = []
+        self.by_full: Dict[str, int] = {}
+        self.by_full_wo_avenida: Dict[str, int] = {}
+        self.by_number: Dict[int, List[int]] = {}
+        self.canonical_by_code: Dict[Any, str] = {}
+        self.canonical_entries: List[Tuple[str, List[str]]] = []
+        self.canonical_by_number: Dict[int, List[int]] = {}
+
+        for code, raw_address in address_map.items():
+            candidates = raw_address if isinstance(raw_address, (list, tuple, set)) else [raw_address]
+            for candidate in candidates:
+                raw_str = str(candidate).strip()
+                if not raw_str:
+                    continue
+                keys = parse(raw_str)
+                order = len(self.entries)
+                self.entries.append((ExpensasSheetService._coerce_code(code), keys))
+                self.by_full.setdefault(keys.full, order)
+                self.by_full_wo_avenida.setdefault(keys.full_wo_avenida, order)
+                for number in keys.numbers:
+                    self.by_number.setdefault(number, []).append(order)
+
+        for raw_code, value in canonical_map.items():
+            self.canonical_by_code.setdefault(
+                ExpensasSheetService._coerce_code(raw_code), str(value).strip()
+            )
+            canonical = parse_canonical(str(value).strip())
+            if canonical is None:
+                continue
+            canonical_text, tokens, numbers = canonical
+            order = len(self.canonical_entries)
+            self.canonical_entries.append((canonical_text, tokens))
+            for number in numbers:
+                self.canonical_by_number.setdefault(number, []).append(order)
+
+    def is_for(self, address_map: dict, canonical_map: dict) -> bool:
+        return self.address_map is address_map and self.canonical_map is canonical_map
+
+    @staticmethod
+    def _same_street(keys: AddressKeys, mapped: AddressKeys) -> bool:
+        if keys.street == mapped.street:
+            return True
+        if keys.street_wo_avenida and keys.street_wo_avenida == mapped.street_wo_avenida:
+            return True
+        return bool(mapped.tokens) and mapped.tokens <= keys.tokens
+
+    def resolve(self, keys: AddressKeys) -> Optional[Any]:
+        matches = []
+        if keys.full and keys.full in self.by_full:
+            matches.append(self.by_full[keys.full])
+        if keys.full_wo_avenida and keys.full_wo_avenida in self.by_full_wo_avenida:
+            matches.append(self.by_full_wo_avenida[keys.full_wo_avenida])
+        for number in keys.numbers:
+            for order in self.by_number.get(number, ()):
+                if self._same_street(keys, self.entries[order][1]):
+                    matches.append(order)
+                    break
+        if not matches:
+            return None
+        return self.entries[min(matches)][0]
+
+    def fuzzy_candidates(self, numbers: Iterable[int]) -> List[Tuple[str, List[str]]]:
+        """Direcciones canónicas que comparten algún número, en el orden del mapa."""
+        orders = set()
+        for number in numbers:
+            orders.update(self.canonical_by_number.get(number, ()))
+        return [self.canonical_entries[order] for order in sorted(orders)]
+
+
 class ExpensasSheetService:
     _FUZZY_STREET_THRESHOLD = 0.80
     _FUZZY_SECONDARY_DELTA = 0.03
@@ -126,6 +229,9 @@ class ExpensasSheetService:
         self._gc = None
         self._last_auth_ts = 0
         self._auth_ttl = 60 * 30
+        self._address_index: Optional[AddressIndex] = None
+        # Catálogo externo (CSV/JSON/pestaña de Sheets); sin configurar se usan los mapas del perfil
+        self.catalog = BuildingCatalog(self._build_address_index, sheet_reader=self._read_catalog_rows)
 
     @staticmethod
     def _parse_uf_from_dpto(dpto: str) -> Optional[str]:
@@ -273,8 +379,7 @@ class ExpensasSheetService:
     def _normalize_address_text(text: str) -> str:
         if not text:
             return ""
-        normalized = unicodedata.normalize("NFD", text.lower().strip())
-        normalized = "".join(c for c in normalized if unicodedata.category(c) != "Mn")
+        normalized = strip_accents(text.lower().strip())
         normalized = re.sub(r"[.,]", " ", normalized)
         normalized = re.sub(r"\bsantafe\b", "santa fe", normalized)
         normalized = re.sub(r"\bavda\.?\b", "avenida", normalized)
@@ -510,19 +615,46 @@ class ExpensasSheetService:
         canonical_map = profile.get("expensas_address_canonical_map", {})
         return address_map, canonical_map
 
+    def _build_address_index(self, address_map: dict, canonical_map: dict) -> AddressIndex:
+        return AddressIndex(
+            address_map,
+            canonical_map,
+            self._parse_address_keys,
+            self._parse_canonical_street,
+        )
+
+    def _get_address_index(self) -> AddressIndex:
+        # Catálogo externo publicado: no pasa por el perfil
+        index = self.catalog.current()
+        if index is not None:
+            return index
+
+        # El perfil activo devuelve siempre los mismos dicts: se rearma solo si cambia el perfil
+        address_map, canonical_map = self._get_profile_maps()
+        index = self._address_index
+        if index is None or not index.is_for(address_map, canonical_map):
+            index = self._build_address_index(address_map, canonical_map)
+            self._address_index = index
+        return index
+
+    def _read_catalog_rows(self, tab_name: str) -> List[List[Any]]:
+        gc = self._get_client()
+        sh = gc.open_by_key(EXPENSAS_SPREADSHEET_ID)
+        return sh.worksheet(tab_name).get_all_values()
+
     def get_canonical_address(self, code: Any) -> Optional[str]:
         try:
-            address_map, canonical_map = self._get_profile_maps()
+            index = self._get_address_index()
         except Exception:
             return None
 
         normalized_code = self._coerce_code(code)
 
-        for raw_code, value in canonical_map.items():
-            if self._coerce_code(raw_code) == normalized_code:
-                canonical = str(value).strip()
-                return canonical or None
+        canonical = index.canonical_by_code.get(normalized_code)
+        if canonical is not None:
+            return canonical or None
 
+        address_map = index.address_map
         raw_value = address_map.get(normalized_code)
         if raw_value is None:
             raw_value = address_map.get(str(normalized_code))
@@ -539,11 +671,8 @@ class ExpensasSheetService:
         text = str(raw_value).strip()
         return text or None
 
-    @classmethod
-    def _street_similarity(cls, input_street_norm: str, candidate_street_norm: str) -> float:
-        input_tokens = [token for token in cls._street_token_set(input_street_norm) if token]
-        candidate_tokens = [token for token in cls._street_token_set(candidate_street_norm) if token]
-
+    @staticmethod
+    def _street_similarity(input_tokens: List[str], candidate_tokens: List[str]) -> float:
         if not input_tokens or not candidate_tokens:
             return 0.0
 
@@ -561,13 +690,26 @@ class ExpensasSheetService:
         token_score = sum(best_token_scores) / len(best_token_scores)
         return max(token_score, full_score)
 
+    def _parse_canonical_street(self, canonical_text: str) -> Optional[Tuple[str, List[str], Set[int]]]:
+        if not canonical_text:
+            return None
+        canonical_clean = self._strip_localidad_tokens(canonical_text)
+        street_raw, numbers = self._extract_numbers_from_raw(canonical_clean)
+        if not numbers:
+            return None
+        street_norm = self._strip_avenida_prefix(self._normalize_address_text(street_raw))
+        if not street_norm:
+            return None
+        tokens = [token for token in self._street_token_set(street_norm) if token]
+        return canonical_text, tokens, numbers
+
     def get_fuzzy_address_suggestions(self, direccion: str) -> List[str]:
         try:
-            _, canonical_map = self._get_profile_maps()
+            index = self._get_address_index()
         except Exception:
             return []
 
-        if not direccion or not canonical_map:
+        if not direccion or not index.canonical_map:
             return []
 
         input_clean = self._strip_localidad_tokens(direccion)
@@ -580,29 +722,11 @@ class ExpensasSheetService:
         )
         if not input_street_norm:
             return []
+        input_tokens = [token for token in self._street_token_set(input_street_norm) if token]
 
         matches: List[Tuple[float, str]] = []
-        for _, canonical in canonical_map.items():
-            canonical_text = str(canonical).strip()
-            if not canonical_text:
-                continue
-
-            canonical_clean = self._strip_localidad_tokens(canonical_text)
-            candidate_street_raw, candidate_numbers = self._extract_numbers_from_raw(
-                canonical_clean
-            )
-            if not candidate_numbers:
-                continue
-            if not any(number in candidate_numbers for number in input_numbers):
-                continue
-
-            candidate_street_norm = self._strip_avenida_prefix(
-                self._normalize_address_text(candidate_street_raw)
-            )
-            if not candidate_street_norm:
-                continue
-
-            similarity = self._street_similarity(input_street_norm, candidate_street_norm)
+        for canonical_text, candidate_tokens in index.fuzzy_candidates(input_numbers):
+            similarity = self._street_similarity(input_tokens, candidate_tokens)
             if similarity < self._FUZZY_STREET_THRESHOLD:
                 continue
 
@@ -632,74 +756,41 @@ class ExpensasSheetService:
 
         return [canonical for _, canonical in unique_matches]
 
-    def _resolve_address_code_once(self, direccion: str, address_map: dict) -> Optional[Any]:
-        input_clean = self._strip_localidad_tokens(direccion)
-        input_street_raw, input_numbers = self._extract_numbers_from_raw(input_clean)
-        input_street_norm = self._normalize_address_text(input_street_raw)
-        input_full_norm = self._normalize_address_text(input_clean)
-        input_street_norm_wo_avenida = self._strip_avenida_prefix(input_street_norm)
-        input_full_norm_wo_avenida = self._strip_avenida_prefix(input_full_norm)
-
-        for code, raw_address in address_map.items():
-            candidates = raw_address if isinstance(raw_address, (list, tuple, set)) else [raw_address]
-            for candidate in candidates:
-                raw_str = str(candidate).strip()
-                if not raw_str:
-                    continue
-
-                mapped_clean = self._strip_localidad_tokens(raw_str)
-                mapped_street_raw, mapped_numbers = self._extract_numbers_from_raw(mapped_clean)
-                mapped_street_norm = self._normalize_address_text(mapped_street_raw)
-                mapped_full_norm = self._normalize_address_text(mapped_clean)
-                mapped_street_norm_wo_avenida = self._strip_avenida_prefix(mapped_street_norm)
-                mapped_full_norm_wo_avenida = self._strip_avenida_prefix(mapped_full_norm)
-
-                same_street = input_street_norm == mapped_street_norm
-                same_street = same_street or (
-                    input_street_norm_wo_avenida
-                    and input_street_norm_wo_avenida == mapped_street_norm_wo_avenida
-                )
-                if not same_street:
-                    input_tokens = self._street_token_set(
-                        input_street_norm_wo_avenida or input_street_norm
-                    )
-                    mapped_tokens = self._street_token_set(
-                        mapped_street_norm_wo_avenida or mapped_street_norm
-                    )
-                    if mapped_tokens and mapped_tokens.issubset(input_tokens):
-                        same_street = True
-
-                if input_numbers and mapped_numbers and same_street:
-                    if any(num in mapped_numbers for num in input_numbers):
-                        return self._coerce_code(code)
-
-                if input_full_norm and input_full_norm == mapped_full_norm:
-                    return self._coerce_code(code)
-                if (
-                    input_full_norm_wo_avenida
-                    and input_full_norm_wo_avenida == mapped_full_norm_wo_avenida
-                ):
-                    return self._coerce_code(code)
+    def _parse_address_keys(self, direccion: str) -> AddressKeys:
+        clean = self._strip_localidad_tokens(direccion)
+        street_raw, numbers = self._extract_numbers_from_raw(clean)
+        street_norm = self._normalize_address_text(street_raw)
+        full_norm = self._normalize_address_text(clean)
+        street_wo_avenida = self._strip_avenida_prefix(street_norm)
+        return AddressKeys(
+            street=street_norm,
+            street_wo_avenida=street_wo_avenida,
+            full=full_norm,
+            full_wo_avenida=self._strip_avenida_prefix(full_norm),
+            tokens=frozenset(self._street_token_set(street_wo_avenida or street_norm)),
+            numbers=frozenset(numbers),
+        )
 
-        return None
+    def _resolve_address_code_once(self, direccion: str, index: AddressIndex) -> Optional[Any]:
+        return index.resolve(self._parse_address_keys(direccion))
 
     def _resolve_address_code(self, direccion: str) -> Optional[Any]:
         try:
-            address_map, _ = self._get_profile_maps()
+            index = self._get_address_index()
         except Exception:
             return None
 
-        if not direccion or not address_map:
+        if not direccion or not index.entries:
             return None
 
-        resolved = self._resolve_address_code_once(direccion, address_map)
+        resolved = self._resolve_address_code_once(direccion, index)
         if resolved is not None:
             return resolved
 
         compact_input = self._strip_localidad_tokens(direccion)
         compact_candidate = self._split_compact_street_number(compact_input)
         if compact_candidate and compact_candidate != compact_input:
-            return self._resolve_address_code_once(compact_candidate, address_map)
+            return self._resolve_address_code_once(compact_candidate, index)
 
         return None
 
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from google.cloud import firestore
+except Exception:
+    firestore = None
+
+logger = logging.getLogger(__name__)
+
+# none | firestore | file
+HANDOFF_QUEUE_STORE = os.getenv("HANDOFF_QUEUE_STORE", "none").lower()
+HANDOFF_QUEUE_COLLECTION = os.getenv("HANDOFF_QUEUE_COLLECTION", "handoff-queue")
+HANDOFF_QUEUE_DOC_ID = os.getenv("HANDOFF_QUEUE_DOC_ID", "default")
+HANDOFF_QUEUE_FILE_PATH = os.getenv("HANDOFF_QUEUE_FILE_PATH", "handoff_queue.jsonl")
+# Cada cuántas operaciones el journal se reescribe como snapshot
+HANDOFF_QUEUE_COMPACT_EVERY = int(os.getenv("HANDOFF_QUEUE_COMPACT_EVERY", "200"))
+
+Snapshot = Dict[str, Any]
+Operation = Dict[str, Any]
+
+
+class FirestoreHandoffQueueStore:
+    """
+    Journal en un único documento: `snapshot` + array `ops`.
+
+    Cada operación se agrega con ArrayUnion (escritura chica, sin leer) y
+    el restore es un solo `get`. Al compactar se reescribe el documento.
+    """
+
+    def __init__(
+        self,
+        collection: str = HANDOFF_QUEUE_COLLECTION,
+        doc_id: str = HANDOFF_QUEUE_DOC_ID,
+        client=None,
+    ) -> None:
+        self.collection = collection
+        self.doc_id = doc_id
+        self._fs_client = client
+
+    def _document(self):
+        if self._fs_client is None:
+            if firestore is None:
+                raise RuntimeError("google-cloud-firestore not installed")
+            self._fs_client = firestore.Client()
+        return self._fs_client.collection(self.collection).document(self.doc_id)
+
+    def load(self) -> Tuple[Optional[Snapshot], List[Operation]]:
+        snapshot = self._document().get()
+        if not snapshot.exists:
+            return None, []
+        data = snapshot.to_dict() or {}
+        return data.get("snapshot"), list(data.get("ops") or [])
+
+    def append(self, operation: Operation) -> None:
+        # `seq` hace único cada elemento: ArrayUnion no deduplica operaciones repetidas
+        self._document().set({"ops": firestore.ArrayUnion([operation])}, merge=True)
+
+    def compact(self, snapshot: Snapshot) -> None:
+        self._document().set({"snapshot": snapshot, "ops": []})
+
+
+class FileHandoffQueueStore:
+    """
+    Journal en un archivo JSONL local: primera línea snapshot, luego una
+    operación por línea. Compactar reescribe el archivo de forma atómica.
+    """
+
+    def __init__(self, path: str = HANDOFF_QUEUE_FILE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Tuple[Optional[Snapshot], List[Operation]]:
+        snapshot = None
+        operations: List[Operation] = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Última línea truncada por un corte a mitad de escritura
+                        logger.warning("handoff_queue_journal_bad_line path=%s", self.path)
+                        continue
+                    if "snapshot" in record:
+                        snapshot = record["snapshot"]
+                    else:
+                        operations.append(record)
+        except FileNotFoundError:
+            return None, []
+        return snapshot, operations
+
+    def append(self, operation: Operation) -> None:
+        line = json.dumps(operation, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def compact(self, snapshot: Snapshot) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                handle.write(json.dumps({"snapshot": snapshot}, separators=(",", ":")) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, self.path)
+
+
+class HandoffQueueJournal:
+    """
+    Registra las mutaciones de la cola de handoffs y la reconstruye al
+    arrancar (un solo `load` del store).
+
+    Fail-open: si el store falla se loguea y la cola en memoria sigue
+    funcionando; el próximo compact vuelve a dejar el journal consistente.
+    """
+
+    def __init__(self, store, *, compact_every: Optional[int] = None) -> None:
+        self.store = store
+        self.compact_every = max(1, HANDOFF_QUEUE_COMPACT_EVERY if compact_every is None else compact_every)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._pending_ops = 0
+        self._writes = 0
+        self._compactions = 0
+        self._failures = 0
+
+    def restore(self) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Returns:
+            tuple: (entradas de la cola en orden con su metadata, número activo)
+        """
+        try:
+            snapshot, operations = self.store.load()
+        except Exception as exc:
+            self._failures += 1
+            logger.error("handoff_queue_restore_failed error=%s", str(exc))
+            return [], None
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        active = None
+        seq = 0
+        if snapshot:
+            for entry in snapshot.get("queue") or []:
+                entries[entry["numero_telefono"]] = entry
+            active = snapshot.get("active")
+            seq = int(snapshot.get("seq") or 0)
+
+        for operation in sorted(operations, key=lambda item: item.get("seq", 0)):
+            if operation.get("seq", 0) <= seq:
+                continue
+            seq = operation["seq"]
+            op = operation.get("op")
+            numero_telefono = operation.get("numero_telefono")
+            if op == "append" and numero_telefono not in entries:
+                entries[numero_telefono] = {"numero_telefono": numero_telefono, **(operation.get("meta") or {})}
+            elif op == "remove":
+                entries.pop(numero_telefono, None)
+            elif op == "rotate" and numero_telefono in entries:
+                entries[numero_telefono] = entries.pop(numero_telefono)
+            elif op == "clear":
+                entries.clear()
+            elif op == "activate":
+                active = numero_telefono
+
+        if active is not None and active not in entries:
+            active = None
+        with self._lock:
+            self._seq = seq
+            self._pending_ops = len(operations)
+        return list(entries.values()), active
+
+    def record(
+        self,
+        op: str,
+        numero_telefono: Optional[str],
+        snapshot: Callable[[], Snapshot],
+        *,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._pending_ops += 1
+            should_compact = self._pending_ops >= self.compact_every
+            if should_compact:
+                self._pending_ops = 0
+        try:
+            if should_compact:
+                # El snapshot ya incluye esta operación
+                self.store.compact({**snapshot(), "seq": seq, "compacted_at": _utc_now_iso()})
+                self._compactions += 1
+            else:
+                operation: Operation = {"seq": seq, "op": op, "numero_telefono": numero_telefono, "at": _utc_now_iso()}
+                if meta:
+                    operation["meta"] = meta
+                self.store.append(operation)
+            self._writes += 1
+        except Exception as exc:
+            self._failures += 1
+            # Forzar compact en la próxima operación para recuperar la consistencia
+            with self._lock:
+                self._pending_ops = self.compact_every
+            logger.error(
+                "handoff_queue_journal_failed op=%s phone=%s error=%s",
+                op,
+                numero_telefono,
+                str(exc),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": type(self.store).__name__,
+            "seq": self._seq,
+            "pending_ops": self._pending_ops,
+            "writes": self._writes,
+            "compactions": self._compactions,
+            "failures": self._failures,
+        }
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def create_handoff_queue_store(backend: Optional[str] = None):
+    """Store del journal según HANDOFF_QUEUE_STORE; None = cola solo en memoria."""
+    backend = (backend or HANDOFF_QUEUE_STORE).lower()
+    if backend == "firestore":
+        return FirestoreHandoffQueueStore()
+    if backend == "file":
+        return FileHandoffQueueStore()
+    if backend != "none":
+        logger.warning("handoff_queue_store_unknown backend=%s (usando memoria)", backend)
+    return None
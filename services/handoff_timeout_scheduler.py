@@ -0,0 +1,282 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from chatbot.models import EstadoConversacion
+
+logger = logging.getLogger(__name__)
+
+# Hilo en background que cierra cada conversación cuando vence su timer.
+# Sin él los timers vencidos se procesan al llamar a /handoff/ttl-sweep.
+HANDOFF_TIMEOUT_SCHEDULER_ENABLED = os.getenv("HANDOFF_TIMEOUT_SCHEDULER_ENABLED", "false").lower() == "true"
+HANDOFF_INACTIVITY_MINUTES = int(os.getenv("HANDOFF_INACTIVITY_MINUTES", "60"))
+# Espera máxima del hilo entre chequeos (por si el reloj del sistema salta)
+HANDOFF_TIMEOUT_MAX_SLEEP_SECONDS = float(os.getenv("HANDOFF_TIMEOUT_MAX_SLEEP_SECONDS", "60"))
+
+SURVEY_OFFER_TIMEOUT_MINUTES = 2
+SURVEY_TIMEOUT_MINUTES = 15
+RESOLUTION_QUESTION_TIMEOUT_MINUTES = 10
+
+REASON_SURVEY_OFFER = "Oferta de encuesta sin respuesta"
+REASON_SURVEY = "Encuesta de satisfacción sin completar"
+REASON_RESOLUTION_QUESTION = "Pregunta de resolución sin respuesta"
+REASON_INACTIVITY = "Inactividad general"
+
+_SURVEY_STATES = {
+    EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA,
+    EstadoConversacion.ENCUESTA_SATISFACCION,
+}
+
+Deadline = Tuple[datetime, str]
+
+
+def handoff_timeout_deadline(conversacion, inactivity_minutes: Optional[int] = None) -> Optional[Deadline]:
+    """
+    Próximo vencimiento de una conversación en handoff o encuesta.
+
+    Returns:
+        tuple: (momento a partir del cual se cierra, motivo) o None si no corre ningún timer
+    """
+    estado = conversacion.estado
+    if not (conversacion.atendido_por_humano or estado in _SURVEY_STATES or estado == EstadoConversacion.ATENDIDO_POR_HUMANO):
+        return None
+    if estado == EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA and conversacion.survey_offer_sent_at:
+        return conversacion.survey_offer_sent_at + timedelta(minutes=SURVEY_OFFER_TIMEOUT_MINUTES), REASON_SURVEY_OFFER
+    if estado == EstadoConversacion.ENCUESTA_SATISFACCION and conversacion.survey_sent_at:
+        return conversacion.survey_sent_at + timedelta(minutes=SURVEY_TIMEOUT_MINUTES), REASON_SURVEY
+    if conversacion.resolution_question_sent and conversacion.resolution_question_sent_at:
+        return (
+            conversacion.resolution_question_sent_at + timedelta(minutes=RESOLUTION_QUESTION_TIMEOUT_MINUTES),
+            REASON_RESOLUTION_QUESTION,
+        )
+    last_ts = conversacion.last_client_message_at or conversacion.handoff_started_at
+    if last_ts:
+        minutes = HANDOFF_INACTIVITY_MINUTES if inactivity_minutes is None else inactivity_minutes
+        return last_ts + timedelta(minutes=minutes), REASON_INACTIVITY
+    return None
+
+
+class HandoffTimeoutScheduler:
+    """
+    Timers de cierre de handoffs indexados por vencimiento (min-heap).
+
+    `refresh` recalcula el vencimiento de una conversación cuando cambia
+    alguno de sus timestamps (O(log n)); las entradas viejas del heap se
+    descartan al llegar al tope. `run_due` cierra solo lo vencido, sin
+    recorrer todas las conversaciones. Cada cierre corre dentro del turno de
+    la conversación (`turn`, el mailbox del ConversationManager) para no
+    pisarse con un mensaje entrante; ya con el turno tomado se vuelve a leer
+    la conversación (`lookup`) por si el timer cambió o ya se cerró.
+    """
+
+    def __init__(
+        self,
+        *,
+        lookup: Optional[Callable[[str], Any]] = None,
+        on_timeout: Optional[Callable[[Any, str], bool]] = None,
+        turn: Optional[Callable[[str], ContextManager]] = None,
+        inactivity_minutes: Optional[int] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        max_sleep_seconds: Optional[float] = None,
+    ) -> None:
+        self.lookup = lookup
+        self.on_timeout = on_timeout
+        self.turn = turn
+        self.inactivity_minutes = HANDOFF_INACTIVITY_MINUTES if inactivity_minutes is None else inactivity_minutes
+        self.max_sleep_seconds = HANDOFF_TIMEOUT_MAX_SLEEP_SECONDS if max_sleep_seconds is None else max_sleep_seconds
+        self._clock = clock
+        self._heap: List[Tuple[datetime, int, str]] = []
+        # numero -> (vencimiento, seq, motivo); solo la entrada con este seq es válida en el heap
+        self._deadlines: Dict[str, Tuple[datetime, int, str]] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._fired: Counter = Counter()
+        self._scheduled = 0
+        self._rescheduled_at_fire = 0
+        self._stale_skipped = 0
+        self._failures = 0
+        self._last_lag_ms = 0.0
+        self._max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+        self._lag_samples = 0
+
+    # ---------- Índice ----------
+
+    def deadline_for(self, conversacion) -> Optional[Deadline]:
+        return handoff_timeout_deadline(conversacion, self.inactivity_minutes)
+
+    def refresh(self, conversacion) -> Optional[Deadline]:
+        """Recalcula el timer de la conversación (llamar al cambiar sus timestamps o estado)."""
+        if conversacion is None:
+            return None
+        deadline = self.deadline_for(conversacion)
+        if deadline is None:
+            self.cancel(conversacion.numero_telefono)
+        else:
+            self.schedule(conversacion.numero_telefono, *deadline)
+        return deadline
+
+    def schedule(self, numero_telefono: str, deadline: datetime, reason: str) -> None:
+        with self._cond:
+            current = self._deadlines.get(numero_telefono)
+            if current is not None and current[0] == deadline and current[2] == reason:
+                return
+            seq = next(self._seq)
+            self._deadlines[numero_telefono] = (deadline, seq, reason)
+            heapq.heappush(self._heap, (deadline, seq, numero_telefono))
+            self._scheduled += 1
+            self._compact_locked()
+            if self._heap[0][1] == seq:
+                # Nuevo primer vencimiento: despertar al hilo para que recalcule la espera
+                self._cond.notify()
+
+    def cancel(self, numero_telefono: str) -> bool:
+        with self._cond:
+            removed = self._deadlines.pop(numero_telefono, None) is not None
+            if removed:
+                self._compact_locked()
+            return removed
+
+    def _compact_locked(self) -> None:
+        # Con muchos reprogramados el heap acumula entradas viejas: se reconstruye en O(n)
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(deadline, seq, numero) for numero, (deadline, seq, _reason) in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: datetime) -> List[Tuple[str, datetime, str]]:
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] < now:
+                deadline, seq, numero_telefono = heapq.heappop(self._heap)
+                current = self._deadlines.get(numero_telefono)
+                if current is None or current[1] != seq:
+                    continue
+                del self._deadlines[numero_telefono]
+                due.append((numero_telefono, deadline, current[2]))
+        return due
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._cond:
+            while self._heap:
+                deadline, seq, numero_telefono = self._heap[0]
+                current = self._deadlines.get(numero_telefono)
+                if current is not None and current[1] == seq:
+                    return deadline
+                heapq.heappop(self._heap)
+            return None
+
+    # ---------- Disparo ----------
+
+    def run_due(self, now: Optional[datetime] = None) -> int:
+        """Cierra las conversaciones con timer vencido. Returns: cantidad cerrada."""
+        now = now or self._clock()
+        closed = 0
+        for numero_telefono, deadline, reason in self._pop_due(now):
+            try:
+                with self.turn(numero_telefono) if self.turn else nullcontext():
+                    if self._fire(numero_telefono, now):
+                        closed += 1
+            except Exception as exc:
+                self._failures += 1
+                logger.error(
+                    "handoff_timeout_failed phone=%s reason=%s error=%s",
+                    numero_telefono,
+                    reason,
+                    str(exc),
+                )
+        return closed
+
+    def _fire(self, numero_telefono: str, now: datetime) -> bool:
+        # Con el turno tomado: mientras se esperaba pudo llegar un mensaje que corrió el timer
+        conversacion = self.lookup(numero_telefono) if self.lookup else None
+        current = self.deadline_for(conversacion) if conversacion is not None else None
+        if current is None:
+            self._stale_skipped += 1
+            return False
+        if current[0] >= now:
+            # El timestamp cambió sin pasar por refresh: reprogramar con el valor actual
+            self._rescheduled_at_fire += 1
+            self.schedule(numero_telefono, *current)
+            return False
+
+        lag_ms = max(0.0, (self._clock() - current[0]).total_seconds() * 1000)
+        self._last_lag_ms = lag_ms
+        self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+        self._total_lag_ms += lag_ms
+        self._lag_samples += 1
+        if self.on_timeout is None or self.on_timeout(conversacion, current[1]) is not False:
+            self._fired[current[1]] += 1
+            return True
+        return False
+
+    def start(self) -> None:
+        """Arranca el hilo que dispara cada timer al vencer (idempotente)."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="handoff-timeouts", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            next_deadline = self.next_deadline()
+            with self._cond:
+                if self._stopping:
+                    return
+                wait = self.max_sleep_seconds
+                if next_deadline is not None:
+                    wait = min(wait, max(0.0, (next_deadline - self._clock()).total_seconds()))
+                if wait > 0:
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+            try:
+                self.run_due()
+            except Exception as exc:
+                logger.error("handoff_timeout_loop_failed error=%s", str(exc))
+
+    # ---------- Métricas ----------
+
+    def stats(self) -> Dict[str, Any]:
+        next_deadline = self.next_deadline()
+        fired_total = sum(self._fired.values())
+        with self._cond:
+            pending = len(self._deadlines)
+            heap_size = len(self._heap)
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "pending": pending,
+            "heap_size": heap_size,
+            "next_deadline_in_seconds": (
+                round((next_deadline - self._clock()).total_seconds(), 3) if next_deadline is not None else None
+            ),
+            "scheduled": self._scheduled,
+            "fired": dict(self._fired),
+            "fired_total": fired_total,
+            "rescheduled_at_fire": self._rescheduled_at_fire,
+            "stale_skipped": self._stale_skipped,
+            "failures": self._failures,
+            "lag_ms": {
+                "last": round(self._last_lag_ms, 3),
+                "max": round(self._max_lag_ms, 3),
+                "avg": round(self._total_lag_ms / self._lag_samples, 3) if self._lag_samples else 0.0,
+            },
+        }
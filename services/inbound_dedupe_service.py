@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INBOUND_DEDUPE_CACHE_SIZE = int(os.getenv("INBOUND_DEDUPE_CACHE_SIZE", "20000"))
+INBOUND_DEDUPE_CACHE_TTL_SECONDS = float(os.getenv("INBOUND_DEDUPE_CACHE_TTL_SECONDS", "900"))
+INBOUND_DEDUPE_ASYNC_MARKERS = os.getenv("INBOUND_DEDUPE_ASYNC_MARKERS", "false").lower() == "true"
+INBOUND_DEDUPE_MARKER_BATCH_SIZE = int(os.getenv("INBOUND_DEDUPE_MARKER_BATCH_SIZE", "200"))
+INBOUND_DEDUPE_MARKER_FLUSH_SECONDS = float(os.getenv("INBOUND_DEDUPE_MARKER_FLUSH_SECONDS", "0.5"))
+
+# Límite de operaciones por WriteBatch de Firestore
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+
+class InboundDedupeCache:
+    """
+    Capa en memoria delante de los marcadores de Firestore.
+
+    - LRU acotado por tamaño y TTL: los reintentos de Meta llegan casi siempre a
+      la misma instancia en segundos, así que se cortan sin round-trip.
+    - Opcionalmente (INBOUND_DEDUPE_ASYNC_MARKERS) los marcadores de ids nuevos
+      se escriben en background y en batches en lugar de un `create` por mensaje.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        async_markers: Optional[bool] = None,
+        batch_size: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max(1, INBOUND_DEDUPE_CACHE_SIZE if max_size is None else max_size)
+        self.ttl_seconds = INBOUND_DEDUPE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.async_markers = INBOUND_DEDUPE_ASYNC_MARKERS if async_markers is None else async_markers
+        self.batch_size = min(
+            FIRESTORE_MAX_BATCH_WRITES,
+            max(1, INBOUND_DEDUPE_MARKER_BATCH_SIZE if batch_size is None else batch_size),
+        )
+        self.flush_seconds = INBOUND_DEDUPE_MARKER_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._pending: List[Tuple[str, Dict[str, Any]]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_client_getter: Optional[Callable[[], Any]] = None
+        self._writer_collection: Optional[str] = None
+        self._markers_flushed = 0
+        self._flush_batches = 0
+        self._flush_failures = 0
+
+    def check_and_add(self, message_id: str) -> bool:
+        """
+        Registra el id en la capa local.
+
+        Returns:
+            bool: True si el id ya estaba (duplicado conocido, sin ir a Firestore).
+        """
+        now = self._clock()
+        with self._lock:
+            expires_at = self._seen.get(message_id)
+            if expires_at is not None and expires_at > now:
+                self._seen.move_to_end(message_id)
+                self._hits += 1
+                return True
+            self._misses += 1
+            self._seen[message_id] = now + self.ttl_seconds
+            self._seen.move_to_end(message_id)
+            self._evict_locked(now)
+            return False
+
+    def forget(self, message_id: str) -> None:
+        with self._lock:
+            self._seen.pop(message_id, None)
+
+    def _evict_locked(self, now: float) -> None:
+        # Los más viejos están al frente: sacar vencidos y excedentes
+        while self._seen:
+            oldest_expiry = next(iter(self._seen.values()))
+            if len(self._seen) > self.max_size or oldest_expiry <= now:
+                self._seen.popitem(last=False)
+                self._evictions += 1
+                continue
+            break
+
+    # ---------- Marcadores async en batch ----------
+
+    def enqueue_marker(
+        self,
+        message_id: str,
+        payload: Dict[str, Any],
+        *,
+        client_getter: Callable[[], Any],
+        collection: str,
+    ) -> None:
+        with self._pending_lock:
+            self._writer_client_getter = client_getter
+            self._writer_collection = collection
+            self._pending.append((message_id, payload))
+            pending = len(self._pending)
+            self._ensure_writer_started()
+        if pending >= self.batch_size:
+            self._flush_event.set()
+
+    def _ensure_writer_started(self) -> None:
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            return
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop,
+            name="inbound-dedupe-marker-writer",
+            daemon=True,
+        )
+        self._writer_thread.start()
+
+    def _writer_loop(self) -> None:
+        while True:
+            self._flush_event.wait(timeout=self.flush_seconds)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.error("message_marker_flush_failed error=%s", str(exc))
+
+    def flush(self) -> int:
+        """Escribe los marcadores pendientes en batches. Retorna cuántos escribió."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            client_getter = self._writer_client_getter
+            collection = self._writer_collection
+        if not pending or client_getter is None:
+            return 0
+        written = 0
+        client = client_getter()
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            try:
+                batch = client.batch()
+                for message_id, payload in chunk:
+                    batch.set(client.collection(collection).document(message_id), payload)
+                batch.commit()
+            except Exception as exc:
+                with self._pending_lock:
+                    self._flush_failures += 1
+                    # Reintentar en el próximo flush sin perder marcadores
+                    self._pending = chunk + pending[start + self.batch_size:] + self._pending
+                logger.error(
+                    "message_marker_batch_failed size=%s error=%s",
+                    len(chunk),
+                    str(exc),
+                )
+                break
+            written += len(chunk)
+            with self._pending_lock:
+                self._markers_flushed += len(chunk)
+                self._flush_batches += 1
+            logger.info("message_marker_batch_saved size=%s", len(chunk))
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            local = {
+                "size": len(self._seen),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+        with self._pending_lock:
+            local.update(
+                {
+                    "async_markers": self.async_markers,
+                    "markers_pending": len(self._pending),
+                    "markers_flushed": self._markers_flushed,
+                    "marker_batches": self._flush_batches,
+                    "marker_flush_failures": self._flush_failures,
+                }
+            )
+        return local
@@ -0,0 +1,350 @@
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Deadline por llamado cuando el caller no pasa presupuesto (segundos)
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "8"))
+# Presupuesto total de llamados LLM de un turno (procesar_mensaje)
+LLM_TURN_BUDGET_SECONDS = float(os.getenv("LLM_TURN_BUDGET_SECONDS", "15"))
+# Llamados simultáneos a OpenAI en todo el proceso; el resto espera dentro de su deadline
+OPENAI_MAX_IN_FLIGHT = int(os.getenv("OPENAI_MAX_IN_FLIGHT", "8"))
+# Hedging: si un llamado corto no respondió en N ms se lanza un segundo y gana el primero
+OPENAI_HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "false").lower() == "true"
+OPENAI_HEDGE_AFTER_MS = float(os.getenv("OPENAI_HEDGE_AFTER_MS", "800"))
+# Circuit breaker sobre los últimos N llamados
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_P95_MS = float(os.getenv("LLM_BREAKER_P95_MS", "6000"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+_LATENCY_SAMPLES = 500
+
+# Motivos de LLMUnavailable que se resuelven sin llegar a la API: no alimentan el breaker
+_LOCAL_REASONS = frozenset({"no_budget", "saturated"})
+
+# Deadline absoluto (time.monotonic) del caller, p. ej. el turno de procesar_mensaje
+_CALLER_DEADLINE: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar("llm_caller_deadline", default=None)
+
+
+class LLMUnavailable(Exception):
+    """No se llamó al modelo (breaker abierto, sin cupo o sin tiempo): usar el fallback determinístico."""
+
+
+@contextmanager
+def llm_budget(seconds: float) -> Iterator[None]:
+    """Acota todos los llamados LLM del bloque a `seconds` en total (se respeta un deadline externo más corto)."""
+    deadline = time.monotonic() + seconds
+    outer = _CALLER_DEADLINE.get()
+    token = _CALLER_DEADLINE.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _CALLER_DEADLINE.reset(token)
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+class CircuitBreaker:
+    """
+    Breaker por tasa de error y p95 de latencia sobre una ventana de llamados.
+
+    closed → open cuando la ventana tiene al menos `min_calls` y supera algún
+    umbral; open → half_open al pasar `cooldown_seconds` (deja pasar un solo
+    llamado de prueba); half_open → closed si la prueba sale bien, si no
+    vuelve a open.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        p95_ms: Optional[float] = None,
+        cooldown_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window = max(1, LLM_BREAKER_WINDOW if window is None else window)
+        self.min_calls = LLM_BREAKER_MIN_CALLS if min_calls is None else min_calls
+        self.error_rate = LLM_BREAKER_ERROR_RATE if error_rate is None else error_rate
+        self.p95_ms = LLM_BREAKER_P95_MS if p95_ms is None else p95_ms
+        self.cooldown_seconds = LLM_BREAKER_COOLDOWN_SECONDS if cooldown_seconds is None else cooldown_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[bool, float]] = deque(maxlen=self.window)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._trips = 0
+        self._rejected = 0
+        self._last_trip_reason = ""
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state_locked()
+
+    def _current_state_locked(self) -> str:
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.cooldown_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state_locked()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def release(self) -> None:
+        """El llamado autorizado por `allow` no llegó a la API: libera el lugar de prueba sin registrar nada."""
+        with self._lock:
+            if self._current_state_locked() == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, ok: bool, latency_ms: float) -> None:
+        with self._lock:
+            state = self._current_state_locked()
+            if state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+                if ok and latency_ms < self.p95_ms:
+                    self._state = STATE_CLOSED
+                    self._outcomes.clear()
+                    logger.info("llm_breaker_closed latency_ms=%.1f", latency_ms)
+                else:
+                    self._trip_locked("probe_failed")
+                return
+            self._outcomes.append((ok, latency_ms))
+            if state != STATE_CLOSED or len(self._outcomes) < self.min_calls:
+                return
+            errors = sum(1 for outcome_ok, _ in self._outcomes if not outcome_ok)
+            if errors / len(self._outcomes) >= self.error_rate:
+                self._trip_locked(f"error_rate={errors}/{len(self._outcomes)}")
+                return
+            p95 = _percentile(sorted(latency for _, latency in self._outcomes), 95)
+            if p95 >= self.p95_ms:
+                self._trip_locked(f"p95_ms={p95:.0f}")
+
+    def _trip_locked(self, reason: str) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = self._clock()
+        self._trips += 1
+        self._last_trip_reason = reason
+        logger.error("llm_breaker_open reason=%s cooldown_seconds=%s", reason, self.cooldown_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state_locked()
+            outcomes = list(self._outcomes)
+            errors = sum(1 for ok, _ in outcomes if not ok)
+            return {
+                "state": state,
+                "trips": self._trips,
+                "rejected": self._rejected,
+                "last_trip_reason": self._last_trip_reason,
+                "window_calls": len(outcomes),
+                "window_error_rate": round(errors / len(outcomes), 4) if outcomes else 0.0,
+                "open_for_seconds": (
+                    round(max(0.0, self.cooldown_seconds - (self._clock() - self._opened_at)), 3)
+                    if state == STATE_OPEN
+                    else 0.0
+                ),
+            }
+
+
+class ResilientLLMClient:
+    """
+    Acceso acotado en latencia a `chat.completions.create`.
+
+    - Deadline por llamado: el menor entre `budget_seconds`, el presupuesto del
+      caller (`llm_budget`) y OPENAI_TIMEOUT_SECONDS; se pasa como `timeout`
+      al SDK, sin reintentos del SDK.
+    - Limitador global de llamados en vuelo: esperar cupo consume deadline.
+    - Hedging opcional (`hedge=True`, para clasificaciones cortas).
+    - Circuit breaker: abierto, levanta `LLMUnavailable` sin llamar a la API
+      y cada caller cae a su fallback determinístico.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout_seconds: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_after_ms: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.timeout_seconds = OPENAI_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+        self.max_in_flight = max(1, OPENAI_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight)
+        self.hedge_enabled = OPENAI_HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.hedge_after_ms = OPENAI_HEDGE_AFTER_MS if hedge_after_ms is None else hedge_after_ms
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._counts = {
+            "calls": 0,
+            "ok": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "saturated": 0,
+            "short_circuited": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def _remaining(self, budget_seconds: Optional[float]) -> float:
+        now = time.monotonic()
+        deadline = now + (self.timeout_seconds if budget_seconds is None else min(budget_seconds, self.timeout_seconds))
+        caller_deadline = _CALLER_DEADLINE.get()
+        if caller_deadline is not None:
+            deadline = min(deadline, caller_deadline)
+        return deadline - now
+
+    def create(self, client: Any, *, budget_seconds: Optional[float] = None, hedge: bool = False, **kwargs) -> Any:
+        """`client.chat.completions.create(**kwargs)` con deadline, cupo, hedging y breaker."""
+        self._count("calls")
+        remaining = self._remaining(budget_seconds)
+        if remaining <= 0:
+            # El caller ya agotó su presupuesto: no dice nada de la salud de la API
+            # (y no ocupa el lugar de prueba del breaker en half_open)
+            self._count("timeouts")
+            raise LLMUnavailable("no_budget")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise LLMUnavailable("circuit_open")
+
+        started = time.monotonic()
+        try:
+            if hedge and self.hedge_enabled:
+                response = self._create_hedged(client, started + remaining, kwargs)
+            else:
+                response = self._create_once(client, started + remaining, kwargs)
+        except LLMUnavailable as exc:
+            if exc.args and exc.args[0] in _LOCAL_REASONS:
+                # Sin cupo en el limitador o sin tiempo antes de llamar: es carga local, no falla de la API
+                self.breaker.release()
+            else:
+                self.breaker.record(False, (time.monotonic() - started) * 1000)
+            raise
+        except Exception as exc:
+            latency_ms = (time.monotonic() - started) * 1000
+            self._count("timeouts" if "timeout" in type(exc).__name__.lower() else "errors")
+            self.breaker.record(False, latency_ms)
+            raise
+        latency_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._counts["ok"] += 1
+            self._latencies.append(latency_ms)
+        self.breaker.record(True, latency_ms)
+        return response
+
+    def _create_once(self, client: Any, deadline: float, kwargs: Dict[str, Any], *, blocking: bool = True) -> Any:
+        wait_seconds = deadline - time.monotonic()
+        if wait_seconds <= 0 or not self._slots.acquire(blocking, wait_seconds if blocking else None):
+            self._count("saturated")
+            raise LLMUnavailable("saturated")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                self._count("timeouts")
+                raise LLMUnavailable("no_budget")
+            return client.chat.completions.create(timeout=timeout, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2 * self.max_in_flight, thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def _create_hedged(self, client: Any, deadline: float, kwargs: Dict[str, Any]) -> Any:
+        executor = self._get_executor()
+        primary = executor.submit(self._create_once, client, deadline, kwargs)
+        done, _ = wait([primary], timeout=max(0.0, min(self.hedge_after_ms / 1000, deadline - time.monotonic())))
+        if done:
+            return primary.result()
+
+        # El segundo intento solo sale si hay cupo libre: no hace cola detrás del primero
+        self._count("hedged")
+        backup = executor.submit(self._create_once, client, deadline, kwargs, blocking=False)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        if error is not None and not isinstance(error, LLMUnavailable):
+            raise error
+        if error is not None and not pending:
+            # Ningún intento llegó a la API (sin cupo o sin tiempo antes de llamar)
+            raise error
+        self._count("timeouts")
+        raise LLMUnavailable("deadline_exceeded")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = sorted(self._latencies)
+            in_flight = self._in_flight
+        return {
+            **counts,
+            "in_flight": in_flight,
+            "max_in_flight": self.max_in_flight,
+            "timeout_seconds": self.timeout_seconds,
+            "hedge_enabled": self.hedge_enabled,
+            "latency_ms": {
+                "samples": len(latencies),
+                "p50": round(_percentile(latencies, 50), 3),
+                "p95": round(_percentile(latencies, 95), 3),
+                "p99": round(_percentile(latencies, 99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+            "breaker": self.breaker.stats(),
+        }
+
+
+# Instancia global: el limitador y el breaker son por proceso
+llm_client = ResilientLLMClient()
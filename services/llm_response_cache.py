@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache de respuestas del LLM (llamadas con temperature=0: misma entrada, misma respuesta)
+NLU_CACHE_ENABLED = os.getenv("NLU_CACHE_ENABLED", "true").lower() == "true"
+NLU_CACHE_SIZE = int(os.getenv("NLU_CACHE_SIZE", "5000"))
+NLU_CACHE_TTL_SECONDS = float(os.getenv("NLU_CACHE_TTL_SECONDS", "86400"))
+# Archivo SQLite del tier persistente (vacío = solo memoria)
+NLU_CACHE_PATH = os.getenv("NLU_CACHE_PATH", "")
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS llm_response_cache (
+        cache_key TEXT PRIMARY KEY,
+        method TEXT NOT NULL,
+        response TEXT NOT NULL,
+        latency_ms REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires_at ON llm_response_cache (expires_at)",
+)
+
+# (respuesta, latencia original en ms, vencimiento epoch)
+_Entry = Tuple[str, float, float]
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """Hash corto de los textos fijos de un prompt (system + template): cambia si cambia el prompt."""
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def build_cache_key(method: str, fingerprint: str, model: str, inputs: Iterable[str]) -> str:
+    payload = json.dumps([method, fingerprint, model, list(inputs)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache de respuestas crudas del LLM en dos niveles.
+
+    - Memoria: LRU con TTL, acotado por `max_size`.
+    - Disco (opcional, `path`): tabla SQLite que sobrevive reinicios; un hit
+      de disco se promueve a memoria.
+
+    La clave (`build_cache_key`) combina método, hash del prompt, modelo y la
+    entrada ya normalizada, así que cambiar el prompt o el modelo invalida
+    solo. Se cachea el texto que devuelve el modelo: el parseo y los
+    fallbacks de cada método siguen corriendo sobre el mensaje real.
+    Errores del tier de disco se loguean y se ignoran (fail-open).
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: Optional[bool] = None,
+        max_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.enabled = NLU_CACHE_ENABLED if enabled is None else enabled
+        self.max_size = max(1, NLU_CACHE_SIZE if max_size is None else max_size)
+        self.ttl_seconds = NLU_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.path = NLU_CACHE_PATH if path is None else path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._method_stats: Dict[str, Dict[str, float]] = {}
+        self._evictions = 0
+        self._disk_errors = 0
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.enabled and self.path:
+            self._open_disk()
+
+    def _open_disk(self) -> None:
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (self._clock(),))
+            self._conn = conn
+        except Exception as exc:
+            self._disk_errors += 1
+            logger.error("nlu_cache_disk_open_failed path=%s error=%s", self.path, str(exc))
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- Lectura / escritura ----------
+
+    def get(self, method: str, key: str) -> Optional[str]:
+        """Respuesta cacheada o None. Cuenta el lookup en las métricas del método."""
+        if not self.enabled:
+            return None
+        now = self._clock()
+        with self._lock:
+            stats = self._stats_for(method)
+            stats["lookups"] += 1
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._entries[key]
+                self._evictions += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                stats["memory_hits"] += 1
+                stats["saved_ms"] += entry[1]
+                return entry[0]
+
+        entry = self._disk_get(key, now)
+        if entry is None:
+            return None
+        with self._lock:
+            stats["disk_hits"] += 1
+            stats["saved_ms"] += entry[1]
+            self._put_locked(key, entry, now)
+        return entry[0]
+
+    def put(self, method: str, key: str, response: str, *, latency_ms: float = 0.0) -> None:
+        """Guarda la respuesta de una llamada real (y cuánto tardó: lo que ahorra cada hit)."""
+        if not self.enabled or not response:
+            return
+        now = self._clock()
+        entry = (response, latency_ms, now + self.ttl_seconds)
+        with self._lock:
+            stats = self._stats_for(method)
+            stats["stored"] += 1
+            stats["llm_ms"] += latency_ms
+            self._put_locked(key, entry, now)
+        self._disk_put(method, key, entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        with self._db_lock:
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM llm_response_cache")
+                except Exception as exc:
+                    self._disk_errors += 1
+                    logger.error("nlu_cache_disk_clear_failed error=%s", str(exc))
+
+    def _put_locked(self, key: str, entry: _Entry, now: float) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while self._entries:
+            oldest_expiry = next(iter(self._entries.values()))[2]
+            if len(self._entries) > self.max_size or oldest_expiry <= now:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+                continue
+            break
+
+    def _disk_get(self, key: str, now: float) -> Optional[_Entry]:
+        if self._conn is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._conn.execute(
+                    "SELECT response, latency_ms, expires_at FROM llm_response_cache WHERE cache_key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+        except Exception as exc:
+            self._disk_errors += 1
+            logger.error("nlu_cache_disk_read_failed error=%s", str(exc))
+            return None
+        return (row[0], row[1], row[2]) if row else None
+
+    def _disk_put(self, method: str, key: str, entry: _Entry) -> None:
+        if self._conn is None:
+            return
+        try:
+            with self._db_lock:
+                self._conn.execute(
+                    """
+                    INSERT INTO llm_response_cache (cache_key, method, response, latency_ms, expires_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(cache_key) DO UPDATE SET
+                        response = excluded.response,
+                        latency_ms = excluded.latency_ms,
+                        expires_at = excluded.expires_at
+                    """,
+                    (key, method, entry[0], entry[1], entry[2]),
+                )
+        except Exception as exc:
+            self._disk_errors += 1
+            logger.error("nlu_cache_disk_write_failed method=%s error=%s", method, str(exc))
+
+    # ---------- Métricas ----------
+
+    def _stats_for(self, method: str) -> Dict[str, float]:
+        stats = self._method_stats.get(method)
+        if stats is None:
+            stats = {"lookups": 0, "memory_hits": 0, "disk_hits": 0, "stored": 0, "llm_ms": 0.0, "saved_ms": 0.0}
+            self._method_stats[method] = stats
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {}
+            lookups_total = 0
+            hits_total = 0
+            saved_total = 0.0
+            for method, stats in self._method_stats.items():
+                hits = stats["memory_hits"] + stats["disk_hits"]
+                lookups_total += stats["lookups"]
+                hits_total += hits
+                saved_total += stats["saved_ms"]
+                methods[method] = {
+                    "lookups": stats["lookups"],
+                    "hits": hits,
+                    "memory_hits": stats["memory_hits"],
+                    "disk_hits": stats["disk_hits"],
+                    "hit_rate": round(hits / stats["lookups"], 4) if stats["lookups"] else 0.0,
+                    "llm_ms_avg": round(stats["llm_ms"] / stats["stored"], 3) if stats["stored"] else 0.0,
+                    # Suma de la latencia original de cada respuesta servida desde cache
+                    "saved_ms": round(stats["saved_ms"], 3),
+                }
+            return {
+                "enabled": self.enabled,
+                "disk": self._conn is not None,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "lookups": lookups_total,
+                "hits": hits_total,
+                "hit_rate": round(hits_total / lookups_total, 4) if lookups_total else 0.0,
+                "saved_ms": round(saved_total, 3),
+                "evictions": self._evictions,
+                "disk_errors": self._disk_errors,
+                "methods": methods,
+            }
+
+
+# Instancia global (la comparte NLUService y la reporta /stats)
+llm_response_cache = LLMResponseCache()
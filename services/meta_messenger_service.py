@@ -3,7 +3,7 @@ import json
 import hmac
 import hashlib
 import logging
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, List
 import requests
 from requests.adapters import HTTPAdapter
 
@@ -240,7 +240,7 @@ class MetaMessengerService:
     
     def extract_message_data(self, webhook_data: dict) -> Optional[Tuple[str, str, str, str, str, str]]:
         """
-        Extrae datos de mensaje del webhook de Messenger.
+        Extrae el primer mensaje del webhook de Messenger.
         
         Args:
             webhook_data: Payload del webhook
@@ -248,78 +248,91 @@ class MetaMessengerService:
         Returns:
             Optional[Tuple]: (sender_id, mensaje, message_id, sender_name, message_type, caption) o None
         """
-        try:
-            # Estructura Messenger: entry[0].messaging[0]
-            if 'entry' not in webhook_data or not webhook_data['entry']:
-                return None
-            
-            entry = webhook_data['entry'][0]
-            messaging = entry.get('messaging', [])
-            
-            if not messaging:
-                return None
-            
-            messaging_event = messaging[0]
-            
-            # Verificar que sea nuestra página
-            recipient = messaging_event.get('recipient', {})
-            page_id = recipient.get('id', '')
-            
-            if self.page_id and page_id != self.page_id:
-                logger.warning(f"Webhook de otra página ignorado: {page_id} (esperado={self.page_id})")
-                return None
-            
-            # Extraer sender
-            sender = messaging_event.get('sender', {})
-            sender_id = sender.get('id', '')
-            
-            # Verificar si hay mensaje
-            message = messaging_event.get('message', {})
-            if not message:
-                # Podría ser un evento de postback u otro tipo
-                postback = messaging_event.get('postback', {})
-                if postback:
-                    return (
-                        sender_id,
-                        postback.get('payload', ''),
-                        '',
-                        '',
-                        'postback',
-                        ''
-                    )
-                return None
-            
-            message_id = message.get('mid', '')
-            
-            # Extraer texto
-            text_body = message.get('text', '')
-            message_type = 'text' if text_body else 'unknown'
-            
-            # Quick reply payload
-            quick_reply = message.get('quick_reply', {})
-            if quick_reply:
-                text_body = quick_reply.get('payload', text_body)
-                message_type = 'quick_reply'
-            
-            # Attachments (imagen, audio, etc.)
-            attachments = message.get('attachments', [])
-            if attachments and not text_body:
-                attachment_type = attachments[0].get('type', 'unknown')
-                message_type = attachment_type
-                logger.info(f"Mensaje de tipo {attachment_type} recibido de {sender_id}")
-            
-            # Nota: Messenger no envía nombre del sender en el webhook
-            # Se necesitaría una llamada adicional a Graph API para obtenerlo
-            sender_name = ''
-            
-            # Prefijo para identificar que es Messenger (no número de teléfono)
-            messenger_id = f"messenger:{sender_id}"
-            
-            return (messenger_id, text_body, message_id, sender_name, message_type, '')
+        messages = self.extract_messages(webhook_data)
+        return messages[0] if messages else None
+    
+    def extract_messages(self, webhook_data: dict) -> List[Tuple[str, str, str, str, str, str]]:
+        """
+        Extrae todos los eventos de mensaje del webhook (entry[*].messaging[*]).
+        
+        Args:
+            webhook_data: Payload del webhook
             
-        except Exception as e:
-            logger.error(f"Error extrayendo datos del webhook Messenger: {str(e)}")
+        Returns:
+            List[Tuple]: [(sender_id, mensaje, message_id, sender_name, message_type, caption), ...]
+        """
+        extracted = []
+        if not isinstance(webhook_data, dict):
+            return extracted
+        for entry in webhook_data.get('entry') or []:
+            if not isinstance(entry, dict):
+                continue
+            for messaging_event in entry.get('messaging') or []:
+                try:
+                    message_data = self._parse_messaging_event(messaging_event)
+                except Exception as e:
+                    logger.error(f"Error extrayendo datos del webhook Messenger: {str(e)}")
+                    continue
+                if message_data:
+                    extracted.append(message_data)
+        return extracted
+    
+    def _parse_messaging_event(self, messaging_event: dict) -> Optional[Tuple[str, str, str, str, str, str]]:
+        # Verificar que sea nuestra página
+        recipient = messaging_event.get('recipient', {})
+        page_id = recipient.get('id', '')
+        
+        if self.page_id and page_id != self.page_id:
+            logger.warning(f"Webhook de otra página ignorado: {page_id} (esperado={self.page_id})")
             return None
+        
+        # Extraer sender
+        sender = messaging_event.get('sender', {})
+        sender_id = sender.get('id', '')
+        
+        # Verificar si hay mensaje
+        message = messaging_event.get('message', {})
+        if not message:
+            # Podría ser un evento de postback u otro tipo
+            postback = messaging_event.get('postback', {})
+            if postback:
+                return (
+                    sender_id,
+                    postback.get('payload', ''),
+                    '',
+                    '',
+                    'postback',
+                    ''
+                )
+            return None
+        
+        message_id = message.get('mid', '')
+        
+        # Extraer texto
+        text_body = message.get('text', '')
+        message_type = 'text' if text_body else 'unknown'
+        
+        # Quick reply payload
+        quick_reply = message.get('quick_reply', {})
+        if quick_reply:
+            text_body = quick_reply.get('payload', text_body)
+            message_type = 'quick_reply'
+        
+        # Attachments (imagen, audio, etc.)
+        attachments = message.get('attachments', [])
+        if attachments and not text_body:
+            attachment_type = attachments[0].get('type', 'unknown')
+            message_type = attachment_type
+            logger.info(f"Mensaje de tipo {attachment_type} recibido de {sender_id}")
+        
+        # Nota: Messenger no envía nombre del sender en el webhook
+        # Se necesitaría una llamada adicional a Graph API para obtenerlo
+        sender_name = ''
+        
+        # Prefijo para identificar que es Messenger (no número de teléfono)
+        messenger_id = f"messenger:{sender_id}"
+        
+        return (messenger_id, text_body, message_id, sender_name, message_type, '')
     
     def get_user_profile(self, psid: str) -> Optional[Dict[str, Any]]:
         """
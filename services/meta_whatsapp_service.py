@@ -533,7 +533,7 @@ class MetaWhatsAppService:
     
     def extract_message_data(self, webhook_data: dict) -> Optional[Tuple[str, str, str, str, str, str]]:
         """
-        Extrae datos de mensaje del webhook de Meta.
+        Extrae el primer mensaje del webhook de Meta.
         
         Args:
             webhook_data: Payload del webhook
@@ -541,19 +541,24 @@ class MetaWhatsAppService:
         Returns:
             Optional[Tuple]: (numero_telefono, mensaje, message_id, profile_name, message_type, caption) o None
         """
-        try:
-            # Estructura: entry[0].changes[0].value
-            if 'entry' not in webhook_data or not webhook_data['entry']:
-                return None
-            
-            entry = webhook_data['entry'][0]
-            changes = entry.get('changes', [])
-            
-            if not changes:
-                return None
-            
-            value = changes[0].get('value', {})
+        messages = self.extract_messages(webhook_data)
+        return messages[0] if messages else None
+    
+    def extract_messages(self, webhook_data: dict) -> List[Tuple[str, str, str, str, str, str]]:
+        """
+        Extrae todos los mensajes de un webhook de Meta (todas las entries/changes).
+        
+        Meta agrupa varios mensajes en un mismo POST en picos de tráfico; se
+        devuelven en el orden del payload.
+        
+        Args:
+            webhook_data: Payload del webhook
             
+        Returns:
+            List[Tuple]: [(numero_telefono, mensaje, message_id, profile_name, message_type, caption), ...]
+        """
+        extracted = []
+        for value in self._iter_change_values(webhook_data):
             # Verificar que el mensaje sea del número correcto
             metadata = value.get('metadata', {})
             phone_number_id = metadata.get('phone_number_id', '')
@@ -565,84 +570,86 @@ class MetaWhatsAppService:
                     self.phone_number_id
                 )
                 logger.debug("Payload ignorado: %s", value)
-                return None
-            
-            # Extraer mensajes
-            messages = value.get('messages', [])
-            if not messages:
-                return None
-            
-            message = messages[0]
-            
-            # Datos básicos
-            from_number = message.get('from', '')
-            message_id = message.get('id', '')
-            message_type = message.get('type', '')
-            
-            # Nombre del contacto
-            contacts = value.get('contacts', [])
-            profile_name = ''
-            if contacts:
-                profile = contacts[0].get('profile', {})
-                profile_name = profile.get('name', '')
-            
-            # Extraer texto/media según el tipo
-            text_body = ''
-            caption_text = ''
-            
-            if message_type == 'text':
-                text_body = message.get('text', {}).get('body', '')
-            
-            elif message_type == 'interactive':
-                # Botón o lista
-                interactive = message.get('interactive', {})
-                inter_type = interactive.get('type', '')
+                continue
+            
+            # Nombre del contacto (por wa_id; fallback al primero)
+            contact_names = {}
+            for contact in value.get('contacts', []) or []:
+                contact_names[contact.get('wa_id', '')] = contact.get('profile', {}).get('name', '')
+            default_name = next(iter(contact_names.values()), '')
+            
+            for message in value.get('messages', []) or []:
+                try:
+                    extracted.append(self._parse_message(message, contact_names, default_name))
+                except Exception as e:
+                    logger.error(f"Error extrayendo datos del webhook: {str(e)}")
+        return extracted
+    
+    def _parse_message(
+        self,
+        message: dict,
+        contact_names: Dict[str, str],
+        default_name: str,
+    ) -> Tuple[str, str, str, str, str, str]:
+        # Datos básicos
+        from_number = message.get('from', '')
+        message_id = message.get('id', '')
+        message_type = message.get('type', '')
+        profile_name = contact_names.get(from_number, default_name)
+        
+        # Extraer texto/media según el tipo
+        text_body = ''
+        caption_text = ''
+        
+        if message_type == 'text':
+            text_body = message.get('text', {}).get('body', '')
+        
+        elif message_type == 'interactive':
+            # Botón o lista
+            interactive = message.get('interactive', {})
+            inter_type = interactive.get('type', '')
+            
+            if inter_type == 'button_reply':
+                # Respuesta de botón
+                button_reply = interactive.get('button_reply', {})
+                text_body = button_reply.get('id', '')  # ID del botón
                 
-                if inter_type == 'button_reply':
-                    # Respuesta de botón
-                    button_reply = interactive.get('button_reply', {})
-                    text_body = button_reply.get('id', '')  # ID del botón
-                    
-                elif inter_type == 'list_reply':
-                    # Respuesta de lista
-                    list_reply = interactive.get('list_reply', {})
-                    text_body = list_reply.get('id', '')  # ID de la opción
-            
-            elif message_type == 'image':
-                # Imagen (registrar pero no procesar por ahora)
-                image = message.get('image', {})
-                media_id = image.get('id', '')
-                caption_text = image.get('caption', '') or ''
-                text_body = f"media:{media_id}" if media_id else ''
-            
-            elif message_type == 'audio':
-                logger.info("Mensaje de tipo audio recibido de %s", from_number)
-                text_body = ''
-            
-            elif message_type == 'video':
-                logger.info("Mensaje de tipo video recibido de %s", from_number)
-                text_body = ''
-            
-            elif message_type == 'document':
-                logger.info("Mensaje de tipo documento recibido de %s", from_number)
-                document = message.get('document', {})
-                media_id = document.get('id', '')
-                caption_text = document.get('caption', '') or ''
-                text_body = f"media:{media_id}" if media_id else ''
-            
-            # Asegurar formato E.164 (agregar + si no lo tiene)
-            if from_number and not from_number.startswith('+'):
-                from_number = f'+{from_number}'
-            
-            return (from_number, text_body, message_id, profile_name, message_type, caption_text)
-            
-        except Exception as e:
-            logger.error(f"Error extrayendo datos del webhook: {str(e)}")
-            return None
+            elif inter_type == 'list_reply':
+                # Respuesta de lista
+                list_reply = interactive.get('list_reply', {})
+                text_body = list_reply.get('id', '')  # ID de la opción
+        
+        elif message_type == 'image':
+            # Imagen (registrar pero no procesar por ahora)
+            image = message.get('image', {})
+            media_id = image.get('id', '')
+            caption_text = image.get('caption', '') or ''
+            text_body = f"media:{media_id}" if media_id else ''
+        
+        elif message_type == 'audio':
+            logger.info("Mensaje de tipo audio recibido de %s", from_number)
+            text_body = ''
+        
+        elif message_type == 'video':
+            logger.info("Mensaje de tipo video recibido de %s", from_number)
+            text_body = ''
+        
+        elif message_type == 'document':
+            logger.info("Mensaje de tipo documento recibido de %s", from_number)
+            document = message.get('document', {})
+            media_id = document.get('id', '')
+            caption_text = document.get('caption', '') or ''
+            text_body = f"media:{media_id}" if media_id else ''
+        
+        # Asegurar formato E.164 (agregar + si no lo tiene)
+        if from_number and not from_number.startswith('+'):
+            from_number = f'+{from_number}'
+        
+        return (from_number, text_body, message_id, profile_name, message_type, caption_text)
     
     def extract_status_data(self, webhook_data: dict) -> Optional[Dict[str, Any]]:
         """
-        Extrae datos de estado de mensaje del webhook.
+        Extrae el primer status update del webhook.
         
         Args:
             webhook_data: Payload del webhook
@@ -650,36 +657,48 @@ class MetaWhatsAppService:
         Returns:
             Optional[Dict]: {"message_id": str, "status": str, "timestamp": str} o None
         """
-        try:
-            if 'entry' not in webhook_data or not webhook_data['entry']:
-                return None
-            
-            entry = webhook_data['entry'][0]
-            changes = entry.get('changes', [])
-            
-            if not changes:
-                return None
-            
-            value = changes[0].get('value', {})
-            statuses = value.get('statuses', [])
-            
-            if not statuses:
-                return None
-            
-            status = statuses[0]
-            errors = status.get('errors', [])
-
-            return {
-                "message_id": status.get('id', ''),
-                "status": status.get('status', ''),  # sent, delivered, read, failed
-                "timestamp": status.get('timestamp', ''),
-                "recipient_id": status.get('recipient_id', ''),
-                "errors": errors,
-            }
+        statuses = self.extract_statuses(webhook_data)
+        return statuses[0] if statuses else None
+    
+    def extract_statuses(self, webhook_data: dict) -> List[Dict[str, Any]]:
+        """
+        Extrae todos los status updates de un webhook (todas las entries/changes).
+        
+        Args:
+            webhook_data: Payload del webhook
             
-        except Exception as e:
-            logger.error(f"Error extrayendo estado del webhook: {str(e)}")
-            return None
+        Returns:
+            List[Dict]: [{"message_id", "status", "timestamp", "recipient_id", "errors"}, ...]
+        """
+        extracted = []
+        for value in self._iter_change_values(webhook_data):
+            for status in value.get('statuses', []) or []:
+                try:
+                    extracted.append({
+                        "message_id": status.get('id', ''),
+                        "status": status.get('status', ''),  # sent, delivered, read, failed
+                        "timestamp": status.get('timestamp', ''),
+                        "recipient_id": status.get('recipient_id', ''),
+                        "errors": status.get('errors', []),
+                    })
+                except Exception as e:
+                    logger.error(f"Error extrayendo estado del webhook: {str(e)}")
+        return extracted
+    
+    @staticmethod
+    def _iter_change_values(webhook_data: dict):
+        """Itera `entry[*].changes[*].value` tolerando payloads incompletos."""
+        if not isinstance(webhook_data, dict):
+            return
+        for entry in webhook_data.get('entry') or []:
+            if not isinstance(entry, dict):
+                continue
+            for change in entry.get('changes') or []:
+                if not isinstance(change, dict):
+                    continue
+                value = change.get('value')
+                if isinstance(value, dict):
+                    yield value
     
     def _normalize_phone_number(self, phone_number: str) -> str:
         """
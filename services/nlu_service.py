@@ -2,118 +2,128 @@ import os
 import logging
 import json
 import re
-import unicodedata
+import time
+from functools import lru_cache
 from typing import Optional, Dict, Any, Iterable
 from openai import OpenAI
 from chatbot.models import TipoConsulta
+from chatbot.normalized_message import NormalizedMessage
+from chatbot.message_matcher import (
+    COMUNICARME,
+    CONTACT_ADJACENCY,
+    CONTACT_CHANNEL,
+    CONTACT_EXCLUSION,
+    CONTACT_INFO,
+    HUMAN_INTENT,
+    HUMAN_NEGATION,
+    scan_message,
+)
 from templates.template import (
     NLU_INTENT_PROMPT,
     NLU_MESSAGE_PARSING_PROMPT,
     NLU_DIRECCION_UNIDAD_PROMPT,
     NLU_EXPENSAS_ED_COMBINED_PROMPT,
+    NLU_TURN_PROMPT,
     PERSONALIZED_GREETING_PROMPT,
 )
 from config.company_profiles import get_active_company_profile, get_company_info_text
+from services.llm_response_cache import (
+    LLMResponseCache,
+    build_cache_key,
+    llm_response_cache,
+    prompt_fingerprint,
+)
+from services.llm_client import OPENAI_TIMEOUT_SECONDS, ResilientLLMClient, llm_client
+from services.nlu_turn_memo import PERFIL_DIRECCION_UNIDAD, PERFIL_EXPENSAS_ED, PERFIL_INTENCION
 
 logger = logging.getLogger(__name__)
 
-CONTACT_INFO_PHRASE_PATTERN = re.compile(r"\binformacion\s+de\s+contacto\b")
-PHONE_KEYWORDS = ("telefono", "tel", "celular", "cel", "movil")
-WHATSAPP_KEYWORDS = ("whatsapp", "wsp", "wa", "wpp")
-EMAIL_KEYWORDS = ("email", "mail", "correo")
-CALL_PATTERNS = [
-    re.compile(r"\bllamar(?:le|les|lo|los|la|las|me|nos)?\b"),
-    re.compile(r"\bllamo\b"),
-]
-NUMERO_SYNONYMS_PATTERN = r"(?:\b(?:numero|nro\.?|num)\b|n°|nº|#)"
-EXCLUSION_TERMS = (
-    "cuenta",
-    "factura",
-    "reclamo",
-    "seguimiento",
-    "unidad",
-    "depto",
-    "dto",
-    "piso",
-    "contrato",
-    "cliente",
-    "servicio",
-    "pedido",
-    "tramite",
-    "referencia",
-    "comprobante",
-    "recibo",
-    "expensa",
-    "expensas",
-    "pago",
-    "cbu",
-    "dni",
-    "cuit",
-    "cuil",
-)
-EXCLUSION_PATTERN = re.compile(
-    rf"{NUMERO_SYNONYMS_PATTERN}\s+de\s+(?:{'|'.join(EXCLUSION_TERMS)})\b"
-)
-CONTACT_ADJ_NUM_PATTERN = re.compile(
-    rf"{NUMERO_SYNONYMS_PATTERN}\s+(?:de|para)?\s*(?:contacto|comunicarme)\b"
-)
-CONTACT_ADJ_EMAIL_PATTERN = re.compile(
-    r"\b(?:email|mail|correo)\b\s+(?:de|para)?\s*(?:contacto|comunicarme)\b"
-)
+# Presupuesto de las clasificaciones cortas (intención): cortas y con hedging
+NLU_CLASSIFY_BUDGET_SECONDS = float(os.getenv("NLU_CLASSIFY_BUDGET_SECONDS", "3"))
 
 
 def _normalize_text(value: str) -> str:
-    value = value.lower().strip()
-    return "".join(
-        c for c in unicodedata.normalize("NFD", value) if unicodedata.category(c) != "Mn"
-    )
-
-
-def _has_any_keyword(text: str, keywords: Iterable[str]) -> bool:
-    for keyword in keywords:
-        if re.search(rf"\b{re.escape(keyword)}\b", text):
-            return True
-    return False
-
-# Patrones para detectar intención de hablar con humano/agente
-HUMAN_INTENT_PATTERNS = [
-    # Palabras clave directas
-    r"\bhumano\b",
-    r"\bpersona\b",
-    r"\balguien\s+real\b",
-    r"\batenci[oó]n\s+al\s+cliente\b",
-    r"\bagente\b",
-    r"\boperador(?:a)?\b",
-    r"\brepresentante\b",
-    r"\basesor(?:a)?\b",
-
-    # Expresiones comunes
-    r"\bquiero\s+hablar\b",
-    r"\bnecesito\s+hablar\b",
-    r"\bpuedo\s+hablar\b",
-    r"\bhablar\s+con\s+(?:alguien|una\s+persona)\b",
-    r"\bquiero\s+hablar\s+con\s+(?:alguien|una\s+persona)\b",
-    r"\bquiero\s+hablar\s+con\s+(?:vos|ustedes)\b",
-    r"\bnecesito\s+hablar\s+con\s+(?:alguien|una\s+persona)\b",
-    r"\bcomunicar(?:me)?\s+con\s+(?:alguien|una\s+persona)\b",
-
-    # Frustración / fallback
-    r"no\s+me\s+entend[eé]s?",
-    r"ninguna\s+opci[oó]n",
-    r"ninguna\s+de\s+las\s+anteriores",
-    r"quiero\s+que\s+me\s+atiendan?",
-
-    # Mayúsculas / errores comunes
-    r"HABLAR\s+CON\s+HUMANO",
-    r"humnao",
-    r"operadro",
-]
+    return NormalizedMessage.of(value).accent_free
+
+
+def _cache_input_exact(value: str) -> str:
+    # Extracciones: la respuesta repite el texto del usuario, solo se unifican espacios
+    return " ".join((value or "").split())
+
+
+def _cache_input_loose(value: str) -> str:
+    # Clasificación: "¡Hola, quiero reclamar!" y "hola quiero reclamar" comparten entrada
+    return " ".join(re.sub(r"[^\w\s]", " ", _normalize_text(value or "")).split())
+
+
+@lru_cache(maxsize=64)
+def _template_fingerprint(template, system: str) -> str:
+    return prompt_fingerprint(system, template.render(mensaje_usuario="{mensaje_usuario}"))
+
+
+# Prompts de validación por campo (`{valor}` se completa con str.format)
+VALIDACION_CAMPO_PROMPTS = {
+    'email': "¿Es '{valor}' un email válido? Responde: {{'valido': true/false, 'sugerencia': 'email corregido o mensaje'}}",
+    'direccion': "¿Es '{valor}' una dirección válida en Argentina? Responde: {{'valido': true/false, 'sugerencia': 'dirección mejorada o mensaje'}}",
+    'horario_visita': "¿Es '{valor}' un horario/disponibilidad comprensible? Responde: {{'valido': true/false, 'sugerencia': 'horario mejorado o mensaje'}}",
+    'descripcion': "¿Es '{valor}' una descripción clara de servicios contra incendios? Responde: {{'valido': true/false, 'sugerencia': 'descripción mejorada o mensaje'}}",
+}
+
+_INTENCIONES_TURNO = {
+    "PAGO_EXPENSAS": TipoConsulta.PAGO_EXPENSAS,
+    "SOLICITAR_SERVICIO": TipoConsulta.SOLICITAR_SERVICIO,
+    "EMERGENCIA": TipoConsulta.EMERGENCIA,
+}
+_CAMPOS_TURNO = {
+    PERFIL_INTENCION: {},
+    PERFIL_EXPENSAS_ED: {
+        "direccion_altura": {"type": "string"},
+        "piso_depto": {"type": "string"},
+        "comprobante_mencionado": {"type": "boolean"},
+        "comentario_extra": {"type": "string"},
+    },
+    PERFIL_DIRECCION_UNIDAD: {
+        "direccion_altura": {"type": "string"},
+        "piso": {"type": "string"},
+        "depto": {"type": "string"},
+        "ufs": {"type": "array", "items": {"type": "string"}},
+        "cocheras": {"type": "array", "items": {"type": "string"}},
+        "oficinas": {"type": "array", "items": {"type": "string"}},
+        "es_local": {"type": "boolean"},
+        "unidad_extra": {"type": "string"},
+    },
+}
+
+
+def _turn_response_format(perfil: str) -> Dict[str, Any]:
+    properties = {"intencion": {"type": "string", "enum": [*_INTENCIONES_TURNO, "UNCLEAR"]}}
+    properties.update(_CAMPOS_TURNO[perfil])
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"nlu_turno_{perfil}",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False,
+            },
+        },
+    }
+
 
 class NLUService:
     
-    def __init__(self):
+    def __init__(
+        self,
+        response_cache: Optional[LLMResponseCache] = None,
+        llm: Optional[ResilientLLMClient] = None,
+    ):
         self._client = None
         self._model = None
+        self.response_cache = llm_response_cache if response_cache is None else response_cache
+        self.llm = llm_client if llm is None else llm
 
     def _get_model(self) -> str:
         """
@@ -123,31 +133,61 @@ class NLUService:
             self._model = os.getenv("OPENAI_NLU_MODEL", "gpt-4o-mini")
         return self._model
 
-    @staticmethod
-    def _matches_contact_adjacency(mensaje_lower: str) -> bool:
-        return bool(
-            CONTACT_ADJ_NUM_PATTERN.search(mensaje_lower)
-            or CONTACT_ADJ_EMAIL_PATTERN.search(mensaje_lower)
-        )
-
-    @staticmethod
-    def _has_contact_channels(mensaje_lower: str) -> bool:
-        if _has_any_keyword(mensaje_lower, PHONE_KEYWORDS):
-            return True
-        if _has_any_keyword(mensaje_lower, WHATSAPP_KEYWORDS):
-            return True
-        if _has_any_keyword(mensaje_lower, EMAIL_KEYWORDS):
-            return True
-        return any(pattern.search(mensaje_lower) for pattern in CALL_PATTERNS)
-
     def _get_client(self) -> OpenAI:
         if self._client is None:
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY es requerido para usar NLU LLM")
-            self._client = OpenAI(api_key=api_key)
+            # Deadline y reintentos los maneja `self.llm` por llamado
+            self._client = OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT_SECONDS, max_retries=0)
         return self._client
 
+    def _complete(
+        self,
+        method: str,
+        *,
+        system: str,
+        prompt: str,
+        max_tokens: int,
+        fingerprint: str,
+        cache_inputs: Iterable[str],
+        response_format: Optional[Dict[str, Any]] = None,
+        budget_seconds: Optional[float] = None,
+        hedge: bool = False,
+    ) -> str:
+        """
+        Llamada temperature=0 al modelo, pasando por `response_cache` y `llm`.
+
+        La clave usa método + hash del prompt + modelo + entrada normalizada;
+        devuelve el texto crudo de la respuesta. Con el breaker abierto levanta
+        `LLMUnavailable` y cada método cae a su fallback.
+        """
+        model = self._get_model()
+        key = build_cache_key(method, fingerprint, model, cache_inputs)
+        cached = self.response_cache.get(method, key)
+        if cached is not None:
+            return cached
+
+        extra = {"response_format": response_format} if response_format else {}
+        started = time.perf_counter()
+        response = self.llm.create(
+            self._get_client(),
+            budget_seconds=budget_seconds,
+            hedge=hedge,
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0,
+            max_tokens=max_tokens,
+            **extra,
+        )
+        latency_ms = (time.perf_counter() - started) * 1000
+        content = (response.choices[0].message.content or "").strip()
+        self.response_cache.put(method, key, content, latency_ms=latency_ms)
+        return content
+
     @staticmethod
     def _strip_code_fences(text: str) -> str:
         if not text:
@@ -325,56 +365,53 @@ class NLUService:
         Extrae 'direccion_altura' y componentes de unidad desde un texto libre.
         """
         try:
-            prompt = NLU_DIRECCION_UNIDAD_PROMPT.render(mensaje_usuario=mensaje_usuario)
-            response = self._get_client().chat.completions.create(
-                model=self._get_model(),
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Eres un extractor de dirección/unidad para consorcios en Argentina. Responde solo JSON válido.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0,
+            system = "Eres un extractor de dirección/unidad para consorcios en Argentina. Responde solo JSON válido."
+            resultado_text = self._complete(
+                "extraer_direccion_unidad",
+                system=system,
+                prompt=NLU_DIRECCION_UNIDAD_PROMPT.render(mensaje_usuario=mensaje_usuario),
                 max_tokens=250,
+                fingerprint=_template_fingerprint(NLU_DIRECCION_UNIDAD_PROMPT, system),
+                cache_inputs=[_cache_input_exact(mensaje_usuario)],
             )
-
-            resultado_text = (response.choices[0].message.content or "").strip()
             logger.info("NLU dirección/unidad: '%s' -> '%s'", mensaje_usuario, resultado_text)
             parsed = self._safe_json_loads(resultado_text)
 
             if not parsed:
                 return {}
-
-            # Sanitizar shape mínimo
-            sanitized: Dict[str, Any] = {
-                "direccion_altura": str(parsed.get("direccion_altura", "") or "").strip(),
-                "piso": str(parsed.get("piso", "") or "").strip(),
-                "depto": str(parsed.get("depto", "") or "").strip(),
-                "ufs": self._unique_keep_order(parsed.get("ufs", [])),
-                "cocheras": self._unique_keep_order(parsed.get("cocheras", [])),
-                "oficinas": self._unique_keep_order(parsed.get("oficinas", [])),
-                "es_local": bool(parsed.get("es_local", False)),
-                "unidad_extra": str(parsed.get("unidad_extra", "") or "").strip(),
-            }
-
-            # Fallback: extraer "of/of." si el LLM no lo capturó.
-            if not sanitized["oficinas"]:
-                oficinas = self._extract_oficinas_from_raw(mensaje_usuario)
-                if oficinas:
-                    sanitized["oficinas"] = oficinas
-
-            # Fallback: extraer "unidad 2" como UF 2 si el LLM no lo capturó.
-            if not sanitized["ufs"]:
-                ufs = self._extract_ufs_from_raw(mensaje_usuario)
-                if ufs:
-                    sanitized["ufs"] = ufs
-
-            return sanitized
+            return self._sanitize_direccion_unidad(parsed, mensaje_usuario)
         except Exception as e:
             logger.error("Error en extracción dirección/unidad: %s", str(e))
             return {}
 
+    @classmethod
+    def _sanitize_direccion_unidad(cls, parsed: Dict[str, Any], mensaje_usuario: str) -> Dict[str, Any]:
+        # Sanitizar shape mínimo
+        sanitized: Dict[str, Any] = {
+            "direccion_altura": str(parsed.get("direccion_altura", "") or "").strip(),
+            "piso": str(parsed.get("piso", "") or "").strip(),
+            "depto": str(parsed.get("depto", "") or "").strip(),
+            "ufs": cls._unique_keep_order(parsed.get("ufs", [])),
+            "cocheras": cls._unique_keep_order(parsed.get("cocheras", [])),
+            "oficinas": cls._unique_keep_order(parsed.get("oficinas", [])),
+            "es_local": bool(parsed.get("es_local", False)),
+            "unidad_extra": str(parsed.get("unidad_extra", "") or "").strip(),
+        }
+
+        # Fallback: extraer "of/of." si el LLM no lo capturó.
+        if not sanitized["oficinas"]:
+            oficinas = cls._extract_oficinas_from_raw(mensaje_usuario)
+            if oficinas:
+                sanitized["oficinas"] = oficinas
+
+        # Fallback: extraer "unidad 2" como UF 2 si el LLM no lo capturó.
+        if not sanitized["ufs"]:
+            ufs = cls._extract_ufs_from_raw(mensaje_usuario)
+            if ufs:
+                sanitized["ufs"] = ufs
+
+        return sanitized
+
     @staticmethod
     def _normalize_fecha_simple(value: str) -> str:
         raw = (value or "").strip()
@@ -400,75 +437,70 @@ class NLUService:
         Extracción combinada (1 solo llamado LLM) para el paso ED de expensas.
         """
         try:
-            prompt = NLU_EXPENSAS_ED_COMBINED_PROMPT.render(mensaje_usuario=mensaje_usuario)
-            response = self._get_client().chat.completions.create(
-                model=self._get_model(),
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Eres un extractor de direccion/unidad/comprobante para pagos de expensas en Argentina. "
-                            "Responde solo JSON válido."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0,
+            system = (
+                "Eres un extractor de direccion/unidad/comprobante para pagos de expensas en Argentina. "
+                "Responde solo JSON válido."
+            )
+            resultado_text = self._complete(
+                "extraer_expensas_ed_combinado",
+                system=system,
+                prompt=NLU_EXPENSAS_ED_COMBINED_PROMPT.render(mensaje_usuario=mensaje_usuario),
                 max_tokens=250,
+                fingerprint=_template_fingerprint(NLU_EXPENSAS_ED_COMBINED_PROMPT, system),
+                cache_inputs=[_cache_input_exact(mensaje_usuario)],
             )
-
-            resultado_text = (response.choices[0].message.content or "").strip()
             logger.info("NLU ED combinado: '%s' -> '%s'", mensaje_usuario, resultado_text)
             parsed = self._safe_json_loads(resultado_text)
             if not parsed:
                 return {}
-
-            direccion_altura = str(parsed.get("direccion_altura", "") or "").strip()
-            piso_depto = str(parsed.get("piso_depto", "") or "").strip()
-            if not piso_depto:
-                # Compat: si el modelo devuelve shape vieja, reconstruir unidad.
-                piso_depto = self.construir_unidad_sugerida(parsed)
-            comprobante_mencionado_raw = parsed.get("comprobante_mencionado", False)
-            if isinstance(comprobante_mencionado_raw, str):
-                comprobante_mencionado = comprobante_mencionado_raw.strip().lower() in {
-                    "1",
-                    "true",
-                    "si",
-                    "sí",
-                    "yes",
-                }
-            else:
-                comprobante_mencionado = bool(comprobante_mencionado_raw)
-
-            sanitized: Dict[str, Any] = {
-                "direccion_altura": direccion_altura,
-                "piso_depto": piso_depto,
-                "comprobante_mencionado": comprobante_mencionado,
-                "comentario_extra": str(parsed.get("comentario_extra", "") or "").strip(),
-            }
-            return sanitized
+            return self._sanitize_expensas_ed(parsed)
         except Exception as e:
             logger.error("Error en extracción ED combinada: %s", str(e))
             return {}
+
+    @classmethod
+    def _sanitize_expensas_ed(cls, parsed: Dict[str, Any]) -> Dict[str, Any]:
+        direccion_altura = str(parsed.get("direccion_altura", "") or "").strip()
+        piso_depto = str(parsed.get("piso_depto", "") or "").strip()
+        if not piso_depto:
+            # Compat: si el modelo devuelve shape vieja, reconstruir unidad.
+            piso_depto = cls.construir_unidad_sugerida(parsed)
+        comprobante_mencionado_raw = parsed.get("comprobante_mencionado", False)
+        if isinstance(comprobante_mencionado_raw, str):
+            comprobante_mencionado = comprobante_mencionado_raw.strip().lower() in {
+                "1",
+                "true",
+                "si",
+                "sí",
+                "yes",
+            }
+        else:
+            comprobante_mencionado = bool(comprobante_mencionado_raw)
+
+        sanitized: Dict[str, Any] = {
+            "direccion_altura": direccion_altura,
+            "piso_depto": piso_depto,
+            "comprobante_mencionado": comprobante_mencionado,
+            "comentario_extra": str(parsed.get("comentario_extra", "") or "").strip(),
+        }
+        return sanitized
     
     def mapear_intencion(self, mensaje_usuario: str) -> Optional[TipoConsulta]:
         """
         Mapea un mensaje de usuario a una de las opciones disponibles usando LLM
         """
         try:
-            prompt = NLU_INTENT_PROMPT.render(mensaje_usuario=mensaje_usuario)
-
-            response = self._get_client().chat.completions.create(
-                model=self._get_model(),
-                messages=[
-                    {"role": "system", "content": "Eres un clasificador de intenciones para un chatbot de expensas y reclamos. Responde solo con la categoría exacta solicitada."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=10
-            )
-            
-            resultado = response.choices[0].message.content.strip().upper()
+            system = "Eres un clasificador de intenciones para un chatbot de expensas y reclamos. Responde solo con la categoría exacta solicitada."
+            resultado = self._complete(
+                "mapear_intencion",
+                system=system,
+                prompt=NLU_INTENT_PROMPT.render(mensaje_usuario=mensaje_usuario),
+                max_tokens=10,
+                fingerprint=_template_fingerprint(NLU_INTENT_PROMPT, system),
+                cache_inputs=[_cache_input_loose(mensaje_usuario)],
+                budget_seconds=NLU_CLASSIFY_BUDGET_SECONDS,
+                hedge=True,
+            ).upper()
             logger.info(f"NLU mapeo: '{mensaje_usuario}' -> '{resultado}'")
             
             # Mapear respuesta a enum
@@ -484,24 +516,64 @@ class NLUService:
             logger.error(f"Error en mapeo de intención: {str(e)}")
             return None
     
+    def analizar_turno(self, mensaje_usuario: str, perfil: str = PERFIL_INTENCION) -> Dict[str, Any]:
+        """
+        Intención + campos del paso actual en un solo llamado (JSON schema estricto).
+
+        Returns:
+            dict: {"intencion": TipoConsulta o None, "campos": dict sanitizado como
+            `extraer_expensas_ed_combinado` / `extraer_direccion_unidad`}, o {} si falla
+        """
+        try:
+            if perfil not in _CAMPOS_TURNO:
+                perfil = PERFIL_INTENCION
+            system = "Eres el NLU de un chatbot de expensas y reclamos. Responde solo JSON según el schema."
+            response_format = _turn_response_format(perfil)
+            resultado_text = self._complete(
+                "analizar_turno",
+                system=system,
+                prompt=NLU_TURN_PROMPT.render(mensaje_usuario=mensaje_usuario, perfil=perfil),
+                max_tokens=60 if perfil == PERFIL_INTENCION else 300,
+                fingerprint=prompt_fingerprint(
+                    system,
+                    NLU_TURN_PROMPT.render(mensaje_usuario="{mensaje_usuario}", perfil=perfil),
+                    json.dumps(response_format, sort_keys=True),
+                ),
+                cache_inputs=[perfil, _cache_input_exact(mensaje_usuario)],
+                response_format=response_format,
+                budget_seconds=NLU_CLASSIFY_BUDGET_SECONDS if perfil == PERFIL_INTENCION else None,
+                hedge=perfil == PERFIL_INTENCION,
+            )
+            logger.info("NLU turno (%s): '%s' -> '%s'", perfil, mensaje_usuario, resultado_text)
+            parsed = self._safe_json_loads(resultado_text)
+            if not parsed:
+                return {}
+
+            campos: Dict[str, Any] = {}
+            if perfil == PERFIL_EXPENSAS_ED:
+                campos = self._sanitize_expensas_ed(parsed)
+            elif perfil == PERFIL_DIRECCION_UNIDAD:
+                campos = self._sanitize_direccion_unidad(parsed, mensaje_usuario)
+            intencion = str(parsed.get("intencion", "") or "").strip().upper()
+            return {"intencion": _INTENCIONES_TURNO.get(intencion), "campos": campos}
+        except Exception as e:
+            logger.error("Error en análisis NLU del turno: %s", str(e))
+            return {}
+
     def extraer_datos_estructurados(self, mensaje_usuario: str) -> Dict[str, Any]:
         """
         Extrae datos de contacto de un mensaje usando LLM con enfoque semántico LLM-first
         """
         try:
-            prompt = NLU_MESSAGE_PARSING_PROMPT.render(mensaje_usuario=mensaje_usuario)
-
-            response = self._get_client().chat.completions.create(
-                model=self._get_model(),
-                messages=[
-                    {"role": "system", "content": "Eres un extractor de datos para expensas y reclamos. Responde solo con JSON válido."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=200
+            system = "Eres un extractor de datos para expensas y reclamos. Responde solo con JSON válido."
+            resultado_text = self._complete(
+                "extraer_datos_estructurados",
+                system=system,
+                prompt=NLU_MESSAGE_PARSING_PROMPT.render(mensaje_usuario=mensaje_usuario),
+                max_tokens=200,
+                fingerprint=_template_fingerprint(NLU_MESSAGE_PARSING_PROMPT, system),
+                cache_inputs=[_cache_input_exact(mensaje_usuario)],
             )
-            
-            resultado_text = response.choices[0].message.content.strip()
             logger.info(f"NLU extracción: '{mensaje_usuario}' -> '{resultado_text}'")
             
             # Intentar parsear JSON
@@ -520,31 +592,23 @@ class NLUService:
         Valida y mejora un campo individual usando LLM
         """
         try:
-            prompts_campo = {
-                'email': f"¿Es '{valor}' un email válido? Responde: {{'valido': true/false, 'sugerencia': 'email corregido o mensaje'}}",
-                'direccion': f"¿Es '{valor}' una dirección válida en Argentina? Responde: {{'valido': true/false, 'sugerencia': 'dirección mejorada o mensaje'}}",
-                'horario_visita': f"¿Es '{valor}' un horario/disponibilidad comprensible? Responde: {{'valido': true/false, 'sugerencia': 'horario mejorado o mensaje'}}",
-                'descripcion': f"¿Es '{valor}' una descripción clara de servicios contra incendios? Responde: {{'valido': true/false, 'sugerencia': 'descripción mejorada o mensaje'}}"
-            }
-            
-            if campo not in prompts_campo:
+            if campo not in VALIDACION_CAMPO_PROMPTS:
                 return {'valido': True, 'sugerencia': valor}
             
-            prompt = prompts_campo[campo]
+            template = VALIDACION_CAMPO_PROMPTS[campo]
+            prompt = template.format(valor=valor)
             if contexto:
                 prompt += f"\nContexto: {contexto}"
             
-            response = self._get_client().chat.completions.create(
-                model=self._get_model(),
-                messages=[
-                    {"role": "system", "content": "Valida datos de contacto. Responde solo con JSON válido."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=100
+            system = "Valida datos de contacto. Responde solo con JSON válido."
+            resultado_text = self._complete(
+                "validar_campo_individual",
+                system=system,
+                prompt=prompt,
+                max_tokens=100,
+                fingerprint=prompt_fingerprint(system, template),
+                cache_inputs=[campo, _cache_input_exact(valor), _cache_input_exact(contexto)],
             )
-            
-            resultado_text = response.choices[0].message.content.strip()
             parsed = self._safe_json_loads(resultado_text)
             if parsed:
                 return parsed
@@ -560,30 +624,30 @@ class NLUService:
         Detecta si el usuario está preguntando sobre información de contacto de la empresa usando regex
         """
         try:
-            mensaje_lower = _normalize_text(mensaje_usuario)
+            hits = scan_message(mensaje_usuario)
 
-            if EXCLUSION_PATTERN.search(mensaje_lower):
+            if CONTACT_EXCLUSION in hits:
                 logger.info(
                     "Detección consulta contacto (regex): '%s' -> NO (exclusion)",
                     mensaje_usuario,
                 )
                 return False
 
-            if CONTACT_INFO_PHRASE_PATTERN.search(mensaje_lower):
+            if CONTACT_INFO in hits:
                 logger.info(
                     "Detección consulta contacto (regex): '%s' -> CONTACTO (informacion)",
                     mensaje_usuario,
                 )
                 return True
 
-            if self._has_contact_channels(mensaje_lower):
+            if CONTACT_CHANNEL in hits:
                 logger.info(
                     "Detección consulta contacto (regex): '%s' -> CONTACTO (canal)",
                     mensaje_usuario,
                 )
                 return True
 
-            if self._matches_contact_adjacency(mensaje_lower):
+            if CONTACT_ADJACENCY in hits:
                 logger.info(
                     "Detección consulta contacto (regex): '%s' -> CONTACTO (adjacency)",
                     mensaje_usuario,
@@ -602,34 +666,25 @@ class NLUService:
         Usa patrones regex tolerantes a acentos y variaciones comunes.
         """
         try:
-            mensaje_lower = _normalize_text(mensaje_usuario)
+            hits = scan_message(mensaje_usuario)
 
             # Negaciones simples para evitar falsos positivos
-            negaciones = [
-                r"no\s+quiero\s+hablar",
-                r"no\s+humano",
-                r"sin\s+humano",
-            ]
-            for neg in negaciones:
-                if re.search(neg, mensaje_lower, re.IGNORECASE):
-                    logger.info(f"Detección humano (regex): '{mensaje_usuario}' -> NO (negación)")
-                    return False
-
-            if "comunicarme" in mensaje_lower:
-                if (
-                    not self._matches_contact_adjacency(mensaje_lower)
-                    and not self._has_contact_channels(mensaje_lower)
-                ):
+            if HUMAN_NEGATION in hits:
+                logger.info(f"Detección humano (regex): '{mensaje_usuario}' -> NO (negación)")
+                return False
+
+            if COMUNICARME in hits:
+                if CONTACT_ADJACENCY not in hits and CONTACT_CHANNEL not in hits:
                     logger.info(
                         "Detección humano (regex): '%s' -> HUMANO (comunicarme sin canal)",
                         mensaje_usuario,
                     )
                     return True
 
-            for pattern in HUMAN_INTENT_PATTERNS:
-                if re.search(pattern, mensaje_lower, re.IGNORECASE):
-                    logger.info(f"Detección humano (regex): '{mensaje_usuario}' -> HUMANO (pattern: {pattern})")
-                    return True
+            if HUMAN_INTENT in hits:
+                pattern = hits.pattern(HUMAN_INTENT)
+                logger.info(f"Detección humano (regex): '{mensaje_usuario}' -> HUMANO (pattern: {pattern})")
+                return True
 
             logger.info(f"Detección humano (regex): '{mensaje_usuario}' -> NO")
             return False
@@ -706,7 +761,8 @@ class NLUService:
                 is_first_time=es_primera_vez
             )
 
-            response = self._get_client().chat.completions.create(
+            response = self.llm.create(
+                self._get_client(),
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": f"Eres {company_profile['bot_name']}, asistente virtual amigable de {company_profile['name']}. Genera saludos naturales y profesionales."},
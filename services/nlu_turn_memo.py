@@ -0,0 +1,81 @@
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+# Un solo llamado LLM (intención + campos del paso) por turno en lugar de mapear_intencion + extractores
+NLU_TURN_COMBINED_ENABLED = os.getenv("NLU_TURN_COMBINED_ENABLED", "false").lower() == "true"
+
+# Perfiles de `NLUService.analizar_turno`: qué campos se piden junto con la intención
+PERFIL_INTENCION = "intencion"
+PERFIL_EXPENSAS_ED = "expensas_ed"
+PERFIL_DIRECCION_UNIDAD = "direccion_unidad"
+
+_MISSING = object()
+
+
+class NLUTurnMemo:
+    """
+    Memoización de resultados NLU dentro de un turno (`procesar_mensaje`).
+
+    `turn()` abre el alcance (anidable: el caption de un adjunto reprocesa
+    dentro del mismo turno) y `get_or_compute` devuelve lo ya calculado para
+    la misma clave. El alcance vive en un ContextVar: cada hilo/tarea que
+    procesa un mensaje tiene su propio memo. Fuera de un turno no memoiza.
+    """
+
+    def __init__(self) -> None:
+        self._current: "contextvars.ContextVar[Optional[Dict[Hashable, Any]]]" = contextvars.ContextVar(
+            "nlu_turn_memo", default=None
+        )
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._hits = 0
+        self._misses = 0
+
+    @contextmanager
+    def turn(self) -> Iterator[Dict[Hashable, Any]]:
+        memo = self._current.get()
+        if memo is not None:
+            yield memo
+            return
+        memo = {}
+        token = self._current.set(memo)
+        with self._lock:
+            self._turns += 1
+        try:
+            yield memo
+        finally:
+            self._current.reset(token)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        memo = self._current.get()
+        if memo is None:
+            return compute()
+        cached = memo.get(key, _MISSING)
+        if cached is not _MISSING:
+            with self._lock:
+                self._hits += 1
+            return cached
+        with self._lock:
+            self._misses += 1
+        value = compute()
+        memo[key] = value
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "combined_enabled": NLU_TURN_COMBINED_ENABLED,
+                "turns": self._turns,
+                "computed": self._misses,
+                # Cada hit es un llamado NLU repetido dentro del mismo turno que no se hizo
+                "reused": self._hits,
+                "reuse_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Instancia global
+nlu_turn_memo = NLUTurnMemo()
@@ -0,0 +1,308 @@
+import copy
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from google.cloud import firestore
+except Exception:
+    firestore = None
+
+from services.handoff_queue_store import HANDOFF_QUEUE_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# local (cola por instancia) | memory (stand-in compartido en el proceso) | firestore
+HANDOFF_QUEUE_BACKEND = os.getenv("HANDOFF_QUEUE_BACKEND", "local").lower()
+HANDOFF_QUEUE_SHARED_DOC_ID = os.getenv("HANDOFF_QUEUE_SHARED_DOC_ID", "shared")
+# Duración del lease que toma una instancia mientras ejecuta un comando del agente
+HANDOFF_LEASE_SECONDS = float(os.getenv("HANDOFF_LEASE_SECONDS", "15"))
+HANDOFF_INSTANCE_ID = os.getenv("HANDOFF_INSTANCE_ID") or f"{os.getenv('K_REVISION', 'local')}-{uuid.uuid4().hex[:8]}"
+
+State = Dict[str, Any]
+
+
+class HandoffLeaseBusy(Exception):
+    """Otra instancia tiene el lease del handoff activo."""
+
+
+def _empty_state() -> State:
+    return {"queue": [], "active": None, "lease_owner": None, "lease_expires_at": 0.0, "version": 0}
+
+
+class SharedHandoffQueue(ABC):
+    """
+    Estado de la cola de handoffs compartido entre instancias.
+
+    Cada operación es una transacción sobre el estado completo (`_transact`):
+    alta, baja, activación y cierre son atómicos aunque lleguen a instancias
+    distintas. Los comandos del agente de varios pasos (/done, /next) toman
+    un lease corto; cerrar o rotar el activo exige tenerlo (o que esté libre
+    o vencido), así un /done duplicado no cierra dos conversaciones.
+    Las implementaciones solo definen `_transact` y `_read`.
+    """
+
+    def __init__(self, *, lease_seconds: Optional[float] = None, clock: Callable[[], float] = time.time) -> None:
+        self.lease_seconds = HANDOFF_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self._clock = clock
+        self._stats_lock = threading.Lock()
+        self._transactions = 0
+        self._lease_conflicts = 0
+
+    # ---------- Primitivas por backend ----------
+
+    @abstractmethod
+    def _transact(self, mutate: Callable[[State], Any]) -> Any:
+        """Lee el estado, aplica `mutate` (que lo modifica in-place) y lo escribe de forma atómica."""
+
+    @abstractmethod
+    def _read(self) -> State:
+        """Estado actual (copia: modificarlo no afecta al backend)."""
+
+    # ---------- Helpers sobre el estado ----------
+
+    @staticmethod
+    def _index(state: State, numero_telefono: str) -> Optional[int]:
+        for index, entry in enumerate(state["queue"]):
+            if entry["numero_telefono"] == numero_telefono:
+                return index
+        return None
+
+    def _lease_free_for(self, state: State, owner: str) -> bool:
+        return (
+            state.get("lease_owner") in (None, owner)
+            or state.get("lease_expires_at", 0.0) <= self._clock()
+        )
+
+    @staticmethod
+    def _activate_first(state: State) -> Optional[str]:
+        state["active"] = state["queue"][0]["numero_telefono"] if state["queue"] else None
+        return state["active"]
+
+    def _count(self, *, conflict: bool = False) -> None:
+        with self._stats_lock:
+            self._transactions += 1
+            if conflict:
+                self._lease_conflicts += 1
+
+    # ---------- Operaciones atómicas ----------
+
+    def enqueue(self, numero_telefono: str, meta: Optional[Dict[str, Any]] = None) -> Tuple[int, int, Optional[str]]:
+        """Returns: (posición 1-indexed, tamaño de la cola, activo)."""
+        def mutate(state):
+            index = self._index(state, numero_telefono)
+            if index is None:
+                state["queue"].append({"numero_telefono": numero_telefono, **(meta or {})})
+                index = len(state["queue"]) - 1
+            if state["active"] is None:
+                self._activate_first(state)
+            return index + 1, len(state["queue"]), state["active"]
+
+        self._count()
+        return self._transact(mutate)
+
+    def remove(self, numero_telefono: str) -> Tuple[bool, Optional[str]]:
+        """Returns: (si estaba en cola, activo después de la baja)."""
+        def mutate(state):
+            index = self._index(state, numero_telefono)
+            if index is None:
+                return False, state["active"]
+            del state["queue"][index]
+            if state["active"] == numero_telefono:
+                self._activate_first(state)
+            return True, state["active"]
+
+        self._count()
+        return self._transact(mutate)
+
+    def activate_next(self) -> Optional[str]:
+        def mutate(state):
+            return self._activate_first(state)
+
+        self._count()
+        return self._transact(mutate)
+
+    def close_active(self, owner: str, expected: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Saca el activo de la cola y activa el siguiente.
+
+        Returns:
+            tuple: (número cerrado o None, nuevo activo)
+        """
+        def mutate(state):
+            active = state["active"]
+            if active is None or (expected is not None and active != expected):
+                return None, active
+            if not self._lease_free_for(state, owner):
+                raise HandoffLeaseBusy(state.get("lease_owner"))
+            index = self._index(state, active)
+            if index is not None:
+                del state["queue"][index]
+            return active, self._activate_first(state)
+
+        return self._run_leased(mutate)
+
+    def move_to_next(self, owner: str) -> Optional[str]:
+        """Mueve el activo al final de la cola y activa el primero."""
+        def mutate(state):
+            active = state["active"]
+            index = self._index(state, active) if active else None
+            if index is None:
+                return None
+            if not self._lease_free_for(state, owner):
+                raise HandoffLeaseBusy(state.get("lease_owner"))
+            state["queue"].append(state["queue"].pop(index))
+            return self._activate_first(state)
+
+        return self._run_leased(mutate)
+
+    def _run_leased(self, mutate):
+        try:
+            result = self._transact(mutate)
+        except HandoffLeaseBusy:
+            self._count(conflict=True)
+            raise
+        self._count()
+        return result
+
+    # ---------- Lease ----------
+
+    def acquire_lease(self, owner: str) -> bool:
+        def mutate(state):
+            if not self._lease_free_for(state, owner):
+                return False
+            state["lease_owner"] = owner
+            state["lease_expires_at"] = self._clock() + self.lease_seconds
+            return True
+
+        acquired = self._transact(mutate)
+        self._count(conflict=not acquired)
+        return acquired
+
+    def release_lease(self, owner: str) -> None:
+        def mutate(state):
+            if state.get("lease_owner") == owner:
+                state["lease_owner"] = None
+                state["lease_expires_at"] = 0.0
+
+        self._count()
+        self._transact(mutate)
+
+    @contextmanager
+    def lease(self, owner: str) -> Iterator[None]:
+        """Lease para un comando de varios pasos; HandoffLeaseBusy si lo tiene otra instancia."""
+        if not self.acquire_lease(owner):
+            raise HandoffLeaseBusy(owner)
+        try:
+            yield
+        finally:
+            self.release_lease(owner)
+
+    # ---------- Lecturas ----------
+
+    def snapshot(self) -> State:
+        return self._read()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "backend": type(self).__name__,
+                "transactions": self._transactions,
+                "lease_conflicts": self._lease_conflicts,
+            }
+
+
+class InMemorySharedHandoffQueue(SharedHandoffQueue):
+    """Stand-in local: un único estado protegido por lock, compartido por los managers del proceso."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._state = _empty_state()
+
+    def _transact(self, mutate):
+        with self._lock:
+            # Se trabaja sobre una copia: si `mutate` falla el estado no queda a medias
+            state = copy.deepcopy(self._state)
+            result = mutate(state)
+            state["version"] += 1
+            self._state = state
+            return result
+
+    def _read(self) -> State:
+        with self._lock:
+            return copy.deepcopy(self._state)
+
+
+class FirestoreSharedHandoffQueue(SharedHandoffQueue):
+    """Estado en un documento de Firestore; cada operación es una transacción (reintenta ante conflicto)."""
+
+    def __init__(
+        self,
+        collection: str = HANDOFF_QUEUE_COLLECTION,
+        doc_id: str = HANDOFF_QUEUE_SHARED_DOC_ID,
+        client=None,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.collection = collection
+        self.doc_id = doc_id
+        self._fs_client = client
+
+    def _get_firestore_client(self):
+        if self._fs_client is None:
+            if firestore is None:
+                raise RuntimeError("google-cloud-firestore not installed")
+            self._fs_client = firestore.Client()
+        return self._fs_client
+
+    def _document(self):
+        return self._get_firestore_client().collection(self.collection).document(self.doc_id)
+
+    @staticmethod
+    def _state_from(snapshot) -> State:
+        state = _empty_state()
+        if snapshot.exists:
+            state.update(snapshot.to_dict() or {})
+        return state
+
+    def _transact(self, mutate):
+        document = self._document()
+        outcome: List[Any] = []
+
+        @firestore.transactional
+        def run(transaction):
+            state = self._state_from(document.get(transaction=transaction))
+            result = mutate(state)
+            state["version"] = int(state.get("version") or 0) + 1
+            transaction.set(document, state)
+            outcome[:] = [result]
+
+        run(self._get_firestore_client().transaction())
+        return outcome[0]
+
+    def _read(self) -> State:
+        return self._state_from(self._document().get())
+
+
+_shared_memory_queue: Optional[InMemorySharedHandoffQueue] = None
+
+
+def create_shared_handoff_queue(backend: Optional[str] = None) -> Optional[SharedHandoffQueue]:
+    """Backend compartido según HANDOFF_QUEUE_BACKEND; None = cola local por instancia."""
+    global _shared_memory_queue
+    backend = (backend or HANDOFF_QUEUE_BACKEND).lower()
+    if backend == "firestore":
+        return FirestoreSharedHandoffQueue()
+    if backend == "memory":
+        if _shared_memory_queue is None:
+            _shared_memory_queue = InMemorySharedHandoffQueue()
+        return _shared_memory_queue
+    if backend != "local":
+        logger.warning("handoff_queue_backend_unknown backend=%s (usando cola local)", backend)
+    return None
@@ -0,0 +1,243 @@
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from chatbot.models import ConversacionData
+from services.conversation_session_service import (
+    CHECKPOINT_COLLECTION,
+    CHECKPOINT_TTL_HOURS,
+    PROCESSED_MESSAGE_COLLECTION,
+    ConversationCheckpoint,
+    ConversationSessionService,
+    _enum_value,
+    _ensure_utc,
+    _utc_now,
+)
+from services.inbound_dedupe_service import InboundDedupeCache
+
+logger = logging.getLogger(__name__)
+
+_TIMESTAMP_FIELDS = ("updated_at", "last_user_message_at", "expires_at")
+_COLLECTION_TABLES = {
+    CHECKPOINT_COLLECTION: "conversation_checkpoints",
+    PROCESSED_MESSAGE_COLLECTION: "processed_inbound_message_ids",
+}
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS conversation_checkpoints (
+        doc_id TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        last_user_message_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conversation_checkpoints_expires_at ON conversation_checkpoints (expires_at)",
+    """
+    CREATE TABLE IF NOT EXISTS processed_inbound_message_ids (
+        message_id TEXT PRIMARY KEY,
+        processed_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_processed_inbound_message_ids_expires_at ON processed_inbound_message_ids (expires_at)",
+)
+
+
+def _to_epoch(value: datetime) -> float:
+    return _ensure_utc(value).timestamp()
+
+
+def _from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+class SQLiteConversationSessionService(ConversationSessionService):
+    """
+    Backend embebido (SQLite en modo WAL) con la misma interfaz que la versión
+    Firestore: checkpoints, cleanup por `expires_at` indexado y marcadores de
+    dedupe. Pensado para deploys de una sola instancia, desarrollo local y
+    pruebas de carga sin round-trips a la nube.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        dedupe_cache: Optional[InboundDedupeCache] = None,
+    ) -> None:
+        # Escribir el documento completo en local cuesta lo mismo que un delta
+        super().__init__(dedupe_cache=dedupe_cache, delta_writes=False)
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def _get_firestore_client(self):
+        raise RuntimeError("SQLite session backend has no Firestore client")
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._conn.close()
+
+    def save(
+        self,
+        channel: str,
+        identifier: str,
+        conversation: ConversacionData,
+        *,
+        last_user_message_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+    ) -> dict:
+        doc_id = self.build_doc_id(channel, identifier)
+        payload = self.serialize(
+            conversation,
+            last_user_message_at=last_user_message_at,
+            updated_at=updated_at,
+        )
+        body = {key: value for key, value in payload.items() if key not in _TIMESTAMP_FIELDS}
+        with self._db_lock:
+            self._conn.execute(
+                """
+                INSERT INTO conversation_checkpoints (doc_id, payload, updated_at, last_user_message_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(doc_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    updated_at = excluded.updated_at,
+                    last_user_message_at = excluded.last_user_message_at,
+                    expires_at = excluded.expires_at
+                """,
+                (
+                    doc_id,
+                    json.dumps(body, default=str, ensure_ascii=False),
+                    _to_epoch(payload["updated_at"]),
+                    _to_epoch(payload["last_user_message_at"]),
+                    _to_epoch(payload["expires_at"]),
+                ),
+            )
+        self._mark_checkpoint_saved(conversation, payload)
+        logger.info(
+            "checkpoint_save doc_id=%s estado=%s mode=sqlite",
+            doc_id,
+            payload["estado"],
+        )
+        return payload
+
+    def load(self, channel: str, identifier: str) -> Optional[ConversationCheckpoint]:
+        doc_id = self.build_doc_id(channel, identifier)
+        with self._db_lock:
+            row = self._conn.execute(
+                """
+                SELECT payload, updated_at, last_user_message_at, expires_at
+                FROM conversation_checkpoints WHERE doc_id = ?
+                """,
+                (doc_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        raw = json.loads(row[0])
+        for field, value in zip(_TIMESTAMP_FIELDS, row[1:]):
+            raw[field] = _from_epoch(value)
+        checkpoint = self.hydrate(identifier, raw, channel=channel)
+        logger.info(
+            "checkpoint_load doc_id=%s estado=%s",
+            doc_id,
+            _enum_value(checkpoint.conversation.estado),
+        )
+        return checkpoint
+
+    def delete(self, channel: str, identifier: str) -> None:
+        doc_id = self.build_doc_id(channel, identifier)
+        with self._db_lock:
+            self._conn.execute("DELETE FROM conversation_checkpoints WHERE doc_id = ?", (doc_id,))
+        logger.info("checkpoint_delete doc_id=%s", doc_id)
+
+    def _delete_expired_page(self, collection: str, now: datetime, batch_size: int) -> int:
+        table = _COLLECTION_TABLES[collection]
+        with self._db_lock:
+            cursor = self._conn.execute(
+                f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} WHERE expires_at <= ? ORDER BY expires_at LIMIT ?
+                )
+                """,
+                (_to_epoch(now), batch_size),
+            )
+        return cursor.rowcount
+
+    def mark_message_processed(
+        self,
+        message_id: str,
+        *,
+        processed_at: Optional[datetime] = None,
+    ) -> bool:
+        if self.dedupe_cache.check_and_add(message_id):
+            logger.info("message_dedupe_local_hit message_id=%s", message_id)
+            return True
+        processed_at = _ensure_utc(processed_at) or _utc_now()
+        expires_at = processed_at + timedelta(hours=CHECKPOINT_TTL_HOURS)
+        with self._db_lock:
+            # Un marcador vencido se pisa; uno vigente deja rowcount en 0
+            cursor = self._conn.execute(
+                """
+                INSERT INTO processed_inbound_message_ids (message_id, processed_at, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(message_id) DO UPDATE SET
+                    processed_at = excluded.processed_at,
+                    expires_at = excluded.expires_at
+                WHERE processed_inbound_message_ids.expires_at <= excluded.processed_at
+                """,
+                (message_id, _to_epoch(processed_at), _to_epoch(expires_at)),
+            )
+        if cursor.rowcount == 0:
+            return True
+        logger.info("message_marker_saved message_id=%s", message_id)
+        return False
+
+
+class AsyncSQLiteConversationSessionService:
+    """
+    Adaptador async sobre el backend SQLite: las operaciones locales tardan
+    microsegundos, así que se ejecutan directo sobre la misma conexión.
+    """
+
+    def __init__(self, sync_service: SQLiteConversationSessionService) -> None:
+        self._sync = sync_service
+
+    def __getattr__(self, name):
+        return getattr(self._sync, name)
+
+    async def save(self, channel, identifier, conversation, **kwargs) -> dict:
+        return self._sync.save(channel, identifier, conversation, **kwargs)
+
+    async def load(self, channel, identifier) -> Optional[ConversationCheckpoint]:
+        return self._sync.load(channel, identifier)
+
+    async def load_for_key(self, conversation_key: str) -> Optional[ConversationCheckpoint]:
+        return self._sync.load_for_key(conversation_key)
+
+    async def save_for_key(self, conversation_key, conversation, **kwargs) -> dict:
+        return self._sync.save_for_key(conversation_key, conversation, **kwargs)
+
+    async def save_for_key_if_changed(self, conversation_key, conversation) -> Optional[dict]:
+        return self._sync.save_for_key_if_changed(conversation_key, conversation)
+
+    async def delete(self, channel, identifier) -> None:
+        self._sync.delete(channel, identifier)
+
+    async def delete_for_key(self, conversation_key: str) -> None:
+        self._sync.delete_for_key(conversation_key)
+
+    async def cleanup_expired(self, **kwargs) -> dict:
+        return self._sync.cleanup_expired(**kwargs)
+
+    async def mark_message_processed(self, message_id: str, **kwargs) -> bool:
+        return self._sync.mark_message_processed(message_id, **kwargs)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKER_POOL_SIZE = 4
+DEFAULT_QUEUE_MAXSIZE = 1000
+
+
+@dataclass
+class _IngestItem:
+    args: Tuple[Any, ...]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class WebhookIngestService:
+    """
+    Cola en memoria + pool de workers para procesar webhooks fuera del request.
+
+    El endpoint valida la firma, encola el evento parseado y responde 200 a Meta
+    enseguida; los workers ejecutan el flujo completo (Firestore, OpenAI, envíos)
+    en background. Cada worker tiene su propio event loop para poder correr los
+    handlers async existentes sin bloquear el loop de FastAPI.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_size: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+    ):
+        self.pool_size = max(
+            1,
+            pool_size
+            if pool_size is not None
+            else int(os.getenv("WEBHOOK_WORKER_POOL_SIZE", str(DEFAULT_WORKER_POOL_SIZE))),
+        )
+        self.max_queue_size = (
+            max_queue_size
+            if max_queue_size is not None
+            else int(os.getenv("WEBHOOK_QUEUE_MAXSIZE", str(DEFAULT_QUEUE_MAXSIZE)))
+        )
+        self._queue: "queue.Queue[_IngestItem]" = queue.Queue(maxsize=max(0, self.max_queue_size))
+        self._handler: Optional[Callable[..., Any]] = None
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def start(self, handler: Callable[..., Any]) -> None:
+        """Arranca el pool (idempotente). `handler` puede ser sync o async."""
+        with self._lock:
+            self._handler = handler
+            if self._workers:
+                return
+            for index in range(self.pool_size):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"webhook-worker-{index}",
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+            logger.info(
+                "webhook_ingest_started workers=%s max_queue=%s",
+                self.pool_size,
+                self.max_queue_size,
+            )
+
+    def submit(self, *args: Any) -> bool:
+        """
+        Encola un evento para procesamiento en background.
+
+        Returns:
+            bool: False si la cola está llena (el caller debe procesar inline).
+        """
+        try:
+            self._queue.put_nowait(_IngestItem(args=args))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            logger.warning(
+                "webhook_ingest_queue_full depth=%s max=%s",
+                self._queue.qsize(),
+                self.max_queue_size,
+            )
+            return False
+        with self._stats_lock:
+            self._enqueued += 1
+        return True
+
+    def wait_idle(self, timeout: float = 5.0) -> bool:
+        """Espera a que la cola se vacíe y no haya eventos en curso (tests/shutdown)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                busy = self._in_flight
+            if busy == 0 and self._queue.empty():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def _worker_loop(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            item = self._queue.get()
+            wait_seconds = time.monotonic() - item.enqueued_at
+            with self._stats_lock:
+                self._in_flight += 1
+                self._wait_total += wait_seconds
+                self._wait_last = wait_seconds
+                if wait_seconds > self._wait_max:
+                    self._wait_max = wait_seconds
+            failed = False
+            try:
+                result = self._handler(*item.args)
+                if asyncio.iscoroutine(result):
+                    loop.run_until_complete(result)
+            except Exception as exc:
+                failed = True
+                logger.error("webhook_ingest_worker_failed error=%s", str(exc))
+            finally:
+                with self._stats_lock:
+                    self._in_flight -= 1
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._processed += 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            dequeued = self._processed + self._failed + self._in_flight
+            avg_wait = (self._wait_total / dequeued) if dequeued else 0.0
+            return {
+                "workers": len(self._workers),
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self.max_queue_size,
+                "in_flight": self._in_flight,
+                "enqueued": self._enqueued,
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "wait_ms_avg": round(avg_wait * 1000, 2),
+                "wait_ms_max": round(self._wait_max * 1000, 2),
+                "wait_ms_last": round(self._wait_last * 1000, 2),
+            }
+
+
+webhook_ingest_service = WebhookIngestService()
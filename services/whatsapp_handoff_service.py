@@ -283,6 +283,7 @@ class WhatsAppHandoffService:
             # Importar aquí para evitar import circular
             from services.survey_service import survey_service
             from chatbot.models import EstadoConversacion
+            from chatbot.states import conversation_manager
             
             # Verificar si las encuestas están habilitadas
             if survey_service.is_enabled() and conversation:
@@ -295,6 +296,7 @@ class WhatsAppHandoffService:
                 if success:
                     # Cambiar estado a encuesta de satisfacción
                     conversation.estado = EstadoConversacion.ENCUESTA_SATISFACCION
+                    conversation_manager.refresh_handoff_timeout(client_phone)
                     logger.info(f"✅ Encuesta de satisfacción enviada al cliente {client_phone}")
                 else:
                     logger.error(f"❌ Error enviando encuesta al cliente {client_phone}")
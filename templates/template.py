@@ -167,6 +167,39 @@ Input: "Tte. Gral. Juan Domingo Perón 2250 Piso 10 Departamento D. Adjunto comp
 Output: {"direccion_altura":"Tte. Gral. Juan Domingo Perón 2250","piso_depto":"10D","comprobante_mencionado":true,"comentario_extra":""}
 """)
 
+# Un solo llamado por turno: intención + campos del paso actual (salida restringida por JSON schema)
+NLU_TURN_PROMPT = Template(r"""
+Sos el NLU de un chatbot de expensas y reclamos de consorcios (Argentina).
+
+Mensaje del usuario:
+"{{mensaje_usuario}}"
+
+1) "intencion": una de PAGO_EXPENSAS (registrar el pago de expensas), SOLICITAR_SERVICIO
+(reclamo: Destapación, Filtracion/Humedad, Pintura, Ruidos Molestos u Otro), EMERGENCIA
+(urgencias que requieren atención inmediata: gas, incendio, inundación, personas en riesgo)
+o UNCLEAR si no hay una intención clara (por ejemplo, el mensaje es solo una dirección).
+{% if perfil == "expensas_ed" %}
+2) El usuario está respondiendo la dirección de un pago de expensas. Extraé:
+- "direccion_altura": SOLO calle/avenida + número (sin piso/depto/UF, sin barrio/ciudad/provincia).
+- "piso_depto": unidad normalizada (ej: "2A", "7D", "Piso 10, Depto D", "Uf 6").
+- "comprobante_mencionado": true solo si menciona comprobante/adjunto/archivo/imagen/pdf.
+- "comentario_extra": texto adicional relevante que no entra en los campos anteriores.
+
+Ejemplo: "Calle Sarmiento 1922 2° A Unidad funcional 6 a nombre de Diego Alberto Vicente"
+→ {"intencion":"UNCLEAR","direccion_altura":"Sarmiento 1922","piso_depto":"2A, Uf 6","comprobante_mencionado":false,"comentario_extra":"a nombre de Diego Alberto Vicente"}
+{% elif perfil == "direccion_unidad" %}
+2) El usuario está respondiendo la dirección de un reclamo. Separá:
+- "direccion_altura": SOLO calle/avenida + número (sin piso/depto/UF/cochera/oficina/local, sin barrio/ciudad/provincia).
+- "piso", "depto", "ufs", "cocheras", "oficinas", "es_local", "unidad_extra".
+- Sinónimos: dpto/dto/departamento = depto; uf/unidad funcional = UF; garage = cochera; of/ofic = oficina.
+- Múltiples valores con "y" o "," (ej: "UF 27 y 28").
+
+Ejemplo: "Lavalle 1282 piso 1 oficina 8 y 10"
+→ {"intencion":"UNCLEAR","direccion_altura":"Lavalle 1282","piso":"1","depto":"","ufs":[],"cocheras":[],"oficinas":["8","10"],"es_local":false,"unidad_extra":""}
+{% endif %}
+Conservadurismo: si no estás seguro, dejá el campo vacío.
+""")
+
 
 
 NLU_LOCATION_PROMPT=Template("""
@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from services.building_catalog import BuildingCatalog, maps_from_rows
+from services.expensas_sheet_service import ExpensasSheetService
+
+CATALOG_CSV = (
+    "codigo,direccion,canonica\n"
+    "30,Av. Santa Fe 2647,Av. Santa Fe 2647\n"
+    "30,Santa Fe 2647,\n"
+    "14,Lavalle 1284,Lavalle 1280/82\n"
+    "TUTORIAL,Sarmiento 1934,\n"
+)
+
+
+def _service_with_catalog(**kwargs):
+    service = ExpensasSheetService()
+    service.catalog = BuildingCatalog(service._build_address_index, reload_seconds=0, **kwargs)
+    # Sin catálogo cargado se usaría el perfil: dejarlo vacío para que se note
+    service._get_profile_maps = lambda: ({}, {})
+    return service
+
+
+def test_csv_catalog_compiles_into_the_lookup_index(tmp_path):
+    path = tmp_path / "edificios.csv"
+    path.write_text(CATALOG_CSV, encoding="utf-8")
+    service = _service_with_catalog(path=str(path))
+
+    assert service._resolve_address_code("Santa Fe 2647") is None
+    assert service.catalog.reload() is True
+    assert service._resolve_address_code("Av Santa Fe 2647, CABA") == 30
+    assert service._resolve_address_code("Lavalle1284") == 14
+    assert service._resolve_address_code("Sarmiento 1934") == "TUTORIAL"
+    assert service.get_canonical_address("14") == "Lavalle 1280/82"
+    assert service.get_canonical_address("TUTORIAL") == "Sarmiento 1934"
+    assert service.get_fuzzy_address_suggestions("Lavale 1282") == ["Lavalle 1280/82"]
+    assert service.catalog.stats()["buildings"] == 3
+
+
+def test_json_catalog_uses_profile_keys(tmp_path):
+    path = tmp_path / "edificios.json"
+    path.write_text(
+        json.dumps(
+            {
+                "expensas_address_map": {"9": ["Av. Córdoba 785", "Córdoba 785"]},
+                "expensas_address_canonical_map": {"9": "Av. Córdoba 783/85"},
+            }
+        ),
+        encoding="utf-8",
+    )
+    service = _service_with_catalog(path=str(path))
+    service.catalog.reload()
+
+    assert service._resolve_address_code("Cordoba 785") == 9
+    assert service.get_canonical_address(9) == "Av. Córdoba 783/85"
+
+
+def test_reload_swaps_on_change_and_keeps_previous_index_on_errors(tmp_path):
+    path = tmp_path / "edificios.csv"
+    path.write_text(CATALOG_CSV, encoding="utf-8")
+    service = _service_with_catalog(path=str(path))
+    service.catalog.reload()
+    first = service.catalog.current()
+
+    # Sin cambios: no recompila
+    assert service.catalog.reload() is False
+    assert service.catalog.current() is first
+
+    path.write_text(CATALOG_CSV + "48,Palestina 580,Palestina 580\n", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert service.catalog.reload() is True
+    assert service._resolve_address_code("Palestina 580") == 48
+    # Quien tenía el índice anterior lo sigue viendo igual
+    assert first.resolve(service._parse_address_keys("Palestina 580")) is None
+
+    path.write_text("direccion\nsin codigo\n", encoding="utf-8")
+    assert service.catalog.reload() is False
+    assert service._resolve_address_code("Palestina 580") == 48
+    assert service.catalog.stats()["failures"] == 1
+
+
+def test_snapshot_boots_without_recompiling(tmp_path):
+    path = tmp_path / "edificios.csv"
+    snapshot = tmp_path / "edificios.pickle"
+    path.write_text(CATALOG_CSV, encoding="utf-8")
+    service = _service_with_catalog(path=str(path), snapshot_path=str(snapshot))
+    service.catalog.reload()
+    assert snapshot.exists()
+
+    compiled = []
+
+    def counting_compile(address_map, canonical_map):
+        compiled.append(address_map)
+        return service._build_address_index(address_map, canonical_map)
+
+    booted = _service_with_catalog(path=str(path), snapshot_path=str(snapshot))
+    booted.catalog.compile_index = counting_compile
+    assert booted.catalog.load_snapshot() is True
+    assert booted._resolve_address_code("Lavalle 1284") == 14
+    assert booted.catalog.stats()["loaded_from"] == "snapshot"
+
+    # Misma fuente que el snapshot: la primera lectura no recompila
+    assert booted.catalog.reload() is False
+    assert compiled == []
+
+
+def test_sheet_tab_rows_feed_the_catalog():
+    rows = [["Codigo", "Direccion", "Canonica"], ["3", "Güemes 3972", "Güemes 3972"], ["", "suelta", ""]]
+    service = _service_with_catalog(path="", sheet_tab="EDIFICIOS", sheet_reader=lambda tab: rows)
+    assert service.catalog.reload() is True
+    assert service._resolve_address_code("Guemes3972") == 3
+    assert maps_from_rows(rows) == ({3: ["Güemes 3972"]}, {3: "Güemes 3972"})
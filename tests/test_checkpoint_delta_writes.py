@@ -0,0 +1,170 @@
+from copy import deepcopy
+
+from google.api_core.exceptions import NotFound
+
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from services import conversation_session_service as session_module
+
+
+def _split_field_path(path):
+    parts, current, quoted, index = [], "", False, 0
+    while index < len(path):
+        char = path[index]
+        if char == "\\" and quoted:
+            current += path[index + 1]
+            index += 2
+            continue
+        if char == "`":
+            quoted = not quoted
+        elif char == "." and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+        index += 1
+    parts.append(current)
+    return parts
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return deepcopy(self._data)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, doc_id):
+        self._client = client
+        self._doc_id = doc_id
+
+    def set(self, payload):
+        self._client.writes.append(("set", deepcopy(payload)))
+        self._client.storage[self._doc_id] = deepcopy(payload)
+
+    def update(self, payload):
+        self._client.writes.append(("update", dict(payload)))
+        if self._doc_id not in self._client.storage:
+            raise NotFound("missing")
+        document = self._client.storage[self._doc_id]
+        for path, value in payload.items():
+            *parents, leaf = _split_field_path(path)
+            target = document
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            if value is session_module.DELETE_FIELD:
+                target.pop(leaf, None)
+            else:
+                target[leaf] = deepcopy(value)
+
+    def get(self):
+        return FakeSnapshot(self._client.storage.get(self._doc_id))
+
+    def delete(self):
+        self._client.storage.pop(self._doc_id, None)
+
+
+class FakeCollectionReference:
+    def __init__(self, client):
+        self._client = client
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, doc_id)
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self.storage = {}
+        self.writes = []
+
+    def collection(self, name):
+        return FakeCollectionReference(self)
+
+
+def _service():
+    service = session_module.ConversationSessionService(delta_writes=True)
+    service._fs_client = FakeFirestoreClient()
+    return service
+
+
+def _conversation(phone="+5491100000001"):
+    return ConversacionData(
+        numero_telefono=phone,
+        estado=EstadoConversacion.RECOLECTANDO_SECUENCIAL,
+        tipo_consulta=TipoConsulta.PAGO_EXPENSAS,
+        datos_temporales={"comprobante": ["https://example.com/a.jpg"], "fecha_pago": "12/03/2026"},
+    )
+
+
+def test_second_save_only_sends_changed_paths():
+    service = _service()
+    conversation = _conversation()
+    service.save_for_key(conversation.numero_telefono, conversation)
+
+    conversation.datos_temporales["monto"] = "42000"
+    conversation.datos_temporales.pop("fecha_pago")
+    conversation.datos_temporales["piso-depto"] = "2A"
+    service.save_for_key(conversation.numero_telefono, conversation)
+
+    mode, payload = service._fs_client.writes[-1]
+    assert mode == "update"
+    assert set(payload) == {
+        "datos_temporales.monto",
+        "datos_temporales.fecha_pago",
+        "datos_temporales.`piso-depto`",
+        "updated_at",
+        "last_user_message_at",
+        "expires_at",
+    }
+    assert payload["datos_temporales.fecha_pago"] is session_module.DELETE_FIELD
+
+    stored = service._fs_client.storage["whatsapp:+5491100000001"]
+    assert stored["datos_temporales"] == {
+        "comprobante": ["https://example.com/a.jpg"],
+        "monto": "42000",
+        "piso-depto": "2A",
+    }
+    stats = service.checkpoint_write_stats()
+    assert stats["delta_writes"] == 1
+    assert stats["full_writes"] == 1
+
+
+def test_delta_matches_full_write_after_reload():
+    service = _service()
+    conversation = _conversation()
+    service.save_for_key(conversation.numero_telefono, conversation)
+
+    loaded = service.load_for_key(conversation.numero_telefono).conversation
+    loaded.estado = EstadoConversacion.CONFIRMANDO
+    loaded.datos_temporales["comprobante"].append("https://example.com/b.jpg")
+    service.save_for_key(loaded.numero_telefono, loaded)
+
+    assert service._fs_client.writes[-1][0] == "update"
+    stored = service._fs_client.storage["whatsapp:+5491100000001"]
+    expected = service.serialize(loaded)
+    for field in ("estado", "tipo_consulta", "datos_temporales", "datos_contacto", "schema_version"):
+        assert stored[field] == expected[field]
+
+
+def test_missing_document_or_schema_change_falls_back_to_full_write():
+    service = _service()
+    conversation = _conversation()
+    service.save_for_key(conversation.numero_telefono, conversation)
+
+    service._fs_client.storage.clear()
+    conversation.datos_temporales["monto"] = "1"
+    service.save_for_key(conversation.numero_telefono, conversation)
+    assert [mode for mode, _ in service._fs_client.writes[-2:]] == ["update", "set"]
+    assert service.checkpoint_write_stats()["delta_fallbacks"] == 1
+
+    stored = service._fs_client.storage["whatsapp:+5491100000001"]
+    stored["schema_version"] = session_module.CHECKPOINT_SCHEMA_VERSION + 1
+    loaded = service.load_for_key(conversation.numero_telefono).conversation
+    loaded.datos_temporales["monto"] = "2"
+    service.save_for_key(loaded.numero_telefono, loaded)
+    assert service._fs_client.writes[-1][0] == "set"
+    assert service._fs_client.storage["whatsapp:+5491100000001"]["schema_version"] == (
+        session_module.CHECKPOINT_SCHEMA_VERSION
+    )
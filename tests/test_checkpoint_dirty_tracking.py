@@ -0,0 +1,96 @@
+from copy import deepcopy
+from datetime import timedelta
+
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from services import conversation_session_service as session_module
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return deepcopy(self._data)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, doc_id):
+        self._client = client
+        self._doc_id = doc_id
+
+    def set(self, payload):
+        self._client.set_calls += 1
+        self._client.storage[self._doc_id] = deepcopy(payload)
+
+    def get(self):
+        return FakeSnapshot(self._client.storage.get(self._doc_id))
+
+
+class FakeCollectionReference:
+    def __init__(self, client):
+        self._client = client
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, doc_id)
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self.storage = {}
+        self.set_calls = 0
+
+    def collection(self, name):
+        return FakeCollectionReference(self)
+
+
+def _service():
+    service = session_module.ConversationSessionService()
+    service._fs_client = FakeFirestoreClient()
+    return service
+
+
+def _conversation(phone="+5491100000001"):
+    return ConversacionData(
+        numero_telefono=phone,
+        estado=EstadoConversacion.RECOLECTANDO_SECUENCIAL,
+        tipo_consulta=TipoConsulta.SOLICITAR_SERVICIO,
+        datos_temporales={"tipo_servicio": "Plomería"},
+    )
+
+
+def test_unchanged_checkpoint_is_skipped_after_forced_save():
+    service = _service()
+    conversation = _conversation()
+
+    # save-before-send forzado y luego el guardado de fin de turno
+    service.save_for_key(conversation.numero_telefono, conversation)
+    assert service.save_for_key_if_changed(conversation.numero_telefono, conversation) is None
+
+    assert service._fs_client.set_calls == 1
+    assert service.checkpoint_write_stats()["written"] == 1
+    assert service.checkpoint_write_stats()["skipped"] == 1
+
+
+def test_mutations_inside_datos_temporales_mark_checkpoint_dirty():
+    service = _service()
+    conversation = _conversation()
+    service.save_for_key(conversation.numero_telefono, conversation)
+
+    conversation.datos_temporales["direccion"] = "Av Siempre Viva 742"
+    payload = service.save_for_key_if_changed(conversation.numero_telefono, conversation)
+
+    assert payload["datos_temporales"]["direccion"] == "Av Siempre Viva 742"
+    assert service._fs_client.set_calls == 2
+
+
+def test_loaded_checkpoint_is_clean_until_refresh_window():
+    service = _service()
+    original = _conversation()
+    service.save_for_key(original.numero_telefono, original)
+
+    checkpoint = service.load_for_key(original.numero_telefono)
+    assert service.needs_checkpoint_write(checkpoint.conversation) is False
+
+    later = checkpoint.updated_at + timedelta(seconds=session_module.CHECKPOINT_REFRESH_SECONDS)
+    assert service.needs_checkpoint_write(checkpoint.conversation, now=later) is True
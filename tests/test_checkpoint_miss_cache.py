@@ -0,0 +1,114 @@
+from copy import deepcopy
+
+from chatbot.models import EstadoConversacion
+from chatbot.states import ConversationManager
+from services.checkpoint_miss_cache import CheckpointMissCache
+from services.conversation_session_service import ConversationSessionService
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return deepcopy(self._data)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, doc_id):
+        self._client = client
+        self._doc_id = doc_id
+
+    def set(self, payload):
+        self._client.storage[self._doc_id] = deepcopy(payload)
+
+    def get(self):
+        self._client.get_calls += 1
+        return FakeSnapshot(self._client.storage.get(self._doc_id))
+
+    def delete(self):
+        self._client.storage.pop(self._doc_id, None)
+
+
+class FakeCollectionReference:
+    def __init__(self, client):
+        self._client = client
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, doc_id)
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self.storage = {}
+        self.get_calls = 0
+
+    def collection(self, name):
+        return FakeCollectionReference(self)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _manager(clock):
+    service = ConversationSessionService(
+        miss_cache=CheckpointMissCache(enabled=True, max_size=10, ttl_seconds=30, clock=clock),
+    )
+    service._fs_client = FakeFirestoreClient()
+    return ConversationManager(session_service=service), service
+
+
+def test_repeated_first_contact_skips_the_checkpoint_read_until_ttl():
+    clock = FakeClock()
+    manager, service = _manager(clock)
+    phone = "+5491100000001"
+
+    manager.get_conversacion(phone)
+    manager.conversaciones.clear()
+    manager.get_conversacion(phone)
+    assert service._fs_client.get_calls == 1
+
+    clock.now += 31
+    manager.conversaciones.clear()
+    manager.get_conversacion(phone)
+    assert service._fs_client.get_calls == 2
+
+    stats = service.miss_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses_recorded"] == 2
+
+
+def test_save_for_key_invalidates_the_negative_entry():
+    manager, service = _manager(FakeClock())
+    phone = "+5491100000002"
+
+    conversation = manager.get_conversacion(phone)
+    conversation.estado = EstadoConversacion.RECOLECTANDO_SECUENCIAL
+    conversation.datos_temporales["tipo_servicio"] = "Plomería"
+    service.save_for_key(phone, conversation)
+    manager.conversaciones.clear()
+
+    resumed = manager.get_conversacion(phone)
+    assert resumed.estado == EstadoConversacion.RECOLECTANDO_SECUENCIAL
+    assert service.miss_cache.stats()["invalidations"] == 1
+
+
+def test_non_resumable_checkpoint_is_cached_as_miss_and_cache_is_bounded():
+    manager, service = _manager(FakeClock())
+    finished = manager.get_conversacion("+5491100000003")
+    finished.estado = EstadoConversacion.FINALIZADO
+    service.save_for_key("+5491100000003", finished)
+    manager.conversaciones.clear()
+
+    assert manager.get_conversacion("+5491100000003").estado == EstadoConversacion.INICIO
+    assert service.miss_cache.contains("+5491100000003") is True
+
+    for index in range(20):
+        manager.get_conversacion(f"+54911000001{index:02d}")
+    assert service.miss_cache.stats()["size"] == 10
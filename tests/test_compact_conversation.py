@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from chatbot.compact_conversation import CompactConversation, HistoryRing
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from chatbot.states import ConversationManager
+from services.conversation_session_service import ConversationCheckpoint
+
+
+class FakeSessionService:
+    def __init__(self, checkpoint=None):
+        self.checkpoint = checkpoint
+
+    def load_for_key(self, conversation_key):
+        return self.checkpoint
+
+    def save_for_key(self, conversation_key, conversation, **kwargs):
+        pass
+
+    def delete_for_key(self, conversation_key):
+        pass
+
+    @staticmethod
+    def is_resumable_state(state):
+        return True
+
+    @staticmethod
+    def is_expired(expires_at):
+        return False
+
+
+def _full_conversation():
+    return ConversacionData(
+        numero_telefono="+5491100000001",
+        estado=EstadoConversacion.ATENDIDO_POR_HUMANO,
+        estado_anterior=EstadoConversacion.CONFIRMANDO,
+        tipo_consulta=TipoConsulta.PAGO_EXPENSAS,
+        datos_temporales={"monto": "42000"},
+        atendido_por_humano=True,
+        handoff_started_at=datetime(2026, 3, 1, 12, 0),
+        message_history=[
+            {"timestamp": datetime(2026, 3, 1, 12, 1), "sender": "client", "message": "hola"},
+            {"timestamp": datetime(2026, 3, 1, 12, 2), "sender": "agent", "message": "buen día"},
+        ],
+        survey_responses={"1": "5"},
+    )
+
+
+def test_round_trip_is_lossless_and_keeps_checkpoint_tracking():
+    original = _full_conversation()
+    original.mark_checkpoint_saved("fp-1", datetime(2026, 3, 1, 12, 5), schema_version=2)
+
+    compact = CompactConversation.from_model(original)
+    restored = compact.to_model()
+
+    assert restored.model_dump() == original.model_dump()
+    assert compact.model_dump() == original.model_dump()
+    assert not restored.checkpoint_changed("fp-1")
+    assert restored.checkpoint_schema_version == 2
+    # Enums internados: mismo objeto str que el miembro
+    assert compact.estado is EstadoConversacion.ATENDIDO_POR_HUMANO.value
+    assert compact.estado == EstadoConversacion.ATENDIDO_POR_HUMANO
+
+
+def test_default_records_are_not_allocated_until_written():
+    compact = CompactConversation("+5491100000002", EstadoConversacion.INICIO)
+
+    assert compact.atendido_por_humano is False
+    assert compact.survey_question_number == 0
+    compact.slack_thread_ts = None
+    assert compact._handoff is None and compact._survey is None
+
+    compact.survey_enabled = True
+    assert compact._survey is not None and compact._handoff is None
+    compact.survey_responses["1"] = "4"
+    assert compact.to_model().survey_responses == {"1": "4"}
+
+
+def test_history_ring_keeps_the_last_entries_and_reads_like_a_list():
+    ring = HistoryRing(maxlen=3)
+    for index in range(5):
+        ring.append({"timestamp": index, "sender": "client", "message": f"m{index}"})
+
+    assert len(ring) == 3
+    assert ring[-1] == {"timestamp": 4, "sender": "client", "message": "m4"}
+    assert [entry["message"] for entry in ring[-2:]] == ["m3", "m4"]
+    assert ring == [{"timestamp": index, "sender": "client", "message": f"m{index}"} for index in (2, 3, 4)]
+
+
+def test_manager_uses_compact_store_when_enabled(monkeypatch):
+    monkeypatch.setattr("chatbot.states.CONVERSATION_COMPACT_STORE", True)
+    monkeypatch.setattr("chatbot.compact_conversation.CONVERSATION_COMPACT_STORE", True)
+    now = datetime(2026, 3, 1, 12, 5)
+    checkpoint = ConversationCheckpoint("+5491100000001", _full_conversation(), now, now, now, 1)
+    service = FakeSessionService(checkpoint=checkpoint)
+    manager = ConversationManager(session_service=service)
+
+    resumed = manager.get_conversacion("+5491100000001")
+    service.checkpoint = None
+    fresh = manager.get_conversacion("+5491100000003")
+    manager.update_estado("+5491100000003", EstadoConversacion.ESPERANDO_OPCION)
+
+    assert isinstance(resumed, CompactConversation)
+    assert resumed.datos_temporales == {"monto": "42000"}
+    assert isinstance(fresh, CompactConversation)
+    assert fresh.estado == EstadoConversacion.ESPERANDO_OPCION
+    assert manager.memory_stats()["resident"] == 2
@@ -0,0 +1,168 @@
+import threading
+import time
+
+from chatbot.conversation_cache import ConversationCache
+from chatbot.models import ConversacionData, EstadoConversacion
+from chatbot.states import ConversationManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSessionService:
+    def __init__(self, fail=False):
+        self.saved = {}
+        self.fail = fail
+
+    def load_for_key(self, conversation_key):
+        return None
+
+    def save_for_key(self, conversation_key, conversation, **kwargs):
+        if self.fail:
+            raise RuntimeError("firestore down")
+        self.saved[conversation_key] = conversation.estado
+
+    def delete_for_key(self, conversation_key):
+        self.saved.pop(conversation_key, None)
+
+    @staticmethod
+    def is_resumable_state(state):
+        return state == EstadoConversacion.RECOLECTANDO_SECUENCIAL
+
+    @staticmethod
+    def is_expired(expires_at):
+        return False
+
+
+def _conversation(phone, estado=EstadoConversacion.INICIO):
+    return ConversacionData(numero_telefono=phone, estado=estado)
+
+
+def _manager(service, clock, max_size=2, idle_seconds=60):
+    manager = ConversationManager(session_service=service)
+    manager.conversaciones = ConversationCache(
+        max_size=max_size,
+        idle_seconds=idle_seconds,
+        on_evict=manager._spill_conversation,
+        is_pinned=manager._is_conversation_pinned,
+        clock=clock,
+    )
+    return manager
+
+
+def test_lru_eviction_spills_resumable_and_drops_terminal_states():
+    service = FakeSessionService()
+    manager = _manager(service, FakeClock())
+    manager.conversaciones["a"] = _conversation("a", EstadoConversacion.RECOLECTANDO_SECUENCIAL)
+    manager.conversaciones["b"] = _conversation("b")
+    manager.conversaciones["a"]  # "a" pasa a ser la más reciente
+
+    manager.conversaciones["c"] = _conversation("c")
+    manager.conversaciones.flush()
+    assert "b" not in manager.conversaciones
+    manager.conversaciones["d"] = _conversation("d")
+    manager.conversaciones.flush()
+
+    assert set(manager.conversaciones) == {"c", "d"}
+    assert service.saved == {"a": EstadoConversacion.RECOLECTANDO_SECUENCIAL}
+    assert manager.conversaciones.stats()["evicted_capacity"] == 2
+
+
+def test_pinned_conversations_stay_and_failed_spill_keeps_state_resident():
+    service = FakeSessionService(fail=True)
+    manager = _manager(service, FakeClock())
+    manager.conversaciones["handoff"] = _conversation("handoff", EstadoConversacion.ATENDIDO_POR_HUMANO)
+    manager.conversaciones["draft"] = _conversation("draft", EstadoConversacion.RECOLECTANDO_SECUENCIAL)
+    manager.conversaciones["new"] = _conversation("new")
+    manager.conversaciones.flush()
+
+    assert "handoff" in manager.conversaciones
+    assert "draft" in manager.conversaciones
+    assert manager.conversaciones.stats()["spill_failures"] == 1
+
+
+def test_idle_conversations_expire_and_full_scans_do_not_refresh_them():
+    clock = FakeClock()
+    service = FakeSessionService()
+    manager = _manager(service, clock, max_size=100, idle_seconds=60)
+    manager.conversaciones["idle"] = _conversation("idle", EstadoConversacion.RECOLECTANDO_SECUENCIAL)
+
+    clock.now += 30
+    manager.conversaciones["active"] = _conversation("active")
+    assert len(manager.conversaciones.values()) == 2
+
+    clock.now += 40
+    manager.conversaciones.sweep()
+    manager.conversaciones.flush()
+
+    assert list(manager.conversaciones) == ["active"]
+    assert service.saved == {"idle": EstadoConversacion.RECOLECTANDO_SECUENCIAL}
+    stats = manager.memory_stats()
+    assert stats["evicted_idle"] == 1
+    assert stats["resident"] == 1
+    assert stats["approx_bytes"] > 0
+
+
+def test_insert_does_not_wait_for_the_spill_and_reads_recover_the_victim():
+    release = threading.Event()
+    spilled = []
+
+    def slow_spill(key, conversation):
+        release.wait(5)
+        spilled.append(key)
+        return True
+
+    cache = ConversationCache(max_size=1, on_evict=slow_spill, clock=FakeClock())
+    cache["a"] = _conversation("a")
+    started = time.monotonic()
+    cache["b"] = _conversation("b")
+    cache["c"] = _conversation("c")
+
+    # El alta no espera el guardado: las víctimas siguen accesibles mientras se guardan
+    assert time.monotonic() - started < 1
+    assert spilled == []
+    assert "a" in cache and "b" in cache
+    assert cache["b"].numero_telefono == "b"
+
+    release.set()
+    cache.flush()
+    assert spilled == ["a", "b"]
+    # "b" se volvió a usar durante el spill: queda residente y "a" se va
+    assert "a" not in cache
+    assert set(cache) == {"b", "c"}
+    stats = cache.stats()
+    assert stats["resurrected"] == 1
+    assert stats["evicted_capacity"] == 1
+    assert stats["spilling"] == 0
+
+
+def test_membership_checks_do_not_refresh_lru_order_or_idle_time():
+    clock = FakeClock()
+    cache = ConversationCache(max_size=2, idle_seconds=60, clock=clock)
+    cache["a"] = _conversation("a")
+    cache["b"] = _conversation("b")
+
+    clock.now += 50
+    assert "a" in cache
+    cache["c"] = _conversation("c")
+    assert "a" not in cache
+
+    clock.now += 20
+    assert "b" in cache
+    cache.sweep()
+    assert list(cache) == ["c"]
+
+
+def test_recently_finalized_is_swept_on_expiry(monkeypatch):
+    manager = ConversationManager(session_service=FakeSessionService())
+    monkeypatch.setattr("chatbot.states.POST_FINALIZADO_WINDOW_SECONDS", 0)
+
+    manager.finalizar_conversacion("+5491100000001")
+    manager.finalizar_conversacion("+5491100000002")
+
+    assert list(manager.recently_finalized) == ["+5491100000002"]
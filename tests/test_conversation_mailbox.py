@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.mailbox import ConversationMailbox
+
+
+def test_same_key_runs_in_reservation_order_even_if_threads_start_reversed():
+    mailbox = ConversationMailbox()
+    tickets = [mailbox.reserve("+5491100000001") for _ in range(4)]
+    processed = []
+
+    def worker(index, ticket):
+        with mailbox.turn("+5491100000001", ticket):
+            processed.append(index)
+            time.sleep(0.01)
+
+    threads = [
+        threading.Thread(target=worker, args=(index, ticket))
+        for index, ticket in reversed(list(enumerate(tickets)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert processed == [0, 1, 2, 3]
+    assert mailbox.queue_length("+5491100000001") == 0
+    stats = mailbox.stats()
+    assert stats["acquired"] == 4
+    assert stats["max_queue_length_seen"] == 4
+    assert stats["active_keys"] == 0
+
+
+def test_different_keys_run_in_parallel():
+    mailbox = ConversationMailbox()
+    barrier = threading.Barrier(2, timeout=2)
+    results = []
+
+    def worker(key):
+        with mailbox.turn(key):
+            # Si las claves se serializaran, el barrier expiraría
+            barrier.wait()
+            results.append(key)
+
+    threads = [threading.Thread(target=worker, args=(key,)) for key in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert sorted(results) == ["a", "b"]
+
+
+def test_turn_is_reentrant_for_owner_thread():
+    mailbox = ConversationMailbox()
+    with mailbox.turn("k"):
+        with mailbox.turn("k"):
+            assert mailbox.queue_length("k") == 1
+    assert mailbox.queue_length("k") == 0
+
+
+def test_abandoned_and_stale_reservations_do_not_block_the_conversation():
+    mailbox = ConversationMailbox(stale_seconds=0.05)
+    abandoned = mailbox.reserve("k")
+    lost = mailbox.reserve("k")
+    live = mailbox.reserve("k")
+
+    mailbox.abandon("k", abandoned)
+    started = time.monotonic()
+    with mailbox.turn("k", live):
+        pass
+
+    assert time.monotonic() - started < 2
+    assert mailbox.stats()["stale_dropped"] == 1
+    assert mailbox.queue_length("k") == 0
+    mailbox.abandon("k", lost)
+
+
+def test_async_turn_waits_without_blocking_the_loop():
+    mailbox = ConversationMailbox(stale_seconds=5)
+    processed = []
+
+    async def handle(name, ticket, delay):
+        # El I/O previo al turno puede terminar en cualquier orden
+        await asyncio.sleep(delay)
+        async with mailbox.turn_async("k", ticket):
+            await asyncio.sleep(0.01)
+            processed.append(name)
+
+    async def main():
+        first = mailbox.reserve("k")
+        second = mailbox.reserve("k")
+        started = time.monotonic()
+        await asyncio.gather(handle("A", first, 0.05), handle("B", second, 0))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(main())
+    assert processed == ["A", "B"]
+    assert elapsed < 1
+    assert mailbox.stats()["stale_dropped"] == 0
+    assert mailbox.queue_length("k") == 0
+
+
+def test_async_turn_is_woken_by_a_thread_releasing_the_turn():
+    mailbox = ConversationMailbox(stale_seconds=5)
+    processed = []
+    held = threading.Event()
+
+    def worker():
+        with mailbox.turn("k"):
+            held.set()
+            time.sleep(0.05)
+            processed.append("thread")
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    held.wait(timeout=2)
+
+    async def main():
+        async with mailbox.turn_async("k"):
+            processed.append("loop")
+
+    asyncio.run(main())
+    thread.join(timeout=2)
+    assert processed == ["thread", "loop"]
+    assert mailbox.stats()["contended"] == 1
@@ -0,0 +1,121 @@
+import importlib
+
+from chatbot.emergency_scorer import AMBIGUOUS, EMERGENCY, NOT_EMERGENCY, EmergencyScorer
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from chatbot.rules import ChatbotRules
+
+
+def _scorer():
+    return EmergencyScorer(
+        keywords=ChatbotRules.EXTRA_MENU_KEYWORDS["emergencia"],
+        outage_phrases=ChatbotRules.EMERGENCY_MENU_PHRASES,
+        normalize=ChatbotRules._normalize_menu_text,
+    )
+
+
+def _patch_nlu(monkeypatch, fake_mapear):
+    # Otros tests reemplazan el módulo en sys.modules: parchear el que va a importar rules
+    module = importlib.import_module("services.nlu_service")
+    monkeypatch.setattr(module.nlu_service, "mapear_intencion", fake_mapear, raising=False)
+
+
+def _midflow_conversation():
+    return ConversacionData(numero_telefono="+5491100000001", estado=EstadoConversacion.RECOLECTANDO_SECUENCIAL)
+
+
+def test_clear_messages_resolve_locally_and_ambiguous_ones_escalate():
+    scorer = _scorer()
+    clear_positive = ["hay olor a gas en el palier", "Me quedé encerrado en el ascensor", "hay humo en la escalera"]
+    clear_negative = ["12/03/2026", "Av. Corrientes 1234 piso 3", "3", "si", "42000", "no es urgente", "humedad en el baño"]
+    ambiguous = ["urgencia", "ES UNA EMERGENCIA!!", "sin agua", "necesito pagar urgente las expensas", "se rompió el caño y sale agua"]
+
+    assert [scorer.classify(m).decision for m in clear_positive] == [EMERGENCY] * len(clear_positive)
+    assert [scorer.classify(m).decision for m in clear_negative] == [NOT_EMERGENCY] * len(clear_negative)
+    assert [scorer.classify(m).decision for m in ambiguous] == [AMBIGUOUS] * len(ambiguous)
+
+    stats = scorer.stats()
+    assert stats["checked"] == 15
+    assert stats["escalated_to_llm"] == 5
+    assert stats["llm_call_rate"] == round(5 / 15, 4)
+
+
+# Reportados en review: keyword suelta, peligro negado, figurado o ya resuelto
+NOT_LOCAL_EMERGENCIES = [
+    "quiero pagar urgente",
+    "pasame el cbu urgente",
+    "necesito la factura urgente",
+    "no hay humo ni fuego",
+    "estoy inundado de trabajo, despues pago",
+    "ayer hubo un incendio, ya esta todo bien, quiero presupuesto",
+]
+
+
+def test_keywords_and_negated_or_figurative_hazards_are_not_local_emergencies():
+    scorer = _scorer()
+    assert [scorer.score(m).decision for m in NOT_LOCAL_EMERGENCIES[:5]] == [AMBIGUOUS] * 5
+    assert scorer.score("no hay humo ni fuego").reason == "negated_hazard:no hay humo"
+    # Fuera del menú ni siquiera un peligro explícito se resuelve localmente
+    assert [scorer.score(m, local_positives=False).decision for m in NOT_LOCAL_EMERGENCIES] == [AMBIGUOUS] * 6
+    assert scorer.score("hay olor a gas", local_positives=False).decision == AMBIGUOUS
+    assert scorer.score("Av. Corrientes 1234", local_positives=False).decision == NOT_EMERGENCY
+
+
+# Sin peligro explícito pero con vocabulario de fuego/salud: no se descartan localmente
+FIRE_AND_HEALTH_PHRASES = [
+    "huele a quemado en el pasillo",
+    "se quema algo en el 3B",
+    "salen llamas del medidor",
+    "un vecino se desmayó en el hall",
+]
+
+
+def test_fire_and_health_vocabulary_escalates_to_the_llm():
+    scorer = _scorer()
+    for mensaje in FIRE_AND_HEALTH_PHRASES:
+        assert scorer.classify(mensaje, local_positives=False).decision == AMBIGUOUS, mensaje
+        assert scorer.classify(mensaje).decision == AMBIGUOUS, mensaje
+
+
+def test_outside_the_menu_positives_go_to_the_llm(monkeypatch):
+    calls = []
+
+    def fake_mapear(mensaje):
+        calls.append(mensaje)
+        return None
+
+    _patch_nlu(monkeypatch, fake_mapear)
+    conversacion = _midflow_conversation()
+
+    assert [ChatbotRules._detect_emergency_intent(m, conversacion) for m in NOT_LOCAL_EMERGENCIES] == [False] * 6
+    assert calls == NOT_LOCAL_EMERGENCIES
+
+
+def test_detection_only_calls_the_llm_for_the_ambiguous_band(monkeypatch):
+    calls = []
+
+    def fake_mapear(mensaje):
+        calls.append(mensaje)
+        return TipoConsulta.EMERGENCIA if "caño" in mensaje or "gas" in mensaje else None
+
+    _patch_nlu(monkeypatch, fake_mapear)
+    conversacion = _midflow_conversation()
+    menu = ConversacionData(numero_telefono="+5491100000002", estado=EstadoConversacion.ESPERANDO_OPCION)
+
+    assert ChatbotRules._detect_emergency_intent("Av. Corrientes 1234", conversacion) is False
+    assert ChatbotRules._detect_emergency_intent("se rompió un caño en el palier", conversacion) is True
+    assert ChatbotRules._detect_emergency_intent("sin agua", conversacion) is False
+    assert ChatbotRules._detect_emergency_intent("hay olor a gas en el palier", conversacion) is True
+    assert calls == ["se rompió un caño en el palier", "sin agua", "hay olor a gas en el palier"]
+
+    # En el menú el peligro explícito se resuelve sin LLM
+    assert ChatbotRules._detect_emergency_intent("hay olor a gas en el palier", menu) is True
+    assert len(calls) == 3
+
+
+def test_scorer_can_be_disabled(monkeypatch):
+    calls = []
+    _patch_nlu(monkeypatch, lambda mensaje: calls.append(mensaje))
+    monkeypatch.setattr("chatbot.rules.EMERGENCY_LOCAL_SCORER_ENABLED", False)
+
+    assert ChatbotRules._detect_emergency_intent("Av. Corrientes 1234", _midflow_conversation()) is False
+    assert calls == ["Av. Corrientes 1234"]
@@ -175,6 +175,44 @@ def test_fuzzy_suggestions_require_exact_number_overlap():
         _restore_profile(previous_profile)
 
 
+def test_address_index_is_built_once_per_profile():
+    previous_profile = _set_profile()
+    try:
+        service = ExpensasSheetService()
+        index = service._get_address_index()
+        assert service._resolve_address_code("Lavalle 1284") == 14
+        assert service.get_canonical_address("30") == "Av. Santa Fe 2647"
+        assert service._get_address_index() is index
+    finally:
+        _restore_profile(previous_profile)
+
+
+def test_address_index_keeps_first_match_in_map_order():
+    service = ExpensasSheetService()
+    address_map = {
+        1: ["Paraguay 2957", "Avenida Santa Fe 100"],
+        2: ["Av. Santa Fe 100", "Drago 438"],
+        3: ["Luis María Drago 438"],
+        "TUTORIAL": "Sarmiento 1934",
+    }
+    canonical_map = {"2": "Av. Santa Fe 100", 3: "  "}
+    service._get_profile_maps = lambda: (address_map, canonical_map)
+
+    # Calle con y sin avenida y por tokens: gana la primera variante del mapa
+    assert service._resolve_address_code("Santa Fe 100") == 1
+    assert service._resolve_address_code("Luis María Drago 438") == 2
+    assert service._resolve_address_code("Sarmiento1934") == "TUTORIAL"
+    assert service._resolve_address_code("Paraguay 2958") is None
+    assert service.get_canonical_address(2) == "Av. Santa Fe 100"
+    assert service.get_canonical_address(3) is None
+    assert service.get_canonical_address(1) == "Paraguay 2957"
+
+    # Otro perfil (otros dicts) rearma el índice
+    address_map = {7: ["Paraguay 2957"]}
+    service._get_profile_maps = lambda: (address_map, {})
+    assert service._resolve_address_code("Paraguay 2957") == 7
+
+
 if __name__ == "__main__":
     test_av_santa_fe_maps_to_santa_fe_code()
     test_missing_av_prefix_still_maps()
@@ -184,4 +222,6 @@ if __name__ == "__main__":
     test_canonical_addresses_are_explicit()
     test_fuzzy_suggestions_use_only_canonical_addresses()
     test_fuzzy_suggestions_require_exact_number_overlap()
+    test_address_index_is_built_once_per_profile()
+    test_address_index_keeps_first_match_in_map_order()
     print("OK")
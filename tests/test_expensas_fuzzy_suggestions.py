@@ -0,0 +1,122 @@
+import os
+import random
+import sys
+from difflib import SequenceMatcher
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from services.expensas_sheet_service import ExpensasSheetService
+
+PROFILE_NAME = "administracion-artuso"
+
+# Casos de test_expensas_address_fuzzy.py y test_expensas_address_map.py, más variantes
+FUZZY_CASES = [
+    "Peorn 1875",
+    "Peron 1877",
+    "Peron 1875",
+    "Guemes3972",
+    "Gueemes 3972",
+    "Peron 1621",
+    "Uruguay 361",
+    "Uruguay 369",
+    "Uruguay 361/69",
+    "Urugay 361",
+    "Av. Sta Fe 2647, CABA",
+    "Santa Fe 2638",
+    "Parguay 2957",
+    "Paraguay 29",
+    "Lavale 1282",
+    "Cordoba 785",
+    "sin numero",
+    "",
+]
+
+
+def _legacy_suggestions(service, direccion, canonical_map):
+    # Referencia: recorrido par a par anterior al índice
+    if not direccion or not canonical_map:
+        return []
+    input_clean = service._strip_localidad_tokens(direccion)
+    input_street_raw, input_numbers = service._extract_numbers_from_raw(input_clean)
+    if not input_numbers:
+        return []
+    input_street_norm = service._strip_avenida_prefix(service._normalize_address_text(input_street_raw))
+    if not input_street_norm:
+        return []
+
+    matches = []
+    for canonical in canonical_map.values():
+        canonical_text = str(canonical).strip()
+        if not canonical_text:
+            continue
+        candidate_street_raw, candidate_numbers = service._extract_numbers_from_raw(
+            service._strip_localidad_tokens(canonical_text)
+        )
+        if not candidate_numbers or not any(number in candidate_numbers for number in input_numbers):
+            continue
+        candidate_street_norm = service._strip_avenida_prefix(
+            service._normalize_address_text(candidate_street_raw)
+        )
+        if not candidate_street_norm:
+            continue
+
+        input_tokens = [token for token in service._street_token_set(input_street_norm) if token]
+        candidate_tokens = [token for token in service._street_token_set(candidate_street_norm) if token]
+        token_score = sum(
+            max(SequenceMatcher(None, a, b).ratio() for b in candidate_tokens) for a in input_tokens
+        ) / len(input_tokens)
+        full_score = SequenceMatcher(None, "".join(input_tokens), "".join(candidate_tokens)).ratio()
+        similarity = max(token_score, full_score)
+        if similarity >= service._FUZZY_STREET_THRESHOLD:
+            matches.append((similarity, canonical_text))
+
+    matches.sort(key=lambda item: (-item[0], item[1]))
+    unique_matches = []
+    for score, canonical in matches:
+        if canonical not in [text for _, text in unique_matches]:
+            unique_matches.append((score, canonical))
+    if len(unique_matches) > 2:
+        return []
+    if len(unique_matches) == 2 and (unique_matches[0][0] - unique_matches[1][0]) > service._FUZZY_SECONDARY_DELTA:
+        return [unique_matches[0][1]]
+    return [canonical for _, canonical in unique_matches]
+
+
+def test_fuzzy_suggestions_match_pairwise_reference_on_profile():
+    previous_profile = os.environ.get("COMPANY_PROFILE")
+    os.environ["COMPANY_PROFILE"] = PROFILE_NAME
+    try:
+        service = ExpensasSheetService()
+        _, canonical_map = service._get_profile_maps()
+        for direccion in FUZZY_CASES:
+            assert service.get_fuzzy_address_suggestions(direccion) == _legacy_suggestions(
+                service, direccion, canonical_map
+            ), direccion
+        assert service.get_fuzzy_address_suggestions("Peorn 1875") == ["Tte. Gral. Juan Domingo Perón 1875"]
+    finally:
+        if previous_profile is None:
+            os.environ.pop("COMPANY_PROFILE", None)
+        else:
+            os.environ["COMPANY_PROFILE"] = previous_profile
+
+
+def test_fuzzy_suggestions_match_pairwise_reference_on_large_map():
+    rng = random.Random(3)
+    streets = ["Paraguay", "Paraná", "Parera", "Santa Fe", "Sarmiento", "Perón", "Pringles", "Uruguay"]
+    canonical_map = {}
+    for code in range(1, 601):
+        # Pocos números distintos: muchos edificios comparten número y calles parecidas
+        canonical_map[code] = f"{rng.choice(['', 'Av. '])}{rng.choice(streets)} {rng.randrange(100, 160)}"
+    canonical_map[601] = "Paraguay 120/24"
+    canonical_map[602] = ""
+    service = ExpensasSheetService()
+    service._get_profile_maps = lambda: ({}, canonical_map)
+
+    queries = ["Paraguai 122", "Parana 130", "Sarmiento 999", "Uruguya 101", "Santa Fee 150"]
+    queries += [f"{rng.choice(streets)[:-1]} {rng.randrange(100, 160)}" for _ in range(40)]
+    for direccion in queries:
+        assert service.get_fuzzy_address_suggestions(direccion) == _legacy_suggestions(
+            service, direccion, canonical_map
+        ), direccion
@@ -119,3 +119,23 @@ def test_survey_invalid_attempts_abort(monkeypatch):
     assert captured["row"][4] == "N/A"
     assert conv.survey_accepted is None
     assert conv.datos_temporales.get("survey_aborted_invalids") is True
+
+
+def test_agent_commands_accept_compact_conversations(monkeypatch):
+    # En modo compacto `estado` es un str internado, no el enum
+    from chatbot.compact_conversation import CompactConversation
+
+    waiting = "+5491344444444"
+    in_handoff = "+5491355555555"
+    conversation_manager.conversaciones[waiting] = CompactConversation(waiting, EstadoConversacion.ESPERANDO_OPCION)
+    active = CompactConversation(in_handoff, EstadoConversacion.ATENDIDO_POR_HUMANO)
+    active.nombre_usuario = "Cliente Compacto"
+    conversation_manager.conversaciones[in_handoff] = active
+    conversation_manager.handoff_queue.append(in_handoff)
+    conversation_manager.active_handoff = in_handoff
+    conversation_manager.add_message_to_history(in_handoff, "client", "hola")
+
+    assert "no está en handoff" in agent_command_service.execute_historial_command("+5491000000000", waiting)
+    assert "hola" in agent_command_service.execute_historial_command("+5491000000000", in_handoff)
+    assert "Error" not in agent_command_service.execute_active_command("+5491000000000")
+    assert "Error" not in agent_command_service.execute_queue_command("+5491000000000")
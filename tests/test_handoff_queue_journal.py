@@ -0,0 +1,154 @@
+from datetime import datetime
+
+from chatbot.handoff_queue import HandoffQueue
+from chatbot.models import EstadoConversacion
+from chatbot.states import ConversationManager
+from services.handoff_queue_store import FileHandoffQueueStore, FirestoreHandoffQueueStore
+
+
+class FakeSessionService:
+    def load_for_key(self, conversation_key):
+        return None
+
+    def save_for_key(self, conversation_key, conversation, **kwargs):
+        pass
+
+    def delete_for_key(self, conversation_key):
+        pass
+
+    @staticmethod
+    def is_resumable_state(state):
+        return False
+
+    @staticmethod
+    def is_expired(expires_at):
+        return False
+
+
+class FakeArrayUnion:
+    def __init__(self, values):
+        self.values = values
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeDocument:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self):
+        self.client.reads += 1
+        return FakeSnapshot(self.client.data)
+
+    def set(self, data, merge=False):
+        if not merge or self.client.data is None:
+            self.client.data = {}
+        for key, value in data.items():
+            if isinstance(value, FakeArrayUnion):
+                self.client.data[key] = list(self.client.data.get(key) or []) + value.values
+            else:
+                self.client.data[key] = value
+
+
+class FakeCollection:
+    def __init__(self, client):
+        self.client = client
+
+    def document(self, doc_id):
+        return FakeDocument(self.client)
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self.data = None
+        self.reads = 0
+
+    def collection(self, name):
+        return FakeCollection(self)
+
+
+def _start_handoff(manager, phone, name):
+    conversacion = manager.get_conversacion(phone)
+    conversacion.estado = EstadoConversacion.ATENDIDO_POR_HUMANO
+    conversacion.atendido_por_humano = True
+    conversacion.nombre_usuario = name
+    conversacion.handoff_started_at = datetime(2026, 3, 1, 12, 0)
+    return manager.add_to_handoff_queue(phone)
+
+
+def test_queue_operations_match_list_semantics():
+    queue = HandoffQueue(["a", "b", "c", "d"])
+
+    assert queue.append("b") is False
+    queue.remove("b")
+    assert queue.rotate("a") is True
+    assert queue == ["c", "d", "a"]
+    assert queue.index("a") == 2
+    assert queue.position("c") == 1
+    assert queue.position("b") is None
+    assert queue[1] == "d" and queue[-1] == "a"
+    try:
+        queue.remove("zz")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("remove de un número ausente debe fallar como list.remove")
+
+    # Muchas rotaciones fuerzan la renumeración interna sin perder el orden
+    for _ in range(300):
+        queue.rotate(queue.first())
+    assert queue == ["c", "d", "a"]
+
+
+def test_file_journal_restores_queue_active_and_metadata(tmp_path):
+    path = str(tmp_path / "handoff_queue.jsonl")
+    manager = ConversationManager(session_service=FakeSessionService(), handoff_store=FileHandoffQueueStore(path))
+    _start_handoff(manager, "+5491100000001", "Ana")
+    _start_handoff(manager, "+5491100000002", "Beto")
+    _start_handoff(manager, "+5491100000003", "Caro")
+    manager.move_to_next_in_queue()
+    manager.remove_from_handoff_queue("+5491100000003")
+
+    restarted = ConversationManager(session_service=FakeSessionService(), handoff_store=FileHandoffQueueStore(path))
+
+    assert restarted.handoff_queue == ["+5491100000002", "+5491100000001"]
+    assert restarted.get_active_handoff() == "+5491100000002"
+    restored = restarted.conversaciones["+5491100000001"]
+    assert restored.nombre_usuario == "Ana"
+    assert restored.atendido_por_humano is True
+    assert restored.handoff_started_at == datetime(2026, 3, 1, 12, 0)
+    assert restarted.get_queue_position("+5491100000001") == 2
+
+
+def test_firestore_journal_compacts_and_restores_in_one_read(monkeypatch):
+    monkeypatch.setattr("services.handoff_queue_store.firestore", type("fs", (), {"ArrayUnion": FakeArrayUnion}))
+    client = FakeFirestoreClient()
+    manager = ConversationManager(
+        session_service=FakeSessionService(),
+        handoff_store=FirestoreHandoffQueueStore(client=client),
+    )
+    manager.handoff_journal.compact_every = 4
+    for index in range(1, 4):
+        _start_handoff(manager, f"+54911000000{index:02d}", f"Cliente {index}")
+    manager.close_active_handoff()
+
+    assert manager.handoff_journal.stats()["compactions"] >= 1
+    assert len(client.data["ops"]) < manager.handoff_journal.stats()["seq"]
+
+    client.reads = 0
+    restarted = ConversationManager(
+        session_service=FakeSessionService(),
+        handoff_store=FirestoreHandoffQueueStore(client=client),
+    )
+
+    assert client.reads == 1
+    assert restarted.handoff_queue == ["+5491100000002", "+5491100000003"]
+    assert restarted.get_active_handoff() == "+5491100000002"
+    assert restarted.handoff_queue_stats()["journal"]["store"] == "FirestoreHandoffQueueStore"
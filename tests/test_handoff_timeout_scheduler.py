@@ -0,0 +1,209 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.models import ConversacionData, EstadoConversacion
+from chatbot.states import ConversationManager
+from services.handoff_timeout_scheduler import (
+    REASON_INACTIVITY,
+    REASON_SURVEY_OFFER,
+    HandoffTimeoutScheduler,
+)
+
+
+class FakeSessionService:
+    def load_for_key(self, conversation_key):
+        return None
+
+    def save_for_key(self, conversation_key, conversation, **kwargs):
+        pass
+
+    def delete_for_key(self, conversation_key):
+        pass
+
+    @staticmethod
+    def is_resumable_state(state):
+        return False
+
+    @staticmethod
+    def is_expired(expires_at):
+        return False
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+T0 = datetime(2026, 3, 1, 12, 0)
+
+
+def _handoff_conversation(phone, last_message_at):
+    return ConversacionData(
+        numero_telefono=phone,
+        estado=EstadoConversacion.ATENDIDO_POR_HUMANO,
+        atendido_por_humano=True,
+        handoff_started_at=T0,
+        last_client_message_at=last_message_at,
+    )
+
+
+def test_only_due_timers_fire_and_moved_deadlines_are_respected():
+    clock = FakeClock(T0)
+    conversations = {}
+    closed = []
+    scheduler = HandoffTimeoutScheduler(
+        lookup=conversations.get,
+        on_timeout=lambda conv, reason: closed.append((conv.numero_telefono, reason)),
+        inactivity_minutes=60,
+        clock=clock,
+    )
+    for index in range(200):
+        phone = f"+54911{index:08d}"
+        conversations[phone] = _handoff_conversation(phone, T0 + timedelta(minutes=index))
+        scheduler.refresh(conversations[phone])
+
+    # El cliente 0 vuelve a escribir: su timer se corre (la entrada vieja queda descartada)
+    conversations["+5491100000000"].last_client_message_at = T0 + timedelta(minutes=30)
+    scheduler.refresh(conversations["+5491100000000"])
+    # El cliente 1 escribe sin pasar por refresh: al vencer se reprograma en lugar de cerrarse
+    conversations["+5491100000001"].last_client_message_at = T0 + timedelta(minutes=45)
+
+    clock.now = T0 + timedelta(minutes=63, seconds=30)
+    assert scheduler.run_due() == 2
+    assert closed == [("+5491100000002", REASON_INACTIVITY), ("+5491100000003", REASON_INACTIVITY)]
+
+    stats = scheduler.stats()
+    assert stats["pending"] == 198
+    assert stats["fired"] == {REASON_INACTIVITY: 2}
+    assert stats["rescheduled_at_fire"] == 1
+    assert stats["lag_ms"]["max"] == 90_000.0
+
+    clock.now = T0 + timedelta(minutes=65, seconds=30)
+    assert scheduler.run_due() == 2
+    assert closed[2:] == [("+5491100000004", REASON_INACTIVITY), ("+5491100000005", REASON_INACTIVITY)]
+
+    # Minuto 105.5: vencen 6..45 más los clientes 0 (minuto 90) y 1 (minuto 105)
+    clock.now = T0 + timedelta(minutes=105, seconds=30)
+    assert scheduler.run_due() == 42
+    assert ("+5491100000000", REASON_INACTIVITY) in closed
+    assert ("+5491100000001", REASON_INACTIVITY) in closed
+
+
+def test_manager_hooks_schedule_and_cancel_handoff_timers():
+    manager = ConversationManager(session_service=FakeSessionService())
+    phone = "+5491100000001"
+    conversacion = manager.get_conversacion(phone)
+    conversacion.estado = EstadoConversacion.ATENDIDO_POR_HUMANO
+    conversacion.atendido_por_humano = True
+    conversacion.handoff_started_at = T0
+    manager.add_to_handoff_queue(phone)
+    assert manager.handoff_timeouts.next_deadline() == T0 + timedelta(minutes=manager.handoff_timeouts.inactivity_minutes)
+
+    # /done con encuesta: el timer pasa a ser el de la oferta (2 minutos)
+    conversacion.estado = EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA
+    conversacion.survey_offer_sent_at = T0 + timedelta(minutes=5)
+    conversacion.atendido_por_humano = False
+    manager.refresh_handoff_timeout(phone)
+    assert manager.handoff_timeouts.next_deadline() == T0 + timedelta(minutes=7)
+
+    closed = []
+    manager.handoff_timeouts.on_timeout = lambda conv, reason: closed.append(reason)
+    assert manager.handoff_timeouts.run_due(T0 + timedelta(minutes=8)) == 1
+    assert closed == [REASON_SURVEY_OFFER]
+
+    manager.refresh_handoff_timeout(phone)
+    manager.finalizar_conversacion(phone)
+    assert manager.handoff_timeouts.stats()["pending"] == 0
+
+
+def test_timeout_waits_for_the_conversation_turn_and_rechecks_the_deadline():
+    manager = ConversationManager(session_service=FakeSessionService())
+    phone = "+5491100000001"
+    conversacion = manager.get_conversacion(phone)
+    conversacion.estado = EstadoConversacion.ATENDIDO_POR_HUMANO
+    conversacion.atendido_por_humano = True
+    conversacion.handoff_started_at = T0
+    manager.refresh_handoff_timeout(phone)
+    closed = []
+    manager.handoff_timeouts.on_timeout = lambda conv, reason: closed.append(reason)
+    fire_at = T0 + timedelta(minutes=manager.handoff_timeouts.inactivity_minutes + 1)
+
+    result = []
+    with manager.mailbox.turn(phone):
+        # Hay un mensaje del cliente en proceso: el cierre espera su turno
+        sweeper = threading.Thread(target=lambda: result.append(manager.handoff_timeouts.run_due(fire_at)))
+        sweeper.start()
+        sweeper.join(0.2)
+        assert sweeper.is_alive()
+        assert closed == []
+        # El mensaje corre el timer sin pasar por refresh
+        conversacion.last_client_message_at = fire_at
+    sweeper.join(2)
+
+    assert result == [0]
+    assert closed == []
+    stats = manager.handoff_timeouts.stats()
+    assert stats["rescheduled_at_fire"] == 1
+    assert stats["pending"] == 1
+
+
+def test_background_thread_fires_at_the_deadline():
+    fired = threading.Event()
+    conversations = {}
+    scheduler = HandoffTimeoutScheduler(
+        lookup=conversations.get,
+        on_timeout=lambda conv, reason: fired.set(),
+        inactivity_minutes=0,
+        max_sleep_seconds=5,
+    )
+    scheduler.start()
+    try:
+        conversation = _handoff_conversation("+5491100000001", datetime.utcnow() + timedelta(milliseconds=100))
+        conversations[conversation.numero_telefono] = conversation
+        scheduler.refresh(conversation)
+        assert fired.wait(3)
+        assert scheduler.stats()["fired_total"] == 1
+        assert scheduler.stats()["lag_ms"]["last"] < 2000
+    finally:
+        scheduler.stop()
+    assert scheduler.stats()["running"] is False
+
+
+def test_ttl_sweep_endpoint_stays_as_manual_trigger(monkeypatch):
+    monkeypatch.setenv("META_WA_ACCESS_TOKEN", "test_token_123")
+    monkeypatch.setenv("META_WA_PHONE_NUMBER_ID", "123456789")
+    monkeypatch.setenv("META_WA_APP_SECRET", "test_secret")
+    monkeypatch.setenv("META_WA_VERIFY_TOKEN", "test_verify_token")
+    monkeypatch.setenv("HANDOFF_WHATSAPP_NUMBER", "+5491135722871")
+    monkeypatch.setenv("AGENT_API_TOKEN", "agent-token")
+
+    import main
+
+    sent = []
+    monkeypatch.setattr(main, "send_message", lambda phone, text: sent.append(phone) or True)
+    phone = "+5491199999901"
+    stale = datetime.utcnow() - timedelta(minutes=main.HANDOFF_INACTIVITY_MINUTES + 5)
+    # Conversación que no pasó por los hooks (p. ej. cargada a mano): solo la ve el full_scan
+    main.conversation_manager.conversaciones[phone] = _handoff_conversation(phone, stale)
+    client = TestClient(main.app)
+
+    assert client.post("/handoff/ttl-sweep", data={"token": "wrong"}).status_code == 401
+    client.post("/handoff/ttl-sweep", data={"token": "agent-token"})
+    assert phone in main.conversation_manager.conversaciones
+    response = client.post("/handoff/ttl-sweep", data={"token": "agent-token", "full_scan": "true"})
+
+    assert response.json()["closed"] >= 1
+    assert phone in sent
+    assert phone not in main.conversation_manager.conversaciones
+    assert client.get("/stats").json()["handoff_timeouts"]["fired"][REASON_INACTIVITY] >= 1
@@ -0,0 +1,133 @@
+import time
+from copy import deepcopy
+
+from google.api_core.exceptions import AlreadyExists
+
+from services import conversation_session_service as session_module
+from services.inbound_dedupe_service import InboundDedupeCache
+
+
+class FakeDocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.doc_id = doc_id
+
+    def create(self, payload):
+        self._client.create_calls += 1
+        storage = self._client.collections.setdefault(self._collection, {})
+        if self.doc_id in storage:
+            raise AlreadyExists("exists")
+        storage[self.doc_id] = deepcopy(payload)
+
+
+class FakeCollectionReference:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, self._name, doc_id)
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, payload):
+        self._ops.append((reference, payload))
+
+    def commit(self):
+        self._client.batch_sizes.append(len(self._ops))
+        for reference, payload in self._ops:
+            self._client.collections.setdefault(reference._collection, {})[reference.doc_id] = deepcopy(payload)
+
+
+class FakeFirestoreClient:
+    def __init__(self, database=None):
+        self.collections = {}
+        self.create_calls = 0
+        self.batch_sizes = []
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _service(cache):
+    service = session_module.ConversationSessionService(dedupe_cache=cache)
+    service._fs_client = FakeFirestoreClient()
+    return service
+
+
+def test_local_tier_short_circuits_retries_without_firestore_round_trip():
+    service = _service(InboundDedupeCache(max_size=100, ttl_seconds=60, async_markers=False))
+
+    assert service.mark_message_processed("wamid.1") is False
+    assert service.mark_message_processed("wamid.1") is True
+    assert service.mark_message_processed("wamid.1") is True
+
+    assert service._fs_client.create_calls == 1
+    stats = service.dedupe_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_firestore_marker_still_catches_duplicates_from_other_instances():
+    shared_client = FakeFirestoreClient()
+    instance_a = session_module.ConversationSessionService(dedupe_cache=InboundDedupeCache(async_markers=False))
+    instance_b = session_module.ConversationSessionService(dedupe_cache=InboundDedupeCache(async_markers=False))
+    instance_a._fs_client = shared_client
+    instance_b._fs_client = shared_client
+
+    assert instance_a.mark_message_processed("wamid.cross") is False
+    assert instance_b.mark_message_processed("wamid.cross") is True
+
+
+def test_local_tier_is_bounded_by_size_and_ttl():
+    clock = FakeClock()
+    cache = InboundDedupeCache(max_size=2, ttl_seconds=10, async_markers=False, clock=clock)
+
+    assert cache.check_and_add("a") is False
+    assert cache.check_and_add("b") is False
+    assert cache.check_and_add("c") is False
+    assert cache.stats()["size"] == 2
+    assert cache.check_and_add("a") is False
+
+    clock.now += 11
+    assert cache.check_and_add("c") is False
+    assert cache.stats()["evictions"] >= 2
+
+
+def test_async_markers_are_written_in_batches():
+    cache = InboundDedupeCache(async_markers=True, batch_size=2, flush_seconds=3600)
+    service = _service(cache)
+
+    for index in range(5):
+        assert service.mark_message_processed(f"wamid.{index}") is False
+    assert service.mark_message_processed("wamid.0") is True
+    assert service._fs_client.create_calls == 0
+
+    cache.flush()
+    deadline = time.monotonic() + 2
+    while cache.stats()["markers_flushed"] < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    batch_sizes = service._fs_client.batch_sizes
+    assert sum(batch_sizes) == 5
+    assert max(batch_sizes) <= 2
+    assert set(service._fs_client.collections["processed-inbound-message-ids"]) == {
+        f"wamid.{index}" for index in range(5)
+    }
+    assert cache.stats()["markers_pending"] == 0
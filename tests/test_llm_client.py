@@ -0,0 +1,205 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from services.llm_client import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    LLMUnavailable,
+    ResilientLLMClient,
+    llm_budget,
+)
+from services.llm_response_cache import LLMResponseCache
+
+
+def _load_nlu_service_module():
+    # test_expensas_address_fuzzy reemplaza services.nlu_service en sys.modules por un stub
+    spec = importlib.util.spec_from_file_location(
+        "_nlu_service_under_test", os.path.join(REPO_ROOT, "services", "nlu_service.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.handler(len(self.calls), kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _fail(_n, _kwargs):
+    raise RuntimeError("upstream 500")
+
+
+def test_breaker_trips_on_errors_short_circuits_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, p95_ms=5000, cooldown_seconds=30, clock=clock)
+    llm = ResilientLLMClient(breaker=breaker)
+    failing = FakeClient(_fail)
+
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            llm.create(failing, model="m", messages=[])
+    assert breaker.state == STATE_OPEN
+
+    # Abierto: no se llama a la API
+    with pytest.raises(LLMUnavailable):
+        llm.create(failing, model="m", messages=[])
+    assert len(failing.calls) == 4
+
+    clock.now += 31
+    assert breaker.state == STATE_HALF_OPEN
+    healthy = FakeClient(lambda _n, _kwargs: "ok")
+    llm.create(healthy, model="m", messages=[])
+    assert breaker.state == STATE_CLOSED
+
+    stats = llm.stats()
+    assert stats["errors"] == 4
+    assert stats["short_circuited"] == 1
+    assert stats["breaker"]["trips"] == 1
+    assert stats["latency_ms"]["samples"] == 1
+
+
+def test_breaker_trips_on_p95_latency():
+    breaker = CircuitBreaker(window=10, min_calls=5, error_rate=0.9, p95_ms=100, cooldown_seconds=30)
+    for latency in (20, 30, 25, 40, 250):
+        breaker.record(True, latency)
+    assert breaker.state == STATE_OPEN
+    assert breaker.stats()["last_trip_reason"].startswith("p95_ms")
+
+
+def test_deadline_follows_caller_budget_and_limiter_sheds_load():
+    release = threading.Event()
+
+    def slow(n, _kwargs):
+        if n == 1:
+            release.wait(2)
+        return "ok"
+
+    llm = ResilientLLMClient(max_in_flight=1, timeout_seconds=8)
+    client = FakeClient(slow)
+    worker = threading.Thread(target=lambda: llm.create(client, model="m", messages=[]))
+    worker.start()
+    time.sleep(0.05)
+
+    # Sin cupo: espera como mucho su presupuesto y cae al fallback
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        llm.create(client, budget_seconds=0.1, model="m", messages=[])
+    assert time.monotonic() - started < 1
+    release.set()
+    worker.join()
+
+    with llm_budget(0.5):
+        llm.create(client, budget_seconds=3, model="m", messages=[])
+    assert client.calls[0]["timeout"] <= 8
+    assert client.calls[-1]["timeout"] <= 0.5
+    assert llm.stats()["saturated"] == 1
+
+
+def test_exhausted_budget_does_not_hold_the_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, error_rate=0.5, cooldown_seconds=30, clock=clock)
+    breaker.record(False, 10.0)
+    llm = ResilientLLMClient(breaker=breaker)
+    client = FakeClient(lambda _n, _kwargs: "ok")
+
+    clock.now += 31
+    assert breaker.state == STATE_HALF_OPEN
+    # Turno sin presupuesto durante half_open: no consume la prueba
+    with llm_budget(0):
+        with pytest.raises(LLMUnavailable, match="no_budget"):
+            llm.create(client, model="m", messages=[])
+    assert breaker.state == STATE_HALF_OPEN
+
+    llm.create(client, model="m", messages=[])
+    assert breaker.state == STATE_CLOSED
+    assert llm.stats()["short_circuited"] == 0
+
+
+def test_limiter_saturation_does_not_trip_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=10, min_calls=2, error_rate=0.5, cooldown_seconds=30, clock=clock)
+    llm = ResilientLLMClient(max_in_flight=1, timeout_seconds=8, breaker=breaker)
+    release = threading.Event()
+    client = FakeClient(lambda n, _kwargs: "ok" if n > 1 or release.wait(2) else "ok")
+    worker = threading.Thread(target=lambda: llm.create(client, model="m", messages=[]))
+    worker.start()
+    time.sleep(0.05)
+
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable, match="saturated"):
+            llm.create(client, budget_seconds=0.05, model="m", messages=[])
+    assert breaker.state == STATE_CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+    # Half_open con el cupo todavía ocupado: la prueba sin cupo libera su lugar
+    breaker.record(False, 10.0)
+    breaker.record(False, 10.0)
+    clock.now += 31
+    with pytest.raises(LLMUnavailable, match="saturated"):
+        llm.create(client, budget_seconds=0.05, model="m", messages=[])
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow() is True
+    breaker.release()
+
+    release.set()
+    worker.join()
+    assert llm.stats()["saturated"] == 4
+
+
+def test_hedged_call_returns_the_first_answer():
+    def handler(n, _kwargs):
+        if n == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    llm = ResilientLLMClient(hedge_enabled=True, hedge_after_ms=50, max_in_flight=4)
+    response = llm.create(FakeClient(handler), hedge=True, model="m", messages=[])
+
+    assert response.choices[0].message.content == "fast"
+    assert llm.stats()["hedged"] == 1
+    assert llm.stats()["hedge_wins"] == 1
+
+
+def test_nlu_falls_back_without_calling_openai_when_breaker_is_open():
+    module = _load_nlu_service_module()
+    breaker = CircuitBreaker(min_calls=1, error_rate=0.5, cooldown_seconds=60)
+    breaker.record(False, 10.0)
+    service = module.NLUService(
+        response_cache=LLMResponseCache(enabled=False),
+        llm=ResilientLLMClient(breaker=breaker),
+    )
+    client = FakeClient(lambda _n, _kwargs: "PAGO_EXPENSAS")
+    service._client = client
+
+    assert service.mapear_intencion("quiero pagar") is None
+    assert service.extraer_datos_estructurados("pagué 45800 el 12/09/2025") == {}
+    assert client.calls == []
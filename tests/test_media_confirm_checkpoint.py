@@ -22,7 +22,7 @@ def _build_client(monkeypatch):
     import main
 
     monkeypatch.setattr(main.meta_whatsapp_service, "validate_webhook_signature", lambda *_: True)
-    monkeypatch.setattr(main.meta_whatsapp_service, "extract_status_data", lambda *_: None)
+    monkeypatch.setattr(main.meta_whatsapp_service, "extract_statuses", lambda *_: [])
     monkeypatch.setattr(main.whatsapp_handoff_service, "is_agent_message", lambda *_: False)
     monkeypatch.setattr(main.conversation_session_service, "mark_message_processed", lambda *_: False)
     monkeypatch.setattr(main, "_maybe_notify_handoff", lambda *_: None)
@@ -76,8 +76,8 @@ def test_media_confirmation_persists_before_prompt(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "media:test-media", "wamid.media.1", "Usuario Test", "image", ""),
+        "extract_messages",
+        lambda *_: [(phone, "media:test-media", "wamid.media.1", "Usuario Test", "image", "")],
     )
     monkeypatch.setattr(main.meta_whatsapp_service, "download_media", lambda *_: (b"img", "image/jpeg"))
 
@@ -115,8 +115,8 @@ def test_media_confirmation_prompt_is_blocked_when_save_fails(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "media:test-media", "wamid.media.2", "Usuario Test", "image", ""),
+        "extract_messages",
+        lambda *_: [(phone, "media:test-media", "wamid.media.2", "Usuario Test", "image", "")],
     )
     monkeypatch.setattr(main.meta_whatsapp_service, "download_media", lambda *_: (b"img", "image/jpeg"))
 
@@ -158,8 +158,8 @@ def test_confirmacion_interactiva_persists_before_prompt(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "Necesito ayuda", "wamid.text.1", "Usuario Test", "text", ""),
+        "extract_messages",
+        lambda *_: [(phone, "Necesito ayuda", "wamid.text.1", "Usuario Test", "text", "")],
     )
 
     def fake_process(*_args, **_kwargs):
@@ -196,8 +196,8 @@ def test_confirmacion_interactiva_is_blocked_when_save_fails(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "Necesito ayuda", "wamid.text.2", "Usuario Test", "text", ""),
+        "extract_messages",
+        lambda *_: [(phone, "Necesito ayuda", "wamid.text.2", "Usuario Test", "text", "")],
     )
 
     def fake_process(*_args, **_kwargs):
@@ -240,8 +240,8 @@ def test_final_save_runs_after_standard_resumable_response(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "Necesito ayuda", "wamid.text.3", "Usuario Test", "text", ""),
+        "extract_messages",
+        lambda *_: [(phone, "Necesito ayuda", "wamid.text.3", "Usuario Test", "text", "")],
     )
 
     def fake_process(*_args, **_kwargs):
@@ -276,8 +276,8 @@ def test_final_save_skips_non_resumable_state(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "Necesito ayuda", "wamid.text.4", "Usuario Test", "text", ""),
+        "extract_messages",
+        lambda *_: [(phone, "Necesito ayuda", "wamid.text.4", "Usuario Test", "text", "")],
     )
 
     def fake_process(*_args, **_kwargs):
@@ -308,8 +308,8 @@ def test_final_save_failure_does_not_block_response(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "Necesito ayuda", "wamid.text.5", "Usuario Test", "text", ""),
+        "extract_messages",
+        lambda *_: [(phone, "Necesito ayuda", "wamid.text.5", "Usuario Test", "text", "")],
     )
 
     def fake_process(*_args, **_kwargs):
@@ -344,8 +344,8 @@ def test_final_save_runs_after_interactive_response(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "btn_confirmar", "wamid.interactive.1", "Usuario Test", "interactive", ""),
+        "extract_messages",
+        lambda *_: [(phone, "btn_confirmar", "wamid.interactive.1", "Usuario Test", "interactive", "")],
     )
 
     async def fake_handle(*_args, **_kwargs):
@@ -379,8 +379,8 @@ def test_media_flow_resumes_after_cold_start_and_button_reply(monkeypatch):
 
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "media:test-media", "wamid.media.resume", "Usuario Test", "image", ""),
+        "extract_messages",
+        lambda *_: [(phone, "media:test-media", "wamid.media.resume", "Usuario Test", "image", "")],
     )
     monkeypatch.setattr(main.meta_whatsapp_service, "download_media", lambda *_: (b"img", "image/jpeg"))
 
@@ -400,8 +400,8 @@ def test_media_flow_resumes_after_cold_start_and_button_reply(monkeypatch):
     main.conversation_manager.conversaciones.clear()
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "media_expensas_si", "wamid.media.resume.2", "Usuario Test", "interactive", ""),
+        "extract_messages",
+        lambda *_: [(phone, "media_expensas_si", "wamid.media.resume.2", "Usuario Test", "interactive", "")],
     )
 
     second_response = _post_payload(client)
@@ -436,8 +436,8 @@ def test_correction_flow_resumes_after_cold_start(monkeypatch):
     main.conversation_manager.conversaciones.clear()
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "fecha_hoy", "wamid.correction.1", "Usuario Test", "interactive", ""),
+        "extract_messages",
+        lambda *_: [(phone, "fecha_hoy", "wamid.correction.1", "Usuario Test", "interactive", "")],
     )
     monkeypatch.setattr(
         main,
@@ -478,8 +478,8 @@ def test_final_confirmation_survives_cold_start(monkeypatch):
     main.conversation_manager.conversaciones.clear()
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: (phone, "si", "wamid.confirm.1", "Usuario Test", "interactive", ""),
+        "extract_messages",
+        lambda *_: [(phone, "si", "wamid.confirm.1", "Usuario Test", "interactive", "")],
     )
     monkeypatch.setattr(
         main,
@@ -0,0 +1,93 @@
+import re
+
+from chatbot.message_matcher import (
+    COMUNICARME,
+    CONTACT_ADJACENCY,
+    CONTACT_CHANNEL,
+    CONTACT_EXCLUSION,
+    DETECTORS,
+    EMERGENCY_PHRASE,
+    GRATITUDE,
+    HUMAN_INTENT,
+    HUMAN_NEGATION,
+    VOLVER_MENU,
+    MessageMatcher,
+    message_matcher,
+    scan_message,
+)
+from chatbot.normalized_message import NormalizedMessage
+from chatbot.rules import ChatbotRules
+
+
+def _brute_force(message):
+    # Referencia: cada patrón por separado sobre su vista
+    scan = message_matcher.scan(message)
+    hits = set()
+    for detector, (view, patterns) in DETECTORS.items():
+        text = getattr(scan.message, view)
+        if any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns):
+            hits.add(detector)
+    return hits
+
+
+def test_single_scan_reports_every_detector_hit_including_overlaps():
+    # "mail de contacto": canal y adyacencia arrancan en la misma posición
+    scan = message_matcher.scan("Me pasás el MAIL de contacto? necesito comunicarme")
+    assert {CONTACT_CHANNEL, CONTACT_ADJACENCY, COMUNICARME} <= scan.hits
+    assert HUMAN_INTENT not in scan
+
+    scan = message_matcher.scan("No quiero hablar con un humano, volvé al menú")
+    assert {HUMAN_NEGATION, HUMAN_INTENT, VOLVER_MENU} <= scan.hits
+    assert scan.pattern(HUMAN_INTENT) == r"\bquiero\s+hablar\b"
+
+    scan = message_matcher.scan("Nro de cuenta 1234, graciasss!!")
+    assert {CONTACT_EXCLUSION, GRATITUDE} <= scan.hits
+
+    # Vista de menú: alargamientos colapsados antes de buscar las frases
+    assert EMERGENCY_PHRASE in message_matcher.scan("sin aguaaa desde ayer")
+
+
+def test_prefilter_matches_brute_force():
+    messages = [
+        "12/03/2026",
+        "Av. Corrientes 1234 piso 3",
+        "bueno me entendés?",
+        "HABLAR CON HUMANO",
+        "tel: 4444-5555 o wsp",
+        "n° de contacto",
+        "#contacto por favor",
+        "llamame al celu",
+        "hotel telefonico",
+        "ninguna de las anteriores",
+        "corte de gas",
+        "thank you!",
+        "",
+    ]
+    for message in messages:
+        assert message_matcher.scan(message).hits == _brute_force(message), message
+
+
+def test_detectors_share_one_scan_per_message(monkeypatch):
+    scans = []
+    original = message_matcher.scan
+
+    def counting_scan(message):
+        scans.append(message)
+        return original(message)
+
+    monkeypatch.setattr(message_matcher, "scan", counting_scan)
+    mensaje = NormalizedMessage("gracias, ya volví al menu")
+    assert ChatbotRules._detectar_volver_menu(mensaje) is True
+    assert ChatbotRules.es_mensaje_agradecimiento(mensaje) is True
+    ChatbotRules._match_menu_option(mensaje)
+    assert scan_message(mensaje) is mensaje.scan
+    assert scans == [mensaje]
+
+
+def test_patterns_need_a_literal_prefix():
+    try:
+        MessageMatcher({"x": ("text", [r"(?:a|b)c"])})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("un patrón sin prefijo literal no se puede anclar")
@@ -0,0 +1,112 @@
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.models import TipoConsulta
+from services.llm_response_cache import LLMResponseCache
+
+
+def _load_nlu_service_module():
+    # test_expensas_address_fuzzy reemplaza services.nlu_service en sys.modules por un stub
+    spec = importlib.util.spec_from_file_location(
+        "_nlu_service_under_test", os.path.join(REPO_ROOT, "services", "nlu_service.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+NLUService = _load_nlu_service_module().NLUService
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCompletions:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.reply(kwargs) if callable(self.reply) else self.reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _service(reply, cache):
+    service = NLUService(response_cache=cache)
+    completions = FakeCompletions(reply)
+    service._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    service._model = "gpt-test"
+    return service, completions
+
+
+def test_intent_cache_uses_normalized_input_and_reports_per_method():
+    cache = LLMResponseCache(enabled=True, path="", clock=FakeClock())
+    service, completions = _service("PAGO_EXPENSAS", cache)
+
+    assert service.mapear_intencion("Expensas") == TipoConsulta.PAGO_EXPENSAS
+    assert service.mapear_intencion("  expensas!! ") == TipoConsulta.PAGO_EXPENSAS
+    assert service.mapear_intencion("EXPENSAS") == TipoConsulta.PAGO_EXPENSAS
+    assert len(completions.calls) == 1
+
+    # Otro modelo: otra clave
+    service._model = "gpt-other"
+    service.mapear_intencion("expensas")
+    assert len(completions.calls) == 2
+
+    stats = cache.stats()["methods"]["mapear_intencion"]
+    assert stats["lookups"] == 4
+    assert stats["hits"] == 2
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_ms"] >= 0.0
+
+
+def test_extraction_keeps_case_and_failed_calls_are_not_cached():
+    cache = LLMResponseCache(enabled=True, path="", clock=FakeClock())
+    service, completions = _service(
+        lambda kwargs: '{"direccion_altura": "Paraguay 2957", "piso": "7", "depto": "D"}',
+        cache,
+    )
+    assert service.extraer_direccion_unidad("Paraguay 2957  7D")["direccion_altura"] == "Paraguay 2957"
+    assert service.extraer_direccion_unidad("Paraguay 2957 7D")["depto"] == "D"
+    assert len(completions.calls) == 1
+    # La extracción repite el texto: distinta capitalización es otra entrada
+    service.extraer_direccion_unidad("paraguay 2957 7d")
+    assert len(completions.calls) == 2
+
+    empty_service, empty_calls = _service("", cache)
+    assert empty_service.extraer_datos_estructurados("hola") == {}
+    assert empty_service.extraer_datos_estructurados("hola") == {}
+    assert len(empty_calls.calls) == 2
+
+
+def test_disk_tier_survives_restart_and_ttl_expires(tmp_path):
+    path = str(tmp_path / "nlu_cache.sqlite3")
+    clock = FakeClock()
+    first = LLMResponseCache(enabled=True, path=path, ttl_seconds=60, clock=clock)
+    service, completions = _service('{"valido": true, "sugerencia": "juan@mail.com"}', first)
+    assert service.validar_campo_individual("email", "juan@mail.com")["valido"] is True
+    first.close()
+
+    restarted = LLMResponseCache(enabled=True, path=path, ttl_seconds=60, clock=clock)
+    service, completions = _service("{}", restarted)
+    assert service.validar_campo_individual("email", "juan@mail.com")["sugerencia"] == "juan@mail.com"
+    assert completions.calls == []
+    assert restarted.stats()["methods"]["validar_campo_individual"]["disk_hits"] == 1
+
+    # Memoria y disco vencen con el mismo TTL
+    clock.now += 61
+    service.validar_campo_individual("email", "juan@mail.com")
+    assert len(completions.calls) == 1
+    restarted.close()
@@ -0,0 +1,103 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import chatbot.rules as rules_module
+from chatbot.models import EstadoConversacion, TipoConsulta
+from chatbot.rules import ChatbotRules
+from chatbot.states import conversation_manager
+from services.expensas_sheet_service import expensas_sheet_service
+from services.nlu_turn_memo import PERFIL_EXPENSAS_ED, PERFIL_INTENCION, nlu_turn_memo
+
+
+def _nlu(monkeypatch, **fakes):
+    # Otros tests reemplazan el módulo en sys.modules: parchear el que va a importar rules
+    service = importlib.import_module("services.nlu_service").nlu_service
+    for name, fake in fakes.items():
+        monkeypatch.setattr(service, name, fake, raising=False)
+
+
+def test_intent_is_computed_once_per_turn(monkeypatch):
+    calls = []
+
+    def fake_mapear(mensaje):
+        calls.append(mensaje)
+        return None
+
+    _nlu(monkeypatch, mapear_intencion=fake_mapear)
+    numero = "+5491188880001"
+    conversation_manager.reset_conversacion(numero)
+    conversation_manager.update_estado(numero, EstadoConversacion.ESPERANDO_OPCION)
+
+    # Ambiguo para el scorer: la detección de emergencia y la selección de opción necesitan NLU
+    ChatbotRules.procesar_mensaje(numero, "necesito ayuda con algo del edificio")
+    assert calls == ["necesito ayuda con algo del edificio"]
+
+    # Otro turno con el mismo texto vuelve a consultar
+    conversation_manager.update_estado(numero, EstadoConversacion.ESPERANDO_OPCION)
+    ChatbotRules.procesar_mensaje(numero, "necesito ayuda con algo del edificio")
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def no_address_map(monkeypatch):
+    # Otros tests dejan activo un perfil con mapa de direcciones ("Sarmiento 1922" → "Sarmiento 1920/22")
+    monkeypatch.setattr(expensas_sheet_service, "_get_profile_maps", lambda: ({}, {}))
+    monkeypatch.setattr(expensas_sheet_service, "_address_index", None)
+    monkeypatch.setattr(expensas_sheet_service.catalog, "current", lambda: None)
+
+
+def test_combined_call_serves_emergency_check_and_ed_fields(monkeypatch, no_address_map):
+    monkeypatch.setattr(rules_module, "NLU_TURN_COMBINED_ENABLED", True)
+    monkeypatch.setattr(rules_module, "EMERGENCY_LOCAL_SCORER_ENABLED", False)
+    calls = []
+
+    def fake_analizar(mensaje, perfil):
+        calls.append(perfil)
+        return {
+            "intencion": None,
+            "campos": {
+                "direccion_altura": "Sarmiento 1922",
+                "piso_depto": "2A",
+                "comprobante_mencionado": False,
+                "comentario_extra": "",
+            },
+        }
+
+    def forbidden(*_args, **_kwargs):
+        raise AssertionError("con el análisis combinado no hay llamados separados")
+
+    _nlu(
+        monkeypatch,
+        analizar_turno=fake_analizar,
+        mapear_intencion=forbidden,
+        extraer_expensas_ed_combinado=forbidden,
+    )
+    numero = "messenger:test_turn_combined"
+    conversation_manager.reset_conversacion(numero)
+    conversation_manager.set_tipo_consulta(numero, TipoConsulta.PAGO_EXPENSAS)
+    conversation_manager.update_estado(numero, EstadoConversacion.RECOLECTANDO_SECUENCIAL)
+    conversation_manager.set_datos_temporales(numero, "fecha_pago", "12/02/2026")
+    conversation_manager.set_datos_temporales(numero, "monto", "45800")
+    conversacion = conversation_manager.get_conversacion(numero)
+    mensaje = "Calle Sarmiento 1922 2° A"
+
+    before = nlu_turn_memo.stats()["reused"]
+    with nlu_turn_memo.turn():
+        assert ChatbotRules._detect_emergency_intent(mensaje, conversacion) is False
+        ChatbotRules._procesar_campo_secuencial(numero, mensaje)
+
+    assert calls == [PERFIL_EXPENSAS_ED]
+    assert nlu_turn_memo.stats()["reused"] == before + 1
+    assert conversacion.datos_temporales.get("direccion") == "Sarmiento 1922"
+    assert conversacion.datos_temporales.get("piso_depto") == "2A"
+
+    # Fuera del paso de dirección solo se pide la intención
+    conversation_manager.update_estado(numero, EstadoConversacion.ESPERANDO_OPCION)
+    assert ChatbotRules._perfil_nlu_turno(mensaje, conversacion) == PERFIL_INTENCION
@@ -0,0 +1,62 @@
+import importlib
+import json
+import pickle
+
+from chatbot.models import EstadoConversacion
+from chatbot.normalized_message import NormalizedMessage
+from chatbot.rules import ChatbotRules, normalizar_texto
+from chatbot.states import conversation_manager
+
+
+def test_views_are_lazy_and_match_previous_normalizers():
+    mensaje = NormalizedMessage("  ¡Holaaa, Menú Principal!! Bs. As. 12 ")
+
+    assert "words" not in mensaje.__dict__
+    assert mensaje.accent_free == "¡holaaa, menu principal!! bs. as. 12"
+    assert mensaje.words == "holaaa menu principal bs as 12"
+    assert "words" in mensaje.__dict__
+    assert mensaje.tokens == ("holaaa", "menu", "principal", "bs", "as", "12")
+    assert mensaje.squeezed == "hola menu principal bs as 12"
+    assert mensaje.digits == ("1", "2")
+    assert mensaje.command == "holaaa, menu principal!! bs. as. 12"
+    assert mensaje.keyword == "¡HOLAAA, MENU PRINCIPAL!! BS. AS. 12"
+
+    assert normalizar_texto("Bs. As.") == "bsas"
+    assert ChatbotRules._normalize_greeting_command("¡Hola!") == "hola"
+    assert ChatbotRules._normalize_menu_text("Urgenciaaa!!") == "urgencia"
+
+
+def test_is_a_plain_string_when_stored():
+    mensaje = NormalizedMessage.of("Pagué 45.800")
+    assert NormalizedMessage.of(mensaje) is mensaje
+    assert mensaje == "Pagué 45.800"
+    assert mensaje.lower() == "pagué 45.800"
+    assert type(pickle.loads(pickle.dumps(mensaje))) is str
+    assert json.loads(json.dumps({"m": mensaje})) == {"m": "Pagué 45.800"}
+
+
+def test_procesar_mensaje_threads_one_instance_to_the_detectors(monkeypatch):
+    seen = []
+
+    def fake_humano(mensaje):
+        seen.append(mensaje)
+        return False
+
+    def fake_contacto(mensaje):
+        seen.append(mensaje)
+        return False
+
+    # Otros tests reemplazan el módulo en sys.modules: parchear el que va a importar rules
+    service = importlib.import_module("services.nlu_service").nlu_service
+    monkeypatch.setattr(service, "detectar_solicitud_humano", fake_humano, raising=False)
+    monkeypatch.setattr(service, "detectar_consulta_contacto", fake_contacto, raising=False)
+    monkeypatch.setattr(service, "mapear_intencion", lambda _mensaje: None, raising=False)
+
+    numero = "messenger:test_normalized_message"
+    conversation_manager.reset_conversacion(numero)
+    conversation_manager.update_estado(numero, EstadoConversacion.ESPERANDO_OPCION)
+    ChatbotRules.procesar_mensaje(numero, "necesito ayuda con algo del edificio")
+
+    assert len(seen) == 2
+    assert isinstance(seen[0], NormalizedMessage)
+    assert seen[0] is seen[1]
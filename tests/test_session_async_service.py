@@ -0,0 +1,182 @@
+import asyncio
+import time
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists
+
+from chatbot.mailbox import ConversationMailbox
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from chatbot.states import ConversationManager
+from services.conversation_session_service import (
+    AsyncConversationSessionService,
+    ConversationSessionService,
+)
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return deepcopy(self._data)
+
+
+class FakeAsyncDocumentReference:
+    def __init__(self, storage, doc_id):
+        self._storage = storage
+        self._doc_id = doc_id
+
+    async def set(self, payload):
+        self._storage[self._doc_id] = deepcopy(payload)
+
+    async def create(self, payload):
+        if self._doc_id in self._storage:
+            raise AlreadyExists("exists")
+        self._storage[self._doc_id] = deepcopy(payload)
+
+    async def get(self):
+        return FakeSnapshot(self._storage.get(self._doc_id))
+
+    async def delete(self):
+        self._storage.pop(self._doc_id, None)
+
+
+class FakeAsyncCollectionReference:
+    def __init__(self, storage, name):
+        self._storage = storage
+        self._name = name
+
+    def document(self, doc_id):
+        return FakeAsyncDocumentReference(self._storage.setdefault(self._name, {}), doc_id)
+
+
+class FakeAsyncFirestoreClient:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return FakeAsyncCollectionReference(self.collections, name)
+
+
+def _build_service():
+    client = FakeAsyncFirestoreClient()
+    return AsyncConversationSessionService(client_factory=lambda: client), client
+
+
+def test_async_mark_message_processed_detects_duplicates():
+    service, client = _build_service()
+
+    async def run():
+        first = await service.mark_message_processed("wamid.1")
+        second = await service.mark_message_processed("wamid.1")
+        return first, second
+
+    assert asyncio.run(run()) == (False, True)
+    assert "wamid.1" in client.collections["processed-inbound-message-ids"]
+
+
+def test_async_save_load_delete_round_trip():
+    service, client = _build_service()
+    conversation = ConversacionData(
+        numero_telefono="messenger:abc",
+        estado=EstadoConversacion.CONFIRMANDO,
+        tipo_consulta=TipoConsulta.PAGO_EXPENSAS,
+        datos_temporales={"monto": "100"},
+    )
+
+    async def run():
+        await service.save_for_key("messenger:abc", conversation)
+        loaded = await service.load_for_key("messenger:abc")
+        await service.delete_for_key("messenger:abc")
+        missing = await service.load_for_key("messenger:abc")
+        return loaded, missing
+
+    loaded, missing = asyncio.run(run())
+
+    assert loaded.doc_id == "messenger:abc"
+    assert loaded.conversation.numero_telefono == "messenger:abc"
+    assert loaded.conversation.datos_temporales == {"monto": "100"}
+    assert missing is None
+    assert client.collections["conversation-checkpoints"] == {}
+
+
+def test_manager_get_conversacion_async_hydrates_and_drops_expired():
+    service, client = _build_service()
+    sync_service = ConversationSessionService()
+    manager = ConversationManager(session_service=sync_service, async_session_service=service)
+    now = datetime.now(timezone.utc)
+    checkpoints = client.collections.setdefault("conversation-checkpoints", {})
+    checkpoints["whatsapp:+5491100000001"] = sync_service.serialize(
+        ConversacionData(
+            numero_telefono="+5491100000001",
+            estado=EstadoConversacion.RECOLECTANDO_SECUENCIAL,
+            tipo_consulta=TipoConsulta.SOLICITAR_SERVICIO,
+            datos_temporales={"tipo_servicio": "Plomería"},
+        ),
+        last_user_message_at=now,
+    )
+    checkpoints["whatsapp:+5491100000002"] = sync_service.serialize(
+        ConversacionData(
+            numero_telefono="+5491100000002",
+            estado=EstadoConversacion.RECOLECTANDO_SECUENCIAL,
+        ),
+        last_user_message_at=now - timedelta(hours=48),
+    )
+
+    async def run():
+        resumed = await manager.get_conversacion_async("+5491100000001")
+        fresh = await manager.get_conversacion_async("+5491100000002")
+        return resumed, fresh
+
+    resumed, fresh = asyncio.run(run())
+
+    assert resumed.estado == EstadoConversacion.RECOLECTANDO_SECUENCIAL
+    assert resumed.datos_temporales == {"tipo_servicio": "Plomería"}
+    assert manager.get_conversacion("+5491100000001") is resumed
+    assert fresh.estado == EstadoConversacion.INICIO
+    assert "whatsapp:+5491100000002" not in checkpoints
+
+
+def test_prefetch_finishing_out_of_order_does_not_stall_the_loop(monkeypatch):
+    monkeypatch.setenv("META_WA_ACCESS_TOKEN", "test_token_123")
+    monkeypatch.setenv("META_WA_PHONE_NUMBER_ID", "123456789")
+    monkeypatch.setenv("META_WA_APP_SECRET", "test_secret")
+    monkeypatch.setenv("META_WA_VERIFY_TOKEN", "test_verify_token")
+    monkeypatch.setenv("HANDOFF_WHATSAPP_NUMBER", "+5491135722871")
+    import main
+
+    mailbox = ConversationMailbox(stale_seconds=5)
+    monkeypatch.setattr(main.conversation_manager, "mailbox", mailbox)
+    prefetch_delay = {"wamid.A": 0.05, "wamid.B": 0}
+    handled = []
+
+    async def fake_prefetch(message_data):
+        await asyncio.sleep(prefetch_delay[message_data[2]])
+        return False
+
+    async def fake_handle(message_data, is_whatsapp, **_):
+        await asyncio.sleep(0.01)
+        handled.append(message_data[2])
+        return main.PlainTextResponse("", status_code=200)
+
+    monkeypatch.setattr(main, "_prefetch_session_async", fake_prefetch)
+    monkeypatch.setattr(main, "_handle_inbound_message", fake_handle)
+
+    async def run():
+        batches = []
+        for message_id in ("wamid.A", "wamid.B"):
+            message_data = ("+5491100000009", "hola", message_id, None, "text", None)
+            batches.append([(message_data, mailbox.reserve(message_data[0]))])
+        started = time.monotonic()
+        # Dos webhooks del mismo número en el loop: el prefetch de B termina primero
+        await asyncio.gather(
+            *(main._process_sender_messages(batch, True, use_async_session=True) for batch in batches)
+        )
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert handled == ["wamid.A", "wamid.B"]
+    assert elapsed < 1
+    assert mailbox.stats()["stale_dropped"] == 0
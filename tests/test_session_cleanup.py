@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 from copy import deepcopy
@@ -64,6 +65,20 @@ class FakeQuery:
         return matches
 
 
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._references = []
+
+    def delete(self, reference):
+        self._references.append(reference)
+
+    def commit(self):
+        self._client.batch_sizes.append(len(self._references))
+        for reference in self._references:
+            reference.delete()
+
+
 class FakeCollectionReference:
     def __init__(self, storage, name):
         self._storage = storage
@@ -84,11 +99,15 @@ class FakeFirestoreClient:
     def __init__(self, database):
         self.database = database
         self.collections = {}
+        self.batch_sizes = []
         FakeFirestoreClient.instances.append(self)
 
     def collection(self, name):
         return FakeCollectionReference(self.collections, name)
 
+    def batch(self):
+        return FakeWriteBatch(self)
+
 
 def _build_main(monkeypatch):
     monkeypatch.setenv("META_WA_ACCESS_TOKEN", "test_token_123")
@@ -141,17 +160,66 @@ def test_cleanup_service_deletes_only_expired_checkpoints(monkeypatch):
         last_user_message_at=now - timedelta(hours=30),
     )
 
-    deleted_doc_ids = service.cleanup_expired_checkpoints(now=now, limit=10)
+    result = service.cleanup_expired(now=now, batch_size=10)
 
-    assert deleted_doc_ids == [
-        "whatsapp:+5491111111111",
-        "whatsapp:+5491333333333",
-    ]
+    assert result["deleted"] == 2
+    assert result["collections"]["conversation-checkpoints"]["deleted"] == 2
+    assert result["budget_exhausted"] is False
     assert service.load("whatsapp", "+5491111111111") is None
     assert service.load("whatsapp", "+5491333333333") is None
     assert service.load("whatsapp", "+5491222222222") is not None
 
 
+def test_cleanup_pages_through_both_collections_in_batches(monkeypatch):
+    FakeFirestoreClient.instances.clear()
+    monkeypatch.setattr(
+        session_module,
+        "firestore",
+        SimpleNamespace(Client=FakeFirestoreClient),
+    )
+    service = session_module.ConversationSessionService()
+    now = datetime(2026, 3, 18, 15, 0, tzinfo=timezone.utc)
+    client = service._get_firestore_client()
+    checkpoints = client.collections.setdefault("conversation-checkpoints", {})
+    markers = client.collections.setdefault("processed-inbound-message-ids", {})
+    for index in range(7):
+        checkpoints[f"whatsapp:+54911{index:08d}"] = {"expires_at": now - timedelta(hours=1)}
+    checkpoints["whatsapp:+5491199999999"] = {"expires_at": now + timedelta(hours=1)}
+    for index in range(5):
+        markers[f"wamid.{index}"] = {"expires_at": now - timedelta(minutes=index + 1)}
+    markers["wamid.fresh"] = {"expires_at": now + timedelta(hours=1)}
+
+    result = service.cleanup_expired(now=now, batch_size=3)
+
+    assert result["collections"]["conversation-checkpoints"]["deleted"] == 7
+    assert result["collections"]["conversation-checkpoints"]["batches"] == 3
+    assert result["collections"]["processed-inbound-message-ids"]["deleted"] == 5
+    assert max(client.batch_sizes) == 3
+    assert list(checkpoints) == ["whatsapp:+5491199999999"]
+    assert list(markers) == ["wamid.fresh"]
+
+
+def test_cleanup_stops_when_time_budget_is_exhausted(monkeypatch):
+    FakeFirestoreClient.instances.clear()
+    monkeypatch.setattr(
+        session_module,
+        "firestore",
+        SimpleNamespace(Client=FakeFirestoreClient),
+    )
+    service = session_module.ConversationSessionService()
+    now = datetime(2026, 3, 18, 15, 0, tzinfo=timezone.utc)
+    client = service._get_firestore_client()
+    checkpoints = client.collections.setdefault("conversation-checkpoints", {})
+    for index in range(4):
+        checkpoints[f"whatsapp:+54911{index:08d}"] = {"expires_at": now - timedelta(hours=1)}
+
+    result = service.cleanup_expired(now=now, batch_size=2, time_budget_seconds=0)
+
+    assert result["budget_exhausted"] is True
+    assert result["deleted"] == 0
+    assert len(checkpoints) == 4
+
+
 def test_cleanup_endpoint_requires_valid_token(monkeypatch):
     main = _build_main(monkeypatch)
     client = TestClient(main.app)
@@ -165,14 +233,29 @@ def test_cleanup_endpoint_runs_bounded_batch(monkeypatch):
     main = _build_main(monkeypatch)
     captured = {}
 
-    def fake_cleanup_expired_checkpoints(*, limit):
-        captured["limit"] = limit
-        return ["whatsapp:+5491111111111", "whatsapp:+5491222222222"]
+    def fake_cleanup_expired(*, batch_size, time_budget_seconds):
+        captured["batch_size"] = batch_size
+        captured["time_budget_seconds"] = time_budget_seconds
+        # Corre en un hilo aparte, no en el loop del servidor
+        try:
+            asyncio.get_running_loop()
+            captured["on_loop"] = True
+        except RuntimeError:
+            pass
+        return {
+            "deleted": 3,
+            "collections": {
+                "conversation-checkpoints": {"deleted": 2, "batches": 1, "elapsed_ms": 1.0, "per_second": 2000.0},
+                "processed-inbound-message-ids": {"deleted": 1, "batches": 1, "elapsed_ms": 1.0, "per_second": 1000.0},
+            },
+            "elapsed_ms": 2.0,
+            "budget_exhausted": False,
+        }
 
     monkeypatch.setattr(
         main.conversation_session_service,
-        "cleanup_expired_checkpoints",
-        fake_cleanup_expired_checkpoints,
+        "cleanup_expired",
+        fake_cleanup_expired,
     )
 
     client = TestClient(main.app)
@@ -182,12 +265,9 @@ def test_cleanup_endpoint_runs_bounded_batch(monkeypatch):
     )
 
     assert response.status_code == 200
-    assert captured["limit"] == 2
-    assert response.json() == {
-        "deleted": 2,
-        "deleted_doc_ids": [
-            "whatsapp:+5491111111111",
-            "whatsapp:+5491222222222",
-        ],
-        "batch_limit": 2,
-    }
+    assert captured == {"batch_size": 2, "time_budget_seconds": 45.0}
+    body = response.json()
+    assert body["deleted"] == 3
+    assert body["collections"]["processed-inbound-message-ids"]["deleted"] == 1
+    assert body["batch_limit"] == 2
+    assert "deleted_doc_ids" not in body
@@ -96,7 +96,7 @@ def _build_main(monkeypatch):
     monkeypatch.setattr(main.whatsapp_handoff_service, "is_agent_message", lambda *_: False)
     monkeypatch.setattr(main, "_maybe_notify_handoff", lambda *_: None)
     monkeypatch.setattr(main, "_postprocess_enviando", lambda *_: None)
-    monkeypatch.setattr(main.meta_whatsapp_service, "extract_status_data", lambda *_: None)
+    monkeypatch.setattr(main.meta_whatsapp_service, "extract_statuses", lambda *_: [])
     monkeypatch.setattr(main.meta_whatsapp_service, "validate_webhook_signature", lambda *_: True)
     return main
 
@@ -198,8 +198,8 @@ def test_main_logs_deduped_inbound(monkeypatch, caplog):
     main = _build_main(monkeypatch)
     monkeypatch.setattr(
         main.meta_whatsapp_service,
-        "extract_message_data",
-        lambda *_: ("+5491198765432", "Necesito ayuda", "wamid.dup-1", "Usuario Test", "text", ""),
+        "extract_messages",
+        lambda *_: [("+5491198765432", "Necesito ayuda", "wamid.dup-1", "Usuario Test", "text", "")],
     )
     monkeypatch.setattr(main.conversation_session_service, "mark_message_processed", lambda *_: True)
 
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from chatbot.models import ConversacionData, EstadoConversacion, TipoConsulta
+from chatbot.states import ConversationManager
+from services.conversation_session_service import create_session_services
+from services.inbound_dedupe_service import InboundDedupeCache
+from services.sqlite_session_service import SQLiteConversationSessionService
+
+
+def _service(tmp_path):
+    return SQLiteConversationSessionService(
+        str(tmp_path / "sessions.db"),
+        dedupe_cache=InboundDedupeCache(async_markers=False),
+    )
+
+
+def _conversation(phone):
+    return ConversacionData(
+        numero_telefono=phone,
+        estado=EstadoConversacion.CONFIRMANDO,
+        tipo_consulta=TipoConsulta.PAGO_EXPENSAS,
+        datos_temporales={"monto": "42000", "comprobante": ["https://example.com/a.jpg"]},
+    )
+
+
+def test_save_load_delete_round_trip_in_wal_mode(tmp_path):
+    service = _service(tmp_path)
+    service.save_for_key("messenger:abc", _conversation("messenger:abc"))
+
+    checkpoint = service.load_for_key("messenger:abc")
+    assert checkpoint.doc_id == "messenger:abc"
+    assert checkpoint.conversation.numero_telefono == "messenger:abc"
+    assert checkpoint.conversation.datos_temporales["comprobante"] == ["https://example.com/a.jpg"]
+    assert checkpoint.expires_at == checkpoint.last_user_message_at + timedelta(hours=24)
+    assert service._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    service.delete_for_key("messenger:abc")
+    assert service.load_for_key("messenger:abc") is None
+
+
+def test_cleanup_uses_expires_at_index_and_purges_markers(tmp_path):
+    service = _service(tmp_path)
+    now = datetime.now(timezone.utc)
+    service.save_for_key("+5491100000001", _conversation("+5491100000001"), last_user_message_at=now - timedelta(hours=30))
+    service.save_for_key("+5491100000002", _conversation("+5491100000002"), last_user_message_at=now)
+    service.mark_message_processed("wamid.old", processed_at=now - timedelta(hours=30))
+
+    plan = service._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT doc_id FROM conversation_checkpoints WHERE expires_at <= ? ORDER BY expires_at LIMIT 10",
+        (now.timestamp(),),
+    ).fetchall()
+    assert any("idx_conversation_checkpoints_expires_at" in row[-1] for row in plan)
+
+    result = service.cleanup_expired(now=now)
+    assert result["collections"]["conversation-checkpoints"]["deleted"] == 1
+    assert result["collections"]["processed-inbound-message-ids"]["deleted"] == 1
+    assert service.load_for_key("+5491100000002") is not None
+    assert service._conn.execute("SELECT COUNT(*) FROM processed_inbound_message_ids").fetchone()[0] == 0
+
+
+def test_dedupe_markers_survive_restart_and_expire(tmp_path):
+    now = datetime.now(timezone.utc)
+    first = _service(tmp_path)
+    assert first.mark_message_processed("wamid.1", processed_at=now) is False
+    assert first.mark_message_processed("wamid.1", processed_at=now) is True
+    first.close()
+
+    # Nueva instancia (cache local vacío) sobre el mismo archivo
+    second = _service(tmp_path)
+    assert second.mark_message_processed("wamid.1", processed_at=now) is True
+    third = _service(tmp_path)
+    assert third.mark_message_processed("wamid.1", processed_at=now + timedelta(hours=25)) is False
+
+
+def test_backend_factory_wires_async_adapter_to_the_same_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "services.conversation_session_service.SESSION_SQLITE_PATH",
+        str(tmp_path / "factory.db"),
+    )
+    sync_service, async_service = create_session_services("sqlite")
+    manager = ConversationManager(session_service=sync_service, async_session_service=async_service)
+    conversation = _conversation("+5491100000003")
+    conversation.estado = EstadoConversacion.RECOLECTANDO_SECUENCIAL
+    sync_service.save_for_key("+5491100000003", conversation)
+
+    resumed = asyncio.run(manager.get_conversacion_async("+5491100000003"))
+
+    assert isinstance(sync_service, SQLiteConversationSessionService)
+    assert resumed.estado == EstadoConversacion.RECOLECTANDO_SECUENCIAL
+    assert asyncio.run(async_service.mark_message_processed("wamid.async")) is False
+    assert sync_service.mark_message_processed("wamid.async") is True
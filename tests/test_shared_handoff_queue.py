@@ -0,0 +1,139 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from chatbot.models import EstadoConversacion
+from chatbot.states import ConversationManager
+from services.shared_handoff_queue import HandoffLeaseBusy, InMemorySharedHandoffQueue, SharedHandoffQueue
+
+
+class FakeSessionService:
+    def load_for_key(self, conversation_key):
+        return None
+
+    def save_for_key(self, conversation_key, conversation, **kwargs):
+        pass
+
+    def delete_for_key(self, conversation_key):
+        pass
+
+    @staticmethod
+    def is_resumable_state(state):
+        return False
+
+    @staticmethod
+    def is_expired(expires_at):
+        return False
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _instance(backend, name):
+    manager = ConversationManager(session_service=FakeSessionService(), handoff_backend=backend)
+    manager.instance_id = name
+    return manager
+
+
+def _start_handoff(manager, phone, name):
+    conversacion = manager.get_conversacion(phone)
+    conversacion.estado = EstadoConversacion.ATENDIDO_POR_HUMANO
+    conversacion.atendido_por_humano = True
+    conversacion.nombre_usuario = name
+    conversacion.handoff_started_at = datetime.utcnow()
+    return manager.add_to_handoff_queue(phone)
+
+
+def test_agent_commands_see_the_same_queue_from_any_instance():
+    backend = InMemorySharedHandoffQueue()
+    instance_a = _instance(backend, "a")
+    instance_b = _instance(backend, "b")
+
+    assert _start_handoff(instance_a, "+5491100000001", "Ana") == 1
+    assert _start_handoff(instance_a, "+5491100000002", "Beto") == 2
+
+    # La instancia B nunca vio estas conversaciones: las arma con la metadata compartida
+    assert instance_b.get_active_handoff() == "+5491100000001"
+    assert instance_b.get_queue_size() == 2
+    status = instance_b.format_queue_status()
+    assert "Ana" in status and "Beto" in status
+    assert instance_b.get_conversacion("+5491100000001").nombre_usuario == "Ana"
+
+    assert instance_b.close_active_handoff(expected="+5491100000001") == "+5491100000002"
+    assert instance_a.get_active_handoff() == "+5491100000002"
+    assert instance_a.get_queue_position("+5491100000002") == 1
+    # Un /done repetido con el activo anterior no cierra al siguiente
+    assert instance_a.close_active_handoff(expected="+5491100000001") is None
+    assert instance_a.get_queue_size() == 1
+
+
+def test_concurrent_instances_enqueue_and_close_each_handoff_exactly_once():
+    backend = InMemorySharedHandoffQueue()
+    instances = [_instance(backend, f"instance-{index}") for index in range(4)]
+    phones = [f"+54911{index:08d}" for index in range(80)]
+
+    def enqueue(instance, offset):
+        # Cada número llega dos veces (reintentos del webhook en otra instancia)
+        for phone in phones[offset::4] + phones[(offset + 1) % 4::4]:
+            _start_handoff(instance, phone, phone[-4:])
+
+    threads = [threading.Thread(target=enqueue, args=(instance, index)) for index, instance in enumerate(instances)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert instances[0].get_queue_size() == len(phones)
+
+    def agent_loop(instance):
+        while instance.get_queue_size():
+            try:
+                with instance.handoff_command_lease():
+                    active = instance.get_active_handoff()
+                    if active:
+                        instance.close_active_handoff(expected=active)
+            except HandoffLeaseBusy:
+                continue
+
+    threads = [threading.Thread(target=agent_loop, args=(instance,)) for instance in instances]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    # Cada cierre finaliza la conversación en la instancia que lo ejecutó
+    closed = [phone for instance in instances for phone in instance.recently_finalized]
+    assert sorted(closed) == sorted(phones)
+    assert instances[3].get_active_handoff() is None
+
+
+def test_lease_blocks_other_instances_until_it_expires():
+    clock = FakeClock()
+    backend = InMemorySharedHandoffQueue(lease_seconds=15, clock=clock)
+    instance_a = _instance(backend, "a")
+    instance_b = _instance(backend, "b")
+    _start_handoff(instance_a, "+5491100000001", "Ana")
+    _start_handoff(instance_a, "+5491100000002", "Beto")
+
+    assert backend.acquire_lease("a") is True
+    assert instance_b.move_to_next_in_queue() is None
+    assert instance_b.close_active_handoff() is None
+    assert backend.stats()["lease_conflicts"] == 2
+
+    clock.now += 16
+    assert instance_b.move_to_next_in_queue() == "+5491100000002"
+    assert instance_a.get_handoff_by_index(2) == "+5491100000001"
+
+
+def test_backend_missing_a_primitive_fails_at_construction():
+    class WriteOnlyBackend(SharedHandoffQueue):
+        def _transact(self, mutate):
+            return mutate({})
+
+    with pytest.raises(TypeError):
+        WriteOnlyBackend()
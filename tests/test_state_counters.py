@@ -0,0 +1,114 @@
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from chatbot.models import EstadoConversacion
+from chatbot.states import ConversationManager
+
+
+class FakeSessionService:
+    def load_for_key(self, conversation_key):
+        return None
+
+    def save_for_key(self, conversation_key, conversation, **kwargs):
+        pass
+
+    def delete_for_key(self, conversation_key):
+        pass
+
+    @staticmethod
+    def is_resumable_state(state):
+        return False
+
+    @staticmethod
+    def is_expired(expires_at):
+        return False
+
+
+def _brute_force_counts(manager):
+    return dict(Counter(getattr(conv.estado, "value", conv.estado) for conv in manager.conversaciones.values()))
+
+
+def test_state_counters_follow_updates_removals_and_evictions():
+    manager = ConversationManager(session_service=FakeSessionService())
+    manager.conversaciones.max_size = 30
+    estados = [
+        EstadoConversacion.ESPERANDO_OPCION,
+        EstadoConversacion.RECOLECTANDO_SECUENCIAL,
+        EstadoConversacion.CONFIRMANDO,
+        EstadoConversacion.ATENDIDO_POR_HUMANO,
+    ]
+    for index in range(60):
+        phone = f"+54911{index:08d}"
+        manager.get_conversacion(phone)
+        manager.update_estado(phone, estados[index % len(estados)])
+        if index % 7 == 0:
+            manager.finalizar_conversacion(phone)
+        elif index % 11 == 0:
+            manager.reset_conversacion(phone)
+
+    # Cambio directo sobre la conversación (como hacen los servicios de encuesta) + hook
+    survey_phone = "+5491100000003"
+    manager.get_conversacion(survey_phone).estado = EstadoConversacion.ESPERANDO_RESPUESTA_ENCUESTA
+    manager.refresh_handoff_timeout(survey_phone)
+    # Los desalojos se guardan en background: esperar a que terminen
+    manager.conversaciones.flush()
+
+    assert len(manager.conversaciones) <= 30 + 15  # las de handoff quedan fijadas
+    assert manager.state_counts() == _brute_force_counts(manager)
+    assert manager.state_counts()["esperando_respuesta_encuesta"] == 1
+
+
+def test_queue_aggregates_track_size_oldest_and_mean_wait():
+    manager = ConversationManager(session_service=FakeSessionService())
+    now = datetime.utcnow()
+    for minutes_ago, phone in ((30, "+5491100000001"), (20, "+5491100000002"), (10, "+5491100000003")):
+        conversacion = manager.get_conversacion(phone)
+        conversacion.estado = EstadoConversacion.ATENDIDO_POR_HUMANO
+        conversacion.atendido_por_humano = True
+        conversacion.handoff_started_at = now - timedelta(minutes=minutes_ago)
+        manager.add_to_handoff_queue(phone)
+
+    # /next rota la cola pero el más antiguo sigue siendo el primero en llegar
+    manager.move_to_next_in_queue()
+    stats = manager.handoff_queue_stats()
+    assert stats["size"] == 3
+    assert 30 * 60 <= stats["oldest_wait_seconds"] < 31 * 60
+    assert stats["completed"] == 0
+
+    manager.remove_from_handoff_queue("+5491100000001")
+    manager.close_active_handoff()
+    stats = manager.handoff_queue_stats()
+    assert stats["size"] == 1
+    assert 10 * 60 <= stats["oldest_wait_seconds"] < 11 * 60
+    assert stats["completed"] == 2
+    assert 25 * 60 <= stats["mean_wait_seconds"] < 26 * 60
+    assert 30 * 60 <= stats["max_wait_seconds"] < 31 * 60
+
+    status = manager.format_queue_status()
+    assert "📊 Total: 1 conversación(es)" in status
+
+
+def test_stats_reports_counters_and_a_real_timestamp(monkeypatch):
+    monkeypatch.setenv("META_WA_ACCESS_TOKEN", "test_token_123")
+    monkeypatch.setenv("META_WA_PHONE_NUMBER_ID", "123456789")
+    monkeypatch.setenv("META_WA_APP_SECRET", "test_secret")
+    monkeypatch.setenv("META_WA_VERIFY_TOKEN", "test_verify_token")
+    monkeypatch.setenv("HANDOFF_WHATSAPP_NUMBER", "+5491135722871")
+
+    import main
+
+    before = datetime.now(timezone.utc)
+    body = TestClient(main.app).get("/stats").json()
+
+    assert datetime.fromisoformat(body["timestamp"]) >= before
+    assert body["conversaciones_por_estado"] == _brute_force_counts(main.conversation_manager)
+    assert sum(body["conversaciones_por_estado"].values()) == body["total_conversaciones_activas"]
+    assert "oldest_wait_seconds" in body["handoff_queue"]
@@ -0,0 +1,149 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+
+from fastapi.testclient import TestClient
+from chatbot.models import ConversacionData, EstadoConversacion
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from services.webhook_ingest_service import WebhookIngestService
+
+
+def _build_payload(message_id: str, text_body: str = "Necesito ayuda"):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "123456789",
+            "changes": [{
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {
+                        "display_phone_number": "5491135722871",
+                        "phone_number_id": "123456789",
+                    },
+                    "contacts": [{
+                        "profile": {"name": "Usuario Test"},
+                        "wa_id": "5491198765432",
+                    }],
+                    "messages": [{
+                        "from": "5491198765432",
+                        "id": message_id,
+                        "timestamp": "1234567890",
+                        "type": "text",
+                        "text": {"body": text_body},
+                    }],
+                },
+                "field": "messages",
+            }],
+        }],
+    }
+
+
+def _post_signed(client: TestClient, payload: dict, secret: bytes = b"test_secret"):
+    body = json.dumps(payload)
+    signature_hash = hmac.new(secret, body.encode("utf-8"), hashlib.sha256).hexdigest()
+    return client.post(
+        "/webhook/whatsapp",
+        data=body,
+        headers={
+            "X-Hub-Signature-256": f"sha256={signature_hash}",
+            "Content-Type": "application/json",
+        },
+    )
+
+
+def _setup_env(monkeypatch):
+    monkeypatch.setenv("META_WA_ACCESS_TOKEN", "test_token_123")
+    monkeypatch.setenv("META_WA_PHONE_NUMBER_ID", "123456789")
+    monkeypatch.setenv("META_WA_APP_SECRET", "test_secret")
+    monkeypatch.setenv("META_WA_VERIFY_TOKEN", "test_verify_token")
+    monkeypatch.setenv("HANDOFF_WHATSAPP_NUMBER", "+5491135722871")
+
+
+def test_ack_first_returns_before_processing_and_worker_completes(monkeypatch):
+    _setup_env(monkeypatch)
+    import main
+
+    # El servicio lee el entorno al importarse: fijarlo por si otro test lo importó antes
+    monkeypatch.setattr(main.meta_whatsapp_service, "app_secret", "test_secret")
+    monkeypatch.setattr(main.meta_whatsapp_service, "phone_number_id", "123456789")
+
+    phone = "+5491198765432"
+    release = threading.Event()
+    process_calls = []
+    sent_messages = []
+    fake_conversation = ConversacionData(numero_telefono=phone, estado=EstadoConversacion.INICIO)
+
+    def slow_process_message(numero_telefono, mensaje_usuario, profile_name=""):
+        release.wait(timeout=5)
+        process_calls.append((numero_telefono, mensaje_usuario))
+        return "respuesta async"
+
+    ingest = WebhookIngestService(pool_size=2, max_queue_size=10)
+    monkeypatch.setattr(main, "webhook_ingest_service", ingest)
+    monkeypatch.setattr(main, "WEBHOOK_ACK_FIRST_ENABLED", True)
+    monkeypatch.setattr(main.conversation_session_service, "mark_message_processed", lambda _: False)
+    monkeypatch.setattr(main.conversation_session_service, "save_for_key", lambda *a, **k: None)
+    monkeypatch.setattr(main.whatsapp_handoff_service, "is_agent_message", lambda _: False)
+    monkeypatch.setattr(main.conversation_manager, "get_conversacion", lambda _: fake_conversation)
+    monkeypatch.setattr(main.conversation_manager, "was_finalized_recently", lambda _: False)
+    monkeypatch.setattr(main.conversation_manager, "get_campo_siguiente", lambda _: None)
+    monkeypatch.setattr(main.conversation_manager, "clear_recently_finalized", lambda _: None)
+    monkeypatch.setattr(main, "_maybe_notify_handoff", lambda _: None)
+    monkeypatch.setattr(main, "_postprocess_enviando", lambda _: None)
+    monkeypatch.setattr(main.ChatbotRules, "es_mensaje_agradecimiento", lambda _: False)
+    monkeypatch.setattr(main.ChatbotRules, "procesar_mensaje", slow_process_message)
+    monkeypatch.setattr(main, "send_message", lambda user_id, message: sent_messages.append((user_id, message)) or True)
+
+    client = TestClient(main.app)
+    response = _post_signed(client, _build_payload("wamid.ack-1"))
+
+    assert response.status_code == 200
+    assert process_calls == []
+
+    release.set()
+    assert ingest.wait_idle(timeout=5)
+    assert process_calls == [(phone, "Necesito ayuda")]
+    assert sent_messages == [(phone, "respuesta async")]
+
+    stats = ingest.stats()
+    assert stats["enqueued"] == 1
+    assert stats["processed"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["wait_ms_max"] >= 0
+
+
+def test_ack_first_rejects_invalid_signature_without_enqueueing(monkeypatch):
+    _setup_env(monkeypatch)
+    import main
+
+    # El servicio lee el entorno al importarse: fijarlo por si otro test lo importó antes
+    monkeypatch.setattr(main.meta_whatsapp_service, "app_secret", "test_secret")
+    monkeypatch.setattr(main.meta_whatsapp_service, "phone_number_id", "123456789")
+
+    ingest = WebhookIngestService(pool_size=1, max_queue_size=10)
+    monkeypatch.setattr(main, "webhook_ingest_service", ingest)
+    monkeypatch.setattr(main, "WEBHOOK_ACK_FIRST_ENABLED", True)
+
+    client = TestClient(main.app)
+    response = _post_signed(client, _build_payload("wamid.bad-sig"), secret=b"wrong")
+
+    assert response.status_code == 403
+    assert ingest.stats()["enqueued"] == 0
+
+
+def test_submit_reports_full_queue_for_inline_fallback():
+    ingest = WebhookIngestService(pool_size=1, max_queue_size=1)
+
+    assert ingest.submit("a") is True
+    assert ingest.submit("b") is False
+
+    stats = ingest.stats()
+    assert stats["queue_depth"] == 1
+    assert stats["rejected"] == 1
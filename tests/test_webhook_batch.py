@@ -0,0 +1,180 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _setup_env(monkeypatch):
+    monkeypatch.setenv("META_WA_ACCESS_TOKEN", "test_token_123")
+    monkeypatch.setenv("META_WA_PHONE_NUMBER_ID", "123456789")
+    monkeypatch.setenv("META_WA_APP_SECRET", "test_secret")
+    monkeypatch.setenv("META_WA_VERIFY_TOKEN", "test_verify_token")
+    monkeypatch.setenv("HANDOFF_WHATSAPP_NUMBER", "+5491135722871")
+
+
+def _text_message(sender: str, message_id: str, body: str):
+    return {
+        "from": sender,
+        "id": message_id,
+        "timestamp": "1234567890",
+        "type": "text",
+        "text": {"body": body},
+    }
+
+
+def _change(messages=None, statuses=None, contacts=None, phone_number_id="123456789"):
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "5491135722871", "phone_number_id": phone_number_id},
+    }
+    if contacts is not None:
+        value["contacts"] = contacts
+    if messages is not None:
+        value["messages"] = messages
+    if statuses is not None:
+        value["statuses"] = statuses
+    return {"value": value, "field": "messages"}
+
+
+def _batched_payload():
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "id": "1",
+                "changes": [
+                    _change(
+                        messages=[
+                            _text_message("5491100000001", "wamid.a1", "hola"),
+                            _text_message("5491100000002", "wamid.b1", "buenas"),
+                        ],
+                        contacts=[
+                            {"profile": {"name": "Ana"}, "wa_id": "5491100000001"},
+                            {"profile": {"name": "Beto"}, "wa_id": "5491100000002"},
+                        ],
+                    ),
+                    _change(statuses=[
+                        {"id": "wamid.out1", "status": "delivered", "timestamp": "1", "recipient_id": "x"},
+                        {"id": "wamid.out2", "status": "read", "timestamp": "2", "recipient_id": "y"},
+                    ]),
+                ],
+            },
+            {
+                "id": "2",
+                "changes": [
+                    _change(messages=[_text_message("5491100000001", "wamid.a2", "segundo")]),
+                    _change(
+                        messages=[_text_message("5491100000003", "wamid.other", "ignorado")],
+                        phone_number_id="999",
+                    ),
+                ],
+            },
+        ],
+    }
+
+
+def test_whatsapp_extract_messages_and_statuses_cover_whole_batch(monkeypatch):
+    _setup_env(monkeypatch)
+    from services.meta_whatsapp_service import MetaWhatsAppService
+
+    service = MetaWhatsAppService()
+    payload = _batched_payload()
+
+    messages = service.extract_messages(payload)
+    assert [(m[0], m[1], m[2], m[3]) for m in messages] == [
+        ("+5491100000001", "hola", "wamid.a1", "Ana"),
+        ("+5491100000002", "buenas", "wamid.b1", "Beto"),
+        ("+5491100000001", "segundo", "wamid.a2", ""),
+    ]
+    assert service.extract_message_data(payload)[2] == "wamid.a1"
+
+    statuses = service.extract_statuses(payload)
+    assert [(s["message_id"], s["status"]) for s in statuses] == [
+        ("wamid.out1", "delivered"),
+        ("wamid.out2", "read"),
+    ]
+    assert service.extract_status_data(payload)["message_id"] == "wamid.out1"
+    assert service.extract_messages({"object": "whatsapp_business_account"}) == []
+
+
+def test_messenger_extract_messages_cover_all_entries(monkeypatch):
+    monkeypatch.setenv("META_PAGE_ACCESS_TOKEN", "page_token")
+    monkeypatch.setenv("META_PAGE_ID", "PAGE")
+    from services.meta_messenger_service import MetaMessengerService
+
+    service = MetaMessengerService()
+    payload = {
+        "object": "page",
+        "entry": [
+            {"messaging": [
+                {"sender": {"id": "u1"}, "recipient": {"id": "PAGE"}, "message": {"mid": "m1", "text": "hola"}},
+                {"sender": {"id": "u2"}, "recipient": {"id": "PAGE"}, "message": {"mid": "m2", "text": "chau"}},
+            ]},
+            {"messaging": [
+                {"sender": {"id": "u1"}, "recipient": {"id": "PAGE"}, "message": {"mid": "m3", "text": "otra"}},
+                {"sender": {"id": "u9"}, "recipient": {"id": "OTHER"}, "message": {"mid": "m4", "text": "x"}},
+            ]},
+        ],
+    }
+
+    messages = service.extract_messages(payload)
+    assert [(m[0], m[1], m[2]) for m in messages] == [
+        ("messenger:u1", "hola", "m1"),
+        ("messenger:u2", "chau", "m2"),
+        ("messenger:u1", "otra", "m3"),
+    ]
+
+
+def test_webhook_dispatches_every_message_ordered_per_sender(monkeypatch):
+    _setup_env(monkeypatch)
+    import main
+
+    # El servicio lee el entorno al importarse: fijarlo por si otro test lo importó antes
+    monkeypatch.setattr(main.meta_whatsapp_service, "app_secret", "test_secret")
+    monkeypatch.setattr(main.meta_whatsapp_service, "phone_number_id", "123456789")
+
+    handled = []
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    status_calls = []
+
+    async def fake_handle(message_data, is_whatsapp, **_):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+            handled.append((message_data[0], message_data[2]))
+        return main.PlainTextResponse("", status_code=200)
+
+    monkeypatch.setattr(main, "_handle_inbound_message", fake_handle)
+    monkeypatch.setattr(main, "_handle_status_update", lambda data: status_calls.append(data["status"]))
+
+    body = json.dumps(_batched_payload())
+    signature = hmac.new(b"test_secret", body.encode("utf-8"), hashlib.sha256).hexdigest()
+    response = TestClient(main.app).post(
+        "/webhook/whatsapp",
+        content=body,
+        headers={"X-Hub-Signature-256": f"sha256={signature}", "Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 200
+    assert sorted(handled) == sorted([
+        ("+5491100000001", "wamid.a1"),
+        ("+5491100000002", "wamid.b1"),
+        ("+5491100000001", "wamid.a2"),
+    ])
+    sender_one = [mid for phone, mid in handled if phone == "+5491100000001"]
+    assert sender_one == ["wamid.a1", "wamid.a2"]
+    assert active["max"] == 2
+    assert status_calls == ["delivered", "read"]